@@ -38,6 +38,12 @@ export const OPTIONS_CONTEXT_SERVER: IOptionsContext = {
             valuePath: ["lftp", "use_ssh_key"],
             description: null
         },
+        {
+            type: OptionType.Checkbox,
+            label: "Reuse SSH Connections",
+            valuePath: ["lftp", "use_ssh_multiplexing"],
+            description: "Keep one SSH connection open to the server and use it for all remote scans and deletes"
+        },
         {
             type: OptionType.Text,
             label: "Server Directory",
@@ -86,6 +92,50 @@ export const OPTIONS_CONTEXT_DISCOVERY: IOptionsContext = {
             valuePath: ["controller", "interval_ms_downloading_scan"],
             description: "How often the downloading information is updated"
         },
+        {
+            type: OptionType.Text,
+            label: "Idle Scan Interval Limit (ms)",
+            valuePath: ["controller", "interval_ms_max_idle_scan"],
+            description: "Local scans are done less often while nothing changes, " +
+                         "up to this interval.\n" +
+                         "They are back to the scan interval as soon as something changes"
+        },
+        {
+            type: OptionType.Checkbox,
+            label: "Slow Down Idle Remote Scans",
+            valuePath: ["controller", "use_remote_scan_backoff"],
+            description: "Also scan the remote server less often while nothing changes, " +
+                         "up to the idle scan interval limit.\n" +
+                         "New remote files may take that long to show up, unless Auto-Queue is waiting for them"
+        },
+        {
+            type: OptionType.Text,
+            label: "Local Scan Workers",
+            valuePath: ["controller", "num_local_scan_workers"],
+            description: "Number of threads used to scan the local directory"
+        },
+        {
+            type: OptionType.Checkbox,
+            label: "Watch Local Directory",
+            valuePath: ["controller", "use_local_watch"],
+            description: "Use filesystem notifications to rescan only the local files that changed.\n" +
+                         "Don't enable this if the local directory is on a network share"
+        },
+        {
+            type: OptionType.Checkbox,
+            label: "Keep Remote Scanner Running",
+            valuePath: ["controller", "use_remote_scan_agent"],
+            description: "Keep the scanner running on the remote server between scans.\n" +
+                         "Repeat scans are faster, but a connection to the server stays open"
+        },
+        {
+            type: OptionType.Checkbox,
+            label: "Watch Remote Directory",
+            valuePath: ["controller", "use_remote_watch"],
+            description: "Use filesystem notifications on the remote server to pick up changes " +
+                         "as soon as they happen.\n" +
+                         "The remote directory is still fully rescanned at the remote scan interval"
+        },
     ]
 };
 
@@ -24,6 +24,10 @@ export abstract class BaseStreamService implements IStreamService {
         return this._eventNames;
     }
 
+    getStreamParams(): {[key: string]: string} {
+        return {};
+    }
+
     notifyConnected() {
         this.onConnected();
     }
@@ -32,8 +36,8 @@ export abstract class BaseStreamService implements IStreamService {
         this.onDisconnected();
     }
 
-    notifyEvent(eventName: string, data: string) {
-        this.onEvent(eventName, data);
+    notifyEvent(eventName: string, data: string, id?: string) {
+        this.onEvent(eventName, data, id);
     }
 
     protected registerEventName(eventName: string) {
@@ -44,8 +48,9 @@ export abstract class BaseStreamService implements IStreamService {
      * Callback for a new event
      * @param {string} eventName
      * @param {string} data
+     * @param {string} id, last event id of the stream
      */
-    protected abstract onEvent(eventName: string, data: string);
+    protected abstract onEvent(eventName: string, data: string, id?: string);
 
     /**
      * Callback for connected
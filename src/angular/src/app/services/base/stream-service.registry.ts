@@ -22,6 +22,13 @@ export interface IStreamService {
      */
     getEventNames(): string[];
 
+    /**
+     * Returns the query parameters this stream service adds to the
+     * stream url. They are read again on every reconnect.
+     * @returns {{[key: string]: string}}
+     */
+    getStreamParams(): {[key: string]: string};
+
     /**
      * Notifies the stream service that it is now connected
      */
@@ -36,8 +43,9 @@ export interface IStreamService {
      * Notifies the stream service of an event
      * @param {string} eventName
      * @param {string} data
+     * @param {string} id, last event id of the stream
      */
-    notifyEvent(eventName: string, data: string);
+    notifyEvent(eventName: string, data: string, id?: string);
 }
 
 
@@ -79,14 +87,26 @@ export class StreamDispatchService {
         return service;
     }
 
+    private getStreamUrl(): string {
+        const params: string[] = [];
+        for (let service of this._services) {
+            const serviceParams = service.getStreamParams();
+            for (let key of Object.keys(serviceParams)) {
+                params.push(encodeURIComponent(key) + "=" + encodeURIComponent(serviceParams[key]));
+            }
+        }
+        return params.length > 0 ? this.STREAM_URL + "?" + params.join("&") : this.STREAM_URL;
+    }
+
     private createSseObserver() {
         const observable = Observable.create(observer => {
-            const eventSource = EventSourceFactory.createEventSource(this.STREAM_URL);
+            const eventSource = EventSourceFactory.createEventSource(this.getStreamUrl());
             for (let eventName of Array.from(this._eventNameToServiceMap.keys())) {
                 eventSource.addEventListener(eventName, event => observer.next(
                     {
                         "event": eventName,
-                        "data": event.data
+                        "data": event.data,
+                        "id": event.lastEventId
                     }
                 ));
             }
@@ -114,9 +134,10 @@ export class StreamDispatchService {
             next: (x) => {
                 let eventName = x["event"];
                 let eventData = x["data"];
+                let eventId = x["id"];
                 // this._logger.debug("Received event:", eventName);
                 this._zone.run(() => {
-                    this._eventNameToServiceMap.get(eventName).notifyEvent(eventName, eventData);
+                    this._eventNameToServiceMap.get(eventName).notifyEvent(eventName, eventData, eventId);
                 });
             },
             error: err => {
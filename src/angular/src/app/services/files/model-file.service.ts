@@ -17,6 +17,9 @@ import {RestService, WebReaction} from "../utils/rest.service";
  * The model is stored as an Immutable Map of name=>ModelFiles. Hence, the
  * ModelFiles have no defined order. The name key allows more efficient
  * lookup and model diffing.
+ * The id of each event is the model version it brings the model up to.
+ * After a disconnect, the stream is resumed from the last version seen,
+ * so that only the missed changes are sent instead of the whole model.
  * Reference: http://blog.angular-university.io/how-to-build-angular2
  *            -apps-using-rxjs-observable-data-services-pitfalls-to-avoid
  */
@@ -26,10 +29,19 @@ export class ModelFileService extends BaseStreamService {
     private readonly EVENT_ADDED = "model-added";
     private readonly EVENT_UPDATED = "model-updated";
     private readonly EVENT_REMOVED = "model-removed";
+    private readonly EVENT_PATCHED = "model-patched";
+    private readonly EVENT_RESUMED = "model-resumed";
+
+    private readonly PARAM_MODEL_VERSION = "model_version";
 
     private _files: BehaviorSubject<Immutable.Map<string, ModelFile>> =
         new BehaviorSubject(Immutable.Map<string, ModelFile>());
 
+    // Model version of the last event, null if unknown
+    private _version: string = null;
+    // Model as of _version, kept while disconnected so that it can be resumed
+    private _resumeFiles: Immutable.Map<string, ModelFile> = null;
+
     constructor(private _logger: LoggerService,
                 private _restService: RestService) {
         super();
@@ -37,6 +49,8 @@ export class ModelFileService extends BaseStreamService {
         this.registerEventName(this.EVENT_ADDED);
         this.registerEventName(this.EVENT_UPDATED);
         this.registerEventName(this.EVENT_REMOVED);
+        this.registerEventName(this.EVENT_PATCHED);
+        this.registerEventName(this.EVENT_RESUMED);
     }
 
     get files(): Observable<Immutable.Map<string, ModelFile>> {
@@ -108,8 +122,16 @@ export class ModelFileService extends BaseStreamService {
         return this._restService.sendRequest(url);
     }
 
-    protected onEvent(eventName: string, data: string) {
+    getStreamParams(): {[key: string]: string} {
+        if (this._resumeFiles !== null) {
+            return {[this.PARAM_MODEL_VERSION]: this._version};
+        }
+        return {};
+    }
+
+    protected onEvent(eventName: string, data: string, id?: string) {
         this.parseEvent(eventName, data);
+        this._version = id ? id : null;
     }
 
     protected onConnected() {
@@ -117,6 +139,11 @@ export class ModelFileService extends BaseStreamService {
     }
 
     protected onDisconnected() {
+        // Keep the model in case the stream can be resumed
+        // If reconnecting failed, the model was already kept
+        if (this._version !== null && this._resumeFiles === null) {
+            this._resumeFiles = this._files.getValue();
+        }
         // Update clients by clearing the model
         this._files.next(this._files.getValue().clear());
     }
@@ -151,6 +178,7 @@ export class ModelFileService extends BaseStreamService {
             t1 = performance.now();
             this._logger.debug("ModelFile map creation took", (t1 - t0).toFixed(0), "ms");
 
+            this._resumeFiles = null;
             this._files.next(newMap);
             // this._logger.debug("New model: %O", this._files.getValue().toJS());
         } else if (name === this.EVENT_ADDED) {
@@ -186,6 +214,35 @@ export class ModelFileService extends BaseStreamService {
             } else {
                 this._logger.error("Failed to find ModelFile named " + file.name);
             }
+        } else if (name === this.EVENT_PATCHED) {
+            // Patched event receives the changes to a file by path
+            const parsed: {name: string, patches: any[]} = JSON.parse(data);
+            let file = this._files.getValue().get(parsed.name);
+            if (file === undefined) {
+                this._logger.error("Failed to find ModelFile named " + parsed.name);
+                return;
+            }
+            for (const patch of parsed.patches) {
+                // Paths include the file's own name
+                const patchedFile = ModelFile.applyPatch(file, patch.path.split("/").slice(1), patch);
+                if (patchedFile === null) {
+                    this._logger.error("Failed to apply patch to " + patch.path);
+                } else {
+                    file = patchedFile;
+                }
+            }
+            this._files.next(this._files.getValue().set(file.name, file));
+            this._logger.debug("Patched file: %O", file.toJS());
+        } else if (name === this.EVENT_RESUMED) {
+            // Resumed event means the model kept on disconnect is still
+            // current, and the missed changes follow
+            if (this._resumeFiles === null) {
+                this._logger.error("No model to resume");
+            } else {
+                this._files.next(this._resumeFiles);
+                this._resumeFiles = null;
+                this._logger.debug("Resumed model");
+            }
         } else {
             this._logger.error("Unrecognized event:", name);
         }
@@ -14,6 +14,9 @@ interface IModelFile {
     eta: number;
     full_path: string;
     is_extractable: boolean;
+    num_files: number;
+    num_remote_files: number;
+    num_downloaded_files: number;
     children: Set<ModelFile>;
 }
 
@@ -28,6 +31,9 @@ const DefaultModelFile: IModelFile = {
     eta: null,
     full_path: null,
     is_extractable: null,
+    num_files: null,
+    num_remote_files: null,
+    num_downloaded_files: null,
     children: null
 };
 const ModelFileRecord = Record(DefaultModelFile);
@@ -48,6 +54,9 @@ export class ModelFile extends ModelFileRecord implements IModelFile {
     eta: number;
     full_path: string;
     is_extractable: boolean;
+    num_files: number;
+    num_remote_files: number;
+    num_downloaded_files: number;
     children: Set<ModelFile>;
 
     constructor(props) {
@@ -71,6 +80,44 @@ export module ModelFile {
         return new ModelFile(json);
     }
 
+    /**
+     * Apply a patch received from the backend
+     * Returns the patched file, or null if the patch doesn't apply to it
+     * @param {ModelFile} file
+     * @param {string[]} path, relative to the file
+     * @param patch
+     * @returns {ModelFile}
+     */
+    export function applyPatch(file: ModelFile, path: string[], patch): ModelFile {
+        if (path.length === 0) {
+            // Patch this file
+            const fields = Object.assign({}, patch.fields);
+            if (fields.state !== undefined) {
+                fields.state = ModelFile.State[fields.state.toUpperCase()];
+            }
+            return <ModelFile> file.merge(fields);
+        }
+        const child = file.children.find(value => value.name === path[0]);
+        let children = file.children;
+        if (path.length === 1 && patch.change === "added") {
+            if (child !== undefined) {
+                return null;
+            }
+            children = children.add(ModelFile.fromJson(patch.file));
+        } else if (child === undefined) {
+            return null;
+        } else if (path.length === 1 && patch.change === "removed") {
+            children = children.remove(child);
+        } else {
+            const patchedChild = ModelFile.applyPatch(child, path.slice(1), patch);
+            if (patchedChild === null) {
+                return null;
+            }
+            children = children.remove(child).add(patchedChild);
+        }
+        return <ModelFile> file.set("children", children);
+    }
+
     export enum State {
         DEFAULT         = <any> "default",
         QUEUED          = <any> "queued",
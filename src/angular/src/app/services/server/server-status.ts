@@ -12,6 +12,8 @@ interface IServerStatus {
     controller: {
         latestLocalScanTime: Date;
         latestRemoteScanTime: Date;
+        localScanIntervalMs: number;
+        remoteScanIntervalMs: number;
     };
 }
 const DefaultServerStatus: IServerStatus = {
@@ -21,7 +23,9 @@ const DefaultServerStatus: IServerStatus = {
     },
     controller: {
         latestLocalScanTime: null,
-        latestRemoteScanTime: null
+        latestRemoteScanTime: null,
+        localScanIntervalMs: null,
+        remoteScanIntervalMs: null
     }
 };
 const ServerStatusRecord = Record(DefaultServerStatus);
@@ -34,6 +38,8 @@ export class ServerStatus extends ServerStatusRecord implements IServerStatus {
     controller: {
         latestLocalScanTime: Date;
         latestRemoteScanTime: Date;
+        localScanIntervalMs: number;
+        remoteScanIntervalMs: number;
     };
 
     constructor(props) {
@@ -63,7 +69,9 @@ export module ServerStatus {
             },
             controller: {
                 latestLocalScanTime: latestLocalScanTime,
-                latestRemoteScanTime: latestRemoteScanTime
+                latestRemoteScanTime: latestRemoteScanTime,
+                localScanIntervalMs: json.controller.local_scan_interval_ms,
+                remoteScanIntervalMs: json.controller.remote_scan_interval_ms
             }
         });
     }
@@ -82,5 +90,7 @@ export interface ServerStatusJson {
     controller: {
         latest_local_scan_time: string;
         latest_remote_scan_time: string;
+        local_scan_interval_ms: number;
+        remote_scan_interval_ms: number;
     }
 }
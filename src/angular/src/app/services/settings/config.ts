@@ -28,6 +28,7 @@ interface ILftp {
     local_path: string;
     remote_path_to_scan_script: string;
     use_ssh_key: boolean;
+    use_ssh_multiplexing: boolean;
     num_max_parallel_downloads: number;
     num_max_parallel_files_per_download: number;
     num_max_connections_per_root_file: number;
@@ -44,6 +45,7 @@ const DefaultLftp: ILftp = {
     local_path: null,
     remote_path_to_scan_script: null,
     use_ssh_key: null,
+    use_ssh_multiplexing: null,
     num_max_parallel_downloads: null,
     num_max_parallel_files_per_download: null,
     num_max_connections_per_root_file: null,
@@ -60,15 +62,27 @@ interface IController {
     interval_ms_remote_scan: number;
     interval_ms_local_scan: number;
     interval_ms_downloading_scan: number;
+    interval_ms_max_idle_scan: number;
+    use_remote_scan_backoff: boolean;
     extract_path: string;
     use_local_path_as_extract_path: boolean;
+    num_local_scan_workers: number;
+    use_local_watch: boolean;
+    use_remote_scan_agent: boolean;
+    use_remote_watch: boolean;
 }
 const DefaultController: IController = {
     interval_ms_remote_scan: null,
     interval_ms_local_scan: null,
     interval_ms_downloading_scan: null,
+    interval_ms_max_idle_scan: null,
+    use_remote_scan_backoff: null,
     extract_path: null,
     use_local_path_as_extract_path: null,
+    num_local_scan_workers: null,
+    use_local_watch: null,
+    use_remote_scan_agent: null,
+    use_remote_watch: null,
 };
 const ControllerRecord = Record(DefaultController);
 
@@ -12,11 +12,17 @@ import {LogService} from "../../../../services/logs/log.service";
 class MockStreamService implements IStreamService {
     eventList = [];
     connectedSeq = [];
+    idList = [];
+    streamParams = {};
 
     getEventNames(): string[] {
         throw new Error("Method not implemented.");
     }
 
+    getStreamParams(): {[key: string]: string} {
+        return this.streamParams;
+    }
+
     notifyConnected() {
         this.connectedSeq.push(true);
     }
@@ -25,8 +31,9 @@ class MockStreamService implements IStreamService {
         this.connectedSeq.push(false);
     }
 
-    notifyEvent(eventName: string, data: string) {
+    notifyEvent(eventName: string, data: string, id?: string) {
         this.eventList.push([eventName, data]);
+        this.idList.push(id);
     }
 }
 
@@ -73,6 +80,20 @@ describe("Testing stream dispatch service", () => {
         expect(mockEventSource.url).toBe("/server/stream");
     }));
 
+    it("should add the services' params to the url on reconnect", fakeAsync(() => {
+        mockService1.streamParams = {"param1": "value 1"};
+        mockService2.streamParams = {"param2": "2"};
+        mockEventSource.onerror(new Event("bad event"));
+        tick(4000);
+        expect(mockEventSource.url).toBe("/server/stream?param1=value%201&param2=2");
+    }));
+
+    it("should forward the event id", fakeAsync(() => {
+        mockEventSource.eventListeners.get("event1a")({data: "data1a", lastEventId: "42"});
+        tick();
+        expect(mockService1.idList).toEqual(["42"]);
+    }));
+
     it("should register all events with the event source", fakeAsync(() => {
         expect(mockEventSource.addEventListener).toHaveBeenCalledTimes(4);
         expect(mockEventSource.eventListeners.size).toBe(4);
@@ -40,7 +40,7 @@ describe("Testing model file service", () => {
 
     it("should register all events with the event source", () => {
         expect(modelFileService.getEventNames()).toEqual(
-            ["model-init", "model-added", "model-updated", "model-removed"]
+            ["model-init", "model-added", "model-updated", "model-removed", "model-patched", "model-resumed"]
         );
     });
 
@@ -287,6 +287,96 @@ describe("Testing model file service", () => {
         expect(Immutable.is(latestModel.get("File.One"), expectedModelFiles[0])).toBe(true);
     }));
 
+    it("should apply patches on a patched event", fakeAsync(() => {
+        let initialModelFiles = [
+            {
+                name: "Dir.One",
+                is_dir: true,
+                local_size: 100,
+                remote_size: 300,
+                state: "downloading",
+                downloading_speed: 10,
+                eta: 20,
+                full_path: "Dir.One",
+                children: [
+                    {
+                        name: "File.One",
+                        is_dir: false,
+                        local_size: 100,
+                        remote_size: 100,
+                        state: "downloaded",
+                        downloading_speed: null,
+                        eta: null,
+                        full_path: "Dir.One/File.One",
+                        children: []
+                    },
+                    {
+                        name: "File.Two",
+                        is_dir: false,
+                        local_size: 0,
+                        remote_size: 200,
+                        state: "queued",
+                        downloading_speed: null,
+                        eta: null,
+                        full_path: "Dir.One/File.Two",
+                        children: []
+                    }
+                ]
+            }
+        ];
+        modelFileService.notifyEvent("model-init", JSON.stringify(initialModelFiles));
+
+        let count = 0;
+        let latestModel: Immutable.Map<string, ModelFile> = null;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                count++;
+                latestModel = modelFiles;
+            }
+        });
+        tick();
+        expect(count).toBe(1);
+
+        let patch = {
+            name: "Dir.One",
+            patches: [
+                {change: "updated", path: "Dir.One", fields: {local_size: 150}},
+                {change: "updated", path: "Dir.One/File.Two", fields: {local_size: 50, state: "downloading"}},
+                {change: "removed", path: "Dir.One/File.One"},
+                {
+                    change: "added",
+                    path: "Dir.One/File.Three",
+                    file: {
+                        name: "File.Three",
+                        is_dir: false,
+                        local_size: null,
+                        remote_size: 10,
+                        state: "default",
+                        downloading_speed: null,
+                        eta: null,
+                        full_path: "Dir.One/File.Three",
+                        children: []
+                    }
+                }
+            ]
+        };
+        modelFileService.notifyEvent("model-patched", JSON.stringify(patch));
+        tick();
+        expect(count).toBe(2);
+        expect(latestModel.size).toBe(1);
+        const dir = latestModel.get("Dir.One");
+        expect(dir.local_size).toBe(150);
+        expect(dir.remote_size).toBe(300);
+        expect(dir.children.size).toBe(2);
+        const fileTwo = dir.children.find(value => value.name === "File.Two");
+        expect(fileTwo.local_size).toBe(50);
+        expect(fileTwo.state).toBe(ModelFile.State.DOWNLOADING);
+        expect(fileTwo.remote_size).toBe(200);
+        const fileThree = dir.children.find(value => value.name === "File.Three");
+        expect(fileThree.remote_size).toBe(10);
+        expect(fileThree.state).toBe(ModelFile.State.DEFAULT);
+    }));
+
     it("should send empty model on disconnect", fakeAsync(() => {
         let count = 0;
         let latestModel: Immutable.Map<string, ModelFile> = null;
@@ -308,6 +398,93 @@ describe("Testing model file service", () => {
         tick(4000);
     }));
 
+    it("should resume the model from the last version after a disconnect", fakeAsync(() => {
+        let initialModelFiles = [
+            {
+                name: "File.One",
+                is_dir: false,
+                local_size: 1234,
+                remote_size: 4567,
+                state: "default",
+                downloading_speed: 99,
+                eta: 54,
+                full_path: "/full/path/to/file.one",
+                children: []
+            }
+        ];
+        expect(modelFileService.getStreamParams()).toEqual({});
+        modelFileService.notifyEvent("model-init", JSON.stringify(initialModelFiles), "41");
+        let removedModelFile = {
+            new_file: {},
+            old_file: initialModelFiles[0]
+        };
+        modelFileService.notifyEvent("model-removed", JSON.stringify(removedModelFile), "42");
+        modelFileService.notifyEvent("model-added", JSON.stringify({new_file: initialModelFiles[0]}), "43");
+
+        let count = 0;
+        let latestModel: Immutable.Map<string, ModelFile> = null;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                count++;
+                latestModel = modelFiles;
+            }
+        });
+        tick();
+        expect(count).toBe(1);
+        expect(latestModel.size).toBe(1);
+        // Not resuming while connected
+        expect(modelFileService.getStreamParams()).toEqual({});
+
+        modelFileService.notifyDisconnected();
+        tick();
+        expect(count).toBe(2);
+        expect(latestModel.size).toBe(0);
+        expect(modelFileService.getStreamParams()).toEqual({model_version: "43"});
+
+        // Reconnect fails
+        modelFileService.notifyDisconnected();
+        tick();
+        expect(modelFileService.getStreamParams()).toEqual({model_version: "43"});
+
+        modelFileService.notifyEvent("model-resumed", JSON.stringify({}), "43");
+        tick();
+        expect(count).toBe(4);
+        expect(latestModel.size).toBe(1);
+        expect(latestModel.get("File.One").local_size).toBe(1234);
+        expect(modelFileService.getStreamParams()).toEqual({});
+    }));
+
+    it("should replace the model if the stream can't be resumed", fakeAsync(() => {
+        let initialModelFiles = [
+            {
+                name: "File.One",
+                is_dir: false,
+                local_size: 1234,
+                remote_size: 4567,
+                state: "default",
+                downloading_speed: 99,
+                eta: 54,
+                full_path: "/full/path/to/file.one",
+                children: []
+            }
+        ];
+        modelFileService.notifyEvent("model-init", JSON.stringify(initialModelFiles), "41");
+        modelFileService.notifyDisconnected();
+        expect(modelFileService.getStreamParams()).toEqual({model_version: "41"});
+
+        let latestModel: Immutable.Map<string, ModelFile> = null;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                latestModel = modelFiles;
+            }
+        });
+        modelFileService.notifyEvent("model-init", JSON.stringify([]), "1000");
+        tick();
+        expect(latestModel.size).toBe(0);
+        expect(modelFileService.getStreamParams()).toEqual({});
+    }));
+
+
     it("should send a GET on queue command", fakeAsync(() => {
         // Connect the service
         modelFileService.notifyConnected();
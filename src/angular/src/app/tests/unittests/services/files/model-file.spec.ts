@@ -17,6 +17,9 @@ describe("Testing config record initialization", () => {
             eta: 54,
             full_path: "/full/path/to/file.one",
             is_extractable: true,
+            num_files: 0,
+            num_remote_files: 0,
+            num_downloaded_files: 0,
             children: []
         };
         baseModelFile = ModelFile.fromJson(baseJson);
@@ -64,6 +67,9 @@ describe("Testing config record initialization", () => {
         expect(baseModelFile.eta).toBe(54);
         expect(baseModelFile.full_path).toBe("/full/path/to/file.one");
         expect(baseModelFile.is_extractable).toBe(true);
+        expect(baseModelFile.num_files).toBe(0);
+        expect(baseModelFile.num_remote_files).toBe(0);
+        expect(baseModelFile.num_downloaded_files).toBe(0);
         expect(baseModelFile.children.size).toBe(0);
     });
 
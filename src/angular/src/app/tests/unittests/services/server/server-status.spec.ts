@@ -16,6 +16,8 @@ describe("Testing log record initialization", () => {
             controller: {
                 latest_local_scan_time: "1514776875.9439101",
                 latest_remote_scan_time: "1524743857.3456243",
+                local_scan_interval_ms: 10000,
+                remote_scan_interval_ms: 60000,
             }
         };
         baseStatus = ServerStatus.fromJson(baseJson);
@@ -48,4 +50,9 @@ describe("Testing log record initialization", () => {
         let newStatus = ServerStatus.fromJson(baseJson);
         expect(newStatus.controller.latestRemoteScanTime).toBeNull();
     });
+
+    it("should correctly initialize controller scan intervals", () => {
+        expect(baseStatus.controller.localScanIntervalMs).toBe(10000);
+        expect(baseStatus.controller.remoteScanIntervalMs).toBe(60000);
+    });
 });
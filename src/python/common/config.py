@@ -103,23 +103,30 @@ class InnerConfig(ABC):
     Each property has associated with is a checker and a converter function.
     The checker function performs boundary check on the native type value.
     The converter function converts the string representation into the native type.
+    A property may also have a default value, used when it is missing from a dict. This
+    lets config files written before the property was added still be loaded.
     """
     class PropMetadata:
         """Tracks property metadata"""
-        def __init__(self, checker: Callable, converter: Callable):
+        def __init__(self, checker: Callable, converter: Callable, default: Any):
             self.checker = checker
             self.converter = converter
+            self.default = default
 
     # Global map to map a property to its metadata
     # Is there a way for each concrete class to do this separately?
     __prop_addon_map = collections.OrderedDict()
 
     @classmethod
-    def _create_property(cls, name: str, checker: Callable, converter: Callable) -> property:
+    def _create_property(cls,
+                         name: str,
+                         checker: Callable,
+                         converter: Callable,
+                         default: Any = None) -> property:
         # noinspection PyProtectedMember
         prop = property(fget=lambda s: s._get_property(name),
                         fset=lambda s, v: s._set_property(name, v, checker))
-        prop_addon = InnerConfig.PropMetadata(checker=checker, converter=converter)
+        prop_addon = InnerConfig.PropMetadata(checker=checker, converter=converter, default=default)
         InnerConfig.__prop_addon_map[prop] = prop_addon
         return prop
 
@@ -144,15 +151,20 @@ class InnerConfig(ABC):
         config_dict = dict(config_dict)  # copy that we can modify
 
         # Loop over all the property name, and set them to the value given in config_dict
-        # Raise error if a matching key is not found in config_dict
+        # Use the default value if a matching key is not found in config_dict
+        # Raise error if there's no default value either
         # noinspection PyCallingNonCallable
         inner_config = cls()
         property_map = {p: getattr(cls, p) for p in dir(cls) if isinstance(getattr(cls, p), property)}
         for name, prop in property_map.items():
             if name not in config_dict:
-                raise ConfigError("Missing config: {}.{}".format(cls.__name__, name))
-            inner_config.set_property(name, config_dict[name])
-            del config_dict[name]
+                default = InnerConfig.__prop_addon_map[prop].default
+                if default is None:
+                    raise ConfigError("Missing config: {}.{}".format(cls.__name__, name))
+                inner_config.set_property(name, default)
+            else:
+                inner_config.set_property(name, config_dict[name])
+                del config_dict[name]
 
         # Raise error if a key in config_dict did not match a property
         extra_keys = config_dict.keys()
@@ -234,6 +246,7 @@ class Config(Persist):
         local_path = PROP("local_path", Checkers.string_nonempty, Converters.null)
         remote_path_to_scan_script = PROP("remote_path_to_scan_script", Checkers.string_nonempty, Converters.null)
         use_ssh_key = PROP("use_ssh_key", Checkers.null, Converters.bool)
+        use_ssh_multiplexing = PROP("use_ssh_multiplexing", Checkers.null, Converters.bool, False)
         num_max_parallel_downloads = PROP("num_max_parallel_downloads", Checkers.int_positive, Converters.int)
         num_max_parallel_files_per_download = PROP("num_max_parallel_files_per_download",
                                                    Checkers.int_positive,
@@ -257,6 +270,7 @@ class Config(Persist):
             self.local_path = None
             self.remote_path_to_scan_script = None
             self.use_ssh_key = None
+            self.use_ssh_multiplexing = None
             self.num_max_parallel_downloads = None
             self.num_max_parallel_files_per_download = None
             self.num_max_connections_per_root_file = None
@@ -268,16 +282,28 @@ class Config(Persist):
         interval_ms_remote_scan = PROP("interval_ms_remote_scan", Checkers.int_positive, Converters.int)
         interval_ms_local_scan = PROP("interval_ms_local_scan", Checkers.int_positive, Converters.int)
         interval_ms_downloading_scan = PROP("interval_ms_downloading_scan", Checkers.int_positive, Converters.int)
+        interval_ms_max_idle_scan = PROP("interval_ms_max_idle_scan", Checkers.int_positive, Converters.int, 300000)
+        use_remote_scan_backoff = PROP("use_remote_scan_backoff", Checkers.null, Converters.bool, False)
         extract_path = PROP("extract_path", Checkers.string_nonempty, Converters.null)
         use_local_path_as_extract_path = PROP("use_local_path_as_extract_path", Checkers.null, Converters.bool)
+        num_local_scan_workers = PROP("num_local_scan_workers", Checkers.int_positive, Converters.int, 4)
+        use_local_watch = PROP("use_local_watch", Checkers.null, Converters.bool, False)
+        use_remote_scan_agent = PROP("use_remote_scan_agent", Checkers.null, Converters.bool, False)
+        use_remote_watch = PROP("use_remote_watch", Checkers.null, Converters.bool, False)
 
         def __init__(self):
             super().__init__()
             self.interval_ms_remote_scan = None
             self.interval_ms_local_scan = None
             self.interval_ms_downloading_scan = None
+            self.interval_ms_max_idle_scan = None
+            self.use_remote_scan_backoff = None
             self.extract_path = None
             self.use_local_path_as_extract_path = None
+            self.num_local_scan_workers = None
+            self.use_local_watch = None
+            self.use_remote_scan_agent = None
+            self.use_remote_watch = None
 
     class Web(InnerConfig):
         port = PROP("port", Checkers.int_positive, Converters.int)
@@ -12,5 +12,6 @@ class Constants:
     LOG_BACKUP_COUNT = 10
     WEB_ACCESS_LOG_NAME = 'web_access'
     MIN_PERSIST_TO_FILE_INTERVAL_IN_SECS = 30
+    MIN_SNAPSHOT_TO_FILE_INTERVAL_IN_SECS = 300
     JSON_PRETTY_PRINT_INDENT = 4
     LFTP_TEMP_FILE_SUFFIX = ".lftp"
@@ -115,11 +115,15 @@ class Status(BaseStatus):
     class ControllerStatus(StatusComponent):
         latest_local_scan_time = StatusComponent._create_property("latest_local_scan_time")
         latest_remote_scan_time = StatusComponent._create_property("latest_remote_scan_time")
+        local_scan_interval_ms = StatusComponent._create_property("local_scan_interval_ms")
+        remote_scan_interval_ms = StatusComponent._create_property("remote_scan_interval_ms")
 
         def __init__(self):
             super().__init__()
             self.latest_local_scan_time = None
             self.latest_remote_scan_time = None
+            self.local_scan_interval_ms = None
+            self.remote_scan_interval_ms = None
 
     # ----- End of component definition -----
 
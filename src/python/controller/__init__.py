@@ -3,6 +3,7 @@
 from .controller import Controller
 from .controller_job import ControllerJob
 from .controller_persist import ControllerPersist
+from .controller_snapshot import ControllerSnapshot
 from .model_builder import ModelBuilder
 from .auto_queue import AutoQueue, AutoQueuePersist, IAutoQueuePersistListener, AutoQueuePattern
-from .scan import IScanner, ScannerResult, ScannerProcess
+from .scan import IScanner, ScannerResult, ScannerSingleResult, ScannerProcess
@@ -159,6 +159,8 @@ class AutoQueue:
         self.__enabled = context.config.autoqueue.enabled
         self.__patterns_only = context.config.autoqueue.patterns_only
         self.__auto_extract_enabled = context.config.autoqueue.auto_extract
+        # Whether processing was held back for a model from a snapshot
+        self.__waited_for_scans = False
 
         if self.__enabled:
             persist.add_listener(self.__persist_listener)
@@ -181,6 +183,24 @@ class AutoQueue:
         if not self.__enabled:
             return
 
+        # New remote files are queued as soon as they're scanned, so don't let
+        # the remote scans back off while there's anything to queue them for
+        self.__controller.set_waiting_for_remote_files(
+            not self.__patterns_only or bool(self.__persist.patterns)
+        )
+
+        if self.__controller.is_model_from_snapshot():
+            # The snapshot's files may have been deleted or changed since,
+            # so nothing is done until the new scans are in
+            self.__waited_for_scans = True
+            return
+        if self.__waited_for_scans:
+            # Files that didn't change since the snapshot have no events,
+            # so all files are candidates, as on a start without a snapshot
+            self.__waited_for_scans = False
+            self.__model_listener.new_files = self.__controller.get_model_files()
+            self.__model_listener.modified_files.clear()
+
         ###
         # Queue
         ###
@@ -1,20 +1,21 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 from abc import ABC, abstractmethod
-from typing import List, Callable
+from typing import List, Callable, Optional, Tuple
 from threading import Lock
 from queue import Queue
 from enum import Enum
-import copy
+import functools
 
 # my libs
-from .scan import ScannerProcess, ActiveScanner, LocalScanner, RemoteScanner
+from .scan import ScannerProcess, ActiveScanner, LocalScanner, RemoteScanner, RemoteWatchScanner
 from .extract import ExtractProcess, ExtractStatus
 from .model_builder import ModelBuilder
 from common import Context, AppError, MultiprocessingLogger, AppOneShotProcess, Constants
-from model import ModelError, ModelFile, Model, ModelDiff, ModelDiffUtil, IModelListener
+from model import ModelError, ModelFile, Model, ModelChange, ModelDiff, ModelDiffUtil, IModelListener
 from lftp import Lftp, LftpError, LftpJobStatus
 from .controller_persist import ControllerPersist
+from .controller_snapshot import ControllerSnapshot
 from .delete import DeleteLocalProcess, DeleteRemoteProcess
 
 
@@ -29,6 +30,15 @@ class Controller:
     """
     Top-level class that controls the behaviour of the app
     """
+    # How often to pick up the changes pushed by the remote watch
+    __REMOTE_WATCH_INTERVAL_IN_MS = 500
+    # Spread out remote scans so they don't keep hitting the server at the same time
+    __REMOTE_SCAN_JITTER = 0.1
+    # Size of the recent model changes kept for readers that reconnect, in
+    # number of files and patches
+    # Updates are kept as patches, so this is usually many thousands of changes
+    __MODEL_HISTORY_MAX_NODES = 100000
+
     class Command:
         """
         Class by which clients of Controller can request Actions to be executed
@@ -73,9 +83,18 @@ class Controller:
 
     def __init__(self,
                  context: Context,
-                 persist: ControllerPersist):
+                 persist: ControllerPersist,
+                 snapshot: Optional[ControllerSnapshot] = None):
+        """
+        :param context:
+        :param persist:
+        :param snapshot: Snapshot of the last run. The model is built from it
+                         right away, and the snapshot is kept up to date with
+                         the new scans
+        """
         self.__context = context
         self.__persist = persist
+        self.__snapshot = snapshot if snapshot is not None else ControllerSnapshot()
         self.logger = context.logger.getChild("Controller")
 
         # Decide the password here
@@ -85,7 +104,7 @@ class Controller:
         self.__command_queue = Queue()
 
         # The model
-        self.__model = Model()
+        self.__model = Model(history_max_nodes=Controller.__MODEL_HISTORY_MAX_NODES)
         self.__model.set_base_logger(self.logger)
         # Lock for the model
         # Note: While the scanners are in a separate process, the rest of the application
@@ -99,6 +118,11 @@ class Controller:
         self.__model_builder.set_base_logger(self.logger)
         self.__model_builder.set_downloaded_files(self.__persist.downloaded_file_names)
         self.__model_builder.set_extracted_files(self.__persist.extracted_file_names)
+        # Whether the model still has files from the snapshot, until the
+        # first full scans of this run are in
+        self.__has_snapshot_local_files = False
+        self.__has_snapshot_remote_files = False
+        self.__load_snapshot()
 
         # Lftp
         self.__lftp = Lftp(address=self.__context.config.lftp.remote_address,
@@ -122,17 +146,46 @@ class Controller:
         self.__active_scanner = ActiveScanner(self.__context.config.lftp.local_path)
         self.__local_scanner = LocalScanner(
             local_path=self.__context.config.lftp.local_path,
-            use_temp_file=self.__context.config.lftp.use_temp_file
-        )
-        self.__remote_scanner = RemoteScanner(
-            remote_address=self.__context.config.lftp.remote_address,
-            remote_username=self.__context.config.lftp.remote_username,
-            remote_password=self.__password,
-            remote_port=self.__context.config.lftp.remote_port,
-            remote_path_to_scan=self.__context.config.lftp.remote_path,
-            local_path_to_scan_script=self.__context.args.local_path_to_scanfs,
-            remote_path_to_scan_script=self.__context.config.lftp.remote_path_to_scan_script
+            use_temp_file=self.__context.config.lftp.use_temp_file,
+            num_workers=self.__context.config.controller.num_local_scan_workers,
+            use_watch=self.__context.config.controller.use_local_watch
         )
+        remote_scan_interval_in_ms = self.__context.config.controller.interval_ms_remote_scan
+        max_idle_scan_interval_in_ms = self.__context.config.controller.interval_ms_max_idle_scan
+        if self.__context.config.controller.use_remote_watch:
+            self.__remote_scanner = RemoteWatchScanner(
+                remote_address=self.__context.config.lftp.remote_address,
+                remote_username=self.__context.config.lftp.remote_username,
+                remote_password=self.__password,
+                remote_port=self.__context.config.lftp.remote_port,
+                remote_path_to_scan=self.__context.config.lftp.remote_path,
+                local_path_to_scan_script=self.__context.args.local_path_to_scanfs,
+                remote_path_to_scan_script=self.__context.config.lftp.remote_path_to_scan_script,
+                rescan_interval_in_ms=remote_scan_interval_in_ms,
+                use_multiplexing=self.__context.config.lftp.use_ssh_multiplexing
+            )
+            # Changes are pushed by the remote server, so checking for them is cheap
+            remote_scan_interval_in_ms = min(remote_scan_interval_in_ms,
+                                             Controller.__REMOTE_WATCH_INTERVAL_IN_MS)
+            # Backing off would only delay the changes that were pushed
+            max_remote_scan_interval_in_ms = None
+            remote_scan_jitter = 0.0
+        else:
+            self.__remote_scanner = RemoteScanner(
+                remote_address=self.__context.config.lftp.remote_address,
+                remote_username=self.__context.config.lftp.remote_username,
+                remote_password=self.__password,
+                remote_port=self.__context.config.lftp.remote_port,
+                remote_path_to_scan=self.__context.config.lftp.remote_path,
+                local_path_to_scan_script=self.__context.args.local_path_to_scanfs,
+                remote_path_to_scan_script=self.__context.config.lftp.remote_path_to_scan_script,
+                use_multiplexing=self.__context.config.lftp.use_ssh_multiplexing,
+                use_agent=self.__context.config.controller.use_remote_scan_agent
+            )
+            # Backing off delays new remote files, so it's opt-in
+            max_remote_scan_interval_in_ms = max_idle_scan_interval_in_ms \
+                if self.__context.config.controller.use_remote_scan_backoff else None
+            remote_scan_jitter = Controller.__REMOTE_SCAN_JITTER
 
         self.__active_scan_process = ScannerProcess(
             scanner=self.__active_scanner,
@@ -142,10 +195,15 @@ class Controller:
         self.__local_scan_process = ScannerProcess(
             scanner=self.__local_scanner,
             interval_in_ms=self.__context.config.controller.interval_ms_local_scan,
+            # With a watch, scans only check for notifications
+            max_interval_in_ms=None if self.__context.config.controller.use_local_watch
+            else max_idle_scan_interval_in_ms
         )
         self.__remote_scan_process = ScannerProcess(
             scanner=self.__remote_scanner,
-            interval_in_ms=self.__context.config.controller.interval_ms_remote_scan,
+            interval_in_ms=remote_scan_interval_in_ms,
+            max_interval_in_ms=max_remote_scan_interval_in_ms,
+            jitter=remote_scan_jitter
         )
 
         # Setup extract process
@@ -219,15 +277,25 @@ class Controller:
 
     def get_model_files(self) -> List[ModelFile]:
         """
-        Returns a copy of all the model files
+        Returns all the model files
+        Model files are frozen, so they are shared rather than copied
         :return:
         """
         # Lock the model
         self.__model_lock.acquire()
-        model_files = self.__get_model_files()
+        model_files = self.__model.get_files()
         # Release the model
         self.__model_lock.release()
-        return model_files
+        return list(model_files)
+
+    def is_model_from_snapshot(self) -> bool:
+        """
+        Returns True while the model has files from the snapshot of the last
+        run, which may have changed since
+        Nothing should be queued or extracted based on those files
+        :return:
+        """
+        return self.__has_snapshot_local_files or self.__has_snapshot_remote_files
 
     def add_model_listener(self, listener: IModelListener):
         """
@@ -269,25 +337,67 @@ class Controller:
         # Lock the model
         self.__model_lock.acquire()
         self.__model.add_listener(listener)
-        model_files = self.__get_model_files()
+        model_files = self.__model.get_files()
+        # Release the model
+        self.__model_lock.release()
+        return list(model_files)
+
+    def get_model_version_and_files_and_add_listener(self, listener: IModelListener) -> Tuple[int, List[ModelFile]]:
+        """
+        Same as get_model_files_and_add_listener, but also returns the version
+        of the model that the files are from
+        The listener's events are for the following versions, in order
+        :param listener:
+        :return: (version, files)
+        """
+        # Lock the model
+        self.__model_lock.acquire()
+        self.__model.add_listener(listener)
+        version = self.__model.version
+        model_files = self.__model.get_files()
+        # Release the model
+        self.__model_lock.release()
+        return version, list(model_files)
+
+    def get_model_changes_and_add_listener(self, listener: IModelListener, version: int) \
+            -> Optional[List[ModelChange]]:
+        """
+        Adds a listener and returns the model changes since the given version
+        in one atomic operation, see Model.get_changes_since
+        Returns None, without adding the listener, if those changes are no
+        longer available
+        :param listener:
+        :param version:
+        :return:
+        """
+        # Lock the model
+        self.__model_lock.acquire()
+        changes = self.__model.get_changes_since(version)
+        if changes is not None:
+            self.__model.add_listener(listener)
         # Release the model
         self.__model_lock.release()
-        return model_files
+        return changes
 
     def queue_command(self, command: Command):
         self.__command_queue.put(command)
 
-    def __get_model_files(self) -> List[ModelFile]:
-        model_files = []
-        for filename in self.__model.get_file_names():
-            model_files.append(copy.deepcopy(self.__model.get_file(filename)))
-        return model_files
+    def set_waiting_for_remote_files(self, waiting: bool):
+        """
+        Keep scanning the remote server at the scan interval while something
+        is waiting for new remote files, for example AutoQueue patterns
+        :param waiting:
+        :return:
+        """
+        self.__remote_scan_process.set_busy(waiting)
 
     def __update_model(self):
         # Grab the latest scan results
         latest_remote_scan = self.__remote_scan_process.pop_latest_result()
         latest_local_scan = self.__local_scan_process.pop_latest_result()
         latest_active_scan = self.__active_scan_process.pop_latest_result()
+        remote_single_scans = self.__remote_scan_process.pop_single_results()
+        local_single_scans = self.__local_scan_process.pop_single_results()
 
         # Grab the Lftp status
         lftp_statuses = None
@@ -316,14 +426,43 @@ class Controller:
         self.__active_scanner.set_active_files(
             self.__active_downloading_file_names + self.__active_extracting_file_names
         )
+        # Local files keep changing while anything is active
+        self.__local_scan_process.set_busy(
+            bool(self.__active_downloading_file_names or self.__active_extracting_file_names)
+        )
 
         # Update model builder state
-        if latest_remote_scan is not None:
+        # Heartbeats mean the files are the same as in the last result
+        if latest_remote_scan is not None and not latest_remote_scan.unchanged:
             self.__model_builder.set_remote_files(latest_remote_scan.files)
-        if latest_local_scan is not None:
+        if latest_local_scan is not None and not latest_local_scan.unchanged:
             self.__model_builder.set_local_files(latest_local_scan.files)
-        if latest_active_scan is not None:
+        # The first result of a scanner always has files
+        if latest_remote_scan is not None and self.__has_snapshot_remote_files:
+            self.logger.info("Replaced the snapshot's remote files with a remote scan")
+            self.__has_snapshot_remote_files = False
+        if latest_local_scan is not None and self.__has_snapshot_local_files:
+            self.logger.info("Replaced the snapshot's local files with a local scan")
+            self.__has_snapshot_local_files = False
+        # Single file scans are merged into the last full scan
+        # Note: the scan processes drop single results that are older than
+        #       the last full result, so these are all newer
+        for result in remote_single_scans:
+            self.__model_builder.set_remote_file(result.name, result.file)
+        for result in local_single_scans:
+            self.__model_builder.set_local_file(result.name, result.file)
+        if latest_active_scan is not None and not latest_active_scan.unchanged:
             self.__model_builder.set_active_files(latest_active_scan.files)
+
+        # Keep the snapshot up to date with the scans
+        # Updates are only merged into a snapshot that has a full scan
+        if (latest_remote_scan is not None and not latest_remote_scan.unchanged) or \
+                (remote_single_scans and self.__snapshot.remote_files is not None):
+            self.__snapshot.remote_files = self.__model_builder.get_remote_files()
+        if (latest_local_scan is not None and not latest_local_scan.unchanged) or \
+                ((local_single_scans or (latest_active_scan is not None and not latest_active_scan.unchanged))
+                 and self.__snapshot.local_files is not None):
+            self.__snapshot.local_files = self.__model_builder.get_local_files()
         if lftp_statuses is not None:
             self.__model_builder.set_lftp_statuses(lftp_statuses)
         if latest_extract_statuses is not None:
@@ -331,11 +470,66 @@ class Controller:
         if latest_extracted_results:
             for result in latest_extracted_results:
                 self.__persist.extracted_file_names.add(result.name)
+                if self.__context.config.controller.use_local_path_as_extract_path:
+                    if result.is_dir:
+                        # Archives are extracted in place
+                        self.__local_scan_process.force_scan_single(result.name)
+                    else:
+                        # Extracted files may be anywhere in the local path
+                        self.__local_scan_process.force_scan()
             self.__model_builder.set_extracted_files(self.__persist.extracted_file_names)
 
-        # Build the new model
-        new_model = self.__model_builder.build_model()
+        # Build the new model, unless none of its sources changed
+        if self.__model_builder.has_changes:
+            self.__apply_model(self.__model_builder.build_model())
 
+        # Update the controller status
+        if latest_remote_scan is not None:
+            self.__context.status.controller.latest_remote_scan_time = latest_remote_scan.timestamp
+        if latest_local_scan is not None:
+            self.__context.status.controller.latest_local_scan_time = latest_local_scan.timestamp
+        # Only set on change, since every set notifies the status listeners
+        local_scan_interval_in_ms = self.__local_scan_process.interval_in_ms
+        if self.__context.status.controller.local_scan_interval_ms != local_scan_interval_in_ms:
+            self.__context.status.controller.local_scan_interval_ms = local_scan_interval_in_ms
+        remote_scan_interval_in_ms = self.__remote_scan_process.interval_in_ms
+        if self.__context.status.controller.remote_scan_interval_ms != remote_scan_interval_in_ms:
+            self.__context.status.controller.remote_scan_interval_ms = remote_scan_interval_in_ms
+
+    def __load_snapshot(self):
+        """
+        Build the model from the snapshot of the last run, so that it's
+        available before the first scans finish
+        The new scans replace the snapshot's files as they come in
+        :return:
+        """
+        local_path = self.__context.config.lftp.local_path
+        remote_address = self.__context.config.lftp.remote_address
+        remote_path = self.__context.config.lftp.remote_path
+        if (self.__snapshot.local_path, self.__snapshot.remote_address, self.__snapshot.remote_path) != \
+                (local_path, remote_address, remote_path):
+            if self.__snapshot.local_files is not None or self.__snapshot.remote_files is not None:
+                self.logger.info("Discarding snapshot of different local or remote paths")
+            self.__snapshot.local_path = local_path
+            self.__snapshot.remote_address = remote_address
+            self.__snapshot.remote_path = remote_path
+            self.__snapshot.local_files = None
+            self.__snapshot.remote_files = None
+        # A model from only one of the scans would show files in the wrong states
+        if self.__snapshot.has_files():
+            self.logger.info("Building model from snapshot")
+            self.__model_builder.set_local_files(self.__snapshot.local_files)
+            self.__model_builder.set_remote_files(self.__snapshot.remote_files)
+            self.__has_snapshot_local_files = True
+            self.__has_snapshot_remote_files = True
+            self.__apply_model(self.__model_builder.build_model())
+
+    def __apply_model(self, new_model: Model):
+        """
+        Apply the differences of a newly built model to the current model
+        :param new_model:
+        :return:
+        """
         # Lock the model
         self.__model_lock.acquire()
 
@@ -391,18 +585,17 @@ class Controller:
         # Release the model
         self.__model_lock.release()
 
-        # Update the controller status
-        if latest_remote_scan is not None:
-            self.__context.status.controller.latest_remote_scan_time = latest_remote_scan.timestamp
-        if latest_local_scan is not None:
-            self.__context.status.controller.latest_local_scan_time = latest_local_scan.timestamp
-
     def __process_commands(self):
         def _notify_failure(_command: Controller.Command, _msg: str):
             self.logger.warning("Command failed. {}".format(_msg))
             for _callback in _command.callbacks:
                 _callback.on_failure(_msg)
 
+        if not self.__command_queue.empty():
+            # Commands are usually followed by remote changes, e.g. a deleted
+            # or a newly uploaded file, so stop any scan backoff
+            self.__remote_scan_process.reset_interval()
+
         while not self.__command_queue.empty():
             command = self.__command_queue.get()
             self.logger.info("Received command {} for file {}".format(str(command.action), command.filename))
@@ -468,7 +661,7 @@ class Controller:
                         file_name=file.name
                     )
                     process.set_multiprocessing_logger(self.__mp_logger)
-                    post_callback = self.__local_scan_process.force_scan
+                    post_callback = functools.partial(self.__local_scan_process.force_scan_single, file.name)
                     command_wrapper = Controller.CommandProcessWrapper(
                         process=process,
                         post_callback=post_callback
@@ -497,10 +690,11 @@ class Controller:
                         remote_password=self.__password,
                         remote_port=self.__context.config.lftp.remote_port,
                         remote_path=self.__context.config.lftp.remote_path,
-                        file_name=file.name
+                        file_name=file.name,
+                        use_multiplexing=self.__context.config.lftp.use_ssh_multiplexing
                     )
                     process.set_multiprocessing_logger(self.__mp_logger)
-                    post_callback = self.__remote_scan_process.force_scan
+                    post_callback = functools.partial(self.__remote_scan_process.force_scan_single, file.name)
                     command_wrapper = Controller.CommandProcessWrapper(
                         process=process,
                         post_callback=post_callback
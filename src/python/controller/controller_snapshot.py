@@ -0,0 +1,136 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import base64
+import json
+import struct
+import sys
+import zlib
+from typing import List, Optional
+
+from common import overrides, Constants, Persist, PersistError
+from system import SystemFile, SystemFileTree
+
+
+class ControllerSnapshot(Persist):
+    """
+    Snapshot of the last local and remote scans of the controller
+    It's loaded on startup so that the model can be built right away, instead
+    of staying empty until the first scans finish.
+    The scans are stored as compressed SystemFileTree buffers. These are in
+    the byte order of the machine that wrote them, so a snapshot written on a
+    different machine is rejected.
+    """
+
+    # Keys
+    __KEY_BYTE_ORDER = "byte_order"
+    __KEY_LOCAL_PATH = "local_path"
+    __KEY_REMOTE_ADDRESS = "remote_address"
+    __KEY_REMOTE_PATH = "remote_path"
+    __KEY_LOCAL_FILES = "local_files"
+    __KEY_REMOTE_FILES = "remote_files"
+
+    def __init__(self):
+        # Paths that were scanned
+        self.local_path = None  # type: Optional[str]
+        self.remote_address = None  # type: Optional[str]
+        self.remote_path = None  # type: Optional[str]
+        # Scanned files, None if not scanned
+        # The lists are replaced rather than modified, so that the snapshot
+        # can be saved from another thread
+        self.__local_files = None  # type: Optional[List[SystemFile]]
+        self.__remote_files = None  # type: Optional[List[SystemFile]]
+        # Incremented whenever the files are replaced
+        self.__version = 0
+        # Last encoded lists, so that unchanged scans aren't encoded again
+        self.__encoded = dict()
+
+    @property
+    def local_files(self) -> Optional[List[SystemFile]]:
+        return self.__local_files
+
+    @local_files.setter
+    def local_files(self, files: Optional[List[SystemFile]]):
+        self.__local_files = files
+        self.__version += 1
+
+    @property
+    def remote_files(self) -> Optional[List[SystemFile]]:
+        return self.__remote_files
+
+    @remote_files.setter
+    def remote_files(self, files: Optional[List[SystemFile]]):
+        self.__remote_files = files
+        self.__version += 1
+
+    @property
+    def version(self) -> int:
+        """
+        Changes whenever the files change, so that an unchanged snapshot
+        doesn't have to be saved again
+        :return:
+        """
+        return self.__version
+
+    def has_files(self) -> bool:
+        """
+        Returns True if the snapshot has both a local and a remote scan
+        :return:
+        """
+        return self.local_files is not None and self.remote_files is not None
+
+    @classmethod
+    @overrides(Persist)
+    def from_str(cls: "ControllerSnapshot", content: str) -> "ControllerSnapshot":
+        snapshot = ControllerSnapshot()
+        try:
+            dct = json.loads(content)
+            if dct[ControllerSnapshot.__KEY_BYTE_ORDER] != sys.byteorder:
+                raise PersistError("Snapshot was written with a different byte order")
+            snapshot.local_path = dct[ControllerSnapshot.__KEY_LOCAL_PATH]
+            snapshot.remote_address = dct[ControllerSnapshot.__KEY_REMOTE_ADDRESS]
+            snapshot.remote_path = dct[ControllerSnapshot.__KEY_REMOTE_PATH]
+            snapshot.local_files = ControllerSnapshot.__decode_files(dct[ControllerSnapshot.__KEY_LOCAL_FILES])
+            snapshot.remote_files = ControllerSnapshot.__decode_files(dct[ControllerSnapshot.__KEY_REMOTE_FILES])
+            return snapshot
+        except (json.decoder.JSONDecodeError, KeyError, TypeError, AttributeError,
+                ValueError, zlib.error, struct.error) as e:
+            raise PersistError("Error parsing ControllerSnapshot - {}: {}".format(
+                type(e).__name__, str(e))
+            )
+
+    @overrides(Persist)
+    def to_str(self) -> str:
+        dct = dict()
+        dct[ControllerSnapshot.__KEY_BYTE_ORDER] = sys.byteorder
+        dct[ControllerSnapshot.__KEY_LOCAL_PATH] = self.local_path
+        dct[ControllerSnapshot.__KEY_REMOTE_ADDRESS] = self.remote_address
+        dct[ControllerSnapshot.__KEY_REMOTE_PATH] = self.remote_path
+        dct[ControllerSnapshot.__KEY_LOCAL_FILES] = self.__encode_cached(
+            ControllerSnapshot.__KEY_LOCAL_FILES, self.local_files
+        )
+        dct[ControllerSnapshot.__KEY_REMOTE_FILES] = self.__encode_cached(
+            ControllerSnapshot.__KEY_REMOTE_FILES, self.remote_files
+        )
+        return json.dumps(dct, indent=Constants.JSON_PRETTY_PRINT_INDENT)
+
+    def __encode_cached(self, key: str, files: Optional[List[SystemFile]]) -> Optional[str]:
+        cached = self.__encoded.get(key)
+        if cached is not None and cached[0] is files:
+            return cached[1]
+        content = ControllerSnapshot.__encode_files(files)
+        self.__encoded[key] = (files, content)
+        return content
+
+    @staticmethod
+    def __encode_files(files: Optional[List[SystemFile]]) -> Optional[str]:
+        if files is None:
+            return None
+        data = SystemFileTree.from_system_files(files).to_bytes()
+        return base64.b64encode(zlib.compress(data)).decode("ascii")
+
+    @staticmethod
+    def __decode_files(content: Optional[str]) -> Optional[List[SystemFile]]:
+        if content is None:
+            return None
+        data = zlib.decompress(base64.b64decode(content.encode("ascii"), validate=True))
+        return SystemFileTree.from_bytes(data).roots
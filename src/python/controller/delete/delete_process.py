@@ -33,14 +33,16 @@ class DeleteRemoteProcess(AppOneShotProcess):
                  remote_password: Optional[str],
                  remote_port: int,
                  remote_path: str,
-                 file_name: str):
+                 file_name: str,
+                 use_multiplexing: bool = False):
         super().__init__(name=self.__class__.__name__)
         self.__remote_path = remote_path
         self.__file_name = file_name
         self.__ssh = Sshcp(host=remote_address,
                            port=remote_port,
                            user=remote_username,
-                           password=remote_password)
+                           password=remote_password,
+                           use_multiplexing=use_multiplexing)
 
     def run_once(self):
         self.__ssh.set_base_logger(self.logger)
@@ -122,7 +122,7 @@ class ExtractDispatch:
             while frontier:
                 curr_file = frontier.pop(0)
                 if curr_file.is_dir:
-                    frontier += curr_file.get_children()
+                    frontier += curr_file.children
                 else:
                     archive_full_path = os.path.join(self.__local_path, curr_file.full_path)
                     out_dir_path = os.path.join(self.__out_dir_path, os.path.dirname(curr_file.full_path))
@@ -2,7 +2,7 @@
 
 import os
 import logging
-from typing import List, Optional, Set
+from typing import Any, List, Optional, Set, Dict
 import math
 
 # my libs
@@ -20,6 +20,7 @@ class ModelBuilder:
       * local file system as a Dict[name, SystemFile]
       * remote file system as a Dict[name, SystemFile]
       * lftp status as Dict[name, LftpJobStatus]
+    SystemFileViews of a SystemFileTree may be used in place of SystemFiles
     """
     def __init__(self):
         self.logger = logging.getLogger("ModelBuilder")
@@ -29,6 +30,11 @@ class ModelBuilder:
         self.__downloaded_files = set()
         self.__extract_statuses = dict()
         self.__extracted_files = set()
+        # Root files of the last build, and the names of the roots that
+        # changed since
+        self.__built_files = dict()  # type: Dict[str, ModelFile]
+        self.__dirty_names = set()  # type: Set[str]
+        self.__all_dirty = True
 
     def set_base_logger(self, base_logger: logging.Logger):
         self.logger = base_logger.getChild("ModelBuilder")
@@ -36,25 +42,93 @@ class ModelBuilder:
     def set_active_files(self, active_files: List[SystemFile]):
         # Update the local file state with this latest information
         for file in active_files:
-            self.__local_files[file.name] = file
+            self.__set_file(self.__local_files, file.name, file)
 
     def set_local_files(self, local_files: List[SystemFile]):
-        self.__local_files = {file.name: file for file in local_files}
+        self.__local_files = self.__set_files(self.__local_files, local_files)
 
     def set_remote_files(self, remote_files: List[SystemFile]):
-        self.__remote_files = {file.name: file for file in remote_files}
+        self.__remote_files = self.__set_files(self.__remote_files, remote_files)
+
+    def set_local_file(self, name: str, local_file: Optional[SystemFile]):
+        """
+        Merge the result of a single file scan into the last local scan
+        :param name:
+        :param local_file: None if the file no longer exists
+        :return:
+        """
+        self.__set_file(self.__local_files, name, local_file)
+
+    def set_remote_file(self, name: str, remote_file: Optional[SystemFile]):
+        """
+        Merge the result of a single file scan into the last remote scan
+        :param name:
+        :param remote_file: None if the file no longer exists
+        :return:
+        """
+        self.__set_file(self.__remote_files, name, remote_file)
+
+    def get_local_files(self) -> List[SystemFile]:
+        """
+        Returns the local files, as of the last local scan and its updates
+        :return:
+        """
+        return list(self.__local_files.values())
+
+    def get_remote_files(self) -> List[SystemFile]:
+        """
+        Returns the remote files, as of the last remote scan and its updates
+        :return:
+        """
+        return list(self.__remote_files.values())
+
+    def __set_files(self, old_files: Dict[str, SystemFile], files: List[SystemFile]) -> Dict[str, SystemFile]:
+        new_files = {file.name: file for file in files}
+        self.__mark_dirty(old_files, new_files)
+        return new_files
+
+    def __set_file(self, files: Dict[str, SystemFile], name: str, file: Optional[SystemFile]):
+        old_file = files.get(name, None)
+        if file is not None:
+            files[name] = file
+        else:
+            files.pop(name, None)
+        if old_file != file:
+            self.__dirty_names.add(name)
+
+    def __mark_dirty(self, old_values: Dict[str, Any], new_values: Dict[str, Any]):
+        """
+        Mark the names whose values differ between the two dicts as dirty
+        :param old_values:
+        :param new_values:
+        :return:
+        """
+        self.__dirty_names.update(old_values.keys() ^ new_values.keys())
+        for name, value in new_values.items():
+            if name in old_values and old_values[name] != value:
+                self.__dirty_names.add(name)
 
     def set_lftp_statuses(self, lftp_statuses: List[LftpJobStatus]):
-        self.__lftp_statuses = {file.name: file for file in lftp_statuses}
+        lftp_statuses = {file.name: file for file in lftp_statuses}
+        self.__mark_dirty(self.__lftp_statuses, lftp_statuses)
+        self.__lftp_statuses = lftp_statuses
 
     def set_downloaded_files(self, downloaded_files: Set[str]):
-        self.__downloaded_files = downloaded_files
+        # Keep a copy, since the caller keeps updating its set
+        self.__dirty_names.update(self.__downloaded_files ^ downloaded_files)
+        self.__downloaded_files = set(downloaded_files)
 
     def set_extract_statuses(self, extract_statuses: List[ExtractStatus]):
-        self.__extract_statuses = {status.name: status for status in extract_statuses}
+        def _key(statuses: Dict[str, ExtractStatus]):
+            return {name: (status.is_dir, status.state) for name, status in statuses.items()}
+        extract_statuses = {status.name: status for status in extract_statuses}
+        self.__mark_dirty(_key(self.__extract_statuses), _key(extract_statuses))
+        self.__extract_statuses = extract_statuses
 
     def set_extracted_files(self, extracted_files: Set[str]):
-        self.__extracted_files = extracted_files
+        # Keep a copy, since the caller keeps updating its set
+        self.__dirty_names.update(self.__extracted_files ^ extracted_files)
+        self.__extracted_files = set(extracted_files)
 
     def clear(self):
         self.__local_files.clear()
@@ -63,228 +137,258 @@ class ModelBuilder:
         self.__downloaded_files.clear()
         self.__extract_statuses.clear()
         self.__extracted_files.clear()
+        self.__all_dirty = True
+
+    @property
+    def has_changes(self) -> bool:
+        """
+        Returns True if the model may have changed since the last build
+        :return:
+        """
+        return self.__all_dirty or bool(self.__dirty_names)
 
     def build_model(self) -> Model:
+        """
+        Build the model from the current sources
+        Only the roots that changed since the last build are built again, the
+        rest are reused from the last build. Built files are frozen.
+        :return:
+        """
         model = Model()
         model.set_base_logger(logging.getLogger("dummy"))  # ignore the logs for this temp model
         all_file_names = set().union(self.__local_files.keys(),
                                      self.__remote_files.keys(),
                                      self.__lftp_statuses.keys())
+        if self.__all_dirty:
+            self.__built_files.clear()
+        else:
+            for name in self.__dirty_names:
+                self.__built_files.pop(name, None)
+        self.__all_dirty = False
+        self.__dirty_names.clear()
         for name in all_file_names:
-            remote = self.__remote_files.get(name, None)
-            local = self.__local_files.get(name, None)
-            status = self.__lftp_statuses.get(name, None)
-
-            if remote is None and local is None and status is None:
-                # this should never happen, but just in case
-                raise ModelError("Zero sources have a file object")
-
-            # sanity check between the sources
-            is_dir = remote.is_dir if remote else local.is_dir if local else status.type == LftpJobStatus.Type.MIRROR
-            if (remote and is_dir != remote.is_dir) or \
-               (local and is_dir != local.is_dir) or \
-               (status and is_dir != (status.type == LftpJobStatus.Type.MIRROR)):
-                raise ModelError("Mismatch in is_dir between sources")
-
-            def __fill_model_file(_model_file: ModelFile,
-                                  _remote: Optional[SystemFile],
-                                  _local: Optional[SystemFile],
-                                  _transfer_state: Optional[LftpJobStatus.TransferState]):
-                # set local and remote sizes
-                if _remote:
-                    _model_file.remote_size = _remote.size
-                if _local:
-                    _model_file.local_size = _local.size
-
-                # Note: no longer use lftp's file sizes
-                #       they represent remaining size for resumed downloads
-
-                # set the downloading speed and eta
-                if _transfer_state:
-                    _model_file.downloading_speed = _transfer_state.speed
-                    _model_file.eta = _transfer_state.eta
-
-                # set the transferred size (only if file or dir exists on both ends)
-                if _local and _remote:
-                    if _model_file.is_dir:
-                        # dir transferred size is updated by child files
-                        _model_file.transferred_size = 0
-                    else:
-                        _model_file.transferred_size = min(_local.size, _remote.size)
-
-                        # also update all parent directories
-                        _parent_file = _model_file.parent
-                        while _parent_file is not None:
-                            _parent_file.transferred_size += _model_file.transferred_size
-                            _parent_file = _parent_file.parent
-
-                # set the is_extractable flag
-                if not _model_file.is_dir and Extract.is_archive_fast(_model_file.name):
-                    _model_file.is_extractable = True
-                    # Also set the flag for all of its parents
-                    _parent_file = _model_file.parent
-                    while _parent_file is not None:
-                        _parent_file.is_extractable = True
-                        _parent_file = _parent_file.parent
-
-            model_file = ModelFile(name, is_dir)
-            # set the file state
-            # for now we only set to Queued or Downloading
-            # later after all children are built, we can set to Downloaded after performing a check
-            if status:
-                model_file.state = ModelFile.State.QUEUED if status.state == LftpJobStatus.State.QUEUED \
-                                   else ModelFile.State.DOWNLOADING
-            # fill the rest
-            __fill_model_file(model_file,
-                              remote,
-                              local,
-                              status.total_transfer_state if status and status.state == LftpJobStatus.State.RUNNING
-                              else None)
-
-            # Traverse SystemFile children tree in BFS order
-            # Store (remote, local, status, model_file) tuple in traversal frontier where remote and local
-            # correspond to the same node in both remote and local SystemFile trees, status corresponds
-            # to the LFTP status for the entire tree, and model_file corresponds to the generated ModelFile
-            # for the pair
-            # Note: in this case the frontier contains nodes that have already been process, it is
-            #       merely used for traversing children
-            frontier = []
-            if remote or local:
-                frontier.append((remote, local, status, model_file))
-            while frontier:
-                _remote, _local, _status, _model_file = frontier.pop(0)
-                _remote_children = {sf.name: sf for sf in _remote.children} if _remote else {}
-                _local_children = {sf.name: sf for sf in _local.children} if _local else {}
-                _all_children_names = set().union(_remote_children.keys(), _local_children.keys())
-                for _child_name in _all_children_names:
-                    _remote_child = _remote_children.get(_child_name, None)
-                    _local_child = _local_children.get(_child_name, None)
-                    _is_dir = _remote_child.is_dir if _remote_child else _local_child.is_dir
-                    # sanity check is_dir
-                    if (_remote_child and _is_dir != _remote_child.is_dir) or \
-                       (_local_child and _is_dir != _local_child.is_dir):
-                        raise ModelError("Mismatch in is_dir between child sources")
-                    _child_model_file = ModelFile(_child_name, _is_dir)
-
-                    # add it to the parent right away so we can access the full path
-                    _model_file.add_child(_child_model_file)
-
-                    # find the transfer state (if it exists) corresponding to this child
-                    # Note: transfer states are in full paths
-                    # Note2: transfer states don't include root path
-                    _child_status_path = os.path.join(*(_child_model_file.full_path.split(os.sep)[1:]))
-                    _child_transfer_state = None
-                    if _status:
-                        _child_transfer_state = next((ts for n, ts in _status.get_active_file_transfer_states()
-                                                     if n == _child_status_path), None)
-                    # Set the state, first matching criteria below decides state
-                    #   child is a directory: Default
-                    #   child is active: Downloading
-                    #   child local_size >= remote_size: Downloaded
-                    #   remote child exists and root is Queued or Downloading: Queued
-                    #   Default
-                    # Result:
-                    #   subdirectories are always Default
-                    #   downloading files are Downloading
-                    #   finished files are Downloaded
-                    #   Queued and Downloading root's unfinished files are Queued
-                    #   Local-only files are Default
-                    if _is_dir:
-                        _child_model_file.state = ModelFile.State.DEFAULT
-                    elif _child_transfer_state:
-                        _child_model_file.state = ModelFile.State.DOWNLOADING
-                    elif _remote_child and _local_child and _local_child.size >= _remote_child.size:
-                        _child_model_file.state = ModelFile.State.DOWNLOADED
-                    elif _remote_child and model_file.state in (ModelFile.State.QUEUED, ModelFile.State.DOWNLOADING):
-                        _child_model_file.state = ModelFile.State.QUEUED
-                    else:
-                        _child_model_file.state = ModelFile.State.DEFAULT
-
-                    # fill the rest
-                    __fill_model_file(_child_model_file,
-                                      _remote_child,
-                                      _local_child,
-                                      _child_transfer_state)
-                    # add child to frontier
-                    frontier.append((_remote_child, _local_child, _status, _child_model_file))
-
-            # estimate the ETA for the root if it's not available
-            if model_file.state == ModelFile.State.DOWNLOADING and \
-                    model_file.eta is None and \
-                    model_file.downloading_speed is not None and \
-                    model_file.downloading_speed > 0 and \
-                    model_file.transferred_size is not None:
-                # First-order estimate
-                remaining_size = max(model_file.remote_size - model_file.transferred_size, 0)
-                model_file.eta = int(math.ceil(remaining_size / model_file.downloading_speed))
-
-            # now we can determine if root is Downloaded
-            # root is Downloaded if all child remote files are Downloaded
-            # again we use BFS to traverse
-            if model_file.state == ModelFile.State.DEFAULT:
-                if not model_file.is_dir and \
-                        model_file.local_size is not None and \
-                        model_file.remote_size is not None and \
-                        model_file.local_size >= model_file.remote_size:
-                    # root is a finished single file
-                    model_file.state = ModelFile.State.DOWNLOADED
-                elif model_file.is_dir and model_file.remote_size is not None:
-                    # root is a directory that also exists remotely
-                    # check all the children
-                    all_downloaded = True
-                    frontier = []
-                    frontier += model_file.get_children()
-                    while frontier:
-                        _child_file = frontier.pop(0)
-                        if not _child_file.is_dir and \
-                                _child_file.remote_size is not None and \
-                                _child_file.state != ModelFile.State.DOWNLOADED:
-                            all_downloaded = False
-                            break
-                        frontier += _child_file.get_children()
-                    if all_downloaded:
-                        model_file.state = ModelFile.State.DOWNLOADED
-
-            # next we determine if root was Deleted
-            # root is Deleted if it does not exist locally, but was downloaded in the past
-            if model_file.state == ModelFile.State.DEFAULT and \
-                    model_file.local_size is None and \
-                    model_file.name in self.__downloaded_files:
-                model_file.state = ModelFile.State.DELETED
-
-            # next we check if root is Extracting
-            # root is Extracting if it's part of an extract status, in an expected state,
-            # and exists locally
-            # if root is NOT in an expected state, then ignore the extract status
-            # and report a warning message, as this shouldn't be happening
-            if model_file.name in self.__extract_statuses:
-                extract_status = self.__extract_statuses[model_file.name]
-                if model_file.is_dir != extract_status.is_dir:
-                    raise ModelError("Mismatch in is_dir between file and extract status")
-                if model_file.state in (
-                    ModelFile.State.DEFAULT,
-                    ModelFile.State.DOWNLOADED
-                ) and model_file.local_size is not None:
-                    model_file.state = ModelFile.State.EXTRACTING
-                else:
-                    if model_file.local_size is None:
-                        self.logger.warning("File {} has extract status but doesn't exist locally!".format(
-                            model_file.name
-                        ))
-                    else:
-                        self.logger.warning("File {} has extract status but is in state {}".format(
-                            model_file.name,
-                            str(model_file.state)
-                        ))
-
-            # next we check if root is Extracted
-            # root is Extracted if it is in Downloaded state and in extracted files list
-            # Note: Default files aren't marked extracted because they can still be queued
-            #       for download, and it doesn't make sense to queue after extracting
-            #       If a Default file is extracted, it will return back to the Default state
-            if model_file.name in self.__extracted_files and model_file.state == ModelFile.State.DOWNLOADED:
-                    model_file.state = ModelFile.State.EXTRACTED
-
+            model_file = self.__built_files.get(name, None)
+            if model_file is None:
+                model_file = self.__build_file(name)
+                self.__built_files[name] = model_file
             model.add_file(model_file)
-
+        if len(self.__built_files) > len(all_file_names):
+            # Drop the files that no longer exist
+            for name in set(self.__built_files.keys()).difference(all_file_names):
+                del self.__built_files[name]
         return model
+
+    def __build_file(self, name: str) -> ModelFile:
+        remote = self.__remote_files.get(name, None)
+        local = self.__local_files.get(name, None)
+        status = self.__lftp_statuses.get(name, None)
+
+        if remote is None and local is None and status is None:
+            # this should never happen, but just in case
+            raise ModelError("Zero sources have a file object")
+
+        # sanity check between the sources
+        is_dir = remote.is_dir if remote else local.is_dir if local else status.type == LftpJobStatus.Type.MIRROR
+        if (remote and is_dir != remote.is_dir) or \
+           (local and is_dir != local.is_dir) or \
+           (status and is_dir != (status.type == LftpJobStatus.Type.MIRROR)):
+            raise ModelError("Mismatch in is_dir between sources")
+
+        def __fill_model_file(_model_file: ModelFile,
+                              _remote: Optional[SystemFile],
+                              _local: Optional[SystemFile],
+                              _transfer_state: Optional[LftpJobStatus.TransferState]):
+            # set local and remote sizes
+            if _remote:
+                _model_file.remote_size = _remote.size
+            if _local:
+                _model_file.local_size = _local.size
+
+            # Note: no longer use lftp's file sizes
+            #       they represent remaining size for resumed downloads
+
+            # set the downloading speed and eta
+            if _transfer_state:
+                _model_file.downloading_speed = _transfer_state.speed
+                _model_file.eta = _transfer_state.eta
+
+            # set the transferred size (only if file or dir exists on both ends)
+            if _local and _remote:
+                if _model_file.is_dir:
+                    # dir transferred size is summed up from its children later
+                    _model_file.transferred_size = 0
+                else:
+                    _model_file.transferred_size = min(_local.size, _remote.size)
+
+            # set the is_extractable flag
+            # dirs are flagged from their children later
+            if not _model_file.is_dir and Extract.is_archive_fast(_model_file.name):
+                _model_file.is_extractable = True
+
+        model_file = ModelFile(name, is_dir)
+        # set the file state
+        # for now we only set to Queued or Downloading
+        # later after all children are built, we can set to Downloaded after performing a check
+        if status:
+            model_file.state = ModelFile.State.QUEUED if status.state == LftpJobStatus.State.QUEUED \
+                               else ModelFile.State.DOWNLOADING
+        # fill the rest
+        __fill_model_file(model_file,
+                          remote,
+                          local,
+                          status.total_transfer_state if status and status.state == LftpJobStatus.State.RUNNING
+                          else None)
+
+        # Traverse SystemFile children tree in BFS order
+        # Store (remote, local, model_file, path) tuple in traversal frontier where remote and local
+        # correspond to the same node in both remote and local SystemFile trees, model_file corresponds
+        # to the generated ModelFile for the pair, and path is its path relative to the root
+        # Note: transfer states are in paths relative to the root, so the paths are built up
+        #       during the traversal rather than derived from each file's full path
+        # Note: in this case the frontier contains nodes that have already been process, it is
+        #       merely used for traversing children
+        # Note2: nodes are never removed from the frontier, so that it ends up holding all the
+        #        nodes in BFS order
+        frontier = [(remote, local, model_file, None)]
+        for _remote, _local, _model_file, _path in frontier:
+            _remote_children = {sf.name: sf for sf in _remote.children} if _remote else {}
+            _local_children = {sf.name: sf for sf in _local.children} if _local else {}
+            _all_children_names = set().union(_remote_children.keys(), _local_children.keys())
+            for _child_name in _all_children_names:
+                _remote_child = _remote_children.get(_child_name, None)
+                _local_child = _local_children.get(_child_name, None)
+                _is_dir = _remote_child.is_dir if _remote_child else _local_child.is_dir
+                # sanity check is_dir
+                if (_remote_child and _is_dir != _remote_child.is_dir) or \
+                   (_local_child and _is_dir != _local_child.is_dir):
+                    raise ModelError("Mismatch in is_dir between child sources")
+                _child_model_file = ModelFile(_child_name, _is_dir)
+
+                _model_file.add_child(_child_model_file)
+
+                # find the transfer state (if it exists) corresponding to this child
+                # Note: transfer states don't include root path
+                _child_path = os.path.join(_path, _child_name) if _path is not None else _child_name
+                _child_transfer_state = None
+                if status:
+                    _child_transfer_state = status.get_active_file_transfer_state(_child_path)
+                # Set the state, first matching criteria below decides state
+                #   child is a directory: Default
+                #   child is active: Downloading
+                #   child local_size >= remote_size: Downloaded
+                #   remote child exists and root is Queued or Downloading: Queued
+                #   Default
+                # Result:
+                #   subdirectories are always Default
+                #   downloading files are Downloading
+                #   finished files are Downloaded
+                #   Queued and Downloading root's unfinished files are Queued
+                #   Local-only files are Default
+                if _is_dir:
+                    _child_model_file.state = ModelFile.State.DEFAULT
+                elif _child_transfer_state:
+                    _child_model_file.state = ModelFile.State.DOWNLOADING
+                elif _remote_child and _local_child and _local_child.size >= _remote_child.size:
+                    _child_model_file.state = ModelFile.State.DOWNLOADED
+                elif _remote_child and model_file.state in (ModelFile.State.QUEUED, ModelFile.State.DOWNLOADING):
+                    _child_model_file.state = ModelFile.State.QUEUED
+                else:
+                    _child_model_file.state = ModelFile.State.DEFAULT
+
+                # fill the rest
+                __fill_model_file(_child_model_file,
+                                  _remote_child,
+                                  _local_child,
+                                  _child_transfer_state)
+                # add child to frontier
+                frontier.append((_remote_child, _local_child, _child_model_file, _child_path))
+
+        # Compute the aggregates of the dirs bottom-up in a single pass
+        # In reverse BFS order, all of a dir's children are visited before the dir
+        for _, _, _model_file, _ in reversed(frontier):
+            _parent_file = _model_file.parent
+            if _parent_file is None:
+                continue
+            if _model_file.is_dir:
+                _parent_file.num_files += _model_file.num_files
+                _parent_file.num_remote_files += _model_file.num_remote_files
+                _parent_file.num_downloaded_files += _model_file.num_downloaded_files
+            else:
+                _parent_file.num_files += 1
+                if _model_file.remote_size is not None:
+                    _parent_file.num_remote_files += 1
+                if _model_file.state == ModelFile.State.DOWNLOADED:
+                    _parent_file.num_downloaded_files += 1
+            if _model_file.transferred_size is not None:
+                _parent_file.transferred_size += _model_file.transferred_size
+            if _model_file.is_extractable:
+                _parent_file.is_extractable = True
+
+        # estimate the ETA for the root if it's not available
+        if model_file.state == ModelFile.State.DOWNLOADING and \
+                model_file.eta is None and \
+                model_file.downloading_speed is not None and \
+                model_file.downloading_speed > 0 and \
+                model_file.transferred_size is not None:
+            # First-order estimate
+            remaining_size = max(model_file.remote_size - model_file.transferred_size, 0)
+            model_file.eta = int(math.ceil(remaining_size / model_file.downloading_speed))
+
+        # now we can determine if root is Downloaded
+        # root is Downloaded if all child remote files are Downloaded
+        if model_file.state == ModelFile.State.DEFAULT:
+            if not model_file.is_dir and \
+                    model_file.local_size is not None and \
+                    model_file.remote_size is not None and \
+                    model_file.local_size >= model_file.remote_size:
+                # root is a finished single file
+                model_file.state = ModelFile.State.DOWNLOADED
+            elif model_file.is_dir and model_file.remote_size is not None:
+                # root is a directory that also exists remotely
+                # Note: files are only Downloaded if they exist remotely
+                if model_file.num_downloaded_files == model_file.num_remote_files:
+                    model_file.state = ModelFile.State.DOWNLOADED
+
+        # next we determine if root was Deleted
+        # root is Deleted if it does not exist locally, but was downloaded in the past
+        if model_file.state == ModelFile.State.DEFAULT and \
+                model_file.local_size is None and \
+                model_file.name in self.__downloaded_files:
+            model_file.state = ModelFile.State.DELETED
+
+        # next we check if root is Extracting
+        # root is Extracting if it's part of an extract status, in an expected state,
+        # and exists locally
+        # if root is NOT in an expected state, then ignore the extract status
+        # and report a warning message, as this shouldn't be happening
+        if model_file.name in self.__extract_statuses:
+            extract_status = self.__extract_statuses[model_file.name]
+            if model_file.is_dir != extract_status.is_dir:
+                raise ModelError("Mismatch in is_dir between file and extract status")
+            if model_file.state in (
+                ModelFile.State.DEFAULT,
+                ModelFile.State.DOWNLOADED
+            ) and model_file.local_size is not None:
+                model_file.state = ModelFile.State.EXTRACTING
+            else:
+                if model_file.local_size is None:
+                    self.logger.warning("File {} has extract status but doesn't exist locally!".format(
+                        model_file.name
+                    ))
+                else:
+                    self.logger.warning("File {} has extract status but is in state {}".format(
+                        model_file.name,
+                        str(model_file.state)
+                    ))
+
+        # next we check if root is Extracted
+        # root is Extracted if it is in Downloaded state and in extracted files list
+        # Note: Default files aren't marked extracted because they can still be queued
+        #       for download, and it doesn't make sense to queue after extracting
+        #       If a Default file is extracted, it will return back to the Default state
+        if model_file.name in self.__extracted_files and model_file.state == ModelFile.State.DOWNLOADED:
+                model_file.state = ModelFile.State.EXTRACTED
+
+        # Built files are shared with the last build and with the model's readers
+        model_file.freeze()
+        return model_file
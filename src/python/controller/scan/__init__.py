@@ -1,6 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from .scanner_process import IScanner, ScannerResult, ScannerProcess
+from .scanner_process import IScanner, ScannerResult, ScannerSingleResult, ScannerProcess
 from .active_scanner import ActiveScanner
 from .local_scanner import LocalScanner
 from .remote_scanner import RemoteScanner
+from .remote_watch_scanner import RemoteWatchScanner
@@ -1,7 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
-from typing import List
+from typing import List, Optional
 import multiprocessing
 import queue
 
@@ -19,6 +19,9 @@ class ActiveScanner(IScanner):
     """
     def __init__(self, local_path: str):
         self.__scanner = SystemScanner(local_path)
+        self.__scanner.enable_cache()
+        # Active files are mostly partial downloads, measure what was written
+        self.__scanner.set_use_data_extents(True)
         self.__active_files_queue = multiprocessing.Queue()
         self.__active_files = []  # latest state
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -53,4 +56,19 @@ class ActiveScanner(IScanner):
             except SystemScannerError as ex:
                 # Ignore errors here, file may have been deleted
                 self.logger.warning(str(ex))
+        # Forget the files that are no longer active
+        self.__scanner.retain_cached_roots(self.__active_files)
         return result
+
+    @property
+    @overrides(IScanner)
+    def supports_scan_single(self) -> bool:
+        return True
+
+    @overrides(IScanner)
+    def scan_single(self, name: str) -> Optional[SystemFile]:
+        try:
+            return self.__scanner.scan_single(name)
+        except SystemScannerError:
+            # File no longer exists
+            return None
@@ -1,21 +1,34 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Dict
 
 from .scanner_process import IScanner
 from common import overrides, AppError, Localization, Constants
-from system import SystemScanner, SystemFile, SystemScannerError
+from system import SystemScanner, SystemFile, SystemScannerError, SystemWatcher, SystemWatcherError, ExcludeMatcher
 
 
 class LocalScanner(IScanner):
     """
     Scanner implementation to scan the local filesystem
+    In watch mode, the tree from the last scan is kept in memory and only the
+    top-level files reported as changed by inotify are rescanned. A full scan
+    is still done periodically in case the watcher missed anything.
     """
-    def __init__(self, local_path: str, use_temp_file: bool):
+    FULL_SCAN_INTERVAL_IN_MS = 10 * 60 * 1000
+
+    def __init__(self, local_path: str, use_temp_file: bool, num_workers: int = 1, use_watch: bool = False):
         self.__scanner = SystemScanner(local_path)
         if use_temp_file:
             self.__scanner.set_lftp_temp_suffix(Constants.LFTP_TEMP_FILE_SUFFIX)
+        self.__scanner.set_num_workers(num_workers)
+        self.__scanner.enable_cache()
+        self.__scanner.set_use_data_extents(True)
+        self.__use_temp_file = use_temp_file
+        self.__watcher = SystemWatcher(local_path) if use_watch else None
+        self.__files = None  # type: Optional[Dict[str, SystemFile]]
+        self.__last_full_scan_time = None
         self.logger = logging.getLogger("LocalScanner")
 
     @overrides(IScanner)
@@ -23,10 +36,93 @@ class LocalScanner(IScanner):
         self.logger = base_logger.getChild("LocalScanner")
 
     @overrides(IScanner)
-    def scan(self) -> List[SystemFile]:
+    def scan(self) -> Optional[List[SystemFile]]:
+        if self.__watcher is None:
+            return self.__full_scan()
+
+        # The watcher is started lazily so that it belongs to the scanner process
+        if not self.__watcher.is_started:
+            try:
+                self.__watcher.start()
+            except SystemWatcherError as e:
+                self.logger.warning("Falling back to full scans: {}".format(str(e)))
+                self.__watcher = None
+                return self.__full_scan()
+            return self.__watch_full_scan()
+
+        try:
+            changes = self.__watcher.pop_changes()
+        except SystemWatcherError as e:
+            self.logger.warning("Watcher error, doing a full scan: {}".format(str(e)))
+            self.__watcher.close()
+            return self.__watch_full_scan()
+
+        elapsed_ms = (datetime.now() - self.__last_full_scan_time).total_seconds() * 1000
+        if changes is None or elapsed_ms >= LocalScanner.FULL_SCAN_INTERVAL_IN_MS or \
+                ExcludeMatcher.IGNORE_FILE_NAME in changes:
+            # A new top-level ignore file may affect any file
+            return self.__watch_full_scan()
+        if not changes:
+            return None
+
+        for name in self.__names_to_rescan(changes):
+            try:
+                file = self.__scanner.scan_single(name)
+                self.__files[file.name] = file
+            except SystemScannerError:
+                # File no longer exists
+                self.__files.pop(name, None)
+        return [self.__files[name] for name in sorted(self.__files.keys())]
+
+    @property
+    @overrides(IScanner)
+    def supports_scan_single(self) -> bool:
+        return True
+
+    @overrides(IScanner)
+    def scan_single(self, name: str) -> Optional[SystemFile]:
+        try:
+            file = self.__scanner.scan_single(name)
+        except SystemScannerError:
+            # File no longer exists
+            file = None
+        if self.__files is not None:
+            # Keep the tree of the watch up to date
+            if file is not None:
+                self.__files[file.name] = file
+            else:
+                self.__files.pop(name, None)
+        return file
+
+    def __full_scan(self) -> List[SystemFile]:
         try:
             result = self.__scanner.scan()
         except SystemScannerError:
             self.logger.exception("Caught SystemScannerError")
             raise AppError(Localization.Error.LOCAL_SERVER_SCAN)
+        self.logger.debug("Directory cache hits: {}, misses: {}".format(
+            self.__scanner.cache_hits, self.__scanner.cache_misses
+        ))
+        return result
+
+    def __watch_full_scan(self) -> List[SystemFile]:
+        result = self.__full_scan()
+        self.__files = {file.name: file for file in result}
+        self.__last_full_scan_time = datetime.now()
         return result
+
+    def __names_to_rescan(self, changes: set) -> set:
+        """
+        Convert the changed entry names into names accepted by scan_single
+        An lftp temp file may show up under either name, so try both
+        """
+        names = set()
+        for name in changes:
+            if name.endswith(SystemScanner.LFTP_STATUS_FILE_SUFFIX):
+                name = name[:-len(SystemScanner.LFTP_STATUS_FILE_SUFFIX)]
+            names.add(name)
+            if self.__use_temp_file and \
+                    name != Constants.LFTP_TEMP_FILE_SUFFIX and \
+                    name.endswith(Constants.LFTP_TEMP_FILE_SUFFIX):
+                names.add(name[:-len(Constants.LFTP_TEMP_FILE_SUFFIX)])
+        return names
@@ -1,24 +1,57 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import json
 import logging
-import pickle
+import shlex
 from typing import List
 import os
 from typing import Optional
 
 from .scanner_process import IScanner
 from common import overrides, AppError, Localization
-from ssh import Sshcp, SshcpError
-from system import SystemFile
+from ssh import Sshcp, SshcpError, SshcpSession
+from system import SystemFile, WireDecoder, WireError
 
 
 class RemoteScannerError(AppError):
     pass
 
 
+def install_scanfs(ssh: Sshcp, local_path: str, remote_path: str, logger: logging.Logger):
+    """
+    Copy the scanfs executable to the remote server
+    """
+    logger.info("Installing local:{} to remote:{}".format(local_path, remote_path))
+    if not os.path.isfile(local_path):
+        raise RemoteScannerError("Failed to find scanfs executable at {}".format(local_path))
+    try:
+        ssh.copy(local_path=local_path, remote_path=remote_path)
+    except SshcpError:
+        logger.exception("Caught scp exception")
+        raise AppError(Localization.Error.REMOTE_SERVER_INSTALL)
+
+
+def suppress_ssh_error(error: SshcpError) -> bool:
+    """
+    Returns True for intermittent errors that are worth retrying
+    """
+    error_str = str(error).lower()
+    errors_to_suppress = [
+        "text file busy",
+        "ssh_exchange_identification",
+        "cannot create temporary directory",
+        "connection timed out"
+    ]
+    return any(e in error_str for e in errors_to_suppress)
+
+
 class RemoteScanner(IScanner):
     """
     Scanner implementation to scan the remote filesystem
+    The remote scanner keeps its state in a file next to the script. After
+    the first scan, only the changes since the last scan are transferred.
+    In agent mode, the scanner instead stays running on the remote server
+    for the lifetime of a single ssh session and keeps its state in memory.
     """
     RETRY_COUNT = 5
 
@@ -29,7 +62,9 @@ class RemoteScanner(IScanner):
                  remote_port: int,
                  remote_path_to_scan: str,
                  local_path_to_scan_script: str,
-                 remote_path_to_scan_script: str):
+                 remote_path_to_scan_script: str,
+                 use_multiplexing: bool = False,
+                 use_agent: bool = False):
         self.logger = logging.getLogger("RemoteScanner")
         self.__remote_path_to_scan = remote_path_to_scan
         self.__local_path_to_scan_script = local_path_to_scan_script
@@ -37,69 +72,184 @@ class RemoteScanner(IScanner):
         self.__ssh = Sshcp(host=remote_address,
                            port=remote_port,
                            user=remote_username,
-                           password=remote_password)
+                           password=remote_password,
+                           use_multiplexing=use_multiplexing)
+        self.__remote_path_to_state = remote_path_to_scan_script + ".state"
         self.__first_run = True
+        # Result of the last scan, that the next delta is relative to
+        self.__files = None  # type: Optional[List[SystemFile]]
+        self.__generation = None  # type: Optional[int]
+        self.__use_agent = use_agent
+        self.__session = None  # type: Optional[SshcpSession]
 
     @overrides(IScanner)
     def set_base_logger(self, base_logger: logging.Logger):
         self.logger = base_logger.getChild("RemoteScanner")
         self.__ssh.set_base_logger(self.logger)
 
+    @overrides(IScanner)
+    def close(self):
+        self.__close_agent()
+
     @overrides(IScanner)
     def scan(self) -> List[SystemFile]:
         if self.__first_run:
             self._install_scanfs()
             self.__first_run = False
 
+        if self.__use_agent:
+            decoder = self.__agent_request(lambda: {"op": "scan", "generation": self.__generation})
+            self.logger.debug("Received {} scan, generation {}".format(
+                "delta" if decoder.is_delta else "full", decoder.generation
+            ))
+            self.__files = decoder.files
+            self.__generation = decoder.generation
+            return self.__files
+
+        try:
+            decoder = self.__run_scan()
+        except WireError as e:
+            if self.__generation is None:
+                self.logger.error("Failed to decode scan output: {}".format(str(e)))
+                raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
+            # Our copy is out of sync with the remote state, start over
+            self.logger.warning("Failed to apply scan delta, doing a full scan: {}".format(str(e)))
+            self.__files = None
+            self.__generation = None
+            try:
+                decoder = self.__run_scan()
+            except WireError as e:
+                self.logger.error("Failed to decode scan output: {}".format(str(e)))
+                raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
+
+        self.logger.debug("Received {} scan, generation {}".format(
+            "delta" if decoder.is_delta else "full", decoder.generation
+        ))
+        self.__files = decoder.files
+        self.__generation = decoder.generation
+        return self.__files
+
+    @property
+    @overrides(IScanner)
+    def supports_scan_single(self) -> bool:
+        return True
+
+    @overrides(IScanner)
+    def scan_single(self, name: str) -> Optional[SystemFile]:
+        if self.__first_run:
+            self._install_scanfs()
+            self.__first_run = False
+
+        if not self.__use_agent:
+            # The state file isn't touched, so later deltas are still
+            # relative to the last full scan
+            command = " ".join(shlex.quote(arg) for arg in [
+                self.__remote_path_to_scan_script,
+                self.__remote_path_to_scan,
+                "--name",
+                name
+            ])
+            try:
+                decoder = self.__run_command(command, base_files=None)
+            except WireError as e:
+                self.logger.error("Failed to decode scan output: {}".format(str(e)))
+                raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
+            return decoder.files[0] if decoder.files else None
+
+        decoder = self.__agent_request(lambda: {"op": "scan_single", "name": name})
+        file = decoder.files[0] if decoder.files else None
+        if self.__files is not None and decoder.generation == self.__generation:
+            # The agent applied the same change to its copy
+            self.__files = [f for f in self.__files if f.name != name]
+            if file is not None:
+                self.__files.append(file)
+                self.__files.sort(key=lambda f: f.name)
+        return file
+
+    def __agent_request(self, create_request) -> WireDecoder:
+        """
+        Send a request to the agent and decode the response
+        The agent is (re)started as needed. Since a new agent has no state,
+        the request is created only after the agent is running.
+        :param create_request: callable returning the request
+        :return:
+        """
         retries = 0
-        out = None
-        while out is None:
+        while True:
             try:
-                out = self.__ssh.shell("'{}' '{}'".format(
-                    self.__remote_path_to_scan_script,
-                    self.__remote_path_to_scan)
-                )
+                if self.__session is None or not self.__session.is_alive:
+                    self.__start_agent()
+                decoder = WireDecoder(base_files=self.__files)
+                # Escape all control characters so the pty passes the request as is
+                request = json.dumps(create_request()).replace("\x7f", "\\u007f")
+                self.__session.send_line(request)
+                self.__session.read(decoder.feed, lambda: decoder.done)
+                return decoder
+            except (SshcpError, WireError) as e:
+                self.__close_agent()
+                # Always retry once in case the session died since the last request
+                if retries == 0 or \
+                        (isinstance(e, SshcpError) and suppress_ssh_error(e) and
+                         retries < RemoteScanner.RETRY_COUNT):
+                    self.logger.warning("Restarting scan agent after error: {}".format(str(e)))
+                    retries += 1
+                else:
+                    self.logger.exception("Caught an error from the scan agent")
+                    raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
+
+    def __start_agent(self):
+        self.logger.debug("Starting scan agent")
+        # A new agent doesn't know about any earlier scans
+        self.__files = None
+        self.__generation = None
+        self.__session = self.__ssh.start_session(" ".join(shlex.quote(arg) for arg in [
+            self.__remote_path_to_scan_script,
+            self.__remote_path_to_scan,
+            "--agent"
+        ]))
+
+    def __close_agent(self):
+        if self.__session is not None:
+            self.__session.close()
+            self.__session = None
+
+    def __run_scan(self) -> WireDecoder:
+        args = [
+            self.__remote_path_to_scan_script,
+            self.__remote_path_to_scan,
+            "--state",
+            self.__remote_path_to_state
+        ]
+        if self.__generation is not None:
+            args += ["--generation", str(self.__generation)]
+        command = " ".join(shlex.quote(arg) for arg in args)
+        return self.__run_command(command, base_files=self.__files)
+
+    def __run_command(self, command: str, base_files: Optional[List[SystemFile]]) -> WireDecoder:
+        retries = 0
+        decoder = None
+        while decoder is None:
+            # Output is decoded as it streams in
+            decoder = WireDecoder(base_files=base_files)
+            try:
+                self.__ssh.shell_stream(command, decoder.feed)
             except SshcpError as e:
                 # Suppress specific errors and retry a fixed number of times
                 # Otherwise raise a fatal AppError
-                if RemoteScanner.__suppress_error(e) and retries < RemoteScanner.RETRY_COUNT:
+                if suppress_ssh_error(e) and retries < RemoteScanner.RETRY_COUNT:
                     self.logger.warning("Retrying remote scan after error: {}".format(str(e)))
-                    out = None
+                    decoder = None
                     retries += 1
                 else:
                     self.logger.exception("Caught an SshError")
                     raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
 
-        try:
-            remote_files = pickle.loads(out)
-        except pickle.UnpicklingError as err:
-            self.logger.error("Unpickling error: {}\n{}".format(str(err), out))
-            raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
-        return remote_files
+        if not decoder.done:
+            raise WireError("Scan output is incomplete")
+        return decoder
 
     def _install_scanfs(self):
-        self.logger.info("Installing local:{} to remote:{}".format(
-            self.__local_path_to_scan_script,
-            self.__remote_path_to_scan_script
-        ))
-        if not os.path.isfile(self.__local_path_to_scan_script):
-            raise RemoteScannerError("Failed to find scanfs executable at {}".format(
-                self.__local_path_to_scan_script
-            ))
-        try:
-            self.__ssh.copy(local_path=self.__local_path_to_scan_script,
-                            remote_path=self.__remote_path_to_scan_script)
-        except SshcpError:
-            self.logger.exception("Caught scp exception")
-            raise AppError(Localization.Error.REMOTE_SERVER_INSTALL)
-
-    @staticmethod
-    def __suppress_error(error: SshcpError) -> bool:
-        error_str = str(error).lower()
-        errors_to_suppress = [
-            "text file busy",
-            "ssh_exchange_identification",
-            "cannot create temporary directory",
-            "connection timed out"
-        ]
-        return any(e in error_str for e in errors_to_suppress)
+        install_scanfs(self.__ssh,
+                       self.__local_path_to_scan_script,
+                       self.__remote_path_to_scan_script,
+                       self.logger)
@@ -0,0 +1,162 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import logging
+import shlex
+from typing import List, Optional
+
+from .scanner_process import IScanner
+from .remote_scanner import install_scanfs, suppress_ssh_error
+from common import overrides, AppError, Localization
+from ssh import Sshcp, SshcpError, SshcpSession
+from system import SystemFile, WireDecoder, WireError
+
+
+class RemoteWatchScanner(IScanner):
+    """
+    Scanner implementation that watches the remote filesystem for changes
+    scanfs keeps running on the remote server in watch mode. It sends a full
+    scan once, followed by a delta whenever inotify reports a change. Each
+    scan only applies the deltas that arrived since the last scan, so it
+    never waits on the remote server after the initial scan.
+    If the watch fails, it's restarted with a new full scan.
+    """
+    RETRY_COUNT = 5
+
+    def __init__(self,
+                 remote_address: str,
+                 remote_username: str,
+                 remote_password: Optional[str],
+                 remote_port: int,
+                 remote_path_to_scan: str,
+                 local_path_to_scan_script: str,
+                 remote_path_to_scan_script: str,
+                 rescan_interval_in_ms: int,
+                 use_multiplexing: bool = False):
+        """
+        :param rescan_interval_in_ms: interval of the full rescans done by the
+                                      remote watch, in case inotify misses a change
+        """
+        self.logger = logging.getLogger("RemoteWatchScanner")
+        self.__remote_path_to_scan = remote_path_to_scan
+        self.__local_path_to_scan_script = local_path_to_scan_script
+        self.__remote_path_to_scan_script = remote_path_to_scan_script
+        self.__rescan_interval_in_ms = rescan_interval_in_ms
+        self.__ssh = Sshcp(host=remote_address,
+                           port=remote_port,
+                           user=remote_username,
+                           password=remote_password,
+                           use_multiplexing=use_multiplexing)
+        self.__first_run = True
+        self.__session = None  # type: Optional[SshcpSession]
+        self.__decoder = None  # type: Optional[WireDecoder]
+        self.__files = None  # type: Optional[List[SystemFile]]
+        self.__changed = False
+
+    @overrides(IScanner)
+    def set_base_logger(self, base_logger: logging.Logger):
+        self.logger = base_logger.getChild("RemoteWatchScanner")
+        self.__ssh.set_base_logger(self.logger)
+
+    @overrides(IScanner)
+    def close(self):
+        self.__close_session()
+
+    @overrides(IScanner)
+    def scan(self) -> Optional[List[SystemFile]]:
+        if self.__first_run:
+            install_scanfs(self.__ssh,
+                           self.__local_path_to_scan_script,
+                           self.__remote_path_to_scan_script,
+                           self.logger)
+            self.__first_run = False
+
+        if self.__session is None:
+            return self.__start_watch()
+
+        try:
+            self.__session.poll(self.__feed)
+        except (SshcpError, WireError) as e:
+            self.logger.warning("Restarting remote watch after error: {}".format(str(e)))
+            self.__close_session()
+            return self.__start_watch()
+
+        if not self.__changed:
+            return None
+        self.__changed = False
+        return self.__files
+
+    @property
+    @overrides(IScanner)
+    def supports_scan_single(self) -> bool:
+        # Single scans come from the watch, a full scan starts it
+        return self.__session is not None
+
+    @overrides(IScanner)
+    def scan_single(self, name: str) -> Optional[SystemFile]:
+        # The watch already reports every change, so just pick up the
+        # deltas that arrived since the last scan
+        # These are still reported by the next scan
+        try:
+            self.__session.poll(self.__feed)
+        except (SshcpError, WireError) as e:
+            # The last known file is returned, and the next full scan
+            # restarts the watch
+            self.logger.warning("Remote watch error: {}".format(str(e)))
+            self.__close_session()
+        return next((f for f in self.__files if f.name == name), None)
+
+    def __start_watch(self) -> List[SystemFile]:
+        """
+        Start the remote watch and wait for its initial full scan
+        :return:
+        """
+        command = " ".join(shlex.quote(arg) for arg in [
+            self.__remote_path_to_scan_script,
+            self.__remote_path_to_scan,
+            "--watch",
+            str(self.__rescan_interval_in_ms / 1000)
+        ])
+        retries = 0
+        while True:
+            self.logger.debug("Starting remote watch")
+            self.__files = None
+            self.__decoder = WireDecoder()
+            try:
+                self.__session = self.__ssh.start_session(command)
+                self.__session.read(self.__feed, lambda: self.__files is not None)
+                self.__changed = False
+                return self.__files
+            except (SshcpError, WireError) as e:
+                self.__close_session()
+                # Suppress specific errors and retry a fixed number of times
+                # Otherwise raise a fatal AppError
+                if isinstance(e, SshcpError) and suppress_ssh_error(e) and \
+                        retries < RemoteWatchScanner.RETRY_COUNT:
+                    self.logger.warning("Retrying remote watch after error: {}".format(str(e)))
+                    retries += 1
+                else:
+                    self.logger.exception("Caught an error from the remote watch")
+                    raise AppError(Localization.Error.REMOTE_SERVER_SCAN)
+
+    def __feed(self, data: bytes):
+        """
+        Decode the output of the watch, which is a series of back-to-back scans
+        :param data:
+        :return:
+        """
+        while data:
+            self.__decoder.feed(data)
+            if not self.__decoder.done:
+                return
+            self.logger.debug("Received {} scan, generation {}".format(
+                "delta" if self.__decoder.is_delta else "full", self.__decoder.generation
+            ))
+            self.__files = self.__decoder.files
+            self.__changed = True
+            data = self.__decoder.unused_data
+            self.__decoder = WireDecoder(base_files=self.__files)
+
+    def __close_session(self):
+        if self.__session is not None:
+            self.__session.close()
+            self.__session = None
@@ -0,0 +1,90 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import mmap
+import multiprocessing
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from system import SystemFileTree
+
+
+class ScannerResultBuffer:
+    """
+    Shared memory holding the latest scan result of a scanner process
+    The buffer is double-buffered. The writer packs each result into the slot
+    that isn't published and then flips the header to publish it. The reader
+    copies out only the published slot. A result that's overwritten before it
+    is read is never copied, pickled or decoded.
+    Slots are memory mapped temporary files so that they can grow to fit any
+    result. Like a multiprocessing.Queue, the buffer is shared by the
+    processes forked after it's created.
+    There must be a single writer and a single reader.
+    """
+    def __init__(self):
+        self.__lock = multiprocessing.Lock()
+        self.__slot_files = [tempfile.TemporaryFile(), tempfile.TemporaryFile()]
+        # Header, guarded by the lock
+        self.__slot = multiprocessing.RawValue('i', -1)  # published slot, -1 if none
+        self.__length = multiprocessing.RawValue('q', 0)  # length of the published tree
+        self.__generation = multiprocessing.RawValue('q', 0)  # incremented for every new tree
+        self.__sequence = multiprocessing.RawValue('q', 0)  # incremented for every result
+        self.__timestamp = multiprocessing.RawValue('q', 0)  # of the latest result, in us
+        # Reader state
+        self.__read_generation = 0
+        self.__read_sequence = 0
+
+    def write(self, timestamp: datetime, tree: Optional[SystemFileTree]):
+        """
+        Publish a result
+        :param timestamp:
+        :param tree: None for a heartbeat, when the files haven't changed
+        :return:
+        """
+        slot = None
+        data = None
+        if tree is not None:
+            # Only the writer changes the published slot, so the other slot
+            # can be written without the lock
+            slot = 1 if self.__slot.value == 0 else 0
+            data = tree.to_bytes()
+            self.__write_slot(slot, data)
+        with self.__lock:
+            if tree is not None:
+                self.__slot.value = slot
+                self.__length.value = len(data)
+                self.__generation.value += 1
+            self.__sequence.value += 1
+            self.__timestamp.value = (timestamp - datetime.min) // timedelta(microseconds=1)
+
+    def read_latest(self) -> Optional[Tuple[datetime, Optional[SystemFileTree]]]:
+        """
+        Read the latest result
+        Returns None if nothing was written since the last read. The tree is
+        None if it hasn't changed since the last read.
+        :return: (timestamp, tree)
+        """
+        data = None
+        with self.__lock:
+            if self.__sequence.value == self.__read_sequence:
+                return None
+            self.__read_sequence = self.__sequence.value
+            timestamp = datetime.min + timedelta(microseconds=self.__timestamp.value)
+            if self.__generation.value != self.__read_generation:
+                self.__read_generation = self.__generation.value
+                # The writer can't reuse this slot until the lock is released
+                data = self.__read_slot(self.__slot.value, self.__length.value)
+        return timestamp, SystemFileTree.from_bytes(data) if data is not None else None
+
+    def __write_slot(self, slot: int, data: bytes):
+        fileno = self.__slot_files[slot].fileno()
+        # Slots only ever grow, so that a slot is resized only a few times
+        if os.fstat(fileno).st_size < len(data):
+            os.ftruncate(fileno, len(data))
+        with mmap.mmap(fileno, len(data)) as mm:
+            mm[:] = data
+
+    def __read_slot(self, slot: int, length: int) -> bytes:
+        with mmap.mmap(self.__slot_files[slot].fileno(), length, access=mmap.ACCESS_READ) as mm:
+            return mm[:]
@@ -3,12 +3,15 @@
 import logging
 from abc import ABC, abstractmethod
 import multiprocessing
+import random
 from datetime import datetime
 from typing import List, Optional
 import queue
 
-from common import overrides, AppProcess
-from system import SystemFile
+from .scanner_buffer import ScannerResultBuffer
+from common import overrides, AppError, AppProcess
+from ssh import SshcpError
+from system import SystemFile, SystemFileTree, SystemFileView
 
 
 class IScanner(ABC):
@@ -17,22 +20,82 @@ class IScanner(ABC):
     This hides the scanning implementation from the scanner process.
     """
     @abstractmethod
-    def scan(self) -> List[SystemFile]:
-        """Scan system"""
+    def scan(self) -> Optional[List[SystemFile]]:
+        """
+        Scan system
+        Returns None if the scanner knows that nothing changed since the last scan
+        """
         pass
 
     @abstractmethod
     def set_base_logger(self, base_logger: logging.Logger):
         pass
 
+    @property
+    def supports_scan_single(self) -> bool:
+        """
+        Whether scan_single can be called right now
+        If not, a full scan is done instead of single file scans
+        """
+        return False
+
+    @abstractmethod
+    def scan_single(self, name: str) -> Optional[SystemFile]:
+        """
+        Scan a single top-level file
+        Returns None if the file doesn't exist
+        Only called if supports_scan_single is True
+        """
+        pass
+
+    def close(self):
+        """
+        Release any resources held by the scanner
+        """
+        pass
+
 
 class ScannerResult:
     """
     Results of a system scan
+    The files are packed into a SystemFileTree so that the result is cheap to
+    send across processes. They are read back as SystemFile-compatible views.
+    A result without files is a heartbeat. It means the scan found the same
+    files as the last result that had files.
     """
-    def __init__(self, timestamp: datetime, files: List[SystemFile]):
+    def __init__(self, timestamp: datetime, files: Optional[List[SystemFile]]):
         self.timestamp = timestamp
-        self.files = files
+        self.__tree = SystemFileTree.from_system_files(files) if files is not None else None
+
+    @staticmethod
+    def from_tree(timestamp: datetime, tree: Optional[SystemFileTree]) -> "ScannerResult":
+        result = ScannerResult(timestamp=timestamp, files=None)
+        result.__tree = tree
+        return result
+
+    @property
+    def unchanged(self) -> bool:
+        return self.__tree is None
+
+    @property
+    def files(self) -> Optional[List[SystemFileView]]:
+        return self.__tree.roots if self.__tree is not None else None
+
+
+class ScannerSingleResult:
+    """
+    Result of a scan of a single top-level file
+    The file is None if it doesn't exist
+    """
+    def __init__(self, timestamp: datetime, name: str, file: Optional[SystemFile]):
+        self.timestamp = timestamp
+        self.name = name
+        self.__tree = SystemFileTree.from_system_files([file] if file is not None else [])
+
+    @property
+    def file(self) -> Optional[SystemFileView]:
+        roots = self.__tree.roots
+        return roots[0] if roots else None
 
 
 class ScannerProcess(AppProcess):
@@ -41,19 +104,78 @@ class ScannerProcess(AppProcess):
     """
     def __init__(self,
                  scanner: IScanner, interval_in_ms: int,
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 max_interval_in_ms: Optional[int] = None,
+                 jitter: float = 0.0):
         """
         Create a scanner process
+        The interval between scans is adaptive. It doubles after every scan
+        that finds nothing changed, up to max_interval_in_ms, and drops back
+        to interval_in_ms as soon as a change is found or the process is set
+        busy.
         :param scanner: IScanner implementation
         :param interval_in_ms: Minimum interval (in ms) between results
+        :param max_interval_in_ms: Maximum interval (in ms) while nothing changes,
+                                   None to always use interval_in_ms
+        :param jitter: Fraction of the interval by which each wait is randomly
+                       shortened or lengthened, so that scans don't line up
+                       with other periodic load
         """
         super().__init__(name=scanner.__class__.__name__)
-        self.__queue = multiprocessing.Queue()
-        self.__wake_event = multiprocessing.Event()
+        # Only the latest full result is kept, so a slow reader doesn't
+        # have to go through all the results it missed
+        self.__buffer = ScannerResultBuffer()
+        self.__single_queue = multiprocessing.Queue()
+        # Scan requests, a name for a single file scan or None for a full scan
+        # Waiting on the requests also serves as the wait between scans
+        self.__request_queue = multiprocessing.Queue()
         self.__scanner = scanner
-        self.__interval_in_ms = interval_in_ms
+        self.__min_interval_in_ms = interval_in_ms
+        self.__max_interval_in_ms = max(max_interval_in_ms or interval_in_ms, interval_in_ms)
+        self.__jitter = jitter
+        # Shared with the parent process
+        self.__interval_in_ms = multiprocessing.Value('i', interval_in_ms)
+        self.__busy = multiprocessing.Value('b', False)
+        self.__is_busy = False  # parent's copy
+        self.__reset = multiprocessing.Value('b', False)
+        # Timestamp of the last full result returned to the parent
+        self.__latest_result_timestamp = None  # type: Optional[datetime]
+        # Scanner process state
+        self.__last_fingerprint = None  # type: Optional[bytes]
         self.verbose = verbose
 
+    @property
+    def interval_in_ms(self) -> int:
+        """
+        Process-safe method to retrieve the current interval between scans
+        :return:
+        """
+        return self.__interval_in_ms.value
+
+    def set_busy(self, busy: bool):
+        """
+        Keep scanning at the minimum interval while busy, for example while
+        downloads are running
+        :param busy:
+        :return:
+        """
+        self.__busy.value = busy
+        if busy and not self.__is_busy and self.interval_in_ms > self.__min_interval_in_ms:
+            # Don't wait out a long backoff
+            self.force_scan()
+        self.__is_busy = busy
+
+    def reset_interval(self):
+        """
+        Drop back to the minimum interval, as if the last scan found a change
+        For example after a command that is likely to be followed by changes
+        :return:
+        """
+        self.__reset.value = True
+        if self.interval_in_ms > self.__min_interval_in_ms:
+            # Don't wait out a long backoff
+            self.force_scan()
+
     @overrides(AppProcess)
     def run_init(self):
         # Set the base logger for scanner
@@ -61,7 +183,7 @@ class ScannerProcess(AppProcess):
 
     @overrides(AppProcess)
     def run_cleanup(self):
-        pass
+        self.__scanner.close()
 
     @overrides(AppProcess)
     def run_loop(self):
@@ -69,35 +191,138 @@ class ScannerProcess(AppProcess):
         if self.verbose:
             self.logger.debug("Running a scan")
         files = self.__scanner.scan()
-        result = ScannerResult(timestamp=timestamp_start,
-                               files=files)
-        self.__queue.put(result)
+        tree = SystemFileTree.from_system_files(files) if files is not None else None
+        changed = False
+        if tree is not None:
+            fingerprint = tree.fingerprint()
+            if fingerprint != self.__last_fingerprint:
+                self.__last_fingerprint = fingerprint
+                changed = True
+            else:
+                # Same as the last result, only publish a heartbeat
+                tree = None
+        self.__buffer.write(timestamp_start, tree)
         delta_in_s = (datetime.now() - timestamp_start).total_seconds()
         delta_in_ms = int(delta_in_s * 1000)
         if self.verbose:
             self.logger.debug("Scan took {:.3f}s".format(delta_in_s))
 
-        # Wait until the next interval, or until a wake event is fired
-        if delta_in_ms < self.__interval_in_ms:
-            wait_time_in_s = float(self.__interval_in_ms - delta_in_ms) / 1000.0
-            self.__wake_event.wait(timeout=wait_time_in_s)
-            self.__wake_event.clear()
+        interval_in_ms = self.__next_interval(changed)
+
+        # Wait until the next interval, or until a scan is requested
+        # Single file scans are done while waiting, since they are cheap
+        if self.__jitter:
+            interval_in_ms = int(interval_in_ms * random.uniform(1 - self.__jitter, 1 + self.__jitter))
+        while delta_in_ms < interval_in_ms:
+            wait_time_in_s = float(interval_in_ms - delta_in_ms) / 1000.0
+            try:
+                request = self.__request_queue.get(timeout=wait_time_in_s)
+            except queue.Empty:
+                break
+            if not self.__scan_singles(request):
+                break
+            delta_in_ms = int((datetime.now() - timestamp_start).total_seconds() * 1000)
+
+    def __next_interval(self, changed: bool) -> int:
+        """
+        Update the interval after a scan
+        :param changed: whether the scan found any changes
+        :return:
+        """
+        prev_interval_in_ms = self.__interval_in_ms.value
+        reset = self.__reset.value
+        self.__reset.value = False
+        if changed or reset or self.__busy.value:
+            interval_in_ms = self.__min_interval_in_ms
+        else:
+            interval_in_ms = min(prev_interval_in_ms * 2, self.__max_interval_in_ms)
+        if interval_in_ms != prev_interval_in_ms:
+            self.__interval_in_ms.value = interval_in_ms
+            self.logger.debug("Scan interval is now {}ms".format(interval_in_ms))
+        return interval_in_ms
+
+    def __scan_singles(self, request: Optional[str]) -> bool:
+        """
+        Scan the files named in the pending requests
+        Returns False if a full scan is due instead, either because one was
+        requested or because the scanner can't scan single files, or because
+        a single scan failed
+        :param request: first request
+        :return:
+        """
+        names = {request}
+        try:
+            while True:
+                names.add(self.__request_queue.get(block=False))
+        except queue.Empty:
+            pass
+        if None in names:
+            # The full scan covers the named files too
+            return False
+        for name in sorted(names):
+            # The scanner may stop supporting single scans, for example if
+            # it loses its connection
+            if not self.__scanner.supports_scan_single:
+                return False
+            timestamp_start = datetime.now()
+            try:
+                file = self.__scanner.scan_single(name)
+            except (AppError, SshcpError, ValueError) as e:
+                # The full scan reports any persistent error
+                self.logger.warning("Failed to scan {}, doing a full scan: {}".format(name, str(e)))
+                return False
+            if self.verbose:
+                self.logger.debug("Scanned {} in {:.3f}s".format(
+                    name, (datetime.now() - timestamp_start).total_seconds()
+                ))
+            self.__single_queue.put(ScannerSingleResult(timestamp=timestamp_start, name=name, file=file))
+        # Single results are merged into the last full result, so the next
+        # full result must be published even if it's the same as the last one
+        self.__last_fingerprint = None
+        return self.__scanner.supports_scan_single
 
     def pop_latest_result(self) -> Optional[ScannerResult]:
         """
         Process-safe method to retrieve latest scan result
         Returns None if no new scan result was generated since the last time
         this method was called
+        The result is a heartbeat only if the files haven't changed since the
+        last result with files that was returned
         :return:
         """
-        latest_scan = None
+        latest = self.__buffer.read_latest()
+        if latest is None:
+            return None
+        timestamp, tree = latest
+        self.__latest_result_timestamp = timestamp
+        return ScannerResult.from_tree(timestamp=timestamp, tree=tree)
+
+    def pop_single_results(self) -> List[ScannerSingleResult]:
+        """
+        Process-safe method to retrieve the single file scan results
+        generated since the last time this method was called, oldest first
+        Results that are older than the last full result returned by
+        pop_latest_result are dropped, since that result already covers them.
+        The queue may deliver a single result after a newer full result.
+        :return:
+        """
+        results = []
         try:
             while True:
-                latest_scan = self.__queue.get(block=False)
+                result = self.__single_queue.get(block=False)
+                if self.__latest_result_timestamp is None or result.timestamp > self.__latest_result_timestamp:
+                    results.append(result)
         except queue.Empty:
             pass
-        return latest_scan
+        return results
 
     def force_scan(self):
         """Force process to wake and do an immediate scan"""
-        self.__wake_event.set()
+        self.__request_queue.put(None)
+
+    def force_scan_single(self, name: str):
+        """
+        Force process to wake and do an immediate scan of a single top-level file
+        Its result is retrieved with pop_single_results
+        """
+        self.__request_queue.put(name)
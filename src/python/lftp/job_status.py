@@ -2,7 +2,7 @@
 
 from collections import namedtuple
 from enum import Enum
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 
 class LftpJobStatus:
@@ -78,6 +78,14 @@ class LftpJobStatus:
         """
         return list(zip(self.__active_files_state.keys(), self.__active_files_state.values()))
 
+    def get_active_file_transfer_state(self, filename: str) -> Optional[TransferState]:
+        """
+        Returns the transfer state of the given file, or None if it's not active
+        :param filename: path relative to the job's root
+        :return:
+        """
+        return self.__active_files_state.get(filename, None)
+
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
@@ -1,5 +1,6 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from .model import Model, IModelListener, ModelError
+from .model import Model, ModelChange, IModelListener, ModelError
+from .patch import ModelFilePatch
 from .file import ModelFile
 from .diff import ModelDiff, ModelDiffUtil
@@ -82,6 +82,8 @@ class ModelDiffUtil:
         for name in file_names_updated:
             file_before = model_before.get_file(name)
             file_after = model_after.get_file(name)
+            # Note: built files are frozen, so this compares their fingerprints
+            #       rather than their whole trees
             if file_before != file_after:
                 diffs.append(ModelDiff(ModelDiff.Change.UPDATED, file_before, file_after))
 
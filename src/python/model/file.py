@@ -2,8 +2,10 @@
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Sequence
+from collections.abc import Sequence as SequenceABC
 import copy
+import hashlib
 import os
 
 
@@ -25,6 +27,49 @@ class ModelFile:
         EXTRACTING = 5
         EXTRACTED = 6
 
+    class _ChildrenView(SequenceABC):
+        """
+        Read-only view of the children of a file, in the order they were added
+        """
+        __slots__ = ("__children",)
+
+        def __init__(self, children: List["ModelFile"]):
+            self.__children = children
+
+        def __getitem__(self, index):
+            return self.__children[index]
+
+        def __len__(self):
+            return len(self.__children)
+
+        def __iter__(self):
+            return iter(self.__children)
+
+        def __repr__(self):
+            return repr(self.__children)
+
+    __slots__ = (
+        "__name",
+        "__is_dir",
+        "__state",
+        "__remote_size",
+        "__local_size",
+        "__transferred_size",
+        "__downloading_speed",
+        "__eta",
+        "__is_extractable",
+        "__num_files",
+        "__num_remote_files",
+        "__num_downloaded_files",
+        "__update_timestamp",
+        "__children",
+        "__children_by_name",
+        "__parent",
+        "__full_path",
+        "__frozen",
+        "__fingerprint"
+    )
+
     def __init__(self, name: str, is_dir: bool):
         self.__name = name  # file or folder name
         self.__is_dir = is_dir  # True if this is a dir, False if file
@@ -35,48 +80,78 @@ class ModelFile:
         self.__downloading_speed = None  # in bytes / sec, None if not downloading
         self.__eta = None  # est. time remaining in seconds, None if not available
         self.__is_extractable = False  # whether file is an archive or dir contains archives
+        # aggregates over all the files (not dirs) under a dir, 0 for a file
+        self.__num_files = 0  # number of files
+        self.__num_remote_files = 0  # number of files that exist remotely
+        self.__num_downloaded_files = 0  # number of Downloaded files
         # timestamp of the latest update
         # Note: timestamp is not part of equality operator
         self.__update_timestamp = datetime.now()
-        self.__children = []  # children files
+        self.__children = []  # children files, in the order they were added
+        self.__children_by_name = {}  # children files by name
         self.__parent = None  # direct predecessor
+        self.__full_path = None  # cached full path, None if not computed yet
+        self.__frozen = False  # True if the file and its children can no longer be modified
+        self.__fingerprint = None  # digest of the file and its children, None if not frozen
 
-    def __eq__(self, other):
+    def __eq_key(self) -> tuple:
         # disregard in comparisons:
         #   timestamp: we don't care about it
         #   parent: semantics are to check self and children only
         #   children: check these manually for easier debugging
-        ka = set(self.__dict__).difference({
-            "_ModelFile__update_timestamp",
-            "_ModelFile__parent",
-            "_ModelFile__children"
-        })
-        kb = set(other.__dict__).difference({
-            "_ModelFile__update_timestamp",
-            "_ModelFile__parent",
-            "_ModelFile__children"
-        })
+        #   file counts: these are derived from the children
+        #   full path: this is derived from the parent
+        #   fingerprint: this is derived from the rest
+        return (
+            self.__name,
+            self.__is_dir,
+            self.__state,
+            self.__remote_size,
+            self.__local_size,
+            self.__transferred_size,
+            self.__downloading_speed,
+            self.__eta,
+            self.__is_extractable
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, ModelFile):
+            return NotImplemented
+        # Frozen files are compared by their fingerprints alone
+        if self.__fingerprint is not None and other.__fingerprint is not None:
+            return self.__fingerprint == other.__fingerprint
+
         # Check self properties
-        if ka != kb:
-            return False
-        if not all(self.__dict__[k] == other.__dict__[k] for k in ka):
+        if self.__eq_key() != other.__eq_key():
             return False
 
         # Check children's properties
-        if len(self.__children) != len(other.__children):
-            return False
-        my_children_dict = {f.name: f for f in self.__children}
-        other_children_dict = {f.name: f for f in other.__children}
-        if my_children_dict.keys() != other_children_dict.keys():
+        if self.__children_by_name.keys() != other.__children_by_name.keys():
             return False
-        for name in my_children_dict.keys():
-            if my_children_dict[name] != other_children_dict[name]:
+        for name, child in self.__children_by_name.items():
+            if child != other.__children_by_name[name]:
                 return False
 
         return True
 
     def __repr__(self):
-        return str(self.__dict__)
+        # parent is left out, its repr would include this file again
+        return str({
+            "name": self.__name,
+            "is_dir": self.__is_dir,
+            "state": self.__state,
+            "remote_size": self.__remote_size,
+            "local_size": self.__local_size,
+            "transferred_size": self.__transferred_size,
+            "downloading_speed": self.__downloading_speed,
+            "eta": self.__eta,
+            "is_extractable": self.__is_extractable,
+            "num_files": self.__num_files,
+            "num_remote_files": self.__num_remote_files,
+            "num_downloaded_files": self.__num_downloaded_files,
+            "update_timestamp": self.__update_timestamp,
+            "children": self.__children
+        })
 
     @property
     def name(self) -> str: return self.__name
@@ -89,6 +164,7 @@ class ModelFile:
 
     @state.setter
     def state(self, state: State):
+        self.__check_not_frozen()
         if type(state) != ModelFile.State:
             raise TypeError
         self.__state = state
@@ -98,6 +174,7 @@ class ModelFile:
 
     @remote_size.setter
     def remote_size(self, remote_size: Optional[int]):
+        self.__check_not_frozen()
         if type(remote_size) == int:
             if remote_size < 0:
                 raise ValueError
@@ -112,6 +189,7 @@ class ModelFile:
 
     @local_size.setter
     def local_size(self, local_size: Optional[int]):
+        self.__check_not_frozen()
         if type(local_size) == int:
             if local_size < 0:
                 raise ValueError
@@ -126,6 +204,7 @@ class ModelFile:
 
     @transferred_size.setter
     def transferred_size(self, transferred_size: Optional[int]):
+        self.__check_not_frozen()
         if type(transferred_size) == int:
             if transferred_size < 0:
                 raise ValueError
@@ -140,6 +219,7 @@ class ModelFile:
 
     @downloading_speed.setter
     def downloading_speed(self, downloading_speed: Optional[int]):
+        self.__check_not_frozen()
         if type(downloading_speed) == int:
             if downloading_speed < 0:
                 raise ValueError
@@ -154,6 +234,7 @@ class ModelFile:
 
     @update_timestamp.setter
     def update_timestamp(self, update_timestamp: datetime):
+        self.__check_not_frozen()
         if type(update_timestamp) != datetime:
             raise TypeError
         self.__update_timestamp = update_timestamp
@@ -163,6 +244,7 @@ class ModelFile:
 
     @eta.setter
     def eta(self, eta: Optional[int]):
+        self.__check_not_frozen()
         if type(eta) == int:
             if eta < 0:
                 raise ValueError
@@ -177,28 +259,129 @@ class ModelFile:
 
     @is_extractable.setter
     def is_extractable(self, is_extractable: bool):
+        self.__check_not_frozen()
         self.__is_extractable = is_extractable
 
+    @property
+    def num_files(self) -> int: return self.__num_files
+
+    @num_files.setter
+    def num_files(self, num_files: int):
+        self.__check_not_frozen()
+        if type(num_files) != int:
+            raise TypeError
+        if num_files < 0:
+            raise ValueError
+        self.__num_files = num_files
+
+    @property
+    def num_remote_files(self) -> int: return self.__num_remote_files
+
+    @num_remote_files.setter
+    def num_remote_files(self, num_remote_files: int):
+        self.__check_not_frozen()
+        if type(num_remote_files) != int:
+            raise TypeError
+        if num_remote_files < 0:
+            raise ValueError
+        self.__num_remote_files = num_remote_files
+
+    @property
+    def num_downloaded_files(self) -> int: return self.__num_downloaded_files
+
+    @num_downloaded_files.setter
+    def num_downloaded_files(self, num_downloaded_files: int):
+        self.__check_not_frozen()
+        if type(num_downloaded_files) != int:
+            raise TypeError
+        if num_downloaded_files < 0:
+            raise ValueError
+        self.__num_downloaded_files = num_downloaded_files
+
     @property
     def full_path(self) -> str:
         """Full path including all predecessors"""
-        if self.__parent:
-            return os.path.join(self.__parent.full_path, self.name)
-        return self.name
+        # Computed once and cached
+        # Note: if a file's path is cached, so are the paths of all its predecessors
+        if self.__full_path is None:
+            if self.__parent:
+                self.__full_path = os.path.join(self.__parent.full_path, self.__name)
+            else:
+                self.__full_path = self.__name
+        return self.__full_path
 
     def add_child(self, child_file: "ModelFile"):
+        self.__check_not_frozen()
+        if child_file.__frozen:
+            raise TypeError("Cannot add a frozen file as a child")
         if not self.is_dir:
             raise TypeError("Cannot add child to a non-directory")
         if child_file is self:
             raise ValueError("Cannot add parent as a child")
-        if child_file.name in (f.name for f in self.__children):
+        if child_file.name in self.__children_by_name:
             raise ValueError("Cannot add child more than once")
         self.__children.append(child_file)
+        self.__children_by_name[child_file.name] = child_file
         child_file.__parent = self
+        # The child's path and those of its successors now include this file
+        frontier = [child_file]
+        for _file in frontier:
+            if _file.__full_path is not None:
+                _file.__full_path = None
+                frontier += _file.__children
+
+    @property
+    def children(self) -> Sequence["ModelFile"]:
+        """Read-only view of the children, in the order they were added"""
+        return ModelFile._ChildrenView(self.__children)
+
+    def get_child(self, name: str) -> Optional["ModelFile"]:
+        """Returns the child of the given name, or None if there isn't one"""
+        return self.__children_by_name.get(name, None)
 
     def get_children(self) -> List["ModelFile"]:
+        """Returns a copy of the children, use children to avoid the copy"""
         return copy.copy(self.__children)
 
     @property
     def parent(self) -> Optional["ModelFile"]:
         return self.__parent
+
+    @property
+    def is_frozen(self) -> bool: return self.__frozen
+
+    def freeze(self):
+        """
+        Make the file and all its successors immutable
+        A frozen tree can be shared by reference, without copying, since no one
+        can modify it. Changes are made by building new files instead.
+        :return:
+        """
+        # Fingerprints are computed bottom-up, so that each file's fingerprint
+        # is a digest of its own properties and its children's fingerprints
+        # Note: children that are already frozen already have fingerprints
+        frontier = [self] if not self.__frozen else []
+        for _file in frontier:
+            frontier += (f for f in _file.__children if not f.__frozen)
+        for _file in reversed(frontier):
+            # The repr of the properties is unambiguous, and the digests all
+            # have the same length
+            # Children are sorted since their order doesn't matter for equality
+            digest = hashlib.sha1(repr(_file.__eq_key()).encode("utf-8", "surrogateescape"))
+            for child_fingerprint in sorted(f.__fingerprint for f in _file.__children):
+                digest.update(child_fingerprint)
+            _file.__fingerprint = digest.digest()
+            _file.__frozen = True
+
+    @property
+    def fingerprint(self) -> Optional[bytes]:
+        """
+        Digest of the file and all its successors, None if the file isn't frozen
+        Two frozen files are equal if and only if their fingerprints are, so
+        they're compared without walking their children
+        """
+        return self.__fingerprint
+
+    def __check_not_frozen(self):
+        if self.__frozen:
+            raise TypeError("Cannot modify a frozen file")
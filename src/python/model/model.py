@@ -1,12 +1,16 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
+import random
 from abc import ABC, abstractmethod
-from typing import Set
+from collections import deque
+from itertools import islice
+from typing import List, Optional, Sequence, Set
 
 # my libs
 from common import AppError
 from .file import ModelFile
+from .patch import ModelFilePatch
 
 
 class ModelError(AppError):
@@ -42,21 +46,119 @@ class IModelListener(ABC):
     def file_updated(self, old_file: ModelFile, new_file: ModelFile):
         """
         Event indicating that the given file was updated
+        The changes by node are in the change passed to model_changed
         :param old_file:
         :param new_file:
         :return:
         """
         pass
 
+    def model_changed(self, change: "ModelChange"):
+        """
+        Event with the change that was made, following the event for the file
+        The changes by node to an updated file are computed once for all the
+        listeners and the history, instead of by each listener
+        :param change:
+        :return:
+        """
+        pass
+
+
+class ModelChange:
+    """
+    A change to the model, as kept in its history
+      Added file: new_file holds the file
+      Removed file: old_file holds the file
+      Updated file: patches hold the changes to the file by node. The whole
+                    old and new files aren't kept, since they would keep a
+                    copy of a large tree alive for every small change to it.
+    """
+    def __init__(self,
+                 version: int,
+                 name: str,
+                 old_file: Optional[ModelFile] = None,
+                 new_file: Optional[ModelFile] = None,
+                 patches: Optional[List[ModelFilePatch]] = None):
+        self.__version = version
+        self.__name = name
+        self.__old_file = old_file
+        self.__new_file = new_file
+        self.__patches = patches
+        # Number of nodes held by the change, counted when first needed
+        self.__num_nodes = None  # type: Optional[int]
+
+    def __key(self):
+        return self.__version, self.__name, self.__old_file, self.__new_file, self.__patches
+
+    def __eq__(self, other):
+        return self.__key() == other.__key()
+
+    def __repr__(self):
+        return str(self.__key())
+
+    @staticmethod
+    def __count_nodes(file: ModelFile) -> int:
+        frontier = [file]
+        for _file in frontier:
+            frontier += _file.children
+        return len(frontier)
+
+    @property
+    def version(self) -> int:
+        """Version of the model after the change"""
+        return self.__version
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def old_file(self) -> Optional[ModelFile]:
+        return self.__old_file
+
+    @property
+    def new_file(self) -> Optional[ModelFile]:
+        return self.__new_file
+
+    @property
+    def patches(self) -> Optional[List[ModelFilePatch]]:
+        return self.__patches
+
+    @property
+    def num_nodes(self) -> int:
+        """Number of files and patches held by the change"""
+        if self.__num_nodes is None:
+            num_nodes = len(self.__patches) if self.__patches is not None else 0
+            for file in [self.__old_file, self.__new_file] + [p.file for p in self.__patches or []]:
+                if file is not None:
+                    num_nodes += ModelChange.__count_nodes(file)
+            self.__num_nodes = num_nodes
+        return self.__num_nodes
+
 
 class Model:
     """
     Represents the entire state of lftp
+    Every change to the model increments its version. The most recent changes
+    are kept, so that a reader that has seen an earlier version can catch up
+    without getting the whole model again.
     """
-    def __init__(self):
+    def __init__(self, history_max_nodes: int = 0):
+        """
+        :param history_max_nodes: Maximum number of files and patches held by
+                                  the kept changes, 0 to keep no changes
+        """
         self.logger = logging.getLogger("Model")
         self.__files = {}  # name->LftpFile
         self.__listeners = []
+        self.__files_snapshot = None  # cached result of get_files, None if it's stale
+        # Versions start at a random epoch so that a version seen by a reader
+        # in a previous run never matches one of this run
+        self.__version = random.getrandbits(20) << 32
+        # Most recent changes, oldest first
+        self.__history = deque()  # type: deque
+        self.__history_max_nodes = history_max_nodes
+        self.__history_num_nodes = 0
 
     def set_base_logger(self, base_logger: logging.Logger):
         self.logger = base_logger.getChild("Model")
@@ -93,8 +195,11 @@ class Model:
         if file.name in self.__files:
             raise ModelError("File already exists in the model")
         self.__files[file.name] = file
+        self.__files_snapshot = None
+        change = self.__add_change(file.name, new_file=file)
         for listener in self.__listeners:
             listener.file_added(self.__files[file.name])
+            listener.model_changed(change)
 
     def remove_file(self, filename: str):
         """
@@ -107,8 +212,11 @@ class Model:
             raise ModelError("File does not exist in the model")
         file = self.__files[filename]
         del self.__files[filename]
+        self.__files_snapshot = None
+        change = self.__add_change(file.name, old_file=file)
         for listener in self.__listeners:
             listener.file_removed(file)
+            listener.model_changed(change)
 
     def update_file(self, file: ModelFile):
         """
@@ -122,12 +230,18 @@ class Model:
         old_file = self.__files[file.name]
         new_file = file
         self.__files[file.name] = new_file
+        self.__files_snapshot = None
+        change = self.__add_change(new_file.name, old_file=old_file, new_file=new_file)
         for listener in self.__listeners:
             listener.file_updated(old_file, new_file)
+            listener.model_changed(change)
 
     def get_file(self, name: str) -> ModelFile:
         """
-        Returns a copy of the file of the given name
+        Returns the file of the given name
+        The file is shared with the model and not copied. Files built by the
+        model builder are frozen, so callers can keep them but must not
+        modify them.
         :param name:
         :return:
         """
@@ -137,3 +251,70 @@ class Model:
 
     def get_file_names(self) -> Set[str]:
         return set(self.__files.keys())
+
+    def get_files(self) -> Sequence[ModelFile]:
+        """
+        Returns all the files
+        The result is cached until the model changes, so that repeated calls
+        are cheap. As with get_file, the files are shared with the model and
+        must not be modified.
+        :return:
+        """
+        if self.__files_snapshot is None:
+            self.__files_snapshot = tuple(self.__files.values())
+        return self.__files_snapshot
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def history_num_nodes(self) -> int:
+        """Number of files and patches held by the kept changes"""
+        return self.__history_num_nodes
+
+    def get_changes_since(self, version: int) -> Optional[List[ModelChange]]:
+        """
+        Returns the changes made after the given version, oldest first
+        Returns None if the changes are no longer kept, or if the version
+        isn't one of this model's
+        :param version:
+        :return:
+        """
+        if version == self.__version:
+            return []
+        if not self.__history or not self.__history[0].version - 1 <= version < self.__version:
+            return None
+        # Versions in the history are consecutive
+        return list(islice(self.__history, version - self.__history[0].version + 1, None))
+
+    def __add_change(self,
+                     name: str,
+                     old_file: Optional[ModelFile] = None,
+                     new_file: Optional[ModelFile] = None) -> Optional[ModelChange]:
+        """
+        Record a change to the model in the history
+        The change isn't built if there's no history and no listener for it,
+        e.g. for the temporary model filled by the model builder
+        :param name:
+        :param old_file:
+        :param new_file:
+        :return: the change, to be passed to the listeners
+        """
+        self.__version += 1
+        if self.__history_max_nodes <= 0 and not self.__listeners:
+            return None
+        if old_file is not None and new_file is not None:
+            change = ModelChange(self.__version, name,
+                                 patches=ModelFilePatch.diff_files(old_file, new_file))
+        else:
+            change = ModelChange(self.__version, name, old_file=old_file, new_file=new_file)
+        if self.__history_max_nodes <= 0:
+            return change
+        self.__history.append(change)
+        self.__history_num_nodes += change.num_nodes
+        # Drop the oldest changes until the history fits
+        # A change that doesn't fit by itself isn't kept either
+        while self.__history_num_nodes > self.__history_max_nodes:
+            self.__history_num_nodes -= self.__history.popleft().num_nodes
+        return change
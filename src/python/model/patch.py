@@ -0,0 +1,106 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+# my libs
+from .file import ModelFile
+
+
+class ModelFilePatch:
+    """
+    Represents a change to a single file or directory in a file tree
+      ADDED: the file at path was added, file holds it along with its children
+      REMOVED: the file at path was removed
+      UPDATED: properties of the file at path changed, fields holds their new values
+               by property name. Its children are patched separately.
+    """
+    class Change(Enum):
+        ADDED = 0
+        REMOVED = 1
+        UPDATED = 2
+
+    # Properties that are compared for UPDATED patches
+    FIELDS = (
+        "state",
+        "remote_size",
+        "local_size",
+        "transferred_size",
+        "downloading_speed",
+        "eta",
+        "is_extractable",
+        "num_files",
+        "num_remote_files",
+        "num_downloaded_files"
+    )
+
+    def __init__(self,
+                 change: Change,
+                 path: str,
+                 fields: Optional[Dict[str, Any]] = None,
+                 file: Optional[ModelFile] = None):
+        self.__change = change
+        self.__path = path
+        self.__fields = fields
+        self.__file = file
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+    @property
+    def change(self) -> Change:
+        return self.__change
+
+    @property
+    def path(self) -> str:
+        """Full path of the changed file"""
+        return self.__path
+
+    @property
+    def fields(self) -> Optional[Dict[str, Any]]:
+        return self.__fields
+
+    @property
+    def file(self) -> Optional[ModelFile]:
+        return self.__file
+
+    @staticmethod
+    def diff_files(old_file: ModelFile, new_file: ModelFile) -> List["ModelFilePatch"]:
+        """
+        Compare two versions of a file and generate the changes by node
+        Subtrees whose fingerprints match are skipped, so for frozen files the
+        cost is proportional to what changed rather than to the size of the tree
+        :param old_file:
+        :param new_file:
+        :return:
+        """
+        patches = []
+        frontier = [(old_file, new_file)]
+        for _old, _new in frontier:
+            if _old.fingerprint is not None and _old.fingerprint == _new.fingerprint:
+                continue
+            if _old.is_dir != _new.is_dir:
+                # Not the same kind of file anymore, replace it
+                patches.append(ModelFilePatch(ModelFilePatch.Change.REMOVED, _old.full_path))
+                patches.append(ModelFilePatch(ModelFilePatch.Change.ADDED, _new.full_path, file=_new))
+                continue
+            fields = dict()
+            for field in ModelFilePatch.FIELDS:
+                value = getattr(_new, field)
+                if getattr(_old, field) != value:
+                    fields[field] = value
+            if fields:
+                patches.append(ModelFilePatch(ModelFilePatch.Change.UPDATED, _new.full_path, fields=fields))
+            for _old_child in _old.children:
+                _new_child = _new.get_child(_old_child.name)
+                if _new_child is None:
+                    patches.append(ModelFilePatch(ModelFilePatch.Change.REMOVED, _old_child.full_path))
+                else:
+                    frontier.append((_old_child, _new_child))
+            for _new_child in _new.children:
+                if _old.get_child(_new_child.name) is None:
+                    patches.append(ModelFilePatch(ModelFilePatch.Change.ADDED, _new_child.full_path, file=_new_child))
+        return patches
@@ -1,11 +1,200 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-import pickle
+import json
+import os
+import random
+import select
 import sys
+import time
 import argparse
+from typing import BinaryIO, List, Optional, Tuple
 
 # my libs
-from system import SystemScanner, SystemFile
+from system import SystemScanner, SystemScannerError, SystemFile, SystemWatcher, SystemWatcherError, \
+    ExcludeMatcher, WireEncoder, WireDecoder, WireError
+
+
+# How long to wait for more changes after the first one, so that a burst of
+# changes is sent as a single delta
+WATCH_SETTLE_SECS = 0.2
+
+
+def load_state(state_path: str) -> Tuple[Optional[int], Optional[List[SystemFile]]]:
+    """
+    Load the generation and files of the previous scan
+    Returns (None, None) if there is no usable state
+    """
+    try:
+        with open(state_path, "rb") as f:
+            decoder = WireDecoder()
+            decoder.feed(f.read())
+    except (OSError, WireError):
+        return None, None
+    if not decoder.done or decoder.generation is None:
+        return None, None
+    return decoder.generation, decoder.files
+
+
+def save_state(state_path: str, generation: int, files: List[SystemFile]):
+    encoder = WireEncoder()
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encoder.header())
+        f.write(encoder.generation(generation))
+        for file in files:
+            f.write(encoder.encode_file(file))
+        f.write(encoder.end())
+    os.replace(temp_path, state_path)
+
+
+def next_generation(generation: Optional[int]) -> int:
+    """
+    Generations are a random 32-bit epoch followed by a 32-bit counter
+    A new epoch is started whenever the state is lost, so that a stale
+    generation held by the reader can never match
+    """
+    if generation is None:
+        return random.getrandbits(32) << 32
+    return (generation & ~0xFFFFFFFF) | ((generation + 1) & 0xFFFFFFFF)
+
+
+def write_scan(out: BinaryIO,
+               compress: bool,
+               files: List[SystemFile],
+               generation: Optional[int],
+               prev_files: Optional[List[SystemFile]] = None):
+    """
+    Write a scan result, as a delta against prev_files if it's given
+    """
+    encoder = WireEncoder(compress=compress)
+    out.write(encoder.header())
+    if prev_files is not None:
+        out.write(encoder.generation(generation, is_delta=True))
+        out.write(encoder.encode_delta(prev_files, files))
+    else:
+        if generation is not None:
+            out.write(encoder.generation(generation))
+        for file in files:
+            out.write(encoder.encode_file(file))
+    out.write(encoder.end())
+    out.flush()
+
+
+def run_agent(scanner: SystemScanner, compress: bool):
+    """
+    Answer scan requests until stdin is closed
+    Each request is a line of json:
+        {"op": "scan", "generation": <generation of the reader's last scan or null>}
+            Scan everything. Outputs a delta if the generation matches the
+            last scan, otherwise a full scan.
+        {"op": "scan_single", "name": <name>}
+            Scan a single top-level file. Outputs zero or one files, with
+            the current generation. The result replaces the file in the
+            last scan, so a reader that applies it the same way stays in
+            sync with the generation.
+    """
+    scanner.enable_cache()
+    out = sys.stdout.buffer
+    files = None  # type: Optional[List[SystemFile]]
+    generation = None  # type: Optional[int]
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            op = request["op"]
+        except (ValueError, KeyError, TypeError):
+            sys.exit("Bad request: {}".format(line.strip()))
+
+        if op == "scan":
+            new_files = scanner.scan()
+            new_generation = next_generation(generation)
+            is_delta = files is not None and request.get("generation") == generation
+            write_scan(out, compress, new_files, new_generation, files if is_delta else None)
+            files = new_files
+            generation = new_generation
+        elif op == "scan_single":
+            name = request["name"]
+            try:
+                file = scanner.scan_single(name)
+            except SystemScannerError:
+                file = None
+            if files is not None:
+                files = [f for f in files if f.name != name]
+                if file is not None:
+                    files.append(file)
+                    files.sort(key=lambda f: f.name)
+            write_scan(out, compress, [file] if file is not None else [], generation)
+        else:
+            sys.exit("Unknown request: {}".format(op))
+
+
+def run_watch(scanner: SystemScanner, path: str, compress: bool, rescan_interval_secs: float):
+    """
+    Output a full scan, followed by a delta against the previous output
+    whenever something changes, until stdin is closed
+    Changes are detected with inotify, and only the changed top-level files
+    are rescanned. Everything is also rescanned every rescan_interval_secs
+    to catch anything inotify missed, or instead of inotify if it's not
+    available.
+    """
+    scanner.enable_cache()
+    out = sys.stdout.buffer
+    # Start watching before the first scan so that no change is missed
+    watcher = SystemWatcher(path)  # type: Optional[SystemWatcher]
+    try:
+        watcher.start()
+    except SystemWatcherError as e:
+        sys.stderr.write("Failed to watch for changes, falling back to rescans: {}\n".format(str(e)))
+        watcher = None
+    files = sorted(scanner.scan(), key=lambda f: f.name)
+    generation = next_generation(None)
+    write_scan(out, compress, files, generation)
+
+    stdin_fd = sys.stdin.fileno()
+    next_rescan = time.monotonic() + rescan_interval_secs
+    while True:
+        read_list = [stdin_fd] if watcher is None else [stdin_fd, watcher]
+        timeout = max(0.0, next_rescan - time.monotonic())
+        ready, _, _ = select.select(read_list, [], [], timeout)
+        if stdin_fd in ready and not os.read(stdin_fd, 4096):
+            # Reader went away
+            break
+
+        new_files = None  # type: Optional[List[SystemFile]]
+        if watcher is not None and watcher in ready:
+            time.sleep(WATCH_SETTLE_SECS)
+            try:
+                changes = watcher.pop_changes()
+            except SystemWatcherError as e:
+                sys.stderr.write("Failed to watch for changes, falling back to rescans: {}\n".format(str(e)))
+                watcher.close()
+                watcher = None
+                changes = None
+            if changes is None or ExcludeMatcher.IGNORE_FILE_NAME in changes:
+                # Events were lost, or the top-level ignore file changed
+                next_rescan = 0
+            elif changes:
+                new_files = [f for f in files if f.name not in changes]
+                for name in changes:
+                    try:
+                        new_files.append(scanner.scan_single(name))
+                    except SystemScannerError:
+                        # File was removed
+                        pass
+                new_files.sort(key=lambda f: f.name)
+        if time.monotonic() >= next_rescan:
+            new_files = sorted(scanner.scan(), key=lambda f: f.name)
+            next_rescan = time.monotonic() + rescan_interval_secs
+
+        # Unchanged files are shared with the previous output, so this is cheap
+        if new_files is not None and new_files != files:
+            generation = next_generation(generation)
+            write_scan(out, compress, new_files, generation, files)
+            files = new_files
 
 
 if __name__ == "__main__":
@@ -16,14 +205,33 @@ if __name__ == "__main__":
     parser.add_argument("path", help="Path of the root directory to scan")
     parser.add_argument("-e", "--exclude-hidden", action="store_true", default=False,
                         help="Exclude hidden files")
+    parser.add_argument("-x", "--exclude", metavar="PATTERN", action="append", default=[],
+                        help="Exclude files matching the glob pattern (gitignore syntax). "
+                             "Can be given multiple times")
     parser.add_argument("-H", "--human-readable", action="store_true", default=False,
                         help="Human readable output")
+    parser.add_argument("-u", "--uncompressed", action="store_true", default=False,
+                        help="Don't compress the binary output")
+    parser.add_argument("-s", "--state", metavar="STATE_PATH",
+                        help="Keep the scan state in the given file and output a generation number")
+    parser.add_argument("-g", "--generation", type=int,
+                        help="Generation of the last scan received by the reader. "
+                             "If it matches the state, only the changes since are output")
+    parser.add_argument("-a", "--agent", action="store_true", default=False,
+                        help="Keep running and answer scan requests from stdin")
+    parser.add_argument("-n", "--name", metavar="NAME",
+                        help="Only scan the top-level file with the given name. "
+                             "Outputs no files if it doesn't exist")
+    parser.add_argument("-w", "--watch", metavar="RESCAN_INTERVAL_SECS", type=float,
+                        help="Keep running and output the changes whenever something changes, "
+                             "until stdin is closed. Everything is rescanned at the given interval.")
     args = parser.parse_args()
 
     scanner = SystemScanner(args.path)
     if args.exclude_hidden:
         scanner.add_exclude_prefix(".")
-    root_files = scanner.scan()
+    for exclude_pattern in args.exclude:
+        scanner.add_exclude_pattern(exclude_pattern)
     if args.human_readable:
         def print_file(file: SystemFile, level: int):
             sys.stdout.write("  "*level)
@@ -34,8 +242,45 @@ if __name__ == "__main__":
             ))
             for child in file.children:
                 print_file(child, level+1)
-        for root_file in root_files:
+        for root_file in scanner.scan():
             print_file(root_file, 0)
+    elif args.agent:
+        run_agent(scanner, compress=not args.uncompressed)
+    elif args.name is not None:
+        try:
+            root_files = [scanner.scan_single(args.name)]
+        except SystemScannerError:
+            root_files = []
+        write_scan(sys.stdout.buffer, not args.uncompressed, root_files, None)
+    elif args.watch is not None:
+        run_watch(scanner, args.path, compress=not args.uncompressed, rescan_interval_secs=args.watch)
+    elif args.state:
+        prev_generation, prev_files = load_state(args.state)
+        root_files = scanner.scan()
+        generation = next_generation(prev_generation)
+        # Save the state before any output so that the reader never sees a
+        # generation that isn't saved
+        try:
+            save_state(args.state, generation, root_files)
+        except OSError as e:
+            sys.stderr.write("Failed to save state: {}\n".format(str(e)))
+            generation = None
+
+        is_delta = generation is not None and \
+            prev_generation is not None and \
+            args.generation == prev_generation
+        write_scan(sys.stdout.buffer,
+                   not args.uncompressed,
+                   root_files,
+                   generation,
+                   prev_files if is_delta else None)
     else:
-        bytes_out = pickle.dumps(root_files)
-        sys.stdout.buffer.write(bytes_out)
+        # Stream out each root file as soon as it's scanned
+        encoder = WireEncoder(compress=not args.uncompressed)
+        out = sys.stdout.buffer
+        out.write(encoder.header())
+        for root_file in scanner.scan_iter():
+            out.write(encoder.encode_file(root_file))
+            out.flush()
+        out.write(encoder.end())
+        out.flush()
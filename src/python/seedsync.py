@@ -15,7 +15,7 @@ import shutil
 from common import ServiceExit, Context, Constants, Config, Args, AppError
 from common import ServiceRestart
 from common import Localization, Status, ConfigError, Persist, PersistError
-from controller import Controller, ControllerJob, ControllerPersist, AutoQueue, AutoQueuePersist
+from controller import Controller, ControllerJob, ControllerPersist, ControllerSnapshot, AutoQueue, AutoQueuePersist
 from web import WebAppJob, WebAppBuilder
 
 
@@ -30,6 +30,7 @@ class Seedsync:
     __FILE_CONFIG = "settings.cfg"
     __FILE_AUTO_QUEUE_PERSIST = "autoqueue.persist"
     __FILE_CONTROLLER_PERSIST = "controller.persist"
+    __FILE_CONTROLLER_SNAPSHOT = "controller.snapshot"
     __CONFIG_DUMMY_VALUE = "<replace me>"
 
     # This logger is used to print any exceptions caught at top module
@@ -100,6 +101,11 @@ class Seedsync:
         self.controller_persist_path = os.path.join(args.config_dir, Seedsync.__FILE_CONTROLLER_PERSIST)
         self.controller_persist = self._load_persist(ControllerPersist, self.controller_persist_path)
 
+        self.controller_snapshot_path = os.path.join(args.config_dir, Seedsync.__FILE_CONTROLLER_SNAPSHOT)
+        self.controller_snapshot = self._load_persist(ControllerSnapshot, self.controller_snapshot_path)
+        # Version of the snapshot in the file, None if not saved yet
+        self.controller_snapshot_version = None  # type: Optional[int]
+
         self.auto_queue_persist_path = os.path.join(args.config_dir, Seedsync.__FILE_AUTO_QUEUE_PERSIST)
         self.auto_queue_persist = self._load_persist(AutoQueuePersist, self.auto_queue_persist_path)
 
@@ -107,7 +113,7 @@ class Seedsync:
         self.context.logger.info("Starting seedsync")
 
         # Create controller
-        controller = Controller(self.context, self.controller_persist)
+        controller = Controller(self.context, self.controller_persist, self.controller_snapshot)
 
         # Create auto queue
         auto_queue = AutoQueue(self.context, self.auto_queue_persist, controller)
@@ -146,6 +152,7 @@ class Seedsync:
 
         try:
             prev_persist_timestamp = datetime.now()
+            prev_snapshot_timestamp = prev_persist_timestamp
 
             # Thread loop
             while True:
@@ -153,7 +160,13 @@ class Seedsync:
                 now = datetime.now()
                 if (now - prev_persist_timestamp).total_seconds() > Constants.MIN_PERSIST_TO_FILE_INTERVAL_IN_SECS:
                     prev_persist_timestamp = now
-                    self.persist()
+                    # The snapshot is large and changes on every scan while
+                    # downloading, so it's saved less often
+                    persist_snapshot = (now - prev_snapshot_timestamp).total_seconds() > \
+                        Constants.MIN_SNAPSHOT_TO_FILE_INTERVAL_IN_SECS
+                    if persist_snapshot:
+                        prev_snapshot_timestamp = now
+                    self.persist(persist_snapshot=persist_snapshot)
 
                 # Propagate exceptions
                 webapp_job.propagate_exception()
@@ -202,10 +215,15 @@ class Seedsync:
             #       by outer code
             raise
 
-    def persist(self):
+    def persist(self, persist_snapshot: bool = True):
         # Save the persists
         self.context.logger.debug("Persisting states to file")
         self.controller_persist.to_file(self.controller_persist_path)
+        # The snapshot is only saved if its files changed
+        snapshot_version = self.controller_snapshot.version
+        if persist_snapshot and snapshot_version != self.controller_snapshot_version:
+            self.controller_snapshot.to_file(self.controller_snapshot_path)
+            self.controller_snapshot_version = snapshot_version
         self.auto_queue_persist.to_file(self.auto_queue_persist_path)
         self.context.config.to_file(self.config_path)
 
@@ -294,6 +312,7 @@ class Seedsync:
         config.lftp.local_path = Seedsync.__CONFIG_DUMMY_VALUE
         config.lftp.remote_path_to_scan_script = "/tmp/scanfs"
         config.lftp.use_ssh_key = False
+        config.lftp.use_ssh_multiplexing = False
         config.lftp.num_max_parallel_downloads = 2
         config.lftp.num_max_parallel_files_per_download = 4
         config.lftp.num_max_connections_per_root_file = 4
@@ -304,8 +323,14 @@ class Seedsync:
         config.controller.interval_ms_remote_scan = 30000
         config.controller.interval_ms_local_scan = 10000
         config.controller.interval_ms_downloading_scan = 1000
+        config.controller.interval_ms_max_idle_scan = 300000
+        config.controller.use_remote_scan_backoff = False
         config.controller.extract_path = "/tmp"
         config.controller.use_local_path_as_extract_path = True
+        config.controller.num_local_scan_workers = 4
+        config.controller.use_local_watch = False
+        config.controller.use_remote_scan_agent = False
+        config.controller.use_remote_watch = False
 
         config.web.port = 8800
 
@@ -1,7 +1,12 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
+import os
+import re
+import subprocess
+import tempfile
 import time
+from typing import Callable, Optional, Tuple
 
 import pexpect
 
@@ -16,33 +21,152 @@ class SshcpError(AppError):
     pass
 
 
+class PtyOutputReader:
+    """
+    Reads the output of a pexpect child as it arrives
+    The pty turns every \n into \r\n, this undoes that without touching
+    any other bytes
+    """
+    READ_SIZE = 64 * 1024
+
+    # Matches whatever output is available
+    __ANY_OUTPUT = re.compile(b".+", re.DOTALL)
+    # Amount of output kept around for error messages
+    __TAIL_SIZE = 4 * 1024
+
+    def __init__(self, sp: pexpect.spawn):
+        self.__sp = sp
+        self.__pending_cr = False
+        self.tail = b""
+        self.eof = False
+
+    def read(self, timeout: float) -> bytes:
+        """
+        Wait for the next chunk of output
+        Sets eof once the child closes its output
+        :param timeout:
+        :return:
+        """
+        i = self.__sp.expect([pexpect.EOF, PtyOutputReader.__ANY_OUTPUT], timeout=timeout)
+        chunk = self.__sp.before if i == 0 else self.__sp.after
+        self.eof = i == 0
+        # A trailing \r may be the start of a split \r\n
+        if self.__pending_cr:
+            chunk = b"\r" + chunk
+        self.__pending_cr = not self.eof and chunk.endswith(b"\r")
+        if self.__pending_cr:
+            chunk = chunk[:-1]
+        chunk = chunk.replace(b"\r\n", b"\n")
+        if chunk:
+            self.tail = (self.tail + chunk)[-PtyOutputReader.__TAIL_SIZE:]
+        return chunk
+
+
+class SshcpSession:
+    """
+    Long-running command on the remote server
+    Input is sent to the command as lines of text, and output is read back
+    as it arrives. Input must not contain control characters, as the line
+    discipline of the pty would interpret them.
+    """
+    def __init__(self, sp: pexpect.spawn, timeout_secs: float):
+        self.__sp = sp
+        self.__reader = PtyOutputReader(sp)
+        self.__timeout_secs = timeout_secs
+
+    @property
+    def is_alive(self) -> bool:
+        return not self.__reader.eof and self.__sp.isalive()
+
+    def send_line(self, line: str):
+        self.__sp.sendline(line)
+
+    def read(self, output_callback: Callable[[bytes], None], is_done: Callable[[], bool]):
+        """
+        Pass output to output_callback until is_done returns True
+        :param output_callback:
+        :param is_done:
+        :return:
+        """
+        while not is_done():
+            try:
+                chunk = self.__reader.read(timeout=self.__timeout_secs)
+            except pexpect.exceptions.TIMEOUT:
+                raise SshcpError("Timed out")
+            if chunk:
+                output_callback(chunk)
+            if self.__reader.eof and not is_done():
+                raise SshcpError(self.__reader.tail.decode(errors="replace"))
+
+    def poll(self, output_callback: Callable[[bytes], None]):
+        """
+        Pass any output that has already arrived to output_callback, without waiting
+        Raises SshcpError if the command has exited
+        :param output_callback:
+        :return:
+        """
+        while True:
+            try:
+                chunk = self.__reader.read(timeout=0)
+            except pexpect.exceptions.TIMEOUT:
+                return
+            if chunk:
+                output_callback(chunk)
+            if self.__reader.eof:
+                raise SshcpError(self.__reader.tail.decode(errors="replace"))
+
+    def close(self):
+        self.__sp.close(force=True)
+
+
 class Sshcp:
     """
     Scp command utility
+    With multiplexing enabled, all commands to the same server share a single
+    OpenSSH master connection, so they only pay for opening a new channel
+    instead of a full handshake. The master is health-checked before every
+    command and restarted if it's gone. An idle master exits on its own
+    after a while.
     """
     __TIMEOUT_SECS = 180
 
+    # How long an idle master connection stays open
+    __CONTROL_PERSIST_SECS = 600
+    __CONTROL_CHECK_TIMEOUT_SECS = 5
+
     def __init__(self,
                  host: str,
                  port: int,
                  user: str = None,
-                 password: str = None):
+                 password: str = None,
+                 use_multiplexing: bool = False):
         if host is None:
             raise ValueError("Hostname not specified.")
         self.__host = host
         self.__port = port
         self.__user = user
         self.__password = password
+        self.__control_path = None
+        if use_multiplexing:
+            # Shared by all processes of this user, so that e.g. the remote
+            # scanner and remote deletes use the same master
+            control_dir = os.path.join(tempfile.gettempdir(), "seedsync-ssh-{}".format(os.getuid()))
+            self.__control_path = os.path.join(control_dir, "%r@%h:%p")
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def set_base_logger(self, base_logger: logging.Logger):
         self.logger = base_logger.getChild(self.__class__.__name__)
 
-    def __run_command(self,
-                      command: str,
-                      flags: str,
-                      args: str) -> bytes:
-
+    def __spawn(self,
+                command: str,
+                flags: str,
+                args: str,
+                use_master: bool = False,
+                interactive: bool = False) -> pexpect.spawn:
+        """
+        Start the command and log in
+        If use_master is set, the command runs over the existing master connection
+        """
         command_args = [
             command,
             flags
@@ -55,7 +179,13 @@ class Sshcp:
             "-o", "LogLevel=error",  # suppress warnings
         ]
 
-        if self.__password is None:
+        if use_master:
+            command_args += [
+                "-o", "ControlMaster=no",  # only use the existing master
+                "-o", "ControlPath={}".format(self.__control_path),
+                "-o", "BatchMode=yes",  # fail instead of prompting if the master is gone
+            ]
+        elif self.__password is None:
             command_args += [
                 "-o", "PasswordAuthentication=no",  # don't ask for password
             ]
@@ -69,10 +199,13 @@ class Sshcp:
         command = " ".join(command_args)
         self.logger.debug("Command: {}".format(command))
 
-        start_time = time.time()
-        sp = pexpect.spawn(command)
+        if interactive:
+            # Don't echo back the input
+            sp = pexpect.spawn(command, maxread=PtyOutputReader.READ_SIZE, echo=False)
+        else:
+            sp = pexpect.spawn(command, maxread=PtyOutputReader.READ_SIZE)
         try:
-            if self.__password is not None:
+            if self.__password is not None and not use_master:
                 i = sp.expect([
                     'password: ',  # i=0, all's good
                     'lost connection',  # i=1, bad hostname
@@ -81,34 +214,78 @@ class Sshcp:
                 if i in (1, 2):
                     raise SshcpError("Bad hostname: {}".format(self.__host))
                 sp.sendline(self.__password)
+        except pexpect.exceptions.TIMEOUT:
+            self.logger.exception("Timed out")
+            self.logger.error("Command output before:\n{}".format(sp.before))
+            sp.close(force=True)
+            raise SshcpError("Timed out")
+        except Exception:
+            sp.close(force=True)
+            raise
+        return sp
 
-            i = sp.expect(
-                [
-                    pexpect.EOF,  # i=0, all's good
-                    'password: ',  # i=1, wrong password
-                    'lost connection',  # i=2, bad hostname
-                    'Could not resolve hostname',  # i=3, bad hostname
-                ],
-                timeout=self.__TIMEOUT_SECS
-            )
-            if i == 1:
-                raise SshcpError("Incorrect password")
-            elif i in (2, 3):
-                raise SshcpError("Bad hostname: {}".format(self.__host))
-
+    def __run_command(self,
+                      command: str,
+                      flags: str,
+                      args: str,
+                      output_callback: Optional[Callable[[bytes], None]] = None,
+                      use_master: bool = False) -> bytes:
+        """
+        Run the command and return its output
+        If output_callback is given, output is instead passed to the callback
+        as it arrives, and only the tail of the output is returned
+        If use_master is set, the command runs over the existing master connection
+        """
+        start_time = time.time()
+        sp = self.__spawn(command, flags, args, use_master=use_master)
+        try:
+            if output_callback is not None:
+                output = self.__stream_output(sp, output_callback)
+            else:
+                output = self.__wait_output(sp)
         except pexpect.exceptions.TIMEOUT:
             self.logger.exception("Timed out")
             self.logger.error("Command output before:\n{}".format(sp.before))
             raise SshcpError("Timed out")
+        except Exception:
+            # e.g. the output callback failed, don't leave the command running
+            sp.close(force=True)
+            raise
         sp.close()
         end_time = time.time()
 
         self.logger.debug("Return code: {}".format(sp.exitstatus))
         self.logger.debug("Command took {:.3f}s".format(end_time-start_time))
         if sp.exitstatus != 0:
-            raise SshcpError(sp.before.decode())
+            raise SshcpError(output.decode(errors="replace"))
+
+        return output.replace(b'\r\n', b'\n').strip()
+
+    def __wait_output(self, sp: pexpect.spawn) -> bytes:
+        i = sp.expect(
+            [
+                pexpect.EOF,  # i=0, all's good
+                'password: ',  # i=1, wrong password
+                'lost connection',  # i=2, bad hostname
+                'Could not resolve hostname',  # i=3, bad hostname
+            ],
+            timeout=self.__TIMEOUT_SECS
+        )
+        if i == 1:
+            raise SshcpError("Incorrect password")
+        elif i in (2, 3):
+            raise SshcpError("Bad hostname: {}".format(self.__host))
+        return sp.before
 
-        return sp.before.replace(b'\r\n', b'\n').strip()
+    def __stream_output(self, sp: pexpect.spawn, output_callback: Callable[[bytes], None]) -> bytes:
+        reader = PtyOutputReader(sp)
+        while not reader.eof:
+            chunk = reader.read(timeout=self.__TIMEOUT_SECS)
+            if chunk:
+                output_callback(chunk)
+            if self.__password is not None and reader.tail.endswith(b"password: "):
+                raise SshcpError("Incorrect password")
+        return reader.tail
 
     def shell(self, command: str) -> bytes:
         """
@@ -116,6 +293,49 @@ class Sshcp:
         :param command:
         :return:
         """
+        flags, args = self.__shell_args(command)
+        return self.__run_command(
+            command="ssh",
+            flags=flags,
+            args=args,
+            use_master=self.__ensure_master()
+        )
+
+    def shell_stream(self, command: str, output_callback: Callable[[bytes], None]):
+        """
+        Run a shell command on remote service and pass its output to
+        output_callback as it arrives
+        Unlike shell(), the output is passed through unmodified
+        :param command:
+        :param output_callback:
+        :return:
+        """
+        flags, args = self.__shell_args(command)
+        self.__run_command(
+            command="ssh",
+            flags=flags,
+            args=args,
+            output_callback=output_callback,
+            use_master=self.__ensure_master()
+        )
+
+    def start_session(self, command: str) -> SshcpSession:
+        """
+        Start a long-running shell command on remote service
+        :param command:
+        :return:
+        """
+        flags, args = self.__shell_args(command)
+        sp = self.__spawn(
+            command="ssh",
+            flags=flags,
+            args=args,
+            use_master=self.__ensure_master(),
+            interactive=True
+        )
+        return SshcpSession(sp, timeout_secs=self.__TIMEOUT_SECS)
+
+    def __shell_args(self, command: str) -> Tuple[str, str]:
         if not command:
             raise ValueError("Command cannot be empty")
 
@@ -137,11 +357,7 @@ class Sshcp:
             "{}@{}".format(self.__user, self.__host),
             command
         ]
-        return self.__run_command(
-            command="ssh",
-            flags=" ".join(flags),
-            args=" ".join(args)
-        )
+        return " ".join(flags), " ".join(args)
 
     def copy(self, local_path: str, remote_path: str):
         """
@@ -166,5 +382,68 @@ class Sshcp:
         self.__run_command(
             command="scp",
             flags=" ".join(flags),
+            args=" ".join(args),
+            use_master=self.__ensure_master()
+        )
+
+    def __ensure_master(self) -> bool:
+        """
+        Make sure the master connection is up, starting it if needed
+        Returns False if commands should connect on their own instead
+        """
+        if self.__control_path is None:
+            return False
+        if self.__is_master_alive():
+            return True
+
+        control_dir = os.path.dirname(self.__control_path)
+        try:
+            os.makedirs(control_dir, mode=0o700, exist_ok=True)
+            stat = os.stat(control_dir)
+        except OSError as e:
+            self.logger.warning("Not multiplexing, failed to create {}: {}".format(control_dir, str(e)))
+            return False
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            self.logger.warning("Not multiplexing, {} is not private".format(control_dir))
+            return False
+
+        self.logger.debug("Starting master connection")
+        # The master backgrounds itself once the command completes,
+        # and exits after being idle for a while
+        flags = [
+            "-p", str(self.__port),
+            "-o", "ControlMaster=auto",
+            "-o", "ControlPath={}".format(self.__control_path),
+            "-o", "ControlPersist={}".format(Sshcp.__CONTROL_PERSIST_SECS),
+        ]
+        args = [
+            "{}@{}".format(self.__user, self.__host),
+            "true"
+        ]
+        self.__run_command(
+            command="ssh",
+            flags=" ".join(flags),
             args=" ".join(args)
         )
+        if not self.__is_master_alive():
+            self.logger.warning("Not multiplexing, master connection failed to start")
+            return False
+        return True
+
+    def __is_master_alive(self) -> bool:
+        args = [
+            "ssh",
+            "-O", "check",
+            "-o", "ControlPath={}".format(self.__control_path),
+            "-p", str(self.__port),
+            "{}@{}".format(self.__user, self.__host)
+        ]
+        try:
+            result = subprocess.run(args,
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL,
+                                    timeout=Sshcp.__CONTROL_CHECK_TIMEOUT_SECS)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return result.returncode == 0
@@ -2,3 +2,7 @@
 
 from .scanner import SystemScanner, SystemScannerError
 from .file import SystemFile
+from .file_tree import SystemFileTree, SystemFileView
+from .watcher import SystemWatcher, SystemWatcherError
+from .exclude import ExcludeMatcher
+from .wire import WireEncoder, WireDecoder, WireError
@@ -0,0 +1,213 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import re
+from typing import List, Optional, Tuple
+
+
+class ExcludeMatcher:
+    """
+    Compiled set of exclusion patterns
+    Patterns follow gitignore syntax:
+        - blank lines and lines starting with # are skipped
+        - a leading ! re-includes anything excluded by an earlier pattern
+        - a trailing / only matches directories
+        - a pattern with a / anywhere else is relative to the base directory,
+          otherwise it matches a name at any depth
+        - * and ? don't match /, ** matches any number of directories
+        - a \\ escapes the next character
+    When several patterns match, the last one wins.
+    All patterns are compiled into a single regex, so matching a path costs
+    one regex match no matter how many patterns there are.
+    """
+    # Name of the files holding exclusion patterns for a directory tree
+    IGNORE_FILE_NAME = ".seedsyncignore"
+
+    # Matches any number of leading directories
+    __ANY_DIRS = "(?:.*/)?"
+
+    def __init__(self, patterns: List[str] = None):
+        self.__rules = []  # type: List[Tuple[str, bool]]  # (regex, is_negated)
+        self.__regex = None
+        self.__negated = []  # type: List[bool]
+        for pattern in patterns or []:
+            self.add_pattern(pattern)
+
+    @staticmethod
+    def from_file(file_path: str) -> "ExcludeMatcher":
+        """
+        Load the patterns in a gitignore style file
+        :param file_path:
+        :return:
+        """
+        with open(file_path, "r", errors="surrogateescape") as f:
+            return ExcludeMatcher(f.read().splitlines())
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.__rules
+
+    def add_pattern(self, pattern: str):
+        """
+        Add a pattern in gitignore syntax
+        :param pattern:
+        :return:
+        """
+        pattern = pattern.rstrip("\n\r")
+        # Trailing spaces are ignored unless escaped
+        while pattern.endswith(" ") and not pattern.endswith("\\ "):
+            pattern = pattern[:-1]
+        if not pattern or pattern.startswith("#"):
+            return
+        is_negated = pattern.startswith("!")
+        if is_negated:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+            pattern = pattern[1:]
+        is_dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if not pattern:
+            return
+        if "/" in pattern:
+            regex = ExcludeMatcher.__translate(pattern.lstrip("/"))
+        else:
+            regex = ExcludeMatcher.__ANY_DIRS + ExcludeMatcher.__translate(pattern)
+        self.__add_rule(regex, is_dir_only, is_negated)
+
+    def add_prefix(self, prefix: str):
+        """
+        Exclude names that begin with prefix, at any depth
+        :param prefix:
+        :return:
+        """
+        self.__add_rule(ExcludeMatcher.__ANY_DIRS + re.escape(prefix) + "[^/]*", False, False)
+
+    def add_suffix(self, suffix: str):
+        """
+        Exclude names that end with suffix, at any depth
+        :param suffix:
+        :return:
+        """
+        self.__add_rule(ExcludeMatcher.__ANY_DIRS + "[^/]*" + re.escape(suffix), False, False)
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Match a path against the patterns
+        Returns True if the path is excluded, False if it's re-included by a
+        negated pattern, and None if no pattern matches
+        :param rel_path: path relative to the base directory, with / separators
+        :param is_dir:
+        :return:
+        """
+        if not self.__rules:
+            return None
+        if self.__regex is None:
+            # Rules are tried last to first, so the first alternative that
+            # matches is the last matching rule
+            # The regex is set last, since scanner threads may match concurrently
+            alternatives = "|".join("({})".format(regex) for regex, _ in reversed(self.__rules))
+            self.__negated = [is_negated for _, is_negated in reversed(self.__rules)]
+            self.__regex = re.compile(alternatives, re.DOTALL)
+        result = self.__regex.fullmatch(rel_path + "/" if is_dir else rel_path)
+        if result is None:
+            return None
+        return not self.__negated[result.lastindex - 1]
+
+    def is_excluded(self, rel_path: str, is_dir: bool) -> bool:
+        return self.match(rel_path, is_dir) is True
+
+    def __add_rule(self, regex: str, is_dir_only: bool, is_negated: bool):
+        # Directories are matched with a trailing /
+        regex += "/" if is_dir_only else "/?"
+        self.__rules.append((regex, is_negated))
+        self.__regex = None
+
+    @staticmethod
+    def __translate(pattern: str) -> str:
+        """
+        Translate a glob into a regex that doesn't have capturing groups
+        :param pattern:
+        :return:
+        """
+        result = []
+        i = 0
+        n = len(pattern)
+        while i < n:
+            c = pattern[i]
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                if pattern.startswith("**/", i):
+                    result.append(ExcludeMatcher.__ANY_DIRS)
+                    i += 3
+                    continue
+                if i + 2 == n:
+                    # Everything inside, but not the directory itself
+                    result.append(".+")
+                    i += 2
+                    continue
+            if c == "*":
+                result.append("[^/]*")
+                while i + 1 < n and pattern[i + 1] == "*":
+                    i += 1
+            elif c == "?":
+                result.append("[^/]")
+            elif c == "[":
+                # A ] right after the opening [ or [! is part of the set
+                j = i + 1
+                if j < n and pattern[j] == "!":
+                    j += 1
+                if j < n and pattern[j] == "]":
+                    j += 1
+                end = pattern.find("]", j)
+                if end < 0:
+                    result.append(re.escape(c))
+                else:
+                    content = pattern[i + 1:end].replace("\\", "\\\\").replace("[", "\\[")
+                    if content.startswith("!"):
+                        content = "^" + content[1:]
+                    elif content.startswith("^"):
+                        content = "\\" + content
+                    result.append("[{}]".format(content))
+                    i = end
+            elif c == "\\" and i + 1 < n:
+                i += 1
+                result.append(re.escape(pattern[i]))
+            else:
+                result.append(re.escape(c))
+            i += 1
+        return "".join(result)
+
+
+class ExcludeChain:
+    """
+    Exclusion patterns from the ignore files of a directory and its ancestors
+    Patterns in deeper directories take precedence, as with gitignore.
+    Chains are immutable, so a chain can be shared by all directories
+    below it.
+    """
+    def __init__(self, links: Tuple[Tuple[str, ExcludeMatcher], ...] = ()):
+        """
+        :param links: (base path, matcher) pairs from the shallowest to the deepest directory
+        """
+        self.__links = links
+
+    def extend(self, base_rel_path: str, matcher: ExcludeMatcher) -> "ExcludeChain":
+        """
+        Returns a new chain with the patterns of a deeper directory added
+        :param base_rel_path: path of the directory that the patterns are relative to
+        :param matcher:
+        :return:
+        """
+        if matcher.is_empty:
+            return self
+        return ExcludeChain(self.__links + ((base_rel_path, matcher),))
+
+    def is_excluded(self, rel_path: str, is_dir: bool) -> bool:
+        for base_rel_path, matcher in reversed(self.__links):
+            if base_rel_path:
+                if not rel_path.startswith(base_rel_path + "/"):
+                    continue
+                result = matcher.match(rel_path[len(base_rel_path) + 1:], is_dir)
+            else:
+                result = matcher.match(rel_path, is_dir)
+            if result is not None:
+                return result
+        return False
@@ -16,6 +16,8 @@ class SystemFile:
         self.__children = []
 
     def __eq__(self, other):
+        if not isinstance(other, SystemFile):
+            return NotImplemented
         return self.__dict__ == other.__dict__
 
     def __repr__(self):
@@ -0,0 +1,202 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import hashlib
+import struct
+from array import array
+from typing import List, Iterator
+
+from .file import SystemFile
+
+
+class SystemFileTree:
+    """
+    Compact representation of a list of SystemFile trees
+    Nodes are stored in pre-order in parallel arrays, and all names are kept
+    in a single string table where repeated names are stored only once.
+    This is much cheaper to hold in memory and to pickle across processes
+    than a tree of SystemFile objects.
+    """
+    FLAG_DIR = 0x1
+
+    # Byte lengths of the string table and of each array, in field order
+    __HEADER = struct.Struct("<7Q")
+
+    def __init__(self):
+        self.__names = ""  # string table
+        self.__name_offsets = array("I")  # start of the node's name in string table
+        self.__name_lengths = array("I")
+        self.__sizes = array("q")
+        self.__flags = array("B")
+        self.__parents = array("i")  # -1 for root nodes
+        self.__ends = array("i")  # index one past the node's last descendant
+
+    @staticmethod
+    def from_system_files(files: List[SystemFile]) -> "SystemFileTree":
+        """
+        Pack a list of SystemFile trees
+        :param files:
+        :return:
+        """
+        tree = SystemFileTree()
+        string_table = []
+        string_table_len = 0
+        name_offsets = dict()
+        stack = [(file, -1) for file in reversed(files)]
+        while stack:
+            file, parent = stack.pop()
+            index = len(tree.__sizes)
+            offset = name_offsets.get(file.name)
+            if offset is None:
+                offset = string_table_len
+                name_offsets[file.name] = offset
+                string_table.append(file.name)
+                string_table_len += len(file.name)
+            tree.__name_offsets.append(offset)
+            tree.__name_lengths.append(len(file.name))
+            tree.__sizes.append(file.size)
+            tree.__flags.append(SystemFileTree.FLAG_DIR if file.is_dir else 0)
+            tree.__parents.append(parent)
+            tree.__ends.append(index + 1)
+            stack.extend((child, index) for child in reversed(file.children))
+        tree.__names = "".join(string_table)
+
+        # Descendants always come after their ancestor, so a reverse pass
+        # finalizes every subtree before its parent reads it
+        for index in range(len(tree.__sizes) - 1, -1, -1):
+            parent = tree.__parents[index]
+            if parent >= 0 and tree.__ends[index] > tree.__ends[parent]:
+                tree.__ends[parent] = tree.__ends[index]
+        return tree
+
+    def to_system_files(self) -> List[SystemFile]:
+        """
+        Unpack into a list of SystemFile trees
+        :return:
+        """
+        nodes = []
+        roots = []
+        for index in range(len(self.__sizes)):
+            file = SystemFile(self.name(index), self.size(index), self.is_dir(index))
+            nodes.append(file)
+            parent = self.__parents[index]
+            if parent < 0:
+                roots.append(file)
+            else:
+                nodes[parent].add_child(file)
+        return roots
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the tree into a flat buffer
+        The arrays are written as is, so the buffer can only be read back on
+        the same machine
+        :return:
+        """
+        names = self.__names.encode("utf-8", "surrogateescape")
+        arrays = [a.tobytes() for a in self.__arrays()]
+        return b"".join([SystemFileTree.__HEADER.pack(len(names), *(len(a) for a in arrays)), names] + arrays)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "SystemFileTree":
+        """
+        Deserialize a buffer written by to_bytes
+        :param data:
+        :return:
+        """
+        tree = SystemFileTree()
+        lengths = SystemFileTree.__HEADER.unpack_from(data)
+        offset = SystemFileTree.__HEADER.size
+        tree.__names = bytes(data[offset:offset + lengths[0]]).decode("utf-8", "surrogateescape")
+        offset += lengths[0]
+        for values, length in zip(tree.__arrays(), lengths[1:]):
+            values.frombytes(data[offset:offset + length])
+            offset += length
+        return tree
+
+    def __arrays(self) -> List[array]:
+        return [self.__name_offsets, self.__name_lengths, self.__sizes, self.__flags, self.__parents, self.__ends]
+
+    def __len__(self):
+        return len(self.__sizes)
+
+    def fingerprint(self) -> bytes:
+        """
+        Digest of the whole tree
+        Trees packed from equal lists of files have equal fingerprints.
+        Hashing the packed arrays is much cheaper than comparing the trees
+        node by node.
+        :return:
+        """
+        digest = hashlib.sha1()
+        digest.update(self.__names.encode("utf-8", "surrogateescape"))
+        for values in (self.__name_offsets, self.__name_lengths, self.__sizes, self.__flags, self.__parents):
+            digest.update(values.tobytes())
+        return digest.digest()
+
+    @property
+    def roots(self) -> List["SystemFileView"]:
+        return [SystemFileView(self, index) for index in self.root_indices()]
+
+    def root_indices(self) -> Iterator[int]:
+        index = 0
+        while index < len(self.__sizes):
+            yield index
+            index = self.__ends[index]
+
+    def child_indices(self, index: int) -> Iterator[int]:
+        child = index + 1
+        end = self.__ends[index]
+        while child < end:
+            yield child
+            child = self.__ends[child]
+
+    def name(self, index: int) -> str:
+        offset = self.__name_offsets[index]
+        return self.__names[offset:offset + self.__name_lengths[index]]
+
+    def size(self, index: int) -> int:
+        return self.__sizes[index]
+
+    def is_dir(self, index: int) -> bool:
+        return bool(self.__flags[index] & SystemFileTree.FLAG_DIR)
+
+    def parent(self, index: int) -> int:
+        return self.__parents[index]
+
+
+class SystemFileView:
+    """
+    Read-only SystemFile-compatible view of a node in a SystemFileTree
+    Views are created on demand and hold no data of their own
+    """
+    __slots__ = ("__tree", "__index")
+
+    def __init__(self, tree: SystemFileTree, index: int):
+        self.__tree = tree
+        self.__index = index
+
+    def __eq__(self, other):
+        if not isinstance(other, (SystemFile, SystemFileView)):
+            return NotImplemented
+        if self.name != other.name or self.size != other.size or self.is_dir != other.is_dir:
+            return False
+        return self.children == other.children
+
+    def __repr__(self):
+        return str({"name": self.name, "size": self.size, "is_dir": self.is_dir, "children": self.children})
+
+    @property
+    def name(self) -> str: return self.__tree.name(self.__index)
+
+    @property
+    def size(self) -> int: return self.__tree.size(self.__index)
+
+    @property
+    def is_dir(self) -> bool: return self.__tree.is_dir(self.__index)
+
+    @property
+    def children(self) -> List["SystemFileView"]:
+        return [SystemFileView(self.__tree, index) for index in self.__tree.child_indices(self.__index)]
+
+    def add_child(self, file: SystemFile):
+        raise TypeError("Cannot add children to a file tree view")
@@ -1,12 +1,17 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import errno
 import os
 import re
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable
 
 # my libs
 from common import AppError
 from .file import SystemFile
+from .exclude import ExcludeMatcher, ExcludeChain
 
 
 class SystemScannerError(AppError):
@@ -30,12 +35,51 @@ class PseudoDirEntry:
         return self._stat
 
 
+class DirCacheEntry:
+    """
+    Cached listing of a single directory
+    The listing is valid for as long as the directory's (mtime, inode) key
+    doesn't change. Files are cached against their (size, mtime).
+    """
+    def __init__(self, key: Optional[Tuple[int, int]], names: List[Tuple[str, bool]]):
+        self.key = key
+        self.names = names  # (name, is_dir) of all entries, including excluded ones
+        self.name_set = set(name for name, _ in names)
+        self.files = dict()  # type: Dict[str, Tuple[Tuple[int, int], SystemFile]]
+        # Patterns of the directory's ignore file, cached against its (size, mtime)
+        self.ignore_file = None  # type: Optional[Tuple[Tuple[int, int], ExcludeMatcher]]
+        # Sizes parsed from lftp status files, cached against the status file's (size, mtime)
+        self.status_sizes = dict()  # type: Dict[str, Tuple[Tuple[int, int], int]]
+
+    def carry_over(self, old_entry: "DirCacheEntry"):
+        """
+        Keep the cached results of an older listing of the same directory
+        They're still checked against their keys before use
+        """
+        self.files = {name: f for name, f in old_entry.files.items() if name in self.name_set}
+        self.status_sizes = {name: s for name, s in old_entry.status_sizes.items() if name in self.name_set}
+        self.ignore_file = old_entry.ignore_file
+
+
 class SystemScanner:
     """
     Scans system to generate list of files and sizes
     Children are returned in alphabetical order
+    Excluded entries are skipped, and excluded directories are not walked.
+    Besides the exclusions set on the scanner, each directory may have an
+    ignore file with gitignore style patterns for the tree below it. The
+    exclusions set on the scanner can't be overridden by ignore files.
     """
-    __LFTP_STATUS_FILE_SUFFIX = ".lftp-pget-status"
+    # Suffix of the status files lftp keeps next to partial downloads
+    LFTP_STATUS_FILE_SUFFIX = ".lftp-pget-status"
+
+    __LFTP_STATUS_SIZE_PATTERN = re.compile(r"^size=(\d+)$")
+    __LFTP_STATUS_POS_PATTERN = re.compile(r"^\d+\.pos=(\d+)$")
+    __LFTP_STATUS_LIMIT_PATTERN = re.compile(r"^\d+\.limit=(\d+)$")
+
+    # Directories modified this recently are not trusted to be unchanged
+    # on the next scan, since the mtime may not have enough resolution
+    __CACHE_RACY_WINDOW_IN_SECS = 2.0
 
     def __init__(self, path_to_scan: str):
         """
@@ -43,8 +87,17 @@ class SystemScanner:
         """
         self.path_to_scan = path_to_scan
         self.exclude_prefixes = []
-        self.exclude_suffixes = [SystemScanner.__LFTP_STATUS_FILE_SUFFIX]
+        self.exclude_suffixes = [SystemScanner.LFTP_STATUS_FILE_SUFFIX]
+        self.exclude_patterns = []
+        self.__exclude_matcher = None  # type: Optional[ExcludeMatcher]
         self.__lftp_temp_file_suffix = None
+        self.__use_data_extents = False
+        self.__num_workers = 1
+        self.__cache = None  # type: Optional[Dict[str, DirCacheEntry]]
+        self.__cache_visited = set()
+        self.__cache_lock = threading.Lock()
+        self.__cache_hits = 0
+        self.__cache_misses = 0
 
     def add_exclude_prefix(self, prefix: str):
         """
@@ -53,6 +106,7 @@ class SystemScanner:
         :return:
         """
         self.exclude_prefixes.append(prefix)
+        self.__exclude_matcher = None
 
     def add_exclude_suffix(self, suffix: str):
         """
@@ -61,6 +115,17 @@ class SystemScanner:
         :return:
         """
         self.exclude_suffixes.append(suffix)
+        self.__exclude_matcher = None
+
+    def add_exclude_pattern(self, pattern: str):
+        """
+        Exclude files that match the given glob pattern
+        Patterns follow gitignore syntax, relative to the scanned directory
+        :param pattern:
+        :return:
+        """
+        self.exclude_patterns.append(pattern)
+        self.__exclude_matcher = None
 
     def set_lftp_temp_suffix(self, suffix: str):
         """
@@ -70,6 +135,79 @@ class SystemScanner:
         :return:
         """
         self.__lftp_temp_file_suffix = suffix
+        if self.__cache is not None:
+            # Cached files have names based on the old suffix
+            self.__cache.clear()
+
+    def set_use_data_extents(self, use_data_extents: bool):
+        """
+        Measure partial downloads by the data actually written to them instead
+        of their length
+        A partial multi-connection download is a sparse file, so its data
+        extents are the bytes transferred so far. Only files with an lftp
+        status file, or lftp temp files, are measured this way, since a
+        complete file can be sparse too. This is cheaper than reading
+        the lftp status file, and works if the status file is missing or
+        stale. The status file is only used if the filesystem can't report
+        data extents, or reports the whole file as data while a status file
+        says otherwise.
+        :param use_data_extents:
+        :return:
+        """
+        self.__use_data_extents = use_data_extents
+        if self.__cache is not None:
+            # Cached files were measured the other way
+            self.__cache.clear()
+
+    def set_num_workers(self, num_workers: int):
+        """
+        Set the number of threads used to walk the directory tree
+        A value of 1 walks the tree serially in the calling thread
+        :param num_workers:
+        :return:
+        """
+        if num_workers < 1:
+            raise ValueError("Number of workers must be greater than zero")
+        self.__num_workers = num_workers
+
+    def enable_cache(self):
+        """
+        Cache directory listings between scans
+        A directory is only re-read if its mtime or inode changed. Files are
+        still stat'ed on every scan, but keep their cached result if their
+        size and mtime didn't change.
+        :return:
+        """
+        if self.__cache is None:
+            self.__cache = dict()
+
+    def retain_cached_roots(self, names: Iterable[str]):
+        """
+        Drop the cached listings of all top-level directories but the named ones
+        Full scans drop the listings of directories that are gone, but single
+        scans only see the directory being scanned. A caller that only does
+        single scans should call this with the names it scans, so that the
+        cache doesn't keep the listings of directories it no longer scans.
+        :param names:
+        :return:
+        """
+        if self.__cache is None:
+            return
+        root_prefix = os.path.join(self.path_to_scan, "")
+        retained_prefixes = tuple(os.path.join(self.path_to_scan, name, "") for name in names)
+        for path in list(self.__cache.keys()):
+            if path.startswith(root_prefix) and not os.path.join(path, "").startswith(retained_prefixes):
+                del self.__cache[path]
+
+    @property
+    def cache_hits(self) -> int:
+        """Number of directory listings served from the cache"""
+        return self.__cache_hits
+
+    @property
+    def cache_misses(self) -> int:
+        """Number of directory listings that had to be read from disk"""
+        return self.__cache_misses
 
     def scan(self) -> List[SystemFile]:
         """
@@ -80,7 +218,32 @@ class SystemScanner:
             raise SystemScannerError("Path does not exist: {}".format(self.path_to_scan))
         elif not os.path.isdir(self.path_to_scan):
             raise SystemScannerError("Path is not a directory: {}".format(self.path_to_scan))
-        return self.__create_children(self.path_to_scan)
+        self.__cache_visited.clear()
+        children = self.__walk(self.path_to_scan, ExcludeChain())
+        self.__prune_cache(self.path_to_scan)
+        return children
+
+    def scan_iter(self) -> Iterator[SystemFile]:
+        """
+        Scan the path and yield the top-level system files one at a time
+        Each file is yielded as soon as its subtree is scanned, in the same
+        order as returned by scan()
+        :return:
+        """
+        if not os.path.exists(self.path_to_scan):
+            raise SystemScannerError("Path does not exist: {}".format(self.path_to_scan))
+        elif not os.path.isdir(self.path_to_scan):
+            raise SystemScannerError("Path is not a directory: {}".format(self.path_to_scan))
+        self.__cache_visited.clear()
+        files, sub_dirs, sub_dir_chain = self.__list_dir(self.path_to_scan, ExcludeChain())
+        entries = [(file.name, file, None) for file in files]
+        entries += [(sub_dir_name, None, sub_dir_path) for sub_dir_name, sub_dir_path in sub_dirs]
+        entries.sort(key=lambda e: e[0])
+        for name, file, sub_dir_path in entries:
+            if file is None:
+                file = SystemScanner.__create_dir(name, self.__walk(sub_dir_path, sub_dir_chain))
+            yield file
+        self.__prune_cache(self.path_to_scan)
 
     def scan_single(self, name: str) -> SystemFile:
         """
@@ -100,61 +263,392 @@ class SystemScanner:
         else:
             raise SystemScannerError("Path does not exist: {}".format(path))
 
-        return self.__create_system_file(
+        # The ignore file of the scanned directory applies to this file too
+        root_cache_entry = None
+        if self.__cache is not None:
+            root_cache_entry = self.__cache.get(self.path_to_scan)
+            if root_cache_entry is None:
+                # Placeholder to cache the ignore file in until the directory
+                # is listed, its key never matches so it's never used as a listing
+                root_cache_entry = DirCacheEntry(None, [])
+                self.__cache[self.path_to_scan] = root_cache_entry
+        chain = self.__dir_chain(self.path_to_scan,
+                                 "",
+                                 ExcludeChain(),
+                                 os.path.isfile(os.path.join(self.path_to_scan, ExcludeMatcher.IGNORE_FILE_NAME)),
+                                 root_cache_entry)
+        is_dir = os.path.isdir(path)
+        if self.__is_excluded(os.path.basename(path), is_dir, chain):
+            raise SystemScannerError("Path is excluded: {}".format(path))
+
+        self.__cache_visited.clear()
+        sys_file = self.__create_system_file(
             PseudoDirEntry(
                 name=name,
                 path=path,
-                is_dir=os.path.isdir(path),
+                is_dir=is_dir,
                 stat=os.stat(path)
-            )
+            ),
+            chain
         )
+        if sys_file.is_dir:
+            self.__prune_cache(path)
+        return sys_file
 
-    def __create_system_file(self, entry) -> SystemFile:
+    def __create_system_file(self, entry, chain: ExcludeChain) -> SystemFile:
         if entry.is_dir():
-            sub_children = self.__create_children(entry.path)
-            size = sum(sub_child.size for sub_child in sub_children)
-            sys_file = SystemFile(entry.name, size, True)
-            for sub_child in sub_children:
-                sys_file.add_child(sub_child)
+            return SystemScanner.__create_dir(entry.name, self.__walk(entry.path, chain))
         else:
-            file_size = entry.stat().st_size
-            # Check if it's a partial lftp file, and if so, use the lftp
-            # status to get the real file size
-            lftp_status_file_path = entry.path + SystemScanner.__LFTP_STATUS_FILE_SUFFIX
-            if os.path.isfile(lftp_status_file_path):
-                with open(lftp_status_file_path, "r") as f:
-                    file_size = SystemScanner._lftp_status_file_size(f.read())
-            # Check to see if this is a lftp temp file, and if so, use the real name
-            file_name = entry.name
-            if self.__lftp_temp_file_suffix is not None and \
-                    file_name != self.__lftp_temp_file_suffix and \
-                    file_name.endswith(self.__lftp_temp_file_suffix):
-                file_name = file_name[:-len(self.__lftp_temp_file_suffix)]
-            sys_file = SystemFile(file_name, file_size, False)
+            return self.__create_file(entry)
+
+    @staticmethod
+    def __create_dir(name: str, children: List[SystemFile]) -> SystemFile:
+        size = sum(child.size for child in children)
+        sys_file = SystemFile(name, size, True)
+        for child in children:
+            sys_file.add_child(child)
         return sys_file
 
-    def __create_children(self, path: str) -> List[SystemFile]:
-        children = []
+    def __create_file(self, entry, has_status_file: Optional[bool] = None) -> SystemFile:
+        """
+        :param entry:
+        :param has_status_file: whether the file has an lftp status file, if the
+                                caller already knows from the directory listing
+        :return:
+        """
+        lftp_status_file_path = entry.path + SystemScanner.LFTP_STATUS_FILE_SUFFIX
+        if has_status_file is None:
+            has_status_file = os.path.isfile(lftp_status_file_path)
+        is_temp_file = self.__file_name(entry.name) != entry.name
+        file_size = None
+        # Only partial lftp downloads are measured by their data extents,
+        # since complete files can have holes too
+        if self.__use_data_extents and (has_status_file or is_temp_file):
+            length = entry.stat().st_size
+            file_size = SystemScanner._data_extents_size(entry.path, length)
+            if file_size == length:
+                # Either complete, or the filesystem doesn't do sparse files
+                # and the status file knows better
+                file_size = None
+        # Check if it's a partial lftp file, and if so, use the lftp
+        # status to get the real file size
+        if file_size is None and has_status_file:
+            file_size = SystemScanner.__read_status_file_size(lftp_status_file_path)
+        if file_size is None:
+            file_size = entry.stat().st_size
+        return SystemFile(self.__file_name(entry.name), file_size, False)
+
+    @staticmethod
+    def _data_extents_size(path: str, length: int) -> Optional[int]:
+        """
+        Returns the number of bytes in the data extents of a file, up to length
+        Holes in a sparse file are not counted. Returns None if the
+        filesystem can't report data extents.
+        :param path:
+        :param length: length of the file
+        :return:
+        """
+        if not hasattr(os, "SEEK_DATA"):
+            return None
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            size = 0
+            offset = 0
+            while offset < length:
+                try:
+                    data_offset = os.lseek(fd, offset, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO:
+                        # Nothing but holes after offset
+                        break
+                    raise
+                if data_offset >= length:
+                    break
+                offset = os.lseek(fd, data_offset, os.SEEK_HOLE)
+                # File may have grown since it was stat'ed
+                size += min(offset, length) - data_offset
+            return size
+        except OSError:
+            # Filesystem doesn't support SEEK_DATA
+            return None
+        finally:
+            os.close(fd)
+
+    def __file_name(self, name: str) -> str:
+        # Check to see if this is a lftp temp file, and if so, use the real name
+        if self.__lftp_temp_file_suffix is not None and \
+                name != self.__lftp_temp_file_suffix and \
+                name.endswith(self.__lftp_temp_file_suffix):
+            return name[:-len(self.__lftp_temp_file_suffix)]
+        return name
+
+    @staticmethod
+    def __read_status_file_size(status_file_path: str) -> Optional[int]:
+        """
+        Returns the size from an lftp status file, or None if the file is gone
+        """
+        try:
+            with open(status_file_path, "r") as f:
+                return SystemScanner._lftp_status_file_size(f.read())
+        except FileNotFoundError:
+            # Download finished while scanning
+            return None
+
+    @staticmethod
+    def __cached_status_file_size(cache_entry: DirCacheEntry, name: str, status_file_path: str) -> Optional[int]:
+        """
+        Returns the size from the lftp status file of the named file
+        The parsed size is reused for as long as the status file's size and mtime
+        don't change. Returns None if the status file is gone.
+        """
+        try:
+            status_stat = os.stat(status_file_path)
+        except FileNotFoundError:
+            return None
+        key = (status_stat.st_size, status_stat.st_mtime_ns)
+        cached = cache_entry.status_sizes.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        size = SystemScanner.__read_status_file_size(status_file_path)
+        if size is not None and \
+                time.time() - status_stat.st_mtime >= SystemScanner.__CACHE_RACY_WINDOW_IN_SECS:
+            cache_entry.status_sizes[name] = (key, size)
+        else:
+            # A recent write may not have changed the mtime
+            cache_entry.status_sizes.pop(name, None)
+        return size
+
+    def __get_exclude_matcher(self) -> ExcludeMatcher:
+        matcher = self.__exclude_matcher
+        if matcher is None:
+            matcher = ExcludeMatcher(self.exclude_patterns)
+            for prefix in self.exclude_prefixes:
+                matcher.add_prefix(prefix)
+            for suffix in self.exclude_suffixes:
+                matcher.add_suffix(suffix)
+            matcher.add_pattern(ExcludeMatcher.IGNORE_FILE_NAME)
+            self.__exclude_matcher = matcher
+        return matcher
+
+    def __is_excluded(self, rel_path: str, is_dir: bool, chain: ExcludeChain) -> bool:
+        return self.__get_exclude_matcher().is_excluded(rel_path, is_dir) or \
+            chain.is_excluded(rel_path, is_dir)
+
+    def __rel_path(self, path: str) -> str:
+        """Path relative to the scanned directory, with / separators"""
+        root_prefix = os.path.join(self.path_to_scan, "")
+        return path[len(root_prefix):].replace(os.sep, "/") if path.startswith(root_prefix) else ""
+
+    def __dir_chain(self,
+                    path: str,
+                    rel_path: str,
+                    chain: ExcludeChain,
+                    has_ignore_file: bool,
+                    cache_entry: Optional[DirCacheEntry] = None) -> ExcludeChain:
+        """
+        Returns the exclusion chain for the entries of a directory
+        :param path: path of the directory
+        :param rel_path: path of the directory relative to the scanned directory
+        :param chain: exclusion chain of the parent directory
+        :param has_ignore_file: True if the directory has an ignore file
+        :param cache_entry: cache entry of the directory, if caching is enabled
+        :return:
+        """
+        if not has_ignore_file:
+            return chain
+        ignore_file_path = os.path.join(path, ExcludeMatcher.IGNORE_FILE_NAME)
+        try:
+            if cache_entry is None:
+                matcher = ExcludeMatcher.from_file(ignore_file_path)
+            else:
+                ignore_file_stat = os.stat(ignore_file_path)
+                key = (ignore_file_stat.st_size, ignore_file_stat.st_mtime_ns)
+                if cache_entry.ignore_file is not None and cache_entry.ignore_file[0] == key:
+                    matcher = cache_entry.ignore_file[1]
+                else:
+                    matcher = ExcludeMatcher.from_file(ignore_file_path)
+                    cache_entry.ignore_file = (key, matcher)
+        except OSError:
+            # Ignore file was removed or is unreadable
+            return chain
+        return chain.extend(rel_path, matcher)
+
+    def __walk(self, path: str, chain: ExcludeChain) -> List[SystemFile]:
+        if self.__num_workers > 1:
+            return self.__create_children_parallel(path, chain)
+        else:
+            return self.__create_children(path, chain)
+
+    def __create_children(self, path: str, chain: ExcludeChain) -> List[SystemFile]:
+        files, sub_dirs, sub_dir_chain = self.__list_dir(path, chain)
+        children = files
+        for sub_dir_name, sub_dir_path in sub_dirs:
+            children.append(SystemScanner.__create_dir(sub_dir_name,
+                                                       self.__create_children(sub_dir_path, sub_dir_chain)))
+        children.sort(key=lambda fl: fl.name)
+        return children
+
+    def __list_dir(self, path: str, chain: ExcludeChain) \
+            -> Tuple[List[SystemFile], List[Tuple[str, str]], ExcludeChain]:
+        """
+        List a single directory without descending into it
+        Returns the files of the directory, the (name, path) of its subdirectories
+        and the exclusion chain to list the subdirectories with
+        :param path:
+        :param chain: exclusion chain of the parent directory
+        :return:
+        """
+        if self.__cache is not None:
+            return self.__list_dir_cached(path, chain)
+
+        files = []
+        sub_dirs = []
+        rel_path = self.__rel_path(path)
         # Files may get deleted while scanning, ignore the error
         try:
-            for entry in os.scandir(path):
-                # Skip excluded entries
-                skip = False
-                for prefix in self.exclude_prefixes:
-                    if entry.name.startswith(prefix):
-                        skip = True
-                for suffix in self.exclude_suffixes:
-                    if entry.name.endswith(suffix):
-                        skip = True
-                if skip:
-                    continue
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return [], [], chain
+        # The listing tells us which files have status files, without a stat per file
+        names = set(entry.name for entry in entries)
+        chain = self.__dir_chain(path, rel_path, chain, ExcludeMatcher.IGNORE_FILE_NAME in names)
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except FileNotFoundError:
+                continue
+            # Skip excluded entries
+            if self.__is_excluded(rel_path + "/" + entry.name if rel_path else entry.name, is_dir, chain):
+                continue
+            if is_dir:
+                sub_dirs.append((entry.name, entry.path))
+            else:
+                has_status_file = (entry.name + SystemScanner.LFTP_STATUS_FILE_SUFFIX) in names
+                try:
+                    files.append(self.__create_file(entry, has_status_file))
+                except FileNotFoundError:
+                    pass
+        return files, sub_dirs, chain
 
-                sys_file = self.__create_system_file(entry)
-                children.append(sys_file)
-            children.sort(key=lambda fl: fl.name)
-            return children
+    def __list_dir_cached(self, path: str, chain: ExcludeChain) \
+            -> Tuple[List[SystemFile], List[Tuple[str, str]], ExcludeChain]:
+        # Files may get deleted while scanning, ignore the error
+        try:
+            dir_stat = os.stat(path)
+            key = (dir_stat.st_mtime_ns, dir_stat.st_ino)
+            cache_entry = self.__cache.get(path)
+            if cache_entry is not None and cache_entry.key == key:
+                with self.__cache_lock:
+                    self.__cache_hits += 1
+            else:
+                with self.__cache_lock:
+                    self.__cache_misses += 1
+                names = [(entry.name, entry.is_dir()) for entry in os.scandir(path)]
+                if time.time() - dir_stat.st_mtime < SystemScanner.__CACHE_RACY_WINDOW_IN_SECS:
+                    key = None
+                new_cache_entry = DirCacheEntry(key, names)
+                if cache_entry is not None:
+                    new_cache_entry.carry_over(cache_entry)
+                cache_entry = new_cache_entry
+                self.__cache[path] = cache_entry
         except FileNotFoundError:
-            return []
+            return [], [], chain
+        self.__cache_visited.add(path)
+
+        rel_path = self.__rel_path(path)
+        chain = self.__dir_chain(path,
+                                 rel_path,
+                                 chain,
+                                 ExcludeMatcher.IGNORE_FILE_NAME in cache_entry.name_set,
+                                 cache_entry)
+        files = []
+        sub_dirs = []
+        for name, is_dir in cache_entry.names:
+            if self.__is_excluded(rel_path + "/" + name if rel_path else name, is_dir, chain):
+                continue
+            entry_path = os.path.join(path, name)
+            if is_dir:
+                sub_dirs.append((name, entry_path))
+                continue
+            # A status file is created and removed in this directory, so the
+            # listing tells us whether it exists
+            status_name = name + SystemScanner.LFTP_STATUS_FILE_SUFFIX
+            has_status_file = status_name in cache_entry.name_set
+            if has_status_file and not self.__use_data_extents:
+                # The real size comes from the status file alone
+                status_size = SystemScanner.__cached_status_file_size(cache_entry,
+                                                                      name,
+                                                                      os.path.join(path, status_name))
+                if status_size is not None:
+                    files.append(SystemFile(self.__file_name(name), status_size, False))
+                    continue
+            try:
+                file_stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            file_key = (file_stat.st_size, file_stat.st_mtime_ns)
+            cached_file = cache_entry.files.get(name)
+            if cached_file is not None and cached_file[0] == file_key and not has_status_file:
+                files.append(cached_file[1])
+            else:
+                sys_file = self.__create_file(PseudoDirEntry(name, entry_path, False, file_stat), has_status_file)
+                cache_entry.files[name] = (file_key, sys_file)
+                files.append(sys_file)
+        return files, sub_dirs, chain
+
+    def __prune_cache(self, root_path: str):
+        """Remove cached directories under root_path that were not seen in the last walk"""
+        if self.__cache is None:
+            return
+        prefix = os.path.join(root_path, "")
+        for path in list(self.__cache.keys()):
+            if (path == root_path or path.startswith(prefix)) and path not in self.__cache_visited:
+                del self.__cache[path]
+
+    def __create_children_parallel(self, path: str, chain: ExcludeChain) -> List[SystemFile]:
+        """
+        Walk the tree with a pool of worker threads
+        Each task lists a single directory, and every subdirectory it finds is
+        submitted as a new task. Workers never wait on each other, so a bounded
+        pool cannot deadlock. The tree is assembled once all listings are in.
+        :param path:
+        :return:
+        """
+        listings = dict()  # type: Dict[str, Tuple[List[SystemFile], List[Tuple[str, str]]]]
+        with ThreadPoolExecutor(max_workers=self.__num_workers) as executor:
+            pending = {executor.submit(self.__list_dir, path, chain): path}
+            while pending:
+                done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path = pending.pop(future)
+                    files, sub_dirs, sub_dir_chain = future.result()
+                    listings[dir_path] = (files, sub_dirs)
+                    for _, sub_dir_path in sub_dirs:
+                        pending[executor.submit(self.__list_dir, sub_dir_path, sub_dir_chain)] = sub_dir_path
+        return SystemScanner.__assemble_children(path, listings)
+
+    @staticmethod
+    def __assemble_children(path: str,
+                            listings: Dict[str, Tuple[List[SystemFile], List[Tuple[str, str]]]]) -> List[SystemFile]:
+        # Iterative post-order assembly so deep trees don't hit the recursion limit
+        children_by_path = dict()
+        stack = [(path, False)]
+        while stack:
+            dir_path, visited = stack.pop()
+            files, sub_dirs = listings[dir_path]
+            if not visited:
+                stack.append((dir_path, True))
+                stack.extend((sub_dir_path, False) for _, sub_dir_path in sub_dirs)
+            else:
+                children = list(files)
+                for sub_dir_name, sub_dir_path in sub_dirs:
+                    children.append(SystemScanner.__create_dir(sub_dir_name, children_by_path.pop(sub_dir_path)))
+                children.sort(key=lambda fl: fl.name)
+                children_by_path[dir_path] = children
+        return children_by_path[path]
 
     @staticmethod
     def _lftp_status_file_size(status: str) -> int:
@@ -163,9 +657,6 @@ class SystemScanner:
         :param status:
         :return:
         """
-        size_pattern_m = re.compile("^size=(\d+)$")
-        pos_pattern_m = re.compile("^\d+\.pos=(\d+)$")
-        limit_pattern_m = re.compile("^\d+\.limit=(\d+)$")
         lines = [s.strip() for s in status.splitlines()]
         lines = list(filter(None, lines))  # remove blank lines
         if not lines:
@@ -173,23 +664,20 @@ class SystemScanner:
 
         empty_size = 0
         # First line should be a size
-        result = size_pattern_m.search(lines[0])
+        result = SystemScanner.__LFTP_STATUS_SIZE_PATTERN.search(lines[0])
         if not result:
             return 0
         total_size = int(result.group(1))
-        lines.pop(0)
-        while lines:
-            # There should be pairs of lines
-            if len(lines) < 2:
-                return 0
-            result_pos = pos_pattern_m.search(lines[0])
-            result_limit = limit_pattern_m.search(lines[1])
+        # There should be pairs of lines
+        if len(lines) % 2 != 1:
+            return 0
+        for i in range(1, len(lines), 2):
+            result_pos = SystemScanner.__LFTP_STATUS_POS_PATTERN.search(lines[i])
+            result_limit = SystemScanner.__LFTP_STATUS_LIMIT_PATTERN.search(lines[i + 1])
             if not result_pos or not result_limit:
                 return 0
             pos = int(result_pos.group(1))
             limit = int(result_limit.group(1))
             empty_size += limit - pos
-            lines.pop(0)
-            lines.pop(0)
 
         return total_size-empty_size
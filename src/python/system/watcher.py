@@ -0,0 +1,250 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+
+from common import AppError
+
+
+class SystemWatcherError(AppError):
+    """
+    Exception indicating that a watch could not be set up
+    """
+    pass
+
+
+class SystemWatcher:
+    """
+    Watches a directory tree for changes using inotify
+    Changes are reported as the set of names of the top-level entries
+    that were affected. The caller is expected to rescan those entries.
+    Symlinked directories are watched too, as the scanner follows them. A
+    directory reached through several paths is watched once, and a change
+    in it is reported for all of them. Symlinks that lead back to one of
+    their parent directories are not followed.
+    """
+    # Constants from <sys/inotify.h>
+    __IN_MODIFY = 0x00000002
+    __IN_MOVED_FROM = 0x00000040
+    __IN_MOVED_TO = 0x00000080
+    __IN_CREATE = 0x00000100
+    __IN_DELETE = 0x00000200
+    __IN_DELETE_SELF = 0x00000400
+    __IN_MOVE_SELF = 0x00000800
+    __IN_Q_OVERFLOW = 0x00004000
+    __IN_IGNORED = 0x00008000
+    __IN_ONLYDIR = 0x01000000
+    __IN_ISDIR = 0x40000000
+    __IN_NONBLOCK = os.O_NONBLOCK
+    __IN_CLOEXEC = os.O_CLOEXEC
+
+    __WATCH_MASK = __IN_MODIFY | __IN_MOVED_FROM | __IN_MOVED_TO | __IN_CREATE | \
+        __IN_DELETE | __IN_DELETE_SELF | __IN_MOVE_SELF | __IN_ONLYDIR
+    __EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+    __READ_SIZE = 64 * 1024
+
+    def __init__(self, path_to_watch: str):
+        """
+        :param path_to_watch: path of the directory to watch
+        """
+        self.path_to_watch = path_to_watch
+        self.__libc = None
+        self.__fd = None
+        # Paths relative to the watched directory of each watched directory
+        self.__watches = dict()  # type: Dict[int, Set[str]]
+        self.__watch_paths = dict()  # type: Dict[str, int]
+
+    @property
+    def is_started(self) -> bool:
+        return self.__fd is not None
+
+    def start(self):
+        """
+        Create the inotify instance and add watches for the whole tree
+        :return:
+        """
+        if self.__libc is None:
+            self.__libc = SystemWatcher.__load_libc()
+        fd = self.__libc.inotify_init1(SystemWatcher.__IN_NONBLOCK | SystemWatcher.__IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise SystemWatcherError("Failed to initialize inotify: {}".format(os.strerror(err)))
+        self.__fd = fd
+        self.__watches.clear()
+        self.__watch_paths.clear()
+        try:
+            self.__add_watches("", frozenset())
+        except SystemWatcherError:
+            self.close()
+            raise
+
+    def fileno(self) -> int:
+        """
+        The inotify file descriptor, which becomes readable when there are changes
+        Allows the watcher to be passed to select()
+        :return:
+        """
+        if self.__fd is None:
+            raise SystemWatcherError("Watcher is not started")
+        return self.__fd
+
+    def close(self):
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+        self.__watches.clear()
+        self.__watch_paths.clear()
+
+    def pop_changes(self) -> Optional[Set[str]]:
+        """
+        Returns the names of all top-level entries that changed since the last call
+        Returns None if events were lost and the whole tree must be rescanned
+        :return:
+        """
+        if self.__fd is None:
+            raise SystemWatcherError("Watcher is not started")
+        changes = set()
+        lost_events = False
+        while True:
+            try:
+                buf = os.read(self.__fd, SystemWatcher.__READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, name_len = SystemWatcher.__EVENT_HEADER.unpack_from(buf, offset)
+                offset += SystemWatcher.__EVENT_HEADER.size
+                name = os.fsdecode(buf[offset:offset + name_len].rstrip(b"\0"))
+                offset += name_len
+                if not self.__handle_event(wd, mask, name, changes):
+                    lost_events = True
+
+        if lost_events:
+            # Start over with a fresh set of watches
+            self.close()
+            self.start()
+            return None
+        return changes
+
+    def __handle_event(self, wd: int, mask: int, name: str, changes: Set[str]) -> bool:
+        """
+        Apply a single event to the watch state and record the changed entry
+        Returns False if the event indicates that the tree is out of sync
+        """
+        if mask & SystemWatcher.__IN_Q_OVERFLOW:
+            return False
+        if mask & SystemWatcher.__IN_IGNORED:
+            for dir_rel_path in self.__watches.pop(wd, set()):
+                self.__watch_paths.pop(dir_rel_path, None)
+            return True
+        if wd not in self.__watches:
+            # Event for a watch that was already removed
+            return True
+        dir_rel_paths = list(self.__watches[wd])
+        if mask & (SystemWatcher.__IN_DELETE_SELF | SystemWatcher.__IN_MOVE_SELF):
+            # The root itself disappeared, otherwise the parent reports this change
+            return "" not in dir_rel_paths
+
+        for dir_rel_path in dir_rel_paths:
+            rel_path = os.path.join(dir_rel_path, name) if dir_rel_path else name
+            changes.add(rel_path.split(os.sep, 1)[0])
+            if mask & (SystemWatcher.__IN_MOVED_FROM | SystemWatcher.__IN_DELETE):
+                # A removed symlink has no IN_ISDIR flag, but may have been watched
+                if rel_path in self.__watch_paths:
+                    self.__remove_watches(rel_path)
+            elif mask & (SystemWatcher.__IN_CREATE | SystemWatcher.__IN_MOVED_TO):
+                # Symlinks to directories are followed too
+                if mask & SystemWatcher.__IN_ISDIR or \
+                        os.path.isdir(os.path.join(self.path_to_watch, rel_path)):
+                    self.__add_watches(rel_path, self.__ancestor_keys(dir_rel_path))
+        return True
+
+    def __ancestor_keys(self, rel_path: str) -> FrozenSet[Tuple[int, int]]:
+        """Returns the (device, inode) of the directory at rel_path and all its parents"""
+        keys = set()
+        path = self.path_to_watch
+        try:
+            keys.add(SystemWatcher.__dir_key(os.stat(path)))
+            for part in rel_path.split(os.sep) if rel_path else []:
+                path = os.path.join(path, part)
+                keys.add(SystemWatcher.__dir_key(os.stat(path)))
+        except OSError:
+            # Parent was removed, its events will follow
+            pass
+        return frozenset(keys)
+
+    @staticmethod
+    def __dir_key(stat: os.stat_result) -> Tuple[int, int]:
+        return stat.st_dev, stat.st_ino
+
+    def __add_watches(self, rel_path: str, ancestor_keys: FrozenSet[Tuple[int, int]]):
+        """
+        Watch the directory at rel_path and every directory below it
+        :param rel_path:
+        :param ancestor_keys: (device, inode) of the parents of the directory,
+                              to stop at symlinks that lead back to them
+        :return:
+        """
+        path = os.path.join(self.path_to_watch, rel_path) if rel_path else self.path_to_watch
+        frontier = [(path, rel_path, ancestor_keys)]
+        while frontier:
+            dir_path, dir_rel_path, dir_ancestor_keys = frontier.pop()
+            try:
+                key = SystemWatcher.__dir_key(os.stat(dir_path))
+            except OSError:
+                # Directory was removed or is a broken symlink
+                continue
+            if key in dir_ancestor_keys:
+                # Symlink loop
+                continue
+            wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(dir_path), SystemWatcher.__WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    # Directory was removed or is unreadable, nothing to watch
+                    continue
+                raise SystemWatcherError("Failed to watch {}: {}".format(dir_path, os.strerror(err)))
+            # A directory that is already watched through another path gets
+            # the same watch descriptor
+            self.__watches.setdefault(wd, set()).add(dir_rel_path)
+            self.__watch_paths[dir_rel_path] = wd
+            child_ancestor_keys = dir_ancestor_keys | {key}
+            try:
+                for entry in os.scandir(dir_path):
+                    if entry.is_dir():
+                        child_rel_path = os.path.join(dir_rel_path, entry.name) if dir_rel_path else entry.name
+                        frontier.append((entry.path, child_rel_path, child_ancestor_keys))
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                pass
+
+    def __remove_watches(self, rel_path: str):
+        prefix = rel_path + os.sep
+        for wd, dir_rel_paths in list(self.__watches.items()):
+            removed = {p for p in dir_rel_paths if p == rel_path or p.startswith(prefix)}
+            if not removed:
+                continue
+            dir_rel_paths -= removed
+            for dir_rel_path in removed:
+                del self.__watch_paths[dir_rel_path]
+            if not dir_rel_paths:
+                # Not reachable through any other path
+                del self.__watches[wd]
+                self.__libc.inotify_rm_watch(self.__fd, wd)
+
+    @staticmethod
+    def __load_libc():
+        libc_name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            # Check that the inotify functions are available
+            for func in (libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch):
+                func.restype = ctypes.c_int
+        except (OSError, AttributeError):
+            raise SystemWatcherError("inotify is not available on this system")
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
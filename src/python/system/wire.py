@@ -0,0 +1,429 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import struct
+import zlib
+from typing import List, Optional, Dict, Set
+
+from common import AppError
+from .file import SystemFile
+
+
+class WireError(AppError):
+    """
+    Exception indicating malformed wire data
+    """
+    pass
+
+
+class WireFormat:
+    """
+    Streaming binary format for SystemFile trees
+
+    The stream starts with a header:
+        magic (4 bytes), version (u8), flags (u8)
+    It is followed by a sequence of records, zlib-compressed as a single
+    stream if FLAG_COMPRESSED is set. Each record is:
+        length (u32), type (u8), payload (length - 1 bytes)
+    Files are sent as FILE records in pre-order. Each FILE record carries the
+    number of children that follow it, so a decoder can rebuild the tree
+    without buffering. The stream ends with an END record carrying the number
+    of root files.
+    All integers are little-endian.
+
+    A stream may start with a GENERATION record identifying the scan. If the
+    record has FLAG_DELTA set, the stream describes the changes relative to
+    an earlier scan the reader already has. It contains REMOVE records with
+    the paths of removed files, and UPDATE records with the path of a parent
+    directory followed by the FILE records of an added or changed child. Paths
+    are relative to the scanned directory, with components joined by "/". Any
+    directory size changes are implied by the changes to its descendants.
+    """
+    MAGIC = b"SSFS"
+    VERSION = 1
+    FLAG_COMPRESSED = 0x1
+
+    TYPE_FILE = 1
+    TYPE_END = 2
+    TYPE_GENERATION = 3
+    TYPE_REMOVE = 4
+    TYPE_UPDATE = 5
+
+    FILE_FLAG_DIR = 0x1
+    GENERATION_FLAG_DELTA = 0x1
+
+    PATH_SEPARATOR = "/"
+
+    HEADER = struct.Struct("<4sBB")
+    RECORD_HEADER = struct.Struct("<IB")
+    FILE = struct.Struct("<BQI")  # flags, size, num children; followed by name
+    END = struct.Struct("<I")  # num roots
+    GENERATION = struct.Struct("<QB")  # generation, flags
+
+    @staticmethod
+    def join(parent_path: str, name: str) -> str:
+        return parent_path + WireFormat.PATH_SEPARATOR + name if parent_path else name
+
+
+class WireEncoder:
+    """
+    Encodes SystemFiles into the wire format
+    Each call returns the bytes that should be written out next. Compressed
+    data is flushed after every root file, so that a reader can decode it
+    as soon as it arrives.
+    """
+    def __init__(self, compress: bool = True):
+        self.__compressor = zlib.compressobj() if compress else None
+        self.__num_roots = 0
+
+    def header(self) -> bytes:
+        flags = WireFormat.FLAG_COMPRESSED if self.__compressor else 0
+        return WireFormat.HEADER.pack(WireFormat.MAGIC, WireFormat.VERSION, flags)
+
+    def generation(self, generation: int, is_delta: bool = False) -> bytes:
+        """
+        Encode the generation of this scan
+        Must come before any files
+        :param generation:
+        :param is_delta: True if the rest of the stream is a delta
+        :return:
+        """
+        flags = WireFormat.GENERATION_FLAG_DELTA if is_delta else 0
+        record = WireEncoder.__record(WireFormat.TYPE_GENERATION, WireFormat.GENERATION.pack(generation, flags))
+        return self.__output(record, zlib.Z_NO_FLUSH)
+
+    def encode_file(self, file: SystemFile) -> bytes:
+        """
+        Encode a root file and all of its descendants
+        :param file:
+        :return:
+        """
+        records = []
+        WireEncoder.__file_records(file, records)
+        self.__num_roots += 1
+        return self.__output(b"".join(records), zlib.Z_SYNC_FLUSH)
+
+    def encode_delta(self, old_files: List[SystemFile], new_files: List[SystemFile]) -> bytes:
+        """
+        Encode the changes needed to turn old_files into new_files
+        :param old_files:
+        :param new_files:
+        :return:
+        """
+        records = []
+        WireEncoder.__delta_records(old_files, new_files, "", records)
+        self.__num_roots = len(new_files)
+        return self.__output(b"".join(records), zlib.Z_SYNC_FLUSH)
+
+    def end(self) -> bytes:
+        record = WireEncoder.__record(WireFormat.TYPE_END, WireFormat.END.pack(self.__num_roots))
+        return self.__output(record, zlib.Z_FINISH)
+
+    def encode(self, files: List[SystemFile]) -> bytes:
+        """
+        Encode a complete stream in one shot
+        :param files:
+        :return:
+        """
+        return self.header() + b"".join(self.encode_file(f) for f in files) + self.end()
+
+    @staticmethod
+    def __file_records(file: SystemFile, records: List[bytes]):
+        stack = [file]
+        while stack:
+            node = stack.pop()
+            children = node.children
+            name = node.name.encode("utf-8", "surrogateescape")
+            flags = WireFormat.FILE_FLAG_DIR if node.is_dir else 0
+            payload = WireFormat.FILE.pack(flags, node.size, len(children)) + name
+            records.append(WireEncoder.__record(WireFormat.TYPE_FILE, payload))
+            stack.extend(reversed(children))
+
+    @staticmethod
+    def __delta_records(old_files: List[SystemFile],
+                        new_files: List[SystemFile],
+                        parent_path: str,
+                        records: List[bytes]):
+        old_files_by_name = {file.name: file for file in old_files}
+        for file in new_files:
+            old_file = old_files_by_name.pop(file.name, None)
+            if old_file is file:
+                # Shared subtree, nothing changed
+                continue
+            if old_file is not None and old_file.is_dir and file.is_dir:
+                WireEncoder.__delta_records(old_file.children,
+                                            file.children,
+                                            WireFormat.join(parent_path, file.name),
+                                            records)
+            elif old_file is None or old_file.is_dir != file.is_dir or old_file.size != file.size:
+                records.append(WireEncoder.__record(WireFormat.TYPE_UPDATE, WireEncoder.__path(parent_path)))
+                WireEncoder.__file_records(file, records)
+        for name in old_files_by_name:
+            path = WireFormat.join(parent_path, name)
+            records.append(WireEncoder.__record(WireFormat.TYPE_REMOVE, WireEncoder.__path(path)))
+
+    @staticmethod
+    def __path(path: str) -> bytes:
+        return path.encode("utf-8", "surrogateescape")
+
+    def __output(self, data: bytes, flush_mode: int) -> bytes:
+        if self.__compressor is None:
+            return data
+        return self.__compressor.compress(data) + self.__compressor.flush(flush_mode)
+
+    @staticmethod
+    def __record(record_type: int, payload: bytes) -> bytes:
+        return WireFormat.RECORD_HEADER.pack(len(payload) + 1, record_type) + payload
+
+
+class WireDecoder:
+    """
+    Incrementally decodes SystemFiles from the wire format
+    Data can be fed in arbitrarily sized chunks. Any bytes preceding the
+    header (e.g. a login banner) are skipped. Any bytes following the end
+    of the stream are kept in unused_data.
+    A delta stream is applied to base_files once the stream is complete.
+    """
+    # Give up looking for the header after this many bytes
+    __MAX_PREAMBLE_SIZE = 64 * 1024
+
+    def __init__(self, base_files: Optional[List[SystemFile]] = None):
+        """
+        :param base_files: files of the scan that a delta stream is relative to
+        """
+        self.__base_files = base_files
+        self.__buffer = b""
+        self.__header_found = False
+        self.__decompressor = None
+        self.__files = []
+        self.__stack = []  # [dir, number of children still to come]
+        self.__done = False
+        self.__generation = None
+        self.__is_delta = False
+        self.__update_parent = None  # parent path of the update in progress
+        self.__removes = set()  # type: Set[str]
+        self.__updates = dict()  # type: Dict[str, Dict[str, SystemFile]]
+        self.__touched = set()  # type: Set[str]
+        self.__num_applied = 0
+        self.__unused_data = b""
+
+    @property
+    def generation(self) -> Optional[int]:
+        """Generation of the scan, if the stream has one"""
+        return self.__generation
+
+    @property
+    def is_delta(self) -> bool:
+        return self.__is_delta
+
+    @property
+    def done(self) -> bool:
+        """True if the complete stream was decoded"""
+        return self.__done
+
+    @property
+    def files(self) -> List[SystemFile]:
+        """
+        All root files decoded so far
+        For a delta stream, this is only available once the stream is done
+        """
+        return self.__files
+
+    @property
+    def unused_data(self) -> bytes:
+        """
+        Data that followed the end of the stream, e.g. the start of the next stream
+        """
+        return self.__unused_data
+
+    def feed(self, data: bytes) -> List[SystemFile]:
+        """
+        Decode the next chunk of data
+        Returns the root files that were completed by this chunk
+        :param data:
+        :return:
+        """
+        if self.__done:
+            self.__add_unused_data(data)
+            return []
+        if not self.__header_found:
+            data = self.__find_header(data)
+            if data is None:
+                return []
+        if self.__decompressor is not None:
+            data = self.__decompress(data)
+        self.__buffer += data
+        completed = self.__decode_records()
+        if self.__done:
+            # Whatever follows belongs to the next stream. A compressed
+            # stream has nothing after the end record, the rest of the input
+            # is kept by the decompressor.
+            leftover = self.__buffer if self.__decompressor is None else b""
+            self.__buffer = b""
+            self.__add_unused_data(leftover)
+        return completed
+
+    def __decompress(self, data: bytes) -> bytes:
+        try:
+            return self.__decompressor.decompress(data)
+        except zlib.error as e:
+            raise WireError("Bad compressed data: {}".format(str(e)))
+
+    def __add_unused_data(self, data: bytes):
+        if self.__decompressor is not None:
+            # The end record may arrive before the end of the compressed stream
+            if not self.__decompressor.eof:
+                self.__decompress(data)
+                if not self.__decompressor.eof:
+                    return
+            data = self.__decompressor.unused_data
+            self.__decompressor = None
+        self.__unused_data += data
+
+    def __find_header(self, data: bytes) -> Optional[bytes]:
+        self.__buffer += data
+        pos = self.__buffer.find(WireFormat.MAGIC)
+        if pos < 0 or len(self.__buffer) < pos + WireFormat.HEADER.size:
+            if len(self.__buffer) > WireDecoder.__MAX_PREAMBLE_SIZE:
+                raise WireError("Header not found")
+            return None
+        _, version, flags = WireFormat.HEADER.unpack_from(self.__buffer, pos)
+        if version != WireFormat.VERSION:
+            raise WireError("Unsupported version: {}".format(version))
+        if flags & WireFormat.FLAG_COMPRESSED:
+            self.__decompressor = zlib.decompressobj()
+        data = self.__buffer[pos + WireFormat.HEADER.size:]
+        self.__buffer = b""
+        self.__header_found = True
+        return data
+
+    def __decode_records(self) -> List[SystemFile]:
+        completed = []
+        buf = self.__buffer
+        offset = 0
+        header_size = WireFormat.RECORD_HEADER.size
+        while not self.__done and len(buf) - offset >= header_size:
+            length, record_type = WireFormat.RECORD_HEADER.unpack_from(buf, offset)
+            if length < 1:
+                raise WireError("Bad record length: {}".format(length))
+            if len(buf) - offset < header_size - 1 + length:
+                break
+            payload = buf[offset + header_size:offset + header_size - 1 + length]
+            offset += header_size - 1 + length
+            if record_type == WireFormat.TYPE_FILE:
+                root = self.__decode_file(payload)
+                if root is not None:
+                    completed.append(root)
+            elif record_type == WireFormat.TYPE_END:
+                self.__decode_end(payload)
+            elif record_type == WireFormat.TYPE_GENERATION:
+                self.__decode_generation(payload)
+            elif record_type == WireFormat.TYPE_REMOVE:
+                self.__decode_remove(payload)
+            elif record_type == WireFormat.TYPE_UPDATE:
+                self.__decode_update(payload)
+            else:
+                raise WireError("Unknown record type: {}".format(record_type))
+        self.__buffer = buf[offset:]
+        return completed
+
+    def __decode_file(self, payload: bytes) -> Optional[SystemFile]:
+        if len(payload) < WireFormat.FILE.size:
+            raise WireError("Truncated file record")
+        flags, size, num_children = WireFormat.FILE.unpack_from(payload)
+        name = payload[WireFormat.FILE.size:].decode("utf-8", "surrogateescape")
+        is_dir = bool(flags & WireFormat.FILE_FLAG_DIR)
+        if num_children and not is_dir:
+            raise WireError("File {} has children".format(name))
+        file = SystemFile(name, size, is_dir)
+        if self.__stack:
+            self.__stack[-1][0].add_child(file)
+            self.__stack[-1][1] -= 1
+        elif self.__is_delta:
+            if self.__update_parent is None:
+                raise WireError("File {} is not part of an update".format(name))
+            self.__updates.setdefault(self.__update_parent, dict())[name] = file
+            self.__update_parent = None
+        else:
+            self.__files.append(file)
+        if num_children:
+            self.__stack.append([file, num_children])
+        while self.__stack and self.__stack[-1][1] == 0:
+            self.__stack.pop()
+        if self.__stack or self.__is_delta:
+            return None
+        # The root's tree is complete
+        return self.__files[-1]
+
+    def __decode_generation(self, payload: bytes):
+        if len(payload) < WireFormat.GENERATION.size:
+            raise WireError("Truncated generation record")
+        if self.__generation is not None or self.__files or self.__stack:
+            raise WireError("Unexpected generation record")
+        self.__generation, flags = WireFormat.GENERATION.unpack_from(payload)
+        self.__is_delta = bool(flags & WireFormat.GENERATION_FLAG_DELTA)
+        if self.__is_delta and self.__base_files is None:
+            raise WireError("Received a delta without a base scan")
+
+    def __decode_remove(self, payload: bytes):
+        if not self.__is_delta or self.__stack:
+            raise WireError("Unexpected remove record")
+        self.__removes.add(payload.decode("utf-8", "surrogateescape"))
+
+    def __decode_update(self, payload: bytes):
+        if not self.__is_delta or self.__stack:
+            raise WireError("Unexpected update record")
+        self.__update_parent = payload.decode("utf-8", "surrogateescape")
+
+    def __decode_end(self, payload: bytes):
+        if len(payload) < WireFormat.END.size:
+            raise WireError("Truncated end record")
+        num_roots, = WireFormat.END.unpack_from(payload)
+        if self.__stack or self.__update_parent is not None:
+            raise WireError("Stream ended in the middle of a file tree")
+        if self.__is_delta:
+            self.__touched = WireDecoder.__ancestors(self.__removes)
+            for parent_path in self.__updates:
+                self.__touched.add(parent_path)
+                self.__touched.update(WireDecoder.__ancestors([parent_path]))
+            self.__files = self.__apply_delta(self.__base_files, "")
+            num_changes = len(self.__removes) + sum(len(u) for u in self.__updates.values())
+            if self.__num_applied != num_changes:
+                raise WireError("Delta does not match the base scan")
+        if num_roots != len(self.__files):
+            raise WireError("Expected {} files, got {}".format(num_roots, len(self.__files)))
+        self.__done = True
+
+    def __apply_delta(self, files: List[SystemFile], parent_path: str) -> List[SystemFile]:
+        """
+        Apply the decoded changes to the files under parent_path
+        Unchanged subtrees are shared with the base scan
+        """
+        updates = self.__updates.get(parent_path, dict())
+        result = []
+        for file in files:
+            path = WireFormat.join(parent_path, file.name)
+            if path in self.__removes:
+                self.__num_applied += 1
+                continue
+            if file.name in updates:
+                # Replaced below
+                continue
+            if file.is_dir and path in self.__touched:
+                children = self.__apply_delta(file.children, path)
+                file = SystemFile(file.name, sum(child.size for child in children), True)
+                for child in children:
+                    file.add_child(child)
+            result.append(file)
+        self.__num_applied += len(updates)
+        result.extend(updates.values())
+        result.sort(key=lambda f: f.name)
+        return result
+
+    @staticmethod
+    def __ancestors(paths) -> Set[str]:
+        ancestors = set()
+        for path in paths:
+            parts = path.split(WireFormat.PATH_SEPARATOR)
+            for i in range(1, len(parts)):
+                ancestors.add(WireFormat.PATH_SEPARATOR.join(parts[:i]))
+        return ancestors
@@ -0,0 +1,135 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import logging
+import os
+import sys
+import timeit
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+from system import SystemFile
+from lftp import LftpJobStatus
+from model import ModelFile
+from controller import ModelBuilder
+
+
+@unittest.skipUnless(os.environ.get("SEEDSYNC_BENCHMARKS"), "Set SEEDSYNC_BENCHMARKS to run benchmarks")
+class TestModelBuilderBenchmark(unittest.TestCase):
+    """
+    Benchmarks building the model of a large mirror job that is downloading
+    Each build is timed with the indexed transfer state lookup, and with the
+    linear search over all transfer states that it replaced
+    Run with: SEEDSYNC_BENCHMARKS=1 python -m pytest -s tests/benchmarks
+    """
+    NUM_DIRS = 50
+    NUM_FILES_PER_DIR = 100
+    NUM_ACTIVE_FILES = 16
+    NUM_REPEATS = 5
+
+    def setUp(self):
+        self.logger = logging.getLogger(TestModelBuilderBenchmark.__name__)
+        handler = logging.StreamHandler(sys.stdout)
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.removeHandler, handler)
+
+        remote = SystemFile("mirror", 0, True)
+        local = SystemFile("mirror", 0, True)
+        self.paths = []
+        for d in range(TestModelBuilderBenchmark.NUM_DIRS):
+            remote_dir = SystemFile("dir{}".format(d), 0, True)
+            local_dir = SystemFile("dir{}".format(d), 0, True)
+            remote.add_child(remote_dir)
+            local.add_child(local_dir)
+            for f in range(TestModelBuilderBenchmark.NUM_FILES_PER_DIR):
+                name = "file{}".format(f)
+                remote_dir.add_child(SystemFile(name, 1000, False))
+                local_dir.add_child(SystemFile(name, 500, False))
+                self.paths.append(os.path.join(remote_dir.name, name))
+        self.remote_file = remote
+        self.local_file = local
+        self.model_builder = ModelBuilder()
+
+    def __create_status(self, speed: int) -> LftpJobStatus:
+        status = LftpJobStatus(job_id=1,
+                               job_type=LftpJobStatus.Type.MIRROR,
+                               state=LftpJobStatus.State.RUNNING,
+                               name="mirror",
+                               flags="-c")
+        status.total_transfer_state = LftpJobStatus.TransferState(None, None, None, speed, None)
+        step = len(self.paths) // TestModelBuilderBenchmark.NUM_ACTIVE_FILES
+        for path in self.paths[::step][:TestModelBuilderBenchmark.NUM_ACTIVE_FILES]:
+            status.add_active_file_transfer_state(path, LftpJobStatus.TransferState(500, 1000, 50, speed, 50))
+        return status
+
+    def __time(self, func) -> float:
+        return min(timeit.repeat(func, number=1, repeat=TestModelBuilderBenchmark.NUM_REPEATS))
+
+    @staticmethod
+    def __linear_transfer_state(status: LftpJobStatus, filename: str) -> Optional[LftpJobStatus.TransferState]:
+        # Lookup used before the transfer states were indexed by path
+        return next((ts for n, ts in status.get_active_file_transfer_states() if n == filename), None)
+
+    def __compare(self, description: str, build):
+        """
+        Time the build with the indexed lookup and with the linear lookup,
+        and check that the indexed lookup is faster
+        """
+        linear_patch = patch.object(LftpJobStatus, "get_active_file_transfer_state",
+                                    TestModelBuilderBenchmark.__linear_transfer_state)
+        with linear_patch:
+            self.__assert_downloading(build())
+        # Alternate between the two, so that both see the same system load
+        indexed_times = []
+        linear_times = []
+        for _ in range(TestModelBuilderBenchmark.NUM_REPEATS):
+            indexed_times.append(self.__time(build))
+            with linear_patch:
+                linear_times.append(self.__time(build))
+        indexed_time = min(indexed_times)
+        linear_time = min(linear_times)
+        self.logger.info("{} of a mirror with {} files and {} active transfers: "
+                         "{:.2f}ms indexed, {:.2f}ms linear ({:.1f}x)".format(
+                             description,
+                             len(self.paths),
+                             TestModelBuilderBenchmark.NUM_ACTIVE_FILES,
+                             indexed_time * 1000,
+                             linear_time * 1000,
+                             linear_time / indexed_time
+                         ))
+        self.assertLess(indexed_time, linear_time)
+
+    def __assert_downloading(self, model):
+        downloading = [f for d in model.get_file("mirror").get_children() for f in d.get_children()
+                       if f.state == ModelFile.State.DOWNLOADING]
+        self.assertEqual(TestModelBuilderBenchmark.NUM_ACTIVE_FILES, len(downloading))
+
+    def test_build_model(self):
+        status = self.__create_status(speed=10)
+
+        def build():
+            # Clear so that every file is built again
+            self.model_builder.clear()
+            self.model_builder.set_remote_files([self.remote_file])
+            self.model_builder.set_local_files([self.local_file])
+            self.model_builder.set_lftp_statuses([status])
+            return self.model_builder.build_model()
+
+        self.__assert_downloading(build())
+        self.__compare("Build", build)
+
+    def test_build_model_status_update(self):
+        # Only the transfer states change between builds, as while downloading
+        statuses = [self.__create_status(speed=10), self.__create_status(speed=20)]
+        self.model_builder.set_remote_files([self.remote_file])
+        self.model_builder.set_local_files([self.local_file])
+        updates = [0]
+
+        def build():
+            updates[0] += 1
+            self.model_builder.set_lftp_statuses([statuses[updates[0] % 2]])
+            return self.model_builder.build_model()
+
+        self.__assert_downloading(build())
+        self.__compare("Status update", build)
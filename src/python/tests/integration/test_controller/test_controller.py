@@ -17,8 +17,9 @@ import timeout_decorator
 
 from tests.utils import TestUtils
 from common import overrides, Context, Config, Args, AppError, Localization, Status
-from controller import Controller, ControllerPersist
+from controller import Controller, ControllerPersist, ControllerSnapshot
 from model import ModelFile, IModelListener
+from system import SystemFile
 
 
 class DummyListener(IModelListener):
@@ -302,6 +303,7 @@ class TestController(unittest.TestCase):
                 "local_path": os.path.join(self.temp_dir, "local"),
                 "remote_path_to_scan_script": remote_exe_path,
                 "use_ssh_key": "True",
+                "use_ssh_multiplexing": "False",
                 "num_max_parallel_downloads": "1",
                 "num_max_parallel_files_per_download": "3",
                 "num_max_connections_per_root_file": "4",
@@ -313,8 +315,14 @@ class TestController(unittest.TestCase):
                 "interval_ms_remote_scan": "100",
                 "interval_ms_local_scan": "100",
                 "interval_ms_downloading_scan": "100",
+                "interval_ms_max_idle_scan": "100",
+                "use_remote_scan_backoff": "False",
                 "extract_path": "/unused/path",
-                "use_local_path_as_extract_path": True
+                "use_local_path_as_extract_path": True,
+                "num_local_scan_workers": "2",
+                "use_local_watch": "False",
+                "use_remote_scan_agent": "True",
+                "use_remote_watch": "False"
             },
             "Web": {
                 "port": "8800",
@@ -456,6 +464,48 @@ class TestController(unittest.TestCase):
             self.assertEqual([self.initial_state[filename]], [files_dict[filename]],
                              "Mismatch in file: {}".format(filename))
 
+    @timeout_decorator.timeout(20)
+    def test_initial_model_from_snapshot(self):
+        snapshot = ControllerSnapshot()
+        self.controller = Controller(self.context, self.controller_persist, snapshot)
+        self.assertFalse(self.controller.is_model_from_snapshot())
+        self.controller.start()
+        # wait for initial scan
+        self.__wait_for_initial_model()
+        while not snapshot.has_files():
+            self.controller.process()
+        self.controller.exit()
+
+        # Model is available before the controller is started
+        snapshot = ControllerSnapshot.from_str(snapshot.to_str())
+        self.controller = Controller(self.context, self.controller_persist, snapshot)
+        model_files = self.controller.get_model_files()
+        files_dict = {f.name: f for f in model_files}
+        self.assertEqual(self.initial_state.keys(), files_dict.keys())
+        for filename in self.initial_state.keys():
+            # Note: put items in a list for a better diff output
+            self.assertEqual([self.initial_state[filename]], [files_dict[filename]],
+                             "Mismatch in file: {}".format(filename))
+
+        # Until the new scans are in
+        self.assertTrue(self.controller.is_model_from_snapshot())
+        self.controller.start()
+        while self.controller.is_model_from_snapshot():
+            self.controller.process()
+
+    @timeout_decorator.timeout(20)
+    def test_initial_model_ignores_snapshot_of_other_path(self):
+        snapshot = ControllerSnapshot()
+        snapshot.local_path = "/some/other/path"
+        snapshot.remote_address = self.context.config.lftp.remote_address
+        snapshot.remote_path = self.context.config.lftp.remote_path
+        snapshot.local_files = [SystemFile("a", 1, False)]
+        snapshot.remote_files = [SystemFile("a", 1, False)]
+        self.controller = Controller(self.context, self.controller_persist, snapshot)
+        self.assertEqual([], self.controller.get_model_files())
+        self.assertFalse(snapshot.has_files())
+        self.assertFalse(self.controller.is_model_from_snapshot())
+
     @timeout_decorator.timeout(20)
     def test_local_file_added(self):
         self.controller = Controller(self.context, self.controller_persist)
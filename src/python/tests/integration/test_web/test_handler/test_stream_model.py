@@ -6,7 +6,7 @@ from threading import Timer
 
 from tests.integration.test_web.test_web_app import BaseTestWebApp
 from web.serialize import SerializeModel
-from model import ModelFile
+from model import ModelFile, ModelChange, ModelFilePatch
 
 
 class TestModelStreamHandler(BaseTestWebApp):
@@ -15,7 +15,8 @@ class TestModelStreamHandler(BaseTestWebApp):
         Timer(0.5, self.web_app.stop).start()
 
         self.test_app.get("/server/stream")
-        self.controller.get_model_files_and_add_listener.assert_called_once_with(unittest.mock.ANY)
+        self.controller.get_model_version_and_files_and_add_listener.assert_called_once_with(unittest.mock.ANY)
+        self.controller.get_model_changes_and_add_listener.assert_not_called()
 
     def test_stream_model_removes_listener(self):
         # Schedule server stop
@@ -37,7 +38,7 @@ class TestModelStreamHandler(BaseTestWebApp):
         self.model_files = [ModelFile("a", True), ModelFile("b", False)]
 
         self.test_app.get("/server/stream")
-        mock_serialize.model.assert_called_once_with([ModelFile("a", True), ModelFile("b", False)])
+        mock_serialize.model.assert_called_once_with([ModelFile("a", True), ModelFile("b", False)], 100)
 
     @patch("web.handler.stream_model.SerializeModel")
     def test_stream_model_serializes_updates(self, mock_serialize_model_cls):
@@ -48,6 +49,7 @@ class TestModelStreamHandler(BaseTestWebApp):
         mock_serialize = mock_serialize_model_cls.return_value
         mock_serialize.model.return_value = "\n"
         mock_serialize.update_event.return_value = "\n"
+        mock_serialize.file_patches.return_value = "\n"
         # Use the real UpdateEvent class
         mock_serialize_model_cls.UpdateEvent = SerializeModel.UpdateEvent
 
@@ -58,23 +60,84 @@ class TestModelStreamHandler(BaseTestWebApp):
         old_file.local_size = 100
         new_file = ModelFile("c", False)
         new_file.local_size = 200
+        patches = [ModelFilePatch(ModelFilePatch.Change.UPDATED, "c", fields={"local_size": 200})]
 
         def send_updates():
             self.assertIsNotNone(self.model_listener)
             self.model_listener.file_added(added_file)
+            self.model_listener.model_changed(ModelChange(101, "a", new_file=added_file))
             self.model_listener.file_removed(removed_file)
+            self.model_listener.model_changed(ModelChange(102, "b", old_file=removed_file))
             self.model_listener.file_updated(old_file, new_file)
+            self.model_listener.model_changed(ModelChange(103, "c", patches=patches))
         Timer(0.5, send_updates).start()
 
         self.test_app.get("/server/stream")
-        self.assertEqual(3, len(mock_serialize.update_event.call_args_list))
-        call1, call2, call3 = mock_serialize.update_event.call_args_list
+        self.assertEqual(2, len(mock_serialize.update_event.call_args_list))
+        call1, call2 = mock_serialize.update_event.call_args_list
         self.assertEqual(SerializeModel.UpdateEvent.Change.ADDED, call1[0][0].change)
         self.assertEqual(None, call1[0][0].old_file)
         self.assertEqual(added_file, call1[0][0].new_file)
+        self.assertEqual(101, call1[0][1])
         self.assertEqual(SerializeModel.UpdateEvent.Change.REMOVED, call2[0][0].change)
         self.assertEqual(removed_file, call2[0][0].old_file)
         self.assertEqual(None, call2[0][0].new_file)
-        self.assertEqual(SerializeModel.UpdateEvent.Change.UPDATED, call3[0][0].change)
-        self.assertEqual(old_file, call3[0][0].old_file)
-        self.assertEqual(new_file, call3[0][0].new_file)
+        self.assertEqual(102, call2[0][1])
+        # Updates are sent as the model's patches
+        mock_serialize.file_patches.assert_called_once_with("c", patches, 103)
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_stream_model_resumes_from_version(self, mock_serialize_model_cls):
+        # Schedule server stop
+        Timer(0.5, self.web_app.stop).start()
+
+        # Setup mock serialize instance
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.model.return_value = "\n"
+        mock_serialize.resumed.return_value = "\n"
+        mock_serialize.update_event.return_value = "\n"
+        mock_serialize.file_patches.return_value = "\n"
+        # Use the real UpdateEvent class
+        mock_serialize_model_cls.UpdateEvent = SerializeModel.UpdateEvent
+
+        added_file = ModelFile("a", True)
+        removed_file = ModelFile("b", False)
+        patches = [ModelFilePatch(ModelFilePatch.Change.UPDATED, "c", fields={"local_size": 200})]
+        self.model_changes = [
+            ModelChange(51, "a", new_file=added_file),
+            ModelChange(52, "b", old_file=removed_file),
+            ModelChange(53, "c", patches=patches)
+        ]
+
+        self.test_app.get("/server/stream?model_version=50")
+        self.controller.get_model_changes_and_add_listener.assert_called_once_with(unittest.mock.ANY, 50)
+        self.controller.get_model_version_and_files_and_add_listener.assert_not_called()
+        mock_serialize.model.assert_not_called()
+        mock_serialize.resumed.assert_called_once_with(50)
+        self.assertEqual(2, len(mock_serialize.update_event.call_args_list))
+        call1, call2 = mock_serialize.update_event.call_args_list
+        self.assertEqual(SerializeModel.UpdateEvent.Change.ADDED, call1[0][0].change)
+        self.assertEqual(added_file, call1[0][0].new_file)
+        self.assertEqual(51, call1[0][1])
+        self.assertEqual(SerializeModel.UpdateEvent.Change.REMOVED, call2[0][0].change)
+        self.assertEqual(removed_file, call2[0][0].old_file)
+        self.assertEqual(52, call2[0][1])
+        # Updates are kept as patches
+        mock_serialize.file_patches.assert_called_once_with("c", patches, 53)
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_stream_model_sends_model_if_version_is_evicted(self, mock_serialize_model_cls):
+        # Schedule server stop
+        Timer(0.5, self.web_app.stop).start()
+
+        # Setup mock serialize instance
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.model.return_value = "\n"
+
+        self.model_files = [ModelFile("a", True)]
+        self.model_changes = None
+
+        self.test_app.get("/server/stream?model_version=50")
+        self.controller.get_model_changes_and_add_listener.assert_called_once_with(unittest.mock.ANY, 50)
+        mock_serialize.resumed.assert_not_called()
+        mock_serialize.model.assert_called_once_with([ModelFile("a", True)], 100)
@@ -33,6 +33,9 @@ class BaseTestWebApp(unittest.TestCase):
 
         # Model files
         self.model_files = []
+        self.model_version = 100
+        # Model changes since a version, None if not available
+        self.model_changes = None
 
         # Real status
         self.context.status = Status()
@@ -46,10 +49,17 @@ class BaseTestWebApp(unittest.TestCase):
         # Capture the model listener
         def capture_listener(listener):
             self.model_listener = listener
-            return self.model_files
+            return self.model_version, self.model_files
+
+        def capture_listener_for_changes(listener, _):
+            if self.model_changes is not None:
+                self.model_listener = listener
+            return self.model_changes
         self.model_listener = None
-        self.controller.get_model_files_and_add_listener = MagicMock()
-        self.controller.get_model_files_and_add_listener.side_effect = capture_listener
+        self.controller.get_model_version_and_files_and_add_listener = MagicMock()
+        self.controller.get_model_version_and_files_and_add_listener.side_effect = capture_listener
+        self.controller.get_model_changes_and_add_listener = MagicMock()
+        self.controller.get_model_changes_and_add_listener.side_effect = capture_listener_for_changes
         self.controller.remove_model_listener = MagicMock()
 
         # noinspection PyTypeChecker
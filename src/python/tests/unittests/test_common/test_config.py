@@ -125,6 +125,20 @@ class TestConfig(unittest.TestCase):
             cls.from_dict(bad_dict)
         self.assertTrue(str(error.exception).startswith("Missing config"))
 
+    def __check_missing_default(self, cls, good_dict, key, default):
+        """
+        Helper method to check that a config class uses the default value
+        for a missing key
+        :param cls:
+        :param good_dict:
+        :param key:
+        :param default:
+        :return:
+        """
+        bad_dict = dict(good_dict)
+        del bad_dict[key]
+        self.assertEqual(default, getattr(cls.from_dict(bad_dict), key))
+
     def __check_empty_error(self, cls, good_dict, key):
         """
         Helper method to check that a config class raises an error on
@@ -144,20 +158,26 @@ class TestConfig(unittest.TestCase):
             cls.from_dict(bad_dict)
         self.assertTrue(str(error.exception).startswith("Bad config"))
 
-    def check_common(self, cls, good_dict, keys):
+    def check_common(self, cls, good_dict, keys, defaults=None):
         """
         Helper method to run some common checks
         :param cls:
         :param good_dict:
         :param keys:
+        :param defaults: default values of the keys that have one
         :return:
         """
+        defaults = defaults or {}
+
         # unknown
         self.__check_unknown_error(cls, good_dict)
 
         for key in keys:
             # missing key
-            self.__check_missing_error(cls, good_dict, key)
+            if key in defaults:
+                self.__check_missing_default(cls, good_dict, key, defaults[key])
+            else:
+                self.__check_missing_error(cls, good_dict, key)
             # empty value
             self.__check_empty_error(cls, good_dict, key)
 
@@ -220,6 +240,7 @@ class TestConfig(unittest.TestCase):
             "local_path": "/path/on/local/server",
             "remote_path_to_scan_script": "/path/on/remote/server/to/scan/script",
             "use_ssh_key": "False",
+            "use_ssh_multiplexing": "True",
             "num_max_parallel_downloads": "2",
             "num_max_parallel_files_per_download": "3",
             "num_max_connections_per_root_file": "4",
@@ -236,6 +257,7 @@ class TestConfig(unittest.TestCase):
         self.assertEqual("/path/on/local/server", lftp.local_path)
         self.assertEqual("/path/on/remote/server/to/scan/script", lftp.remote_path_to_scan_script)
         self.assertEqual(False, lftp.use_ssh_key)
+        self.assertEqual(True, lftp.use_ssh_multiplexing)
         self.assertEqual(2, lftp.num_max_parallel_downloads)
         self.assertEqual(3, lftp.num_max_parallel_files_per_download)
         self.assertEqual(4, lftp.num_max_connections_per_root_file)
@@ -254,12 +276,16 @@ class TestConfig(unittest.TestCase):
                               "local_path",
                               "remote_path_to_scan_script",
                               "use_ssh_key",
+                              "use_ssh_multiplexing",
                               "num_max_parallel_downloads",
                               "num_max_parallel_files_per_download",
                               "num_max_connections_per_root_file",
                               "num_max_connections_per_dir_file",
                               "num_max_total_connections",
                               "use_temp_file"
+                          },
+                          {
+                              "use_ssh_multiplexing": False
                           })
 
         # bad values
@@ -267,6 +293,8 @@ class TestConfig(unittest.TestCase):
         self.check_bad_value_error(Config.Lftp, good_dict, "remote_port", "0")
         self.check_bad_value_error(Config.Lftp, good_dict, "use_ssh_key", "-1")
         self.check_bad_value_error(Config.Lftp, good_dict, "use_ssh_key", "SomeString")
+        self.check_bad_value_error(Config.Lftp, good_dict, "use_ssh_multiplexing", "-1")
+        self.check_bad_value_error(Config.Lftp, good_dict, "use_ssh_multiplexing", "SomeString")
         self.check_bad_value_error(Config.Lftp, good_dict, "num_max_parallel_downloads", "-1")
         self.check_bad_value_error(Config.Lftp, good_dict, "num_max_parallel_downloads", "0")
         self.check_bad_value_error(Config.Lftp, good_dict, "num_max_parallel_files_per_download", "-1")
@@ -284,15 +312,27 @@ class TestConfig(unittest.TestCase):
             "interval_ms_remote_scan": "30000",
             "interval_ms_local_scan": "10000",
             "interval_ms_downloading_scan": "2000",
+            "interval_ms_max_idle_scan": "600000",
+            "use_remote_scan_backoff": "True",
             "extract_path": "/extract/path",
-            "use_local_path_as_extract_path": "True"
+            "use_local_path_as_extract_path": "True",
+            "num_local_scan_workers": "4",
+            "use_local_watch": "True",
+            "use_remote_scan_agent": "False",
+            "use_remote_watch": "True"
         }
         controller = Config.Controller.from_dict(good_dict)
         self.assertEqual(30000, controller.interval_ms_remote_scan)
         self.assertEqual(10000, controller.interval_ms_local_scan)
         self.assertEqual(2000, controller.interval_ms_downloading_scan)
+        self.assertEqual(600000, controller.interval_ms_max_idle_scan)
+        self.assertEqual(True, controller.use_remote_scan_backoff)
         self.assertEqual("/extract/path", controller.extract_path)
         self.assertEqual(True, controller.use_local_path_as_extract_path)
+        self.assertEqual(4, controller.num_local_scan_workers)
+        self.assertEqual(True, controller.use_local_watch)
+        self.assertEqual(False, controller.use_remote_scan_agent)
+        self.assertEqual(True, controller.use_remote_watch)
 
         self.check_common(Config.Controller,
                           good_dict,
@@ -300,8 +340,22 @@ class TestConfig(unittest.TestCase):
                               "interval_ms_remote_scan",
                               "interval_ms_local_scan",
                               "interval_ms_downloading_scan",
+                              "interval_ms_max_idle_scan",
+                              "use_remote_scan_backoff",
                               "extract_path",
-                              "use_local_path_as_extract_path"
+                              "use_local_path_as_extract_path",
+                              "num_local_scan_workers",
+                              "use_local_watch",
+                              "use_remote_scan_agent",
+                              "use_remote_watch"
+                          },
+                          {
+                              "interval_ms_max_idle_scan": 300000,
+                              "use_remote_scan_backoff": False,
+                              "num_local_scan_workers": 4,
+                              "use_local_watch": False,
+                              "use_remote_scan_agent": False,
+                              "use_remote_watch": False
                           })
 
         # bad values
@@ -311,8 +365,17 @@ class TestConfig(unittest.TestCase):
         self.check_bad_value_error(Config.Controller, good_dict, "interval_ms_local_scan", "0")
         self.check_bad_value_error(Config.Controller, good_dict, "interval_ms_downloading_scan", "-1")
         self.check_bad_value_error(Config.Controller, good_dict, "interval_ms_downloading_scan", "0")
+        self.check_bad_value_error(Config.Controller, good_dict, "interval_ms_max_idle_scan", "-1")
+        self.check_bad_value_error(Config.Controller, good_dict, "interval_ms_max_idle_scan", "0")
+        self.check_bad_value_error(Config.Controller, good_dict, "use_remote_scan_backoff", "SomeString")
         self.check_bad_value_error(Config.Controller, good_dict, "use_local_path_as_extract_path", "SomeString")
         self.check_bad_value_error(Config.Controller, good_dict, "use_local_path_as_extract_path", "-1")
+        self.check_bad_value_error(Config.Controller, good_dict, "num_local_scan_workers", "-1")
+        self.check_bad_value_error(Config.Controller, good_dict, "num_local_scan_workers", "0")
+        self.check_bad_value_error(Config.Controller, good_dict, "use_local_watch", "SomeString")
+        self.check_bad_value_error(Config.Controller, good_dict, "use_remote_scan_agent", "-1")
+        self.check_bad_value_error(Config.Controller, good_dict, "use_remote_scan_agent", "SomeString")
+        self.check_bad_value_error(Config.Controller, good_dict, "use_remote_watch", "SomeString")
 
     def test_web(self):
         good_dict = {
@@ -375,6 +438,7 @@ class TestConfig(unittest.TestCase):
         local_path=/path/on/local/server
         remote_path_to_scan_script=/path/on/remote/server/to/scan/script
         use_ssh_key=True
+        use_ssh_multiplexing=False
         num_max_parallel_downloads=2
         num_max_parallel_files_per_download=3
         num_max_connections_per_root_file=4
@@ -386,8 +450,14 @@ class TestConfig(unittest.TestCase):
         interval_ms_remote_scan=30000
         interval_ms_local_scan=10000
         interval_ms_downloading_scan=2000
+        interval_ms_max_idle_scan=600000
+        use_remote_scan_backoff=True
         extract_path=/path/where/to/extract/stuff
         use_local_path_as_extract_path=False
+        num_local_scan_workers=3
+        use_local_watch=False
+        use_remote_scan_agent=True
+        use_remote_watch=False
 
         [Web]
         port=88
@@ -411,6 +481,7 @@ class TestConfig(unittest.TestCase):
         self.assertEqual("/path/on/local/server", config.lftp.local_path)
         self.assertEqual("/path/on/remote/server/to/scan/script", config.lftp.remote_path_to_scan_script)
         self.assertEqual(True, config.lftp.use_ssh_key)
+        self.assertEqual(False, config.lftp.use_ssh_multiplexing)
         self.assertEqual(2, config.lftp.num_max_parallel_downloads)
         self.assertEqual(3, config.lftp.num_max_parallel_files_per_download)
         self.assertEqual(4, config.lftp.num_max_connections_per_root_file)
@@ -421,8 +492,14 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(30000, config.controller.interval_ms_remote_scan)
         self.assertEqual(10000, config.controller.interval_ms_local_scan)
         self.assertEqual(2000, config.controller.interval_ms_downloading_scan)
+        self.assertEqual(600000, config.controller.interval_ms_max_idle_scan)
+        self.assertEqual(True, config.controller.use_remote_scan_backoff)
         self.assertEqual("/path/where/to/extract/stuff", config.controller.extract_path)
         self.assertEqual(False, config.controller.use_local_path_as_extract_path)
+        self.assertEqual(3, config.controller.num_local_scan_workers)
+        self.assertEqual(False, config.controller.use_local_watch)
+        self.assertEqual(True, config.controller.use_remote_scan_agent)
+        self.assertEqual(False, config.controller.use_remote_watch)
 
         self.assertEqual(88, config.web.port)
 
@@ -444,6 +521,71 @@ class TestConfig(unittest.TestCase):
         config_file.close()
         os.remove(config_file.name)
 
+    def test_from_file_without_newer_options(self):
+        # Config file written before the scanner options were added
+        config_file = open(tempfile.mktemp(suffix="test_config"), "w")
+
+        config_file.write("""
+        [General]
+        debug=False
+        verbose=True
+
+        [Lftp]
+        remote_address=remote.server.com
+        remote_username=remote-user
+        remote_password=remote-pass
+        remote_port = 3456
+        remote_path=/path/on/remote/server
+        local_path=/path/on/local/server
+        remote_path_to_scan_script=/path/on/remote/server/to/scan/script
+        use_ssh_key=True
+        num_max_parallel_downloads=2
+        num_max_parallel_files_per_download=3
+        num_max_connections_per_root_file=4
+        num_max_connections_per_dir_file=5
+        num_max_total_connections=7
+        use_temp_file=False
+
+        [Controller]
+        interval_ms_remote_scan=30000
+        interval_ms_local_scan=10000
+        interval_ms_downloading_scan=2000
+        extract_path=/path/where/to/extract/stuff
+        use_local_path_as_extract_path=False
+
+        [Web]
+        port=88
+
+        [AutoQueue]
+        enabled=False
+        patterns_only=True
+        auto_extract=True
+        """)
+        config_file.flush()
+        config = Config.from_file(config_file.name)
+
+        # Existing options are kept
+        self.assertEqual("remote.server.com", config.lftp.remote_address)
+        self.assertEqual("remote-user", config.lftp.remote_username)
+        self.assertEqual("remote-pass", config.lftp.remote_password)
+        self.assertEqual("/path/on/remote/server", config.lftp.remote_path)
+        self.assertEqual("/path/on/local/server", config.lftp.local_path)
+        self.assertEqual(30000, config.controller.interval_ms_remote_scan)
+        self.assertEqual(88, config.web.port)
+
+        # Newer options get their defaults
+        self.assertEqual(False, config.lftp.use_ssh_multiplexing)
+        self.assertEqual(300000, config.controller.interval_ms_max_idle_scan)
+        self.assertEqual(False, config.controller.use_remote_scan_backoff)
+        self.assertEqual(4, config.controller.num_local_scan_workers)
+        self.assertEqual(False, config.controller.use_local_watch)
+        self.assertEqual(False, config.controller.use_remote_scan_agent)
+        self.assertEqual(False, config.controller.use_remote_watch)
+
+        # Remove config file
+        config_file.close()
+        os.remove(config_file.name)
+
     def test_to_file(self):
         config_file_path = tempfile.mktemp(suffix="test_config")
 
@@ -458,6 +600,7 @@ class TestConfig(unittest.TestCase):
         config.lftp.local_path = "/local/server/path"
         config.lftp.remote_path_to_scan_script = "/remote/server/path/to/script"
         config.lftp.use_ssh_key = True
+        config.lftp.use_ssh_multiplexing = True
         config.lftp.num_max_parallel_downloads = 6
         config.lftp.num_max_parallel_files_per_download = 7
         config.lftp.num_max_connections_per_root_file = 2
@@ -467,8 +610,14 @@ class TestConfig(unittest.TestCase):
         config.controller.interval_ms_remote_scan = 1234
         config.controller.interval_ms_local_scan = 5678
         config.controller.interval_ms_downloading_scan = 9012
+        config.controller.interval_ms_max_idle_scan = 3456
+        config.controller.use_remote_scan_backoff = True
         config.controller.extract_path = "/path/extract/stuff"
         config.controller.use_local_path_as_extract_path = True
+        config.controller.num_local_scan_workers = 5
+        config.controller.use_local_watch = True
+        config.controller.use_remote_scan_agent = False
+        config.controller.use_remote_watch = True
         config.web.port = 13
         config.autoqueue.enabled = True
         config.autoqueue.patterns_only = True
@@ -492,6 +641,7 @@ class TestConfig(unittest.TestCase):
         local_path = /local/server/path
         remote_path_to_scan_script = /remote/server/path/to/script
         use_ssh_key = True
+        use_ssh_multiplexing = True
         num_max_parallel_downloads = 6
         num_max_parallel_files_per_download = 7
         num_max_connections_per_root_file = 2
@@ -503,8 +653,14 @@ class TestConfig(unittest.TestCase):
         interval_ms_remote_scan = 1234
         interval_ms_local_scan = 5678
         interval_ms_downloading_scan = 9012
+        interval_ms_max_idle_scan = 3456
+        use_remote_scan_backoff = True
         extract_path = /path/extract/stuff
         use_local_path_as_extract_path = True
+        num_local_scan_workers = 5
+        use_local_watch = True
+        use_remote_scan_agent = False
+        use_remote_watch = True
 
         [Web]
         port = 13
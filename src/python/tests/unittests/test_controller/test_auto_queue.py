@@ -309,6 +309,7 @@ class TestAutoQueue(unittest.TestCase):
         self.controller = MagicMock()
         self.controller.get_model_files_and_add_listener = MagicMock()
         self.controller.queue_command = MagicMock()
+        self.controller.is_model_from_snapshot.return_value = False
         self.model_listener = None
         self.initial_model = []
 
@@ -366,6 +367,23 @@ class TestAutoQueue(unittest.TestCase):
         self.assertEqual(set([Controller.Command.Action.QUEUE]*3), {c.action for c in commands})
         self.assertEqual({"File.One", "File.Two", "File.Three"}, {c.filename for c in commands})
 
+    def test_waits_for_remote_files_while_there_are_patterns(self):
+        persist = AutoQueuePersist()
+        # noinspection PyTypeChecker
+        auto_queue = AutoQueue(self.context, persist, self.controller)
+        auto_queue.process()
+        self.controller.set_waiting_for_remote_files.assert_called_with(False)
+        persist.add_pattern(AutoQueuePattern(pattern="File.One"))
+        auto_queue.process()
+        self.controller.set_waiting_for_remote_files.assert_called_with(True)
+
+        # Without patterns only, every new file is queued
+        self.context.config.autoqueue.patterns_only = False
+        # noinspection PyTypeChecker
+        auto_queue = AutoQueue(self.context, AutoQueuePersist(), self.controller)
+        auto_queue.process()
+        self.controller.set_waiting_for_remote_files.assert_called_with(True)
+
     def test_matching_initial_files_are_queued(self):
         persist = AutoQueuePersist()
         persist.add_pattern(AutoQueuePattern(pattern="File.One"))
@@ -396,6 +414,44 @@ class TestAutoQueue(unittest.TestCase):
         self.assertEqual(set([Controller.Command.Action.QUEUE]*3), {c.action for c in commands})
         self.assertEqual({"File.One", "File.Two", "File.Three"}, {c.filename for c in commands})
 
+    def test_files_are_not_queued_until_model_is_scanned(self):
+        persist = AutoQueuePersist()
+        persist.add_pattern(AutoQueuePattern(pattern="File.One"))
+        persist.add_pattern(AutoQueuePattern(pattern="File.Two"))
+
+        # File.One is in the snapshot, but deleted from the remote since
+        file_one = ModelFile("File.One", True)
+        file_one.remote_size = 100
+        self.initial_model = [file_one]
+        self.controller.is_model_from_snapshot.return_value = True
+
+        # noinspection PyTypeChecker
+        auto_queue = AutoQueue(self.context, persist, self.controller)
+        auto_queue.process()
+        file_two = ModelFile("File.Two", True)
+        file_two.remote_size = 200
+        self.model_listener.file_added(file_two)
+        auto_queue.process()
+        self.controller.queue_command.assert_not_called()
+
+        # Only the scanned files are queued, including those that were
+        # already in the snapshot
+        file_two_scanned = ModelFile("File.Two", True)
+        file_two_scanned.remote_size = 200
+        self.initial_model = [file_two_scanned]
+        self.controller.is_model_from_snapshot.return_value = False
+        auto_queue.process()
+        calls = self.controller.queue_command.call_args_list
+        self.assertEqual(1, len(calls))
+        command = calls[0][0][0]
+        self.assertEqual(Controller.Command.Action.QUEUE, command.action)
+        self.assertEqual("File.Two", command.filename)
+
+        # Later files are queued from the model events as usual
+        self.controller.queue_command.reset_mock()
+        auto_queue.process()
+        self.controller.queue_command.assert_not_called()
+
     def test_matching_is_case_insensitive(self):
         persist = AutoQueuePersist()
         persist.add_pattern(AutoQueuePattern(pattern="FiLe.oNe"))
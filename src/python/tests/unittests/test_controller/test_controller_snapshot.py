@@ -0,0 +1,117 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+import json
+import sys
+
+from common import PersistError
+from system import SystemFile
+from controller import ControllerSnapshot
+
+
+class TestControllerSnapshot(unittest.TestCase):
+    @staticmethod
+    def __create_snapshot() -> ControllerSnapshot:
+        snapshot = ControllerSnapshot()
+        snapshot.local_path = "/local/path"
+        snapshot.remote_address = "remote.address"
+        snapshot.remote_path = "/remote/path"
+        a = SystemFile("a", 300, True)
+        a.add_child(SystemFile("aa", 100, False))
+        a.add_child(SystemFile("ab", 200, False))
+        snapshot.local_files = [a, SystemFile("b", 50, False)]
+        snapshot.remote_files = [SystemFile("c", 10, False), SystemFile("th ree", 20, False)]
+        return snapshot
+
+    def test_has_files(self):
+        snapshot = ControllerSnapshot()
+        self.assertFalse(snapshot.has_files())
+        snapshot.local_files = []
+        self.assertFalse(snapshot.has_files())
+        snapshot.remote_files = []
+        self.assertTrue(snapshot.has_files())
+        snapshot.local_files = None
+        self.assertFalse(snapshot.has_files())
+
+    def test_version(self):
+        snapshot = ControllerSnapshot()
+        version = snapshot.version
+        snapshot.to_str()
+        self.assertEqual(version, snapshot.version)
+        snapshot.local_files = []
+        self.assertNotEqual(version, snapshot.version)
+        version = snapshot.version
+        snapshot.remote_files = []
+        self.assertNotEqual(version, snapshot.version)
+
+    def test_to_str(self):
+        snapshot = TestControllerSnapshot.__create_snapshot()
+        dct = json.loads(snapshot.to_str())
+        self.assertEqual(sys.byteorder, dct["byte_order"])
+        self.assertEqual("/local/path", dct["local_path"])
+        self.assertEqual("remote.address", dct["remote_address"])
+        self.assertEqual("/remote/path", dct["remote_path"])
+        self.assertTrue("local_files" in dct)
+        self.assertTrue("remote_files" in dct)
+
+    def test_to_and_from_str(self):
+        snapshot = TestControllerSnapshot.__create_snapshot()
+        snapshot_actual = ControllerSnapshot.from_str(snapshot.to_str())
+        self.assertEqual("/local/path", snapshot_actual.local_path)
+        self.assertEqual("remote.address", snapshot_actual.remote_address)
+        self.assertEqual("/remote/path", snapshot_actual.remote_path)
+        self.assertEqual(snapshot.local_files, snapshot_actual.local_files)
+        self.assertEqual(snapshot.remote_files, snapshot_actual.remote_files)
+        self.assertEqual(["aa", "ab"], [f.name for f in snapshot_actual.local_files[0].children])
+
+    def test_to_and_from_str_without_files(self):
+        snapshot = ControllerSnapshot()
+        snapshot.remote_files = []
+        snapshot_actual = ControllerSnapshot.from_str(snapshot.to_str())
+        self.assertIsNone(snapshot_actual.local_path)
+        self.assertIsNone(snapshot_actual.local_files)
+        self.assertEqual([], snapshot_actual.remote_files)
+
+    def test_to_str_after_files_change(self):
+        snapshot = TestControllerSnapshot.__create_snapshot()
+        snapshot.to_str()
+        snapshot.local_files = [SystemFile("d", 1, False)]
+        snapshot_actual = ControllerSnapshot.from_str(snapshot.to_str())
+        self.assertEqual([SystemFile("d", 1, False)], snapshot_actual.local_files)
+        self.assertEqual(snapshot.remote_files, snapshot_actual.remote_files)
+
+    def test_persist_read_error(self):
+        content = TestControllerSnapshot.__create_snapshot().to_str()
+
+        # other byte order
+        dct = json.loads(content)
+        dct["byte_order"] = "big" if sys.byteorder == "little" else "little"
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str(json.dumps(dct))
+
+        # missing keys
+        for key in ["byte_order", "local_path", "remote_address", "remote_path", "local_files", "remote_files"]:
+            dct = json.loads(content)
+            del dct[key]
+            with self.assertRaises(PersistError):
+                ControllerSnapshot.from_str(json.dumps(dct))
+
+        # corrupted files
+        dct = json.loads(content)
+        dct["local_files"] = "bad files"
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str(json.dumps(dct))
+        dct["local_files"] = dct["remote_files"][:-8]
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str(json.dumps(dct))
+        dct["local_files"] = 42
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str(json.dumps(dct))
+
+        # empty json
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str("")
+
+        # malformed
+        with self.assertRaises(PersistError):
+            ControllerSnapshot.from_str("{")
@@ -87,6 +87,140 @@ class TestModelBuilder(unittest.TestCase):
         model = self.model_builder.build_model()
         self.assertEqual({"a", "b", "c", "d"}, model.get_file_names())
 
+    def test_build_merges_single_file_scans(self):
+        self.model_builder.set_remote_files([SystemFile("a", 10, False), SystemFile("b", 20, False)])
+        self.model_builder.set_local_files([SystemFile("a", 10, False), SystemFile("b", 20, False)])
+
+        # Local b deleted
+        self.model_builder.set_local_file("b", None)
+        model = self.model_builder.build_model()
+        self.assertEqual({"a", "b"}, model.get_file_names())
+        self.assertEqual(10, model.get_file("a").local_size)
+        self.assertIsNone(model.get_file("b").local_size)
+        self.assertEqual(20, model.get_file("b").remote_size)
+
+        # Remote a deleted, remote c added
+        self.model_builder.set_remote_file("a", None)
+        self.model_builder.set_remote_file("c", SystemFile("c", 30, False))
+        model = self.model_builder.build_model()
+        self.assertEqual({"a", "b", "c"}, model.get_file_names())
+        self.assertIsNone(model.get_file("a").remote_size)
+        self.assertEqual(10, model.get_file("a").local_size)
+        self.assertEqual(30, model.get_file("c").remote_size)
+
+        # Removing a file that's not there is fine
+        self.model_builder.set_local_file("d", None)
+        model = self.model_builder.build_model()
+        self.assertEqual({"a", "b", "c"}, model.get_file_names())
+
+        # A full scan replaces the merged files
+        self.model_builder.set_remote_files([SystemFile("a", 10, False)])
+        model = self.model_builder.build_model()
+        self.assertEqual({"a"}, model.get_file_names())
+
+    def test_has_changes(self):
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+        self.assertFalse(self.model_builder.has_changes)
+
+        self.model_builder.set_remote_files([SystemFile("a", 10, False)])
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+        self.assertFalse(self.model_builder.has_changes)
+
+        self.model_builder.set_local_file("a", SystemFile("a", 10, False))
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+
+        # Setting the same files is not a change
+        self.model_builder.set_local_file("b", None)
+        self.model_builder.set_remote_files([SystemFile("a", 10, False)])
+        self.model_builder.set_downloaded_files(set())
+        self.assertFalse(self.model_builder.has_changes)
+
+        # Statuses that didn't change are ignored
+        s_a = LftpJobStatus(0, LftpJobStatus.Type.PGET, LftpJobStatus.State.QUEUED, "a", "")
+        self.model_builder.set_lftp_statuses([s_a])
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+        self.model_builder.set_lftp_statuses(
+            [LftpJobStatus(0, LftpJobStatus.Type.PGET, LftpJobStatus.State.QUEUED, "a", "")]
+        )
+        self.assertFalse(self.model_builder.has_changes)
+        self.model_builder.set_lftp_statuses([])
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+
+        self.model_builder.set_extract_statuses([ExtractStatus("a", False, ExtractStatus.State.EXTRACTING)])
+        self.assertTrue(self.model_builder.has_changes)
+        self.model_builder.build_model()
+        self.model_builder.set_extract_statuses([ExtractStatus("a", False, ExtractStatus.State.EXTRACTING)])
+        self.assertFalse(self.model_builder.has_changes)
+        self.model_builder.set_extract_statuses([])
+        self.assertTrue(self.model_builder.has_changes)
+
+    def test_build_rebuilds_only_changed_roots(self):
+        self.model_builder.set_remote_files([SystemFile("a", 10, False), SystemFile("b", 20, False)])
+        self.model_builder.set_local_files([SystemFile("a", 5, False)])
+        model = self.model_builder.build_model()
+        a = model.get_file("a")
+        b = model.get_file("b")
+
+        # Each source only rebuilds the roots it changed
+        s_b = LftpJobStatus(0, LftpJobStatus.Type.PGET, LftpJobStatus.State.QUEUED, "b", "")
+        self.model_builder.set_lftp_statuses([s_b])
+        model = self.model_builder.build_model()
+        self.assertIs(a, model.get_file("a"))
+        self.assertIsNot(b, model.get_file("b"))
+        self.assertEqual(ModelFile.State.QUEUED, model.get_file("b").state)
+
+        # Reused files are shared, so they must not be modifiable
+        self.assertTrue(a.is_frozen)
+        with self.assertRaises(TypeError):
+            a.state = ModelFile.State.DOWNLOADED
+        b = model.get_file("b")
+
+        self.model_builder.set_local_files([SystemFile("a", 10, False)])
+        model = self.model_builder.build_model()
+        self.assertIsNot(a, model.get_file("a"))
+        self.assertIs(b, model.get_file("b"))
+        self.assertEqual(ModelFile.State.DOWNLOADED, model.get_file("a").state)
+        a = model.get_file("a")
+
+        downloaded_files = {"a"}
+        self.model_builder.set_downloaded_files(downloaded_files)
+        self.model_builder.set_local_files([])
+        model = self.model_builder.build_model()
+        self.assertIs(b, model.get_file("b"))
+        self.assertEqual(ModelFile.State.DELETED, model.get_file("a").state)
+        a = model.get_file("a")
+
+        # The builder keeps its own copy of the set
+        downloaded_files.add("b")
+        model = self.model_builder.build_model()
+        self.assertIs(a, model.get_file("a"))
+        self.assertIs(b, model.get_file("b"))
+
+        self.model_builder.set_extracted_files({"b"})
+        self.model_builder.set_extract_statuses([ExtractStatus("a", False, ExtractStatus.State.EXTRACTING)])
+        model = self.model_builder.build_model()
+        self.assertIsNot(a, model.get_file("a"))
+        self.assertIsNot(b, model.get_file("b"))
+
+        # Removed roots are dropped
+        self.model_builder.set_remote_files([SystemFile("b", 20, False)])
+        self.model_builder.set_extract_statuses([])
+        model = self.model_builder.build_model()
+        self.assertEqual({"b"}, model.get_file_names())
+
+        # Everything is rebuilt after a clear
+        b = model.get_file("b")
+        self.model_builder.clear()
+        self.model_builder.set_remote_files([SystemFile("b", 20, False)])
+        model = self.model_builder.build_model()
+        self.assertIsNot(b, model.get_file("b"))
+        self.assertEqual(ModelFile.State.DEFAULT, model.get_file("b").state)
+
     def test_build_is_dir(self):
         # remote
         self.model_builder.clear()
@@ -641,6 +775,25 @@ class TestModelBuilder(unittest.TestCase):
         m_da = m_d_ch["da"]
         self.assertEqual((5678, None, None), (m_da.remote_size, m_da.local_size, m_da.transferred_size))
 
+    def test_build_children_file_counts(self):
+        def _counts(_file: ModelFile):
+            return _file.num_files, _file.num_remote_files, _file.num_downloaded_files
+
+        model = self.__build_test_model_children_tree_1()
+        m_a = model.get_file("a")
+        self.assertEqual((2, 2, 2), _counts(m_a))
+        m_a_ch = {m.name: m for m in model.get_file("a").get_children()}
+        self.assertEqual((0, 0, 0), _counts(m_a_ch["aa"]))
+        m_b = model.get_file("b")
+        self.assertEqual((4, 3, 1), _counts(m_b))
+        m_b_ch = {m.name: m for m in model.get_file("b").get_children()}
+        self.assertEqual((1, 1, 0), _counts(m_b_ch["ba"]))
+        self.assertEqual((1, 1, 0), _counts(m_b_ch["bb"]))
+        self.assertEqual((1, 0, 0), _counts(m_b_ch["bc"]))
+        self.assertEqual((0, 0, 0), _counts(m_b_ch["bd"]))
+        self.assertEqual((0, 0, 0), _counts(model.get_file("c")))
+        self.assertEqual((1, 1, 0), _counts(model.get_file("d")))
+
     def test_build_children_state_default(self):
         """File only exists remotely"""
         r_a = SystemFile("a", 300, True)
@@ -1230,3 +1383,21 @@ class TestModelBuilder(unittest.TestCase):
         self.model_builder.set_local_files([SystemFile("a", 22, True)])
         model = self.model_builder.build_model()
         self.assertEqual(None, model.get_file("a").transferred_size)
+
+    def test_get_files(self):
+        self.assertEqual([], self.model_builder.get_local_files())
+        self.assertEqual([], self.model_builder.get_remote_files())
+
+        self.model_builder.set_local_files([SystemFile("a", 100, False), SystemFile("b", 200, False)])
+        self.model_builder.set_remote_files([SystemFile("a", 100, False)])
+        self.assertCountEqual([SystemFile("a", 100, False), SystemFile("b", 200, False)],
+                              self.model_builder.get_local_files())
+        self.assertEqual([SystemFile("a", 100, False)], self.model_builder.get_remote_files())
+
+        # Updates are included
+        self.model_builder.set_local_file("b", None)
+        self.model_builder.set_active_files([SystemFile("a", 150, False)])
+        self.model_builder.set_remote_file("c", SystemFile("c", 300, False))
+        self.assertEqual([SystemFile("a", 150, False)], self.model_builder.get_local_files())
+        self.assertCountEqual([SystemFile("a", 100, False), SystemFile("c", 300, False)],
+                              self.model_builder.get_remote_files())
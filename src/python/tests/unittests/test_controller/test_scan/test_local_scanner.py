@@ -0,0 +1,102 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from controller.scan import LocalScanner
+from system import SystemWatcher, SystemWatcherError
+
+
+class TestLocalScanner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_local_scanner")
+        os.mkdir(os.path.join(self.temp_dir, "a"))
+        self.__touch(100, "a", "aa")
+        self.__touch(200, "b")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def __touch(self, size: int, *args):
+        with open(os.path.join(self.temp_dir, *args), "ab") as f:
+            f.write(bytearray([0xff] * size))
+
+    def __skip_if_no_inotify(self):
+        watcher = SystemWatcher(self.temp_dir)
+        try:
+            watcher.start()
+        except SystemWatcherError as e:
+            self.skipTest(str(e))
+        watcher.close()
+
+    def test_scan(self):
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=False)
+        files = scanner.scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+        # Without watch, every scan is a full scan
+        self.assertEqual(["a", "b"], [f.name for f in scanner.scan()])
+
+    def test_scan_single(self):
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=False)
+        self.assertTrue(scanner.supports_scan_single)
+        file = scanner.scan_single("a")
+        self.assertEqual("a", file.name)
+        self.assertEqual(100, file.size)
+        os.remove(os.path.join(self.temp_dir, "b"))
+        self.assertIsNone(scanner.scan_single("b"))
+
+    def test_watch_returns_none_when_unchanged(self):
+        self.__skip_if_no_inotify()
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=False, use_watch=True)
+        files = scanner.scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+        self.assertIsNone(scanner.scan())
+
+    def test_watch_applies_changes(self):
+        self.__skip_if_no_inotify()
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=False, use_watch=True)
+        scanner.scan()
+
+        self.__touch(50, "a", "aa")
+        self.__touch(300, "c")
+        os.remove(os.path.join(self.temp_dir, "b"))
+        files = scanner.scan()
+        self.assertEqual(["a", "c"], [f.name for f in files])
+        self.assertEqual(150, files[0].size)
+        self.assertEqual(150, files[0].children[0].size)
+        self.assertEqual(300, files[1].size)
+        self.assertIsNone(scanner.scan())
+
+    def test_watch_lftp_temp_file_renamed(self):
+        self.__skip_if_no_inotify()
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=True, use_watch=True)
+        self.__touch(10, "c.mkv.lftp")
+        files = scanner.scan()
+        self.assertEqual(["a", "b", "c.mkv"], [f.name for f in files])
+
+        self.__touch(10, "c.mkv.lftp")
+        files = scanner.scan()
+        self.assertEqual(["a", "b", "c.mkv"], [f.name for f in files])
+        self.assertEqual(20, files[2].size)
+
+        os.rename(os.path.join(self.temp_dir, "c.mkv.lftp"), os.path.join(self.temp_dir, "c.mkv"))
+        files = scanner.scan()
+        self.assertEqual(["a", "b", "c.mkv"], [f.name for f in files])
+        self.assertEqual(20, files[2].size)
+
+        os.remove(os.path.join(self.temp_dir, "c.mkv"))
+        files = scanner.scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+
+    def test_watch_full_scan_after_interval(self):
+        self.__skip_if_no_inotify()
+        scanner = LocalScanner(local_path=self.temp_dir, use_temp_file=False, use_watch=True)
+        scanner.scan()
+        orig_interval = LocalScanner.FULL_SCAN_INTERVAL_IN_MS
+        LocalScanner.FULL_SCAN_INTERVAL_IN_MS = 0
+        try:
+            self.assertEqual(["a", "b"], [f.name for f in scanner.scan()])
+        finally:
+            LocalScanner.FULL_SCAN_INTERVAL_IN_MS = orig_interval
@@ -1,17 +1,43 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import unittest
+import json
+import shlex
 import logging
 import sys
-from unittest.mock import patch
+from unittest.mock import patch, ANY
 import tempfile
 import os
-import pickle
 
 from controller.scan import RemoteScanner
 from ssh import SshcpError
 from common import AppError
 from common import Localization
+from system import SystemFile, WireEncoder
+
+
+class DummyAgentSession:
+    """
+    Session that answers agent requests with the given handler
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.is_alive = True
+        self.__response = b""
+
+    def send_line(self, line: str):
+        self.requests.append(json.loads(line))
+        self.__response = self.handler(self.requests[-1])
+
+    # noinspection PyUnusedLocal
+    def read(self, output_callback, is_done):
+        output_callback(self.__response)
+        if not is_done():
+            raise SshcpError("session ended")
+
+    def close(self):
+        self.is_alive = False
 
 
 class TestRemoteScanner(unittest.TestCase):
@@ -30,8 +56,11 @@ class TestRemoteScanner(unittest.TestCase):
         formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
         handler.setFormatter(formatter)
 
-        # Ssh to return pickled empty list by default
-        self.mock_ssh.shell.return_value = pickle.dumps([])
+        # Ssh to return an encoded empty list by default
+        # noinspection PyUnusedLocal
+        def ssh_shell_stream(command, output_callback):
+            output_callback(WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell_stream
 
     @classmethod
     def setUpClass(cls):
@@ -99,8 +128,28 @@ class TestRemoteScanner(unittest.TestCase):
             remote_path_to_scan_script="/remote/path/to/scan/script"
         )
         scanner.scan()
-        self.mock_ssh.shell.assert_called_once_with(
-            "'/remote/path/to/scan/script' '/remote/path/to/scan'"
+        self.mock_ssh.shell_stream.assert_called_once_with(
+            "/remote/path/to/scan/script /remote/path/to/scan "
+            "--state /remote/path/to/scan/script.state",
+            ANY
+        )
+
+    def test_ssh_command_escapes_paths(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/it's; rm -rf $HOME",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+        scanner.scan()
+        command = self.mock_ssh.shell_stream.call_args[0][0]
+        self.assertEqual(
+            ["/remote/path/to/scan/script", "/remote/it's; rm -rf $HOME",
+             "--state", "/remote/path/to/scan/script.state"],
+            shlex.split(command)
         )
 
     def test_raises_app_error_on_failed_ssh(self):
@@ -123,8 +172,8 @@ class TestRemoteScanner(unittest.TestCase):
             if self.ssh_run_command_count < 2:
                 raise SshcpError("an ssh error")
             else:
-                return pickle.dumps([])
-        self.mock_ssh.shell.side_effect = ssh_shell
+                args[1](WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
 
         with self.assertRaises(AppError) as ctx:
             scanner.scan()
@@ -170,11 +219,11 @@ class TestRemoteScanner(unittest.TestCase):
             if self.ssh_run_command_count < 2:
                 raise SshcpError("bash: /remote/path/to/scan: Text file busy")
             else:
-                return pickle.dumps([])
-        self.mock_ssh.shell.side_effect = ssh_shell
+                args[1](WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
 
         scanner.scan()
-        self.assertEqual(2, self.mock_ssh.shell.call_count)
+        self.assertEqual(2, self.mock_ssh.shell_stream.call_count)
 
     def test_fails_after_max_retries_on_suppressed_error(self):
         scanner = RemoteScanner(
@@ -190,13 +239,13 @@ class TestRemoteScanner(unittest.TestCase):
         # noinspection PyUnusedLocal
         def ssh_shell(*args):
                 raise SshcpError("bash: /remote/path/to/scan: Text file busy")
-        self.mock_ssh.shell.side_effect = ssh_shell
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
 
         with self.assertRaises(AppError) as ctx:
             scanner.scan()
         self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
         # initial try + 5 retries
-        self.assertEqual(6, self.mock_ssh.shell.call_count)
+        self.assertEqual(6, self.mock_ssh.shell_stream.call_count)
 
     def test_suppresses_and_retries_on_ssh_error_exchange_identification(self):
         scanner = RemoteScanner(
@@ -218,11 +267,11 @@ class TestRemoteScanner(unittest.TestCase):
             if self.ssh_run_command_count < 2:
                 raise SshcpError("ssh_exchange_identification: read: Connection reset by peer")
             else:
-                return pickle.dumps([])
-        self.mock_ssh.shell.side_effect = ssh_run_command
+                args[1](WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_run_command
 
         scanner.scan()
-        self.assertEqual(2, self.mock_ssh.shell.call_count)
+        self.assertEqual(2, self.mock_ssh.shell_stream.call_count)
 
     def test_suppresses_and_retries_on_ssh_error_cannot_create_temp_dir(self):
         scanner = RemoteScanner(
@@ -244,11 +293,11 @@ class TestRemoteScanner(unittest.TestCase):
             if self.ssh_run_command_count < 2:
                 raise SshcpError("[23033] INTERNAL ERROR: cannot create temporary directory!")
             else:
-                return pickle.dumps([])
-        self.mock_ssh.shell.side_effect = ssh_shell
+                args[1](WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
 
         scanner.scan()
-        self.assertEqual(2, self.mock_ssh.shell.call_count)
+        self.assertEqual(2, self.mock_ssh.shell_stream.call_count)
 
     def test_suppresses_and_retries_on_ssh_error_connection_timed_out(self):
         scanner = RemoteScanner(
@@ -270,11 +319,11 @@ class TestRemoteScanner(unittest.TestCase):
             if self.ssh_run_command_count < 2:
                 raise SshcpError("connect to host host.remote.com port 2202: Connection timed out")
             else:
-                return pickle.dumps([])
-        self.mock_ssh.shell.side_effect = ssh_shell
+                args[1](WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
 
         scanner.scan()
-        self.assertEqual(2, self.mock_ssh.shell.call_count)
+        self.assertEqual(2, self.mock_ssh.shell_stream.call_count)
 
     def test_raises_app_error_on_mangled_output(self):
         scanner = RemoteScanner(
@@ -290,9 +339,318 @@ class TestRemoteScanner(unittest.TestCase):
         # Ssh run command raises error the first time, succeeds the second time
         # noinspection PyUnusedLocal
         def ssh_shell(*args):
-            return "mangled data".encode()
-        self.mock_ssh.shell.side_effect = ssh_shell
+            args[1]("mangled data".encode())
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        with self.assertRaises(AppError) as ctx:
+            scanner.scan()
+        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
+
+    def test_decodes_streamed_output(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 100, True)
+        a.add_child(SystemFile("aa", 100, False))
+        b = SystemFile("b", 50, False)
+
+        # Output arrives one byte at a time after a login banner
+        # noinspection PyUnusedLocal
+        def ssh_shell(*args):
+            out = b"Welcome!\n" + WireEncoder().encode([a, b])
+            for i in range(len(out)):
+                args[1](out[i:i+1])
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        files = scanner.scan()
+        self.assertEqual([a, b], files)
+
+    def test_raises_app_error_on_truncated_output(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        # noinspection PyUnusedLocal
+        def ssh_shell(*args):
+            encoder = WireEncoder()
+            args[1](encoder.header() + encoder.encode_file(SystemFile("a", 1, False)))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        with self.assertRaises(AppError) as ctx:
+            scanner.scan()
+        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
+
+    def test_applies_delta_to_last_scan(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a1 = SystemFile("a", 100, True)
+        a1.add_child(SystemFile("aa", 100, False))
+        a2 = SystemFile("a", 150, True)
+        a2.add_child(SystemFile("aa", 100, False))
+        a2.add_child(SystemFile("ab", 50, False))
+        b = SystemFile("b", 50, False)
+
+        self.commands = []
+
+        # noinspection PyUnusedLocal
+        def ssh_shell(*args):
+            self.commands.append(args[0])
+            encoder = WireEncoder()
+            if len(self.commands) == 1:
+                out = encoder.header() + encoder.generation(7) + \
+                    encoder.encode_file(a1) + encoder.encode_file(b)
+            else:
+                out = encoder.header() + encoder.generation(8, is_delta=True) + \
+                    encoder.encode_delta([a1, b], [a2])
+            args[1](out + encoder.end())
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        self.assertEqual([a1, b], scanner.scan())
+        self.assertNotIn("--generation", self.commands[0])
+        self.assertEqual([a2], scanner.scan())
+        self.assertTrue(self.commands[1].endswith(" --generation 7"))
+
+    def test_falls_back_to_full_scan_on_bad_delta(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 100, False)
+        b = SystemFile("b", 50, False)
+
+        self.commands = []
+
+        # noinspection PyUnusedLocal
+        def ssh_shell(*args):
+            self.commands.append(args[0])
+            encoder = WireEncoder()
+            if "--generation" in args[0]:
+                # Delta that removes a file the scanner doesn't have
+                out = encoder.header() + encoder.generation(2, is_delta=True) + \
+                    encoder.encode_delta([a, b], [a])
+            else:
+                out = encoder.header() + encoder.generation(len(self.commands)) + \
+                    encoder.encode_file(a)
+            args[1](out + encoder.end())
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        self.assertEqual([a], scanner.scan())
+        self.assertEqual([a], scanner.scan())
+        self.assertEqual(3, len(self.commands))
+        self.assertIn("--generation", self.commands[1])
+        self.assertNotIn("--generation", self.commands[2])
+
+    def test_agent_scans(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script",
+            use_agent=True
+        )
+
+        a = SystemFile("a", 100, False)
+        b1 = SystemFile("b", 50, False)
+        b2 = SystemFile("b", 70, False)
+
+        def handler(request):
+            encoder = WireEncoder()
+            if request["op"] == "scan" and request["generation"] is None:
+                out = encoder.header() + encoder.generation(1) + encoder.encode_file(a) + encoder.encode_file(b1)
+            elif request["op"] == "scan":
+                self.assertEqual(1, request["generation"])
+                out = encoder.header() + encoder.generation(2, is_delta=True) + encoder.encode_delta([a, b1], [b2])
+            else:
+                self.fail("Unexpected request")
+            return out + encoder.end()
+        session = DummyAgentSession(handler)
+        self.mock_ssh.start_session.return_value = session
+
+        self.assertEqual([a, b1], scanner.scan())
+        self.assertEqual([b2], scanner.scan())
+        self.mock_ssh.start_session.assert_called_once_with(
+            "/remote/path/to/scan/script /remote/path/to/scan --agent"
+        )
+        self.mock_ssh.shell_stream.assert_not_called()
+
+        scanner.close()
+        self.assertFalse(session.is_alive)
+
+    def test_scan_single(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 100, False)
+        b = SystemFile("b", 50, False)
+        self.commands = []
+
+        def ssh_shell(command, output_callback):
+            self.commands.append(command)
+            encoder = WireEncoder()
+            if command.endswith("--name a"):
+                output_callback(encoder.encode([a]))
+            elif "--name" in command:
+                output_callback(encoder.encode([]))
+            else:
+                output_callback(encoder.header() + encoder.generation(1) +
+                                encoder.encode_file(a) + encoder.encode_file(b) + encoder.end())
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        self.assertEqual([a, b], scanner.scan())
+        self.assertTrue(scanner.supports_scan_single)
+        self.assertEqual(a, scanner.scan_single("a"))
+        self.assertIsNone(scanner.scan_single("b"))
+        self.assertEqual("/remote/path/to/scan/script /remote/path/to/scan --name a", self.commands[1])
+        self.assertEqual("/remote/path/to/scan/script /remote/path/to/scan --name b", self.commands[2])
+
+        # The single scans don't change the generation of the next scan
+        scanner.scan()
+        self.assertEqual(
+            "/remote/path/to/scan/script /remote/path/to/scan "
+            "--state /remote/path/to/scan/script.state --generation 1",
+            self.commands[3]
+        )
+
 
+    def test_scan_single_escapes_name(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+        self.commands = []
+
+        def ssh_shell(command, output_callback):
+            self.commands.append(command)
+            output_callback(WireEncoder().encode([]))
+        self.mock_ssh.shell_stream.side_effect = ssh_shell
+
+        name = "it's a \"quoted\" name; rm -rf $HOME"
+        self.assertIsNone(scanner.scan_single(name))
+        self.assertEqual(
+            ["/remote/path/to/scan/script", "/remote/path/to/scan", "--name", name],
+            shlex.split(self.commands[0])
+        )
+
+    def test_agent_scan_single(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script",
+            use_agent=True
+        )
+
+        a1 = SystemFile("a", 100, False)
+        a2 = SystemFile("a", 200, False)
+        b = SystemFile("b", 50, False)
+        c = SystemFile("c", 10, False)
+
+        def handler(request):
+            encoder = WireEncoder()
+            if request["op"] == "scan" and request["generation"] is not None:
+                # Agent applied the scan_single results to its copy
+                out = encoder.header() + encoder.generation(2, is_delta=True) + \
+                    encoder.encode_delta([a2, c], [a2, c])
+                return out + encoder.end()
+            out = encoder.header() + encoder.generation(1)
+            if request["op"] == "scan":
+                out += encoder.encode_file(a1) + encoder.encode_file(b)
+            elif request["name"] == "a":
+                out += encoder.encode_file(a2)
+            elif request["name"] == "c":
+                out += encoder.encode_file(c)
+            return out + encoder.end()
+        self.mock_ssh.start_session.return_value = DummyAgentSession(handler)
+
+        self.assertEqual([a1, b], scanner.scan())
+        self.assertEqual(a2, scanner.scan_single("a"))
+        self.assertIsNone(scanner.scan_single("b"))
+        self.assertEqual(c, scanner.scan_single("c"))
+        self.assertEqual([a2, c], scanner.scan())
+
+    def test_agent_restarts_after_error(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script",
+            use_agent=True
+        )
+
+        a = SystemFile("a", 100, False)
+
+        def good_handler(request):
+            # A new agent always gets a request without a generation
+            self.assertIsNone(request["generation"])
+            encoder = WireEncoder()
+            return encoder.header() + encoder.generation(1) + encoder.encode_file(a) + encoder.end()
+
+        # noinspection PyUnusedLocal
+        def bad_handler(request):
+            return b"connection closed"
+
+        sessions = [DummyAgentSession(good_handler),
+                    DummyAgentSession(bad_handler),
+                    DummyAgentSession(good_handler)]
+        self.mock_ssh.start_session.side_effect = sessions
+
+        self.assertEqual([a], scanner.scan())
+        # Dead session is detected and replaced
+        sessions[0].is_alive = False
         with self.assertRaises(AppError) as ctx:
+            # The replacement also fails, but retried only once
+            self.mock_ssh.start_session.side_effect = [sessions[1], sessions[1]]
             scanner.scan()
         self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
+
+        self.mock_ssh.start_session.side_effect = [sessions[1], sessions[2]]
+        self.assertEqual([a], scanner.scan())
+        self.assertEqual(1, len(sessions[2].requests))
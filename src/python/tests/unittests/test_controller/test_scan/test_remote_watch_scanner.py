@@ -0,0 +1,233 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+import logging
+import sys
+from unittest.mock import patch
+import tempfile
+import os
+
+from controller.scan import RemoteWatchScanner
+from ssh import SshcpError
+from common import AppError
+from common import Localization
+from system import SystemFile, WireEncoder
+
+
+class DummyWatchSession:
+    """
+    Session that outputs whatever is pushed to it
+    """
+    def __init__(self):
+        self.output = b""
+        self.error = None
+        self.is_alive = True
+
+    def __pop_output(self, output_callback):
+        output, self.output = self.output, b""
+        if output:
+            output_callback(output)
+        if self.error is not None:
+            raise self.error
+
+    def read(self, output_callback, is_done):
+        self.__pop_output(output_callback)
+        if not is_done():
+            raise SshcpError("session ended")
+
+    def poll(self, output_callback):
+        self.__pop_output(output_callback)
+
+    def close(self):
+        self.is_alive = False
+
+
+def encode_delta(old_files, new_files, generation) -> bytes:
+    encoder = WireEncoder()
+    return encoder.header() + encoder.generation(generation, is_delta=True) + \
+        encoder.encode_delta(old_files, new_files) + encoder.end()
+
+
+class TestRemoteWatchScanner(unittest.TestCase):
+    temp_scan_script = None
+
+    def setUp(self):
+        ssh_patcher = patch('controller.scan.remote_watch_scanner.Sshcp')
+        self.addCleanup(ssh_patcher.stop)
+        self.mock_ssh_cls = ssh_patcher.start()
+        self.mock_ssh = self.mock_ssh_cls.return_value
+
+        logger = logging.getLogger()
+        handler = logging.StreamHandler(sys.stdout)
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+        handler.setFormatter(formatter)
+
+        self.files_a = [SystemFile("a", 1, False)]
+        self.files_ab = [SystemFile("a", 1, False), SystemFile("b", 2, False)]
+
+        # Each new session starts with a full scan
+        self.sessions = []
+
+        # noinspection PyUnusedLocal
+        def start_session(command):
+            session = DummyWatchSession()
+            session.output = WireEncoder().encode(self.files_a)
+            self.sessions.append(session)
+            return session
+        self.mock_ssh.start_session.side_effect = start_session
+
+    @classmethod
+    def setUpClass(cls):
+        TestRemoteWatchScanner.temp_scan_script = tempfile.mktemp()
+        with open(TestRemoteWatchScanner.temp_scan_script, "w") as f:
+            f.write("")
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(TestRemoteWatchScanner.temp_scan_script)
+
+    def __create_scanner(self) -> RemoteWatchScanner:
+        return RemoteWatchScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteWatchScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script",
+            rescan_interval_in_ms=30000
+        )
+
+    def test_installs_scan_script_on_first_scan(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.mock_ssh.copy.assert_called_once_with(
+            local_path=TestRemoteWatchScanner.temp_scan_script,
+            remote_path="/remote/path/to/scan/script"
+        )
+        self.mock_ssh.copy.reset_mock()
+        scanner.scan()
+        self.mock_ssh.copy.assert_not_called()
+
+    def test_starts_watch_on_first_scan(self):
+        scanner = self.__create_scanner()
+        self.assertEqual(self.files_a, scanner.scan())
+        self.mock_ssh.start_session.assert_called_once_with(
+            "/remote/path/to/scan/script /remote/path/to/scan --watch 30.0"
+        )
+
+    def test_returns_none_without_changes(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.assertIsNone(scanner.scan())
+        self.assertIsNone(scanner.scan())
+        self.assertEqual(1, self.mock_ssh.start_session.call_count)
+
+    def test_applies_deltas(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.sessions[0].output = encode_delta(self.files_a, self.files_ab, 2)
+        self.assertEqual(self.files_ab, scanner.scan())
+        self.assertIsNone(scanner.scan())
+        self.sessions[0].output = encode_delta(self.files_ab, [], 3)
+        self.assertEqual([], scanner.scan())
+
+    def test_applies_multiple_deltas_in_one_chunk(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.sessions[0].output = encode_delta(self.files_a, self.files_ab, 2) + \
+            encode_delta(self.files_ab, self.files_ab[1:], 3)
+        self.assertEqual(self.files_ab[1:], scanner.scan())
+
+    def test_applies_delta_split_across_scans(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        data = encode_delta(self.files_a, self.files_ab, 2)
+        self.sessions[0].output = data[:len(data)//2]
+        self.assertIsNone(scanner.scan())
+        self.sessions[0].output = data[len(data)//2:]
+        self.assertEqual(self.files_ab, scanner.scan())
+
+    def test_restarts_watch_on_session_error(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.sessions[0].error = SshcpError("connection lost")
+        self.assertEqual(self.files_a, scanner.scan())
+        self.assertEqual(2, self.mock_ssh.start_session.call_count)
+        self.assertFalse(self.sessions[0].is_alive)
+
+    def test_restarts_watch_on_bad_delta(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        # Delta removes a file that doesn't exist
+        self.sessions[0].output = encode_delta(self.files_ab, self.files_a, 2)
+        self.assertEqual(self.files_a, scanner.scan())
+        self.assertEqual(2, self.mock_ssh.start_session.call_count)
+
+    def test_retries_on_suppressed_error(self):
+        scanner = self.__create_scanner()
+        errors = [SshcpError("ssh_exchange_identification: Connection closed by remote host")]
+
+        def start_session(_):
+            session = DummyWatchSession()
+            if errors:
+                session.error = errors.pop()
+            else:
+                session.output = WireEncoder().encode(self.files_a)
+            return session
+        self.mock_ssh.start_session.side_effect = start_session
+        self.assertEqual(self.files_a, scanner.scan())
+        self.assertEqual(2, self.mock_ssh.start_session.call_count)
+
+    def test_fails_after_max_retries_on_suppressed_error(self):
+        scanner = self.__create_scanner()
+
+        def start_session(_):
+            session = DummyWatchSession()
+            session.error = SshcpError("bash: /remote/path/to/scan/script: Text file busy")
+            return session
+        self.mock_ssh.start_session.side_effect = start_session
+        with self.assertRaises(AppError) as ctx:
+            scanner.scan()
+        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
+        self.assertEqual(RemoteWatchScanner.RETRY_COUNT + 1, self.mock_ssh.start_session.call_count)
+
+    def test_fails_on_error(self):
+        scanner = self.__create_scanner()
+
+        def start_session(_):
+            session = DummyWatchSession()
+            session.error = SshcpError("an ssh error")
+            return session
+        self.mock_ssh.start_session.side_effect = start_session
+        with self.assertRaises(AppError) as ctx:
+            scanner.scan()
+        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN, str(ctx.exception))
+        self.assertEqual(1, self.mock_ssh.start_session.call_count)
+
+    def test_scan_single_applies_pending_deltas(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        self.sessions[0].output = encode_delta(self.files_a, self.files_ab, 2)
+        self.assertEqual(self.files_ab[1], scanner.scan_single("b"))
+        self.assertIsNone(scanner.scan_single("c"))
+        # The delta is still reported by the next scan
+        self.assertEqual(self.files_ab, scanner.scan())
+
+    def test_scan_single_needs_watch(self):
+        scanner = self.__create_scanner()
+        self.assertFalse(scanner.supports_scan_single)
+        scanner.scan()
+        self.assertTrue(scanner.supports_scan_single)
+        # The last known file is returned when the watch is lost
+        self.sessions[0].error = SshcpError("connection lost")
+        self.assertEqual(self.files_a[0], scanner.scan_single("a"))
+        self.assertFalse(scanner.supports_scan_single)
+
+    def test_close_stops_watch(self):
+        scanner = self.__create_scanner()
+        scanner.scan()
+        scanner.close()
+        self.assertFalse(self.sessions[0].is_alive)
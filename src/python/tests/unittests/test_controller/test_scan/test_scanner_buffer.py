@@ -0,0 +1,91 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import multiprocessing
+import unittest
+from datetime import datetime, timedelta
+
+from controller.scan.scanner_buffer import ScannerResultBuffer
+from system import SystemFile, SystemFileTree
+
+
+def write_results(buffer: ScannerResultBuffer, count: int):
+    for i in range(count):
+        buffer.write(datetime(2018, 1, 1) + timedelta(seconds=i),
+                     SystemFileTree.from_system_files([SystemFile("a", i, False)]))
+
+
+class TestScannerResultBuffer(unittest.TestCase):
+    def test_read_latest_empty(self):
+        buffer = ScannerResultBuffer()
+        self.assertIsNone(buffer.read_latest())
+
+    def test_read_latest(self):
+        buffer = ScannerResultBuffer()
+        timestamp = datetime.now()
+        a = SystemFile("a", 100, True)
+        a.add_child(SystemFile("aa", 100, False))
+        buffer.write(timestamp, SystemFileTree.from_system_files([a]))
+        read_timestamp, tree = buffer.read_latest()
+        self.assertEqual(timestamp, read_timestamp)
+        self.assertEqual([a], tree.to_system_files())
+        # Nothing new
+        self.assertIsNone(buffer.read_latest())
+
+    def test_read_only_latest(self):
+        buffer = ScannerResultBuffer()
+        write_results(buffer, 5)
+        timestamp, tree = buffer.read_latest()
+        self.assertEqual(datetime(2018, 1, 1, 0, 0, 4), timestamp)
+        self.assertEqual([SystemFile("a", 4, False)], tree.to_system_files())
+
+    def test_heartbeat(self):
+        buffer = ScannerResultBuffer()
+        buffer.write(datetime(2018, 1, 1), SystemFileTree.from_system_files([SystemFile("a", 1, False)]))
+        buffer.write(datetime(2018, 1, 2), None)
+        # Unread tree is returned with the heartbeat's timestamp
+        timestamp, tree = buffer.read_latest()
+        self.assertEqual(datetime(2018, 1, 2), timestamp)
+        self.assertEqual([SystemFile("a", 1, False)], tree.to_system_files())
+
+        buffer.write(datetime(2018, 1, 3), None)
+        timestamp, tree = buffer.read_latest()
+        self.assertEqual(datetime(2018, 1, 3), timestamp)
+        self.assertIsNone(tree)
+
+    def test_slots_grow_and_shrink(self):
+        buffer = ScannerResultBuffer()
+        big = [SystemFile("file{}".format(i), i, False) for i in range(10000)]
+        small = [SystemFile("a", 1, False)]
+        for files in (small, big, small, small, big):
+            buffer.write(datetime.now(), SystemFileTree.from_system_files(files))
+            self.assertEqual(files, buffer.read_latest()[1].to_system_files())
+
+    def test_across_processes(self):
+        buffer = ScannerResultBuffer()
+        process = multiprocessing.Process(target=write_results, args=(buffer, 100))
+        process.start()
+        process.join()
+        timestamp, tree = buffer.read_latest()
+        self.assertEqual(datetime(2018, 1, 1) + timedelta(seconds=99), timestamp)
+        self.assertEqual([SystemFile("a", 99, False)], tree.to_system_files())
+
+    def test_reads_are_consistent_while_writing(self):
+        buffer = ScannerResultBuffer()
+
+        def write():
+            for i in range(500):
+                files = [SystemFile("a", i, False), SystemFile("b" * (i % 50 + 1), i, False)]
+                buffer.write(datetime.now(), SystemFileTree.from_system_files(files))
+        process = multiprocessing.Process(target=write)
+        process.start()
+        last_size = -1
+        while process.is_alive() or last_size < 499:
+            latest = buffer.read_latest()
+            if latest is None or latest[1] is None:
+                continue
+            a, b = latest[1].to_system_files()
+            self.assertEqual(a.size, b.size)
+            self.assertEqual("b" * (b.size % 50 + 1), b.name)
+            self.assertGreater(a.size, last_size)
+            last_size = a.size
+        process.join()
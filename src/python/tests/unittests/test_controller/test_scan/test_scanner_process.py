@@ -4,11 +4,14 @@ import unittest
 import multiprocessing
 import logging
 import sys
+import time
 from unittest.mock import MagicMock
 
 import timeout_decorator
 
+from common import AppError
 from controller import IScanner, ScannerProcess
+from ssh import SshcpError
 from system import SystemFile
 
 
@@ -19,6 +22,18 @@ class DummyScanner(IScanner):
     def set_base_logger(self, base_logger: logging.Logger):
         pass
 
+    def scan_single(self, name):
+        return None
+
+
+class DummySingleScanner(DummyScanner):
+    def __init__(self):
+        self.single_supported = True
+
+    @property
+    def supports_scan_single(self):
+        return self.single_supported
+
 
 class TestScannerProcess(unittest.TestCase):
     def setUp(self):
@@ -141,3 +156,328 @@ class TestScannerProcess(unittest.TestCase):
             pass
         result = self.process.pop_latest_result()
         self.assertEqual(0, len(result.files))
+
+    @timeout_decorator.timeout(10)
+    def test_force_scan_single(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+        self.scan_single_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummySingleScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+
+        def _scan_single(name):
+            self.scan_single_counter.value += 1
+            return SystemFile(name, 10, False) if name == "a" else None
+        mock_scanner.scan = _scan
+        mock_scanner.scan_single = _scan_single
+
+        # Interval is long enough that only the requested scans are done
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=60000)
+        self.process.start()
+        while self.scan_counter.value < 1:
+            pass
+
+        self.process.force_scan_single("a")
+        self.process.force_scan_single("b")
+        results = []
+        while len(results) < 2:
+            results += self.process.pop_single_results()
+        self.assertEqual(["a", "b"], [r.name for r in results])
+        self.assertEqual("a", results[0].file.name)
+        self.assertEqual(10, results[0].file.size)
+        self.assertIsNone(results[1].file)
+        self.assertLessEqual(results[0].timestamp, results[1].timestamp)
+        self.assertEqual(1, self.scan_counter.value)
+        self.assertEqual(2, self.scan_single_counter.value)
+
+        # A full scan can still be forced
+        self.process.force_scan()
+        while self.scan_counter.value < 2:
+            pass
+
+    @timeout_decorator.timeout(10)
+    def test_drops_single_results_older_than_full_result(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+        self.scan_single_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummySingleScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return [SystemFile("a", self.scan_counter.value, False)]
+
+        def _scan_single(name):
+            self.scan_single_counter.value += 1
+            return SystemFile(name, 100, False)
+        mock_scanner.scan = _scan
+        mock_scanner.scan_single = _scan_single
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=60000)
+        self.process.start()
+        while self.scan_counter.value < 1:
+            pass
+
+        # A full scan follows the single scan, before the single result is read
+        self.process.force_scan_single("a")
+        while self.scan_single_counter.value < 1:
+            pass
+        self.process.force_scan()
+        while self.scan_counter.value < 2:
+            pass
+        result = None
+        while result is None or result.files[0].size < 2:
+            result = self.process.pop_latest_result()
+        # Let the single result arrive
+        time.sleep(0.5)
+        self.assertEqual([], self.process.pop_single_results())
+
+        # Later single results are returned
+        self.process.force_scan_single("b")
+        results = []
+        while not results:
+            results += self.process.pop_single_results()
+        self.assertEqual(["b"], [r.name for r in results])
+
+    @timeout_decorator.timeout(10)
+    def test_force_scan_single_falls_back_to_full_scan(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+        mock_scanner.scan = _scan
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=60000)
+        self.process.start()
+        while self.scan_counter.value < 1:
+            pass
+
+        # DummyScanner doesn't support scan_single
+        self.process.force_scan_single("a")
+        while self.scan_counter.value < 2:
+            pass
+        self.assertEqual([], self.process.pop_single_results())
+
+    @timeout_decorator.timeout(10)
+    def test_force_scan_single_falls_back_when_support_is_lost(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummySingleScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+
+        def _scan_single(name):
+            # e.g. the scanner lost its connection
+            mock_scanner.single_supported = False
+            return None
+        mock_scanner.scan = _scan
+        mock_scanner.scan_single = _scan_single
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=60000)
+        self.process.start()
+        while self.scan_counter.value < 1:
+            pass
+
+        # The single result is still published, followed by a full scan
+        self.process.force_scan_single("a")
+        while self.scan_counter.value < 2:
+            pass
+        # The single result may arrive after the full scan is done
+        results = []
+        while not results:
+            results += self.process.pop_single_results()
+        self.assertEqual(["a"], [r.name for r in results])
+
+    @timeout_decorator.timeout(10)
+    def test_force_scan_single_falls_back_on_error(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummySingleScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+
+        def _scan_single(name):
+            if name == "a":
+                raise AppError("scan failed")
+            elif name == "b":
+                raise SshcpError("connection lost")
+            else:
+                raise ValueError("bad name")
+        mock_scanner.scan = _scan
+        mock_scanner.scan_single = _scan_single
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=60000)
+        self.process.start()
+        while self.scan_counter.value < 1:
+            pass
+
+        # Each failed single scan is replaced by a full scan
+        for count, name in enumerate(["a", "b", "c"], start=2):
+            self.process.force_scan_single(name)
+            while self.scan_counter.value < count:
+                pass
+        self.assertEqual([], self.process.pop_single_results())
+        self.process.propagate_exception()
+
+    @timeout_decorator.timeout(10)
+    def test_backs_off_while_unchanged(self):
+        self.scan_signal = multiprocessing.Value('i', 0)
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            if self.scan_signal.value == 1:
+                # Changes on every scan
+                return [SystemFile("a", self.scan_counter.value, False)]
+            return [SystemFile("a", 0, False)]
+        mock_scanner.scan = _scan
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=400)
+        self.assertEqual(50, self.process.interval_in_ms)
+        self.process.start()
+
+        # Interval doubles up to the ceiling
+        while self.process.interval_in_ms < 400:
+            pass
+        self.assertGreaterEqual(self.scan_counter.value, 4)
+
+        # Back to the minimum as soon as something changes
+        self.scan_signal.value = 1
+        self.process.force_scan()
+        while self.process.interval_in_ms > 50:
+            pass
+        orig_counter = self.scan_counter.value
+        while self.scan_counter.value < orig_counter + 3:
+            pass
+        self.assertEqual(50, self.process.interval_in_ms)
+
+    @timeout_decorator.timeout(10)
+    def test_no_backoff_while_busy(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+        mock_scanner.scan = _scan
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=60000)
+        self.process.start()
+        while self.process.interval_in_ms < 800:
+            pass
+
+        # Going busy cuts the backoff short
+        self.process.set_busy(True)
+        while self.process.interval_in_ms > 50:
+            pass
+        orig_counter = self.scan_counter.value
+        while self.scan_counter.value < orig_counter + 3:
+            pass
+        self.assertEqual(50, self.process.interval_in_ms)
+
+    @timeout_decorator.timeout(10)
+    def test_reset_interval(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            return []
+        mock_scanner.scan = _scan
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=60000)
+        self.process.start()
+        while self.process.interval_in_ms < 800:
+            pass
+
+        # Reset cuts the backoff short, and backing off starts over
+        self.process.reset_interval()
+        while self.process.interval_in_ms > 50:
+            pass
+        while self.process.interval_in_ms < 200:
+            pass
+        self.assertLess(self.process.interval_in_ms, 800)
+
+    @timeout_decorator.timeout(10)
+    def test_publishes_heartbeat_when_unchanged(self):
+        self.scan_signal = multiprocessing.Value('i', 0)
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+
+        def _scan():
+            self.scan_counter.value += 1
+            if self.scan_signal.value == 0:
+                return [SystemFile("a", 10, False)]
+            elif self.scan_signal.value == 1:
+                # Scanner knows nothing changed
+                return None
+            return [SystemFile("a", 20, False)]
+        mock_scanner.scan = _scan
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50)
+        self.process.start()
+
+        while self.scan_counter.value < 1:
+            pass
+        result = None
+        while result is None:
+            result = self.process.pop_latest_result()
+        self.assertFalse(result.unchanged)
+        self.assertEqual(10, result.files[0].size)
+
+        # Same files again, only heartbeats
+        orig_counter = self.scan_counter.value
+        while self.scan_counter.value < orig_counter + 2:
+            pass
+        heartbeat = self.process.pop_latest_result()
+        self.assertTrue(heartbeat.unchanged)
+        self.assertIsNone(heartbeat.files)
+        self.assertGreater(heartbeat.timestamp, result.timestamp)
+
+        self.scan_signal.value = 1
+        orig_counter = self.scan_counter.value
+        while self.scan_counter.value < orig_counter + 2:
+            pass
+        self.assertTrue(self.process.pop_latest_result().unchanged)
+
+        # A change followed by heartbeats returns the changed files
+        # with the latest timestamp
+        self.scan_signal.value = 2
+        orig_counter = self.scan_counter.value
+        while self.scan_counter.value < orig_counter + 3:
+            pass
+        result = self.process.pop_latest_result()
+        self.assertFalse(result.unchanged)
+        self.assertEqual(20, result.files[0].size)
+
+    def test_no_backoff_by_default(self):
+        process = ScannerProcess(scanner=DummyScanner(), interval_in_ms=50)
+        process.set_busy(True)
+        process.set_busy(False)
+        self.assertEqual(50, process.interval_in_ms)
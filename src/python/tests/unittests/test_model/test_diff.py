@@ -79,6 +79,30 @@ class TestModelDiffUtil(unittest.TestCase):
         diff = ModelDiffUtil.diff_models(model_before, model_after)
         self.assertEqual([ModelDiff(ModelDiff.Change.UPDATED, a1, a2)], diff)
 
+    def test_frozen_children(self):
+        def _build(size: int) -> ModelFile:
+            _a = ModelFile("a", True)
+            _aa = ModelFile("aa", True)
+            _a.add_child(_aa)
+            _aaa = ModelFile("aaa", False)
+            _aaa.local_size = size
+            _aa.add_child(_aaa)
+            _a.freeze()
+            return _a
+
+        model_before = Model()
+        model_before.add_file(_build(100))
+        # same content
+        model_after = Model()
+        model_after.add_file(_build(100))
+        self.assertEqual([], ModelDiffUtil.diff_models(model_before, model_after))
+        # nested child changed
+        model_after = Model()
+        a2 = _build(200)
+        model_after.add_file(a2)
+        diff = ModelDiffUtil.diff_models(model_before, model_after)
+        self.assertEqual([ModelDiff(ModelDiff.Change.UPDATED, model_before.get_file("a"), a2)], diff)
+
     def test_diff_1(self):
         model_before = Model()
         model_after = Model()
@@ -1,6 +1,9 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import unittest
+import os
+import subprocess
+import sys
 from datetime import datetime
 
 from model import ModelFile
@@ -109,6 +112,25 @@ class TestModelFile(unittest.TestCase):
         file.is_extractable = False
         self.assertFalse(file.is_extractable)
 
+    def test_file_counts(self):
+        file = ModelFile("test", True)
+        self.assertEqual((0, 0, 0), (file.num_files, file.num_remote_files, file.num_downloaded_files))
+        file.num_files = 3
+        file.num_remote_files = 2
+        file.num_downloaded_files = 1
+        self.assertEqual((3, 2, 1), (file.num_files, file.num_remote_files, file.num_downloaded_files))
+
+        with self.assertRaises(TypeError):
+            file.num_files = None
+        with self.assertRaises(ValueError):
+            file.num_remote_files = -1
+        with self.assertRaises(TypeError):
+            file.num_downloaded_files = "BadValue"
+
+        # Counts are derived from the children, so they are not compared
+        other = ModelFile("test", True)
+        self.assertEqual(file, other)
+
     def test_equality_operator(self):
         # check that timestamp does not affect equality
         now = datetime.now()
@@ -134,6 +156,31 @@ class TestModelFile(unittest.TestCase):
         file_parent.add_child(file_child2)
         self.assertEqual([file_child1, file_child2], file_parent.get_children())
 
+    def test_children_view(self):
+        file_parent = ModelFile("parent", True)
+        children = file_parent.children
+        self.assertEqual(0, len(children))
+        file_child1 = ModelFile("child1", True)
+        file_parent.add_child(file_child1)
+        file_child2 = ModelFile("child2", False)
+        file_parent.add_child(file_child2)
+        # view reflects the added children
+        self.assertEqual(2, len(children))
+        self.assertEqual([file_child1, file_child2], list(file_parent.children))
+        self.assertIs(file_child2, file_parent.children[1])
+        # view is read-only
+        with self.assertRaises(TypeError):
+            file_parent.children[0] = file_child2
+        with self.assertRaises(AttributeError):
+            file_parent.children.append(file_child2)
+
+    def test_get_child(self):
+        file_parent = ModelFile("parent", True)
+        file_child1 = ModelFile("child1", True)
+        file_parent.add_child(file_child1)
+        self.assertIs(file_child1, file_parent.get_child("child1"))
+        self.assertIsNone(file_parent.get_child("child2"))
+
     def test_child_equality(self):
         l_a = ModelFile("a", True)
         l_a.remote_size = 3+1+2
@@ -201,6 +248,97 @@ class TestModelFile(unittest.TestCase):
         self.assertEqual("a/aa/aaa", file_aaa.full_path)
         self.assertEqual("a/ab", file_ab.full_path)
 
+    def test_full_path_after_adding_to_parent(self):
+        file_b = ModelFile("b", True)
+        file_ba = ModelFile("ba", True)
+        file_b.add_child(file_ba)
+        file_baa = ModelFile("baa", False)
+        file_ba.add_child(file_baa)
+        self.assertEqual("b/ba/baa", file_baa.full_path)
+        # paths computed before the file had a parent are not kept
+        file_a = ModelFile("a", True)
+        file_a.add_child(file_b)
+        self.assertEqual("a/b", file_b.full_path)
+        self.assertEqual("a/b/ba", file_ba.full_path)
+        self.assertEqual("a/b/ba/baa", file_baa.full_path)
+
+    def test_freeze(self):
+        file_a = ModelFile("a", True)
+        file_aa = ModelFile("aa", False)
+        file_a.add_child(file_aa)
+        self.assertFalse(file_a.is_frozen)
+        file_a.freeze()
+        self.assertTrue(file_a.is_frozen)
+        self.assertTrue(file_aa.is_frozen)
+
+        with self.assertRaises(TypeError):
+            file_a.state = ModelFile.State.DOWNLOADING
+        with self.assertRaises(TypeError):
+            file_aa.local_size = 100
+        with self.assertRaises(TypeError):
+            file_a.add_child(ModelFile("ab", False))
+        # frozen files can't be added to another parent either
+        with self.assertRaises(TypeError):
+            ModelFile("b", True).add_child(file_a)
+        self.assertEqual("a/aa", file_aa.full_path)
+
+    def test_fingerprint(self):
+        def _build(name: str, size: int) -> ModelFile:
+            _a = ModelFile("a", True)
+            _aa = ModelFile(name, False)
+            _aa.local_size = size
+            _a.add_child(_aa)
+            return _a
+
+        file_a = _build("aa", 100)
+        self.assertIsNone(file_a.fingerprint)
+        file_a.freeze()
+        self.assertIsNotNone(file_a.fingerprint)
+        self.assertIsNotNone(file_a.get_child("aa").fingerprint)
+
+        same = _build("aa", 100)
+        same.freeze()
+        self.assertEqual(file_a.fingerprint, same.fingerprint)
+        self.assertEqual(file_a, same)
+        other_size = _build("aa", 200)
+        other_size.freeze()
+        self.assertNotEqual(file_a.fingerprint, other_size.fingerprint)
+        self.assertNotEqual(file_a, other_size)
+        other_name = _build("ab", 100)
+        other_name.freeze()
+        self.assertNotEqual(file_a.fingerprint, other_name.fingerprint)
+        self.assertNotEqual(file_a, other_name)
+        # frozen and unfrozen files are compared field by field
+        self.assertEqual(file_a, _build("aa", 100))
+        self.assertNotEqual(file_a, _build("aa", 200))
+        # these differ only in sizes with the same hash()
+        size_zero = _build("aa", 0)
+        size_zero.freeze()
+        size_modulus = _build("aa", 2**61 - 1)
+        size_modulus.freeze()
+        self.assertNotEqual(size_zero.fingerprint, size_modulus.fingerprint)
+        self.assertNotEqual(size_zero, size_modulus)
+
+    def test_fingerprint_is_same_across_processes(self):
+        # str hashes are randomized per process, fingerprints must not be
+        code = "\n".join([
+            "from model import ModelFile",
+            "a = ModelFile('a', True)",
+            "a.add_child(ModelFile('aa', False))",
+            "a.freeze()",
+            "print(a.fingerprint.hex())"
+        ])
+        fingerprints = set()
+        for seed in ["1", "2"]:
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=os.pathsep.join(sys.path))
+            fingerprints.add(subprocess.check_output([sys.executable, "-c", code], env=env))
+        self.assertEqual(1, len(fingerprints))
+
+    def test_slots(self):
+        file = ModelFile("a", True)
+        with self.assertRaises(AttributeError):
+            file.unknown_attribute = 1
+
     def test_parent(self):
         a = ModelFile("a", True)
         aa = ModelFile("aa", True)
@@ -1,12 +1,14 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import gc
 import logging
 import sys
+import tracemalloc
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from common import overrides
-from model import Model, ModelFile, IModelListener, ModelError
+from model import Model, ModelChange, ModelFile, ModelFilePatch, IModelListener, ModelError
 
 
 class DummyModelListener(IModelListener):
@@ -84,6 +86,23 @@ class TestLftpModel(unittest.TestCase):
         self.model.add_file(ModelFile("d", False))
         self.assertEqual({"a", "c", "d"}, self.model.get_file_names())
 
+    def test_get_files(self):
+        self.assertEqual((), self.model.get_files())
+        a = ModelFile("a", False)
+        self.model.add_file(a)
+        b = ModelFile("b", False)
+        self.model.add_file(b)
+        files = self.model.get_files()
+        self.assertCountEqual([a, b], files)
+        # same result until the model changes
+        self.assertIs(files, self.model.get_files())
+        b2 = ModelFile("b", False)
+        b2.local_size = 100
+        self.model.update_file(b2)
+        self.assertCountEqual([a, b2], self.model.get_files())
+        self.model.remove_file("a")
+        self.assertCountEqual([b2], self.model.get_files())
+
     def test_add_listener(self):
         listener = DummyModelListener()
         self.model.add_listener(listener)
@@ -138,3 +157,173 @@ class TestLftpModel(unittest.TestCase):
         self.model.update_file(new_file)
         # noinspection PyUnresolvedReferences
         listener.file_updated.assert_called_once_with(old_file, new_file)
+
+    def test_listener_model_changed(self):
+        model = Model(history_max_nodes=100)
+        listener = DummyModelListener()
+        model.add_listener(listener)
+
+        listener.model_changed = MagicMock()
+
+        version = model.version
+        old_file = ModelFile("test", False)
+        old_file.local_size = 100
+        model.add_file(old_file)
+        new_file = ModelFile("test", False)
+        new_file.local_size = 200
+        model.update_file(new_file)
+        model.remove_file("test")
+        # noinspection PyUnresolvedReferences
+        changes = [c[0][0] for c in listener.model_changed.call_args_list]
+        self.assertEqual([
+            ModelChange(version + 1, "test", new_file=old_file),
+            ModelChange(version + 2, "test", patches=[
+                ModelFilePatch(ModelFilePatch.Change.UPDATED, "test", fields={"local_size": 200})
+            ]),
+            ModelChange(version + 3, "test", old_file=new_file)
+        ], changes)
+        # The patches are computed once, for the listeners and the history
+        for change, kept_change in zip(changes, model.get_changes_since(version)):
+            self.assertIs(change, kept_change)
+
+    def test_version(self):
+        version = self.model.version
+        self.model.add_file(ModelFile("a", False))
+        self.assertEqual(version + 1, self.model.version)
+        new_file = ModelFile("a", False)
+        new_file.local_size = 100
+        self.model.update_file(new_file)
+        self.assertEqual(version + 2, self.model.version)
+        self.model.remove_file("a")
+        self.assertEqual(version + 3, self.model.version)
+
+        # Versions of different models don't match
+        self.assertNotEqual(self.model.version, Model().version)
+
+    def test_get_changes_since(self):
+        model = Model(history_max_nodes=3)
+        version = model.version
+        self.assertEqual([], model.get_changes_since(version))
+
+        file_a = ModelFile("a", False)
+        model.add_file(file_a)
+        file_a2 = ModelFile("a", False)
+        file_a2.local_size = 100
+        model.update_file(file_a2)
+        # Updates are kept as patches
+        change_added = ModelChange(version + 1, "a", new_file=file_a)
+        change_updated = ModelChange(version + 2, "a", patches=[
+            ModelFilePatch(ModelFilePatch.Change.UPDATED, "a", fields={"local_size": 100})
+        ])
+        self.assertEqual([change_added, change_updated], model.get_changes_since(version))
+        self.assertEqual([change_updated], model.get_changes_since(version + 1))
+        self.assertEqual([], model.get_changes_since(version + 2))
+
+        model.remove_file("a")
+        self.assertEqual([ModelChange(version + 3, "a", old_file=file_a2)], model.get_changes_since(version + 2))
+
+        # Oldest change is dropped
+        model.add_file(file_a)
+        self.assertIsNone(model.get_changes_since(version))
+        self.assertEqual(3, len(model.get_changes_since(version + 1)))
+
+        # Unknown versions
+        self.assertIsNone(model.get_changes_since(version + 5))
+        self.assertIsNone(model.get_changes_since(Model().version))
+
+    def test_history_num_nodes(self):
+        def _build(size: int) -> ModelFile:
+            _file = ModelFile("a", True)
+            for _i in range(3):
+                _child = ModelFile("a{}".format(_i), False)
+                _child.local_size = size if _i == 0 else 10
+                _file.add_child(_child)
+            _file.freeze()
+            return _file
+
+        model = Model(history_max_nodes=6)
+        version = model.version
+        model.add_file(_build(10))
+        self.assertEqual(4, model.history_num_nodes)
+        model.update_file(_build(20))
+        self.assertEqual(5, model.history_num_nodes)
+        model.update_file(_build(30))
+        self.assertEqual(6, model.history_num_nodes)
+        self.assertEqual(3, len(model.get_changes_since(version)))
+
+        # Added file no longer fits
+        model.update_file(_build(40))
+        self.assertEqual(3, model.history_num_nodes)
+        self.assertIsNone(model.get_changes_since(version))
+        self.assertEqual(3, len(model.get_changes_since(version + 1)))
+
+        # Removed file holds the whole file
+        model.remove_file("a")
+        self.assertEqual(6, model.history_num_nodes)
+        self.assertIsNone(model.get_changes_since(version + 1))
+        self.assertEqual(3, len(model.get_changes_since(version + 2)))
+
+        # A change that doesn't fit by itself isn't kept
+        model = Model(history_max_nodes=3)
+        version = model.version
+        model.add_file(_build(10))
+        self.assertEqual(0, model.history_num_nodes)
+        self.assertIsNone(model.get_changes_since(version))
+        self.assertEqual([], model.get_changes_since(version + 1))
+
+    def test_history_memory_is_bounded(self):
+        # Every update of a large tree is a whole new tree, as built by the
+        # model builder, but only the patches between them are kept
+        num_children = 2000
+
+        def _build(size: int) -> ModelFile:
+            _file = ModelFile("a", True)
+            for _i in range(num_children):
+                _child = ModelFile("a{}".format(_i), False)
+                _child.local_size = size if _i == 0 else 10
+                _file.add_child(_child)
+            _file.freeze()
+            return _file
+
+        model = Model(history_max_nodes=10000)
+        tracemalloc.start()
+        try:
+            gc.collect()
+            memory_start = tracemalloc.get_traced_memory()[0]
+            model.add_file(_build(0))
+            gc.collect()
+            tree_memory = tracemalloc.get_traced_memory()[0] - memory_start
+            version = model.version
+            for size in range(1, 51):
+                model.update_file(_build(size))
+            gc.collect()
+            memory = tracemalloc.get_traced_memory()[0] - memory_start
+        finally:
+            tracemalloc.stop()
+        self.assertLessEqual(model.history_num_nodes, 10000)
+        self.assertEqual(50, len(model.get_changes_since(version)))
+        # The current tree and the added tree, not every version of it
+        self.assertLess(memory, 3 * tree_memory)
+
+    def test_get_changes_since_without_history(self):
+        version = self.model.version
+        self.model.add_file(ModelFile("a", False))
+        self.assertIsNone(self.model.get_changes_since(version))
+        self.assertEqual([], self.model.get_changes_since(self.model.version))
+
+    def test_changes_not_built_without_history_or_listeners(self):
+        old_file = ModelFile("a", False)
+        self.model.add_file(old_file)
+        new_file = ModelFile("a", False)
+        new_file.local_size = 100
+        with patch("model.model.ModelFilePatch.diff_files") as mock_diff_files:
+            self.model.update_file(new_file)
+            mock_diff_files.assert_not_called()
+            # A listener still gets the change
+            listener = DummyModelListener()
+            listener.model_changed = MagicMock()
+            self.model.add_listener(listener)
+            self.model.update_file(old_file)
+            mock_diff_files.assert_called_once_with(new_file, old_file)
+            # noinspection PyUnresolvedReferences
+            listener.model_changed.assert_called_once()
@@ -0,0 +1,43 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+
+from model import ModelFile, ModelFilePatch
+
+
+class TestModelFilePatch(unittest.TestCase):
+    def test_diff_files(self):
+        def _build(sizes: dict) -> ModelFile:
+            _a = ModelFile("a", True)
+            _aa = ModelFile("aa", True)
+            _a.add_child(_aa)
+            for _name, _size in sizes.items():
+                _file = ModelFile(_name, False)
+                _file.local_size = _size
+                _aa.add_child(_file)
+            _a.freeze()
+            return _a
+
+        a1 = _build({"aaa": 100, "aab": 200, "aac": 300})
+        a2 = _build({"aaa": 100, "aab": 250, "aad": 400})
+        patches = sorted(ModelFilePatch.diff_files(a1, a2), key=lambda p: p.path)
+        self.assertEqual([
+            ModelFilePatch(ModelFilePatch.Change.UPDATED, "a/aa/aab", fields={"local_size": 250}),
+            ModelFilePatch(ModelFilePatch.Change.REMOVED, "a/aa/aac"),
+            ModelFilePatch(ModelFilePatch.Change.ADDED, "a/aa/aad", file=a2.get_child("aa").get_child("aad"))
+        ], patches)
+
+        # identical trees have no patches
+        self.assertEqual([], ModelFilePatch.diff_files(a1, _build({"aaa": 100, "aab": 200, "aac": 300})))
+
+    def test_diff_files_is_dir_changed(self):
+        a1 = ModelFile("a", True)
+        a1.add_child(ModelFile("aa", True))
+        a2 = ModelFile("a", True)
+        aa2 = ModelFile("aa", False)
+        a2.add_child(aa2)
+        patches = ModelFilePatch.diff_files(a1, a2)
+        self.assertEqual([
+            ModelFilePatch(ModelFilePatch.Change.REMOVED, "a/aa"),
+            ModelFilePatch(ModelFilePatch.Change.ADDED, "a/aa", file=aa2)
+        ], patches)
@@ -141,6 +141,16 @@ class TestSeedsync(unittest.TestCase):
         config2_dict = config2.as_dict()
         self.assertEqual(config_dict, config2_dict)
 
+    def test_default_config_uses_plain_scans(self):
+        # Persistent connections and watches are opt-in
+        config = Seedsync._create_default_config()
+        self.assertFalse(config.lftp.use_ssh_multiplexing)
+        self.assertFalse(config.controller.use_local_watch)
+        self.assertFalse(config.controller.use_remote_scan_agent)
+        self.assertFalse(config.controller.use_remote_watch)
+        # Remote scans keep their interval
+        self.assertFalse(config.controller.use_remote_scan_backoff)
+
     def test_detect_incomplete_config(self):
         # Test a complete config
         config = Seedsync._create_default_config()
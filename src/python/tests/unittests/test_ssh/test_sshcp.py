@@ -123,6 +123,39 @@ class TestSshcp(unittest.TestCase):
         out_str = out.decode().strip()
         self.assertEqual(self.local_dir, out_str)
 
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password)
+        # Output must arrive unmodified, including newlines and whitespace
+        data = bytes(range(256)) * 100 + b"\r\n\n\r "
+        with open(self.local_file, "wb") as f:
+            f.write(data)
+        chunks = []
+        sshcp.shell_stream("cat {}".format(self.local_file), chunks.append)
+        self.assertTrue(b"".join(chunks).endswith(data))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(10)
+    def test_shell_multiplexed(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_multiplexing=True)
+        # Second command runs over the master started by the first
+        for _ in range(2):
+            out = sshcp.shell("cd {}; pwd".format(self.local_dir))
+            self.assertEqual(self.local_dir, out.decode().strip())
+        sshcp.copy(local_path=self.local_file, remote_path=self.remote_file)
+        self.assertTrue(filecmp.cmp(self.local_file, self.remote_file))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_multiplexed_error_bad_host(self, _, password):
+        sshcp = Sshcp(host="badhost", port=self.port, user=self.user, password=password,
+                      use_multiplexing=True)
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell("cd {}; pwd".format(self.local_dir))
+        self.assertTrue("Bad hostname" in str(ctx.exception))
+
     @parameterized.expand(_PARAMS)
     @timeout_decorator.timeout(5)
     def test_shell_with_escape_characters(self, _, password):
@@ -0,0 +1,80 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+
+from system import ExcludeMatcher
+
+
+class TestExcludeMatcher(unittest.TestCase):
+    def test_no_patterns(self):
+        matcher = ExcludeMatcher()
+        self.assertIsNone(matcher.match("a", False))
+        self.assertFalse(matcher.is_excluded("a", True))
+
+    def test_comments_and_blank_lines(self):
+        matcher = ExcludeMatcher(["# a comment", "", "   "])
+        self.assertTrue(matcher.is_empty)
+        self.assertIsNone(matcher.match("# a comment", False))
+
+    def test_name_matches_at_any_depth(self):
+        matcher = ExcludeMatcher(["*.nfo"])
+        self.assertTrue(matcher.is_excluded("a.nfo", False))
+        self.assertTrue(matcher.is_excluded("x/y/a.nfo", False))
+        self.assertFalse(matcher.is_excluded("a.nfo.mkv", False))
+        self.assertFalse(matcher.is_excluded("a.nfo/b", False))
+
+    def test_path_is_anchored(self):
+        matcher = ExcludeMatcher(["/Sample", "x/Proof"])
+        self.assertTrue(matcher.is_excluded("Sample", True))
+        self.assertFalse(matcher.is_excluded("x/Sample", True))
+        self.assertTrue(matcher.is_excluded("x/Proof", True))
+        self.assertFalse(matcher.is_excluded("y/x/Proof", True))
+
+    def test_dir_only(self):
+        matcher = ExcludeMatcher(["Subs/"])
+        self.assertTrue(matcher.is_excluded("Subs", True))
+        self.assertTrue(matcher.is_excluded("x/Subs", True))
+        self.assertFalse(matcher.is_excluded("Subs", False))
+
+    def test_wildcards(self):
+        matcher = ExcludeMatcher(["a?c", "[!x]y", "[0-9]z", "*/sub*"])
+        self.assertTrue(matcher.is_excluded("abc", False))
+        self.assertFalse(matcher.is_excluded("a/c", False))
+        self.assertTrue(matcher.is_excluded("ay", False))
+        self.assertFalse(matcher.is_excluded("xy", False))
+        self.assertTrue(matcher.is_excluded("5z", False))
+        self.assertTrue(matcher.is_excluded("d/subs", True))
+        self.assertFalse(matcher.is_excluded("d/e/subs", True))
+
+    def test_double_star(self):
+        matcher = ExcludeMatcher(["**/cache", "a/**/b", "logs/**"])
+        self.assertTrue(matcher.is_excluded("cache", True))
+        self.assertTrue(matcher.is_excluded("x/y/cache", True))
+        self.assertTrue(matcher.is_excluded("a/b", False))
+        self.assertTrue(matcher.is_excluded("a/x/y/b", False))
+        self.assertTrue(matcher.is_excluded("logs/x", False))
+        self.assertTrue(matcher.is_excluded("logs/x/y", True))
+        self.assertFalse(matcher.is_excluded("logs", True))
+
+    def test_last_match_wins(self):
+        matcher = ExcludeMatcher(["*.nfo", "!keep.nfo", "keep.nfo/"])
+        self.assertTrue(matcher.is_excluded("a.nfo", False))
+        self.assertIs(False, matcher.match("keep.nfo", False))
+        self.assertIs(True, matcher.match("keep.nfo", True))
+
+    def test_escapes(self):
+        matcher = ExcludeMatcher(["\\#name", "\\!name", "a\\*", "trailing\\ "])
+        self.assertTrue(matcher.is_excluded("#name", False))
+        self.assertTrue(matcher.is_excluded("!name", False))
+        self.assertTrue(matcher.is_excluded("a*", False))
+        self.assertFalse(matcher.is_excluded("ab", False))
+        self.assertTrue(matcher.is_excluded("trailing ", False))
+
+    def test_prefix_and_suffix(self):
+        matcher = ExcludeMatcher()
+        matcher.add_prefix(".")
+        matcher.add_suffix(".lftp-pget-status")
+        self.assertTrue(matcher.is_excluded(".hidden", True))
+        self.assertTrue(matcher.is_excluded("a/.hidden", False))
+        self.assertFalse(matcher.is_excluded("a.b", False))
+        self.assertTrue(matcher.is_excluded("a/b.lftp-pget-status", False))
@@ -0,0 +1,121 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import pickle
+import unittest
+
+from system import SystemFile, SystemFileTree, SystemFileView
+
+
+class TestSystemFileTree(unittest.TestCase):
+    def setUp(self):
+        # a [dir]
+        #   aa [dir]
+        #     x [file]
+        #   ab [file]
+        # b [dir]
+        #   x [file]
+        # c [file]
+        self.a = SystemFile("a", 300, True)
+        aa = SystemFile("aa", 100, True)
+        aa.add_child(SystemFile("x", 100, False))
+        self.a.add_child(aa)
+        self.a.add_child(SystemFile("ab", 200, False))
+        self.b = SystemFile("b", 5, True)
+        self.b.add_child(SystemFile("x", 5, False))
+        self.c = SystemFile("c", 1234, False)
+
+    def test_roots(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        self.assertEqual(7, len(tree))
+        roots = tree.roots
+        self.assertEqual(["a", "b", "c"], [f.name for f in roots])
+        self.assertEqual([300, 5, 1234], [f.size for f in roots])
+        self.assertEqual([True, True, False], [f.is_dir for f in roots])
+
+    def test_children(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        a, b, c = tuple(tree.roots)
+        self.assertEqual(["aa", "ab"], [f.name for f in a.children])
+        aa, ab = tuple(a.children)
+        self.assertTrue(aa.is_dir)
+        self.assertEqual(100, aa.size)
+        self.assertEqual(1, len(aa.children))
+        self.assertEqual("x", aa.children[0].name)
+        self.assertEqual(100, aa.children[0].size)
+        self.assertFalse(ab.is_dir)
+        self.assertEqual(0, len(ab.children))
+        self.assertEqual(["x"], [f.name for f in b.children])
+        self.assertEqual(5, b.children[0].size)
+        self.assertEqual([], c.children)
+
+    def test_parent(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b])
+        self.assertEqual(-1, tree.parent(0))
+        self.assertEqual(0, tree.parent(1))
+        self.assertEqual(1, tree.parent(2))
+        self.assertEqual(0, tree.parent(3))
+        self.assertEqual(-1, tree.parent(4))
+        self.assertEqual(4, tree.parent(5))
+
+    def test_equality_with_system_file(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        self.assertEqual([self.a, self.b, self.c], tree.roots)
+        self.assertEqual(tree.roots, [self.a, self.b, self.c])
+        self.assertNotEqual(self.b, tree.roots[0])
+
+    def test_to_system_files(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        files = tree.to_system_files()
+        self.assertEqual([self.a, self.b, self.c], files)
+        self.assertTrue(all(type(f) == SystemFile for f in files))
+
+    def test_fingerprint(self):
+        fingerprint = SystemFileTree.from_system_files([self.a, self.b, self.c]).fingerprint()
+        self.assertEqual(fingerprint, SystemFileTree.from_system_files([self.a, self.b, self.c]).fingerprint())
+        # Same files, different structure
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files([self.a, self.b]).fingerprint())
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files([self.b, self.a, self.c]).fingerprint())
+        # Child moved up to the root
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files(
+            [self.a, SystemFile("b", 5, True), SystemFile("x", 5, False), self.c]).fingerprint())
+        # Different size, name or type
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files(
+            [self.a, self.b, SystemFile("c", 1235, False)]).fingerprint())
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files(
+            [self.a, self.b, SystemFile("d", 1234, False)]).fingerprint())
+        self.assertNotEqual(fingerprint, SystemFileTree.from_system_files(
+            [self.a, self.b, SystemFile("c", 1234, True)]).fingerprint())
+
+    def test_to_bytes(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        tree = SystemFileTree.from_bytes(tree.to_bytes())
+        self.assertEqual([self.a, self.b, self.c], tree.to_system_files())
+        self.assertEqual([2], list(tree.child_indices(1)))
+        self.assertEqual(SystemFileTree.from_system_files([self.a, self.b, self.c]).fingerprint(),
+                         tree.fingerprint())
+
+        # Names that aren't valid utf-8
+        files = [SystemFile("caf\xe9", 1, False), SystemFile("\udce9", 2, False)]
+        tree = SystemFileTree.from_bytes(SystemFileTree.from_system_files(files).to_bytes())
+        self.assertEqual(files, tree.to_system_files())
+
+        tree = SystemFileTree.from_bytes(SystemFileTree.from_system_files([]).to_bytes())
+        self.assertEqual(0, len(tree))
+
+    def test_empty(self):
+        tree = SystemFileTree.from_system_files([])
+        self.assertEqual(0, len(tree))
+        self.assertEqual([], tree.roots)
+        self.assertEqual([], tree.to_system_files())
+
+    def test_pickle(self):
+        tree = SystemFileTree.from_system_files([self.a, self.b, self.c])
+        unpickled = pickle.loads(pickle.dumps(tree))
+        self.assertEqual([self.a, self.b, self.c], unpickled.roots)
+
+    def test_view_is_read_only(self):
+        tree = SystemFileTree.from_system_files([self.a])
+        view = tree.roots[0]
+        self.assertIsInstance(view, SystemFileView)
+        with self.assertRaises(TypeError):
+            view.add_child(SystemFile("new", 0, False))
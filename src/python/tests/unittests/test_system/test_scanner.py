@@ -5,8 +5,9 @@ import shutil
 import tempfile
 import unittest
 from threading import Thread
+from unittest.mock import patch
 
-from system import SystemScanner, SystemScannerError
+from system import SystemScanner, SystemScannerError, ExcludeMatcher
 
 
 # noinspection SpellCheckingInspection
@@ -585,3 +586,424 @@ class TestSystemScanner(unittest.TestCase):
             self.assertIn("c", names)
         stop = True
         thread.join()
+
+    def test_scan_parallel_matches_serial(self):
+        serial_scanner = SystemScanner(TestSystemScanner.temp_dir)
+        parallel_scanner = SystemScanner(TestSystemScanner.temp_dir)
+        parallel_scanner.set_num_workers(4)
+        self.assertEqual(serial_scanner.scan(), parallel_scanner.scan())
+        self.assertEqual(serial_scanner.scan_single("b"), parallel_scanner.scan_single("b"))
+
+        serial_scanner.add_exclude_prefix(".")
+        parallel_scanner.add_exclude_prefix(".")
+        self.assertEqual(serial_scanner.scan(), parallel_scanner.scan())
+
+    def test_scan_parallel_size(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_num_workers(3)
+        files = scanner.scan()
+        self.assertEqual(3, len(files))
+        a, b, c = tuple(files)
+        ba, bb = tuple(b.children)
+        bba, bbb, bbc = tuple(bb.children)
+        self.assertEqual(12*1024+4+512, a.size)
+        self.assertEqual(512+7+24*1024*1024+24+1, b.size)
+        self.assertEqual(24*1024*1024+24+1, bb.size)
+        self.assertEqual(["bba", "bbb", "bbc"], [f.name for f in bb.children])
+        self.assertEqual(1234, c.size)
+
+    def test_scan_iter_matches_scan(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        self.assertEqual(scanner.scan(), list(scanner.scan_iter()))
+        scanner.add_exclude_prefix(".")
+        self.assertEqual(scanner.scan(), list(scanner.scan_iter()))
+
+    def test_scan_iter_non_existing_dir_fails(self):
+        scanner = SystemScanner(
+            path_to_scan=os.path.join(TestSystemScanner.temp_dir, "nonexisting")
+        )
+        with self.assertRaises(SystemScannerError):
+            list(scanner.scan_iter())
+
+    def test_set_num_workers_rejects_zero(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        with self.assertRaises(ValueError):
+            scanner.set_num_workers(0)
+
+    def test_scan_cache_matches_uncached(self):
+        uncached_scanner = SystemScanner(TestSystemScanner.temp_dir)
+        cached_scanner = SystemScanner(TestSystemScanner.temp_dir)
+        cached_scanner.enable_cache()
+        self.assertEqual(uncached_scanner.scan(), cached_scanner.scan())
+        self.assertEqual(uncached_scanner.scan(), cached_scanner.scan())
+        self.assertEqual(uncached_scanner.scan_single("b"), cached_scanner.scan_single("b"))
+
+        # Exclusions apply to cached listings too
+        uncached_scanner.add_exclude_prefix(".")
+        cached_scanner.add_exclude_prefix(".")
+        self.assertEqual(uncached_scanner.scan(), cached_scanner.scan())
+
+    def test_scan_cache_hits_and_misses(self):
+        # Make the directories old enough to be trusted by the cache
+        old_time = os.stat(TestSystemScanner.temp_dir).st_mtime - 60
+        for dir_path, _, _ in os.walk(TestSystemScanner.temp_dir):
+            os.utime(dir_path, (old_time, old_time))
+
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        scanner.scan()
+        # root, a, aa, .aaa, b, ba, bb, bba, bbc, bbca
+        self.assertEqual(0, scanner.cache_hits)
+        self.assertEqual(10, scanner.cache_misses)
+
+        scanner.scan()
+        self.assertEqual(10, scanner.cache_hits)
+        self.assertEqual(10, scanner.cache_misses)
+
+        scanner.scan_single("b")
+        self.assertEqual(16, scanner.cache_hits)
+        self.assertEqual(10, scanner.cache_misses)
+
+    def test_scan_cache_detects_changes(self):
+        old_time = os.stat(TestSystemScanner.temp_dir).st_mtime - 60
+        for dir_path, _, _ in os.walk(TestSystemScanner.temp_dir):
+            os.utime(dir_path, (old_time, old_time))
+
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        scanner.scan()
+
+        # File grows inside an unchanged directory
+        with open(os.path.join(TestSystemScanner.temp_dir, "b", "ba", "baa"), "ab") as f:
+            f.write(bytearray([0xff] * 100))
+        # New file in a directory
+        with open(os.path.join(TestSystemScanner.temp_dir, "a", "ac"), "wb") as f:
+            f.write(bytearray([0xff] * 10))
+        # Removed directory
+        shutil.rmtree(os.path.join(TestSystemScanner.temp_dir, "b", "bb", "bbc"))
+
+        files = scanner.scan()
+        a, b, c = tuple(files)
+        self.assertEqual(["aa", "ab", "ac"], [f.name for f in a.children])
+        self.assertEqual(12*1024+4+512+10, a.size)
+        ba, bb = tuple(b.children)
+        self.assertEqual(512+7+100, ba.size)
+        self.assertEqual(["bba", "bbb"], [f.name for f in bb.children])
+        self.assertEqual(512+7+100+24*1024*1024+24, b.size)
+        self.assertEqual(SystemScanner(TestSystemScanner.temp_dir).scan(), files)
+
+    def test_scan_cache_parallel(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        scanner.set_num_workers(4)
+        self.assertEqual(SystemScanner(TestSystemScanner.temp_dir).scan(), scanner.scan())
+        self.assertEqual(SystemScanner(TestSystemScanner.temp_dir).scan(), scanner.scan())
+        self.assertEqual(20, scanner.cache_hits + scanner.cache_misses)
+
+    def test_scan_cache_lftp_partial_file(self):
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        path = os.path.join(tempdir, "partial.mkv")
+        with open(path, 'wb') as f:
+            f.write(bytearray([0xff] * 24588))
+        status_path = os.path.join(tempdir, "partial.mkv.lftp-pget-status")
+        with open(status_path, "w") as f:
+            f.write("size=24588\n0.pos=3157\n0.limit=24588\n")
+
+        scanner = SystemScanner(tempdir)
+        scanner.enable_cache()
+        self.assertEqual(3157, scanner.scan()[0].size)
+        # Status file changes without changing the downloaded file
+        with open(status_path, "w") as f:
+            f.write("size=24588\n0.pos=20000\n0.limit=24588\n")
+        self.assertEqual(20000, scanner.scan()[0].size)
+        # Download finished
+        os.remove(status_path)
+        self.assertEqual(24588, scanner.scan()[0].size)
+
+        shutil.rmtree(tempdir)
+
+    def __write_ignore_file(self, text: str, *args):
+        with open(os.path.join(TestSystemScanner.temp_dir, *args, ".seedsyncignore"), "w") as f:
+            f.write(text)
+
+    def test_scan_excluded_pattern(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.add_exclude_pattern("bb*/")
+        scanner.add_exclude_pattern("/a/ab")
+        files = scanner.scan()
+        a, b, c = tuple(files)
+        self.assertEqual(["aa"], [f.name for f in a.children])
+        self.assertEqual(512, a.size)
+        self.assertEqual(["ba"], [f.name for f in b.children])
+        self.assertEqual(512+7, b.size)
+        self.assertEqual(files, list(scanner.scan_iter()))
+
+    def test_scan_ignore_file(self):
+        # Patterns apply to the whole tree below the ignore file
+        self.__write_ignore_file("# comment\nba\nbbb\n", "b")
+        self.__write_ignore_file("c\n")
+        files = SystemScanner(TestSystemScanner.temp_dir).scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+        b = files[1]
+        self.assertEqual(["bb"], [f.name for f in b.children])
+        bb = b.children[0]
+        self.assertEqual(["bba", "bbc"], [f.name for f in bb.children])
+        self.assertEqual(1, b.size)
+
+        # Same result with the cache and the parallel walker
+        cached_scanner = SystemScanner(TestSystemScanner.temp_dir)
+        cached_scanner.enable_cache()
+        cached_scanner.set_num_workers(3)
+        self.assertEqual(files, cached_scanner.scan())
+        self.assertEqual(files, cached_scanner.scan())
+
+    def test_scan_ignore_file_negation(self):
+        # A deeper ignore file overrides the patterns of its ancestors
+        self.__write_ignore_file("b*\n!b\n")
+        self.__write_ignore_file("!bbb\n", "b", "bb")
+        files = SystemScanner(TestSystemScanner.temp_dir).scan()
+        a, b, c = tuple(files)
+        self.assertEqual([], [f.name for f in b.children])
+        # bb is excluded, so its ignore file is never read
+        self.__write_ignore_file("b*\n!b\n!bb\n")
+        files = SystemScanner(TestSystemScanner.temp_dir).scan()
+        a, b, c = tuple(files)
+        bb = b.children[0]
+        self.assertEqual(["bbb"], [f.name for f in bb.children])
+
+    def test_scan_ignore_file_cannot_include_scanner_exclusions(self):
+        self.__write_ignore_file("!.*\n")
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.add_exclude_prefix(".")
+        a, b, c = tuple(scanner.scan())
+        aa = a.children[0]
+        self.assertEqual([], aa.children)
+
+    def test_scan_cache_detects_ignore_file_changes(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        self.__write_ignore_file("ba\n", "b")
+        b = scanner.scan()[1]
+        self.assertEqual(["bb"], [f.name for f in b.children])
+        self.__write_ignore_file("bb\n", "b")
+        b = scanner.scan()[1]
+        self.assertEqual(["ba"], [f.name for f in b.children])
+        os.remove(os.path.join(TestSystemScanner.temp_dir, "b", ".seedsyncignore"))
+        b = scanner.scan()[1]
+        self.assertEqual(["ba", "bb"], [f.name for f in b.children])
+
+    def test_scan_single_ignore_file(self):
+        self.__write_ignore_file("c\nb/bb/bbb\n")
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        with self.assertRaises(SystemScannerError):
+            scanner.scan_single("c")
+        b = scanner.scan_single("b")
+        bb = b.children[1]
+        self.assertEqual(["bba", "bbc"], [f.name for f in bb.children])
+
+    def test_scan_single_caches_ignore_file(self):
+        self.__write_ignore_file("c\n")
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        with patch("system.scanner.ExcludeMatcher.from_file", wraps=ExcludeMatcher.from_file) as mock_from_file:
+            scanner.scan_single("a")
+            scanner.scan_single("b")
+            with self.assertRaises(SystemScannerError):
+                scanner.scan_single("c")
+            self.assertEqual(1, mock_from_file.call_count)
+            # A changed ignore file is read again
+            self.__write_ignore_file("b\n")
+            ignore_file_path = os.path.join(TestSystemScanner.temp_dir, ".seedsyncignore")
+            new_time = os.stat(ignore_file_path).st_mtime + 10
+            os.utime(ignore_file_path, (new_time, new_time))
+            with self.assertRaises(SystemScannerError):
+                scanner.scan_single("b")
+            self.assertEqual(2, mock_from_file.call_count)
+        # The cached ignore file doesn't stand in for a listing
+        self.assertEqual(SystemScanner(TestSystemScanner.temp_dir).scan(), scanner.scan())
+
+    def test_scan_cache_retain_cached_roots(self):
+        old_time = os.stat(TestSystemScanner.temp_dir).st_mtime - 60
+        for dir_path, _, _ in os.walk(TestSystemScanner.temp_dir):
+            os.utime(dir_path, (old_time, old_time))
+
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.enable_cache()
+        scanner.scan_single("a")
+        scanner.scan_single("b")
+        # a, aa, .aaa, b, ba, bb, bba, bbc, bbca
+        self.assertEqual(9, scanner.cache_misses)
+
+        # Listings of b are dropped
+        scanner.retain_cached_roots(["a"])
+        scanner.scan_single("a")
+        self.assertEqual(3, scanner.cache_hits)
+        self.assertEqual(9, scanner.cache_misses)
+        scanner.scan_single("b")
+        self.assertEqual(3, scanner.cache_hits)
+        self.assertEqual(15, scanner.cache_misses)
+
+        # A name that is a prefix of another doesn't retain it
+        os.mkdir(os.path.join(TestSystemScanner.temp_dir, "ab"))
+        scanner.scan_single("ab")
+        scanner.retain_cached_roots(["a"])
+        scanner.scan_single("ab")
+        self.assertEqual(17, scanner.cache_misses)
+
+        scanner.retain_cached_roots([])
+        scanner.scan_single("a")
+        self.assertEqual(20, scanner.cache_misses)
+
+    def test_scan_single_excluded_prefix_fails(self):
+        scanner = SystemScanner(os.path.join(TestSystemScanner.temp_dir, "a", "aa"))
+        scanner.add_exclude_prefix(".")
+        with self.assertRaises(SystemScannerError):
+            scanner.scan_single(".aab")
+
+    def test_scan_cache_lftp_status_size_reused(self):
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        path = os.path.join(tempdir, "partial.mkv")
+        with open(path, 'wb') as f:
+            f.write(bytearray([0xff] * 24588))
+        status_path = os.path.join(tempdir, "partial.mkv.lftp-pget-status")
+        with open(status_path, "w") as f:
+            f.write("size=24588\n0.pos=3157\n0.limit=24588\n")
+        old_time = os.stat(status_path).st_mtime - 60
+        os.utime(status_path, (old_time, old_time))
+
+        scanner = SystemScanner(tempdir)
+        scanner.enable_cache()
+        self.assertEqual(3157, scanner.scan()[0].size)
+        # Same size and mtime, so the status file is not read again
+        with open(status_path, "w") as f:
+            f.write("size=24588\n0.pos=4157\n0.limit=24588\n")
+        os.utime(status_path, (old_time, old_time))
+        self.assertEqual(3157, scanner.scan()[0].size)
+        # A new mtime invalidates the cached size
+        os.utime(status_path, (old_time + 1, old_time + 1))
+        self.assertEqual(4157, scanner.scan()[0].size)
+
+        shutil.rmtree(tempdir)
+
+    def test_scan_lftp_status_file_lookup_uses_listing(self):
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        for name in ("a", "b", "c"):
+            with open(os.path.join(tempdir, name), 'wb') as f:
+                f.write(bytearray([0xff] * 100))
+        with open(os.path.join(tempdir, "b.lftp-pget-status"), "w") as f:
+            f.write("size=100\n0.pos=10\n0.limit=100\n")
+
+        scanner = SystemScanner(tempdir)
+        with patch("os.path.isfile", side_effect=AssertionError("unexpected isfile")):
+            files = scanner.scan()
+        self.assertEqual([100, 10, 100], [f.size for f in files])
+
+        shutil.rmtree(tempdir)
+
+    @staticmethod
+    def __write_sparse(path: str, length: int, data_ranges):
+        with open(path, "wb") as f:
+            f.truncate(length)
+            for offset, size in data_ranges:
+                f.seek(offset)
+                f.write(bytearray([0xff] * size))
+
+    def test_data_extents_size(self):
+        path = os.path.join(TestSystemScanner.temp_dir, "sparse")
+        block = 64 * 1024
+        TestSystemScanner.__write_sparse(path, 16 * block, [(0, block), (8 * block, 2 * block)])
+        size = SystemScanner._data_extents_size(path, 16 * block)
+        if size == 16 * block:
+            self.skipTest("Filesystem doesn't support sparse files")
+        self.assertEqual(3 * block, size)
+        # Only counted up to the given length
+        self.assertEqual(block + block, SystemScanner._data_extents_size(path, 9 * block))
+        # All holes
+        TestSystemScanner.__write_sparse(path, 16 * block, [])
+        self.assertEqual(0, SystemScanner._data_extents_size(path, 16 * block))
+        # Dense file
+        TestSystemScanner.__write_sparse(path, 100, [(0, 100)])
+        self.assertEqual(100, SystemScanner._data_extents_size(path, 100))
+        # Missing file
+        self.assertIsNone(SystemScanner._data_extents_size(path + "x", 100))
+
+    def test_scan_data_extents(self):
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        block = 64 * 1024
+        path = os.path.join(tempdir, "partial.mkv")
+        TestSystemScanner.__write_sparse(path, 16 * block, [(0, block), (8 * block, block)])
+        if SystemScanner._data_extents_size(path, 16 * block) == 16 * block:
+            shutil.rmtree(tempdir)
+            self.skipTest("Filesystem doesn't support sparse files")
+        # Status file is stale, but the extents are what counts
+        with open(path + ".lftp-pget-status", "w") as f:
+            f.write("size={}\n0.pos=0\n0.limit={}\n".format(16 * block, 16 * block))
+
+        for cached in (False, True):
+            scanner = SystemScanner(tempdir)
+            if cached:
+                scanner.enable_cache()
+            scanner.set_use_data_extents(True)
+            self.assertEqual(2 * block, scanner.scan()[0].size)
+            self.assertEqual(2 * block, scanner.scan_single("partial.mkv").size)
+            # Without extents, the status file is used
+            scanner.set_use_data_extents(False)
+            self.assertEqual(0, scanner.scan()[0].size)
+
+        shutil.rmtree(tempdir)
+
+    def test_scan_data_extents_complete_sparse_file(self):
+        # A complete file can have holes too, only partial downloads are
+        # measured by their extents
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        block = 64 * 1024
+        path = os.path.join(tempdir, "complete.img")
+        TestSystemScanner.__write_sparse(path, 16 * block, [(0, block), (8 * block, block)])
+        if SystemScanner._data_extents_size(path, 16 * block) == 16 * block:
+            shutil.rmtree(tempdir)
+            self.skipTest("Filesystem doesn't support sparse files")
+
+        for cached in (False, True):
+            scanner = SystemScanner(tempdir)
+            if cached:
+                scanner.enable_cache()
+            scanner.set_use_data_extents(True)
+            self.assertEqual(16 * block, scanner.scan()[0].size)
+            self.assertEqual(16 * block, scanner.scan_single("complete.img").size)
+
+        shutil.rmtree(tempdir)
+
+    def test_scan_data_extents_temp_file(self):
+        # An lftp temp file is a partial download, even without a status file
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        block = 64 * 1024
+        path = os.path.join(tempdir, "partial.mkv.lftp")
+        TestSystemScanner.__write_sparse(path, 16 * block, [(0, block), (8 * block, block)])
+        if SystemScanner._data_extents_size(path, 16 * block) == 16 * block:
+            shutil.rmtree(tempdir)
+            self.skipTest("Filesystem doesn't support sparse files")
+
+        scanner = SystemScanner(tempdir)
+        scanner.set_lftp_temp_suffix(".lftp")
+        scanner.set_use_data_extents(True)
+        files = scanner.scan()
+        self.assertEqual("partial.mkv", files[0].name)
+        self.assertEqual(2 * block, files[0].size)
+
+        shutil.rmtree(tempdir)
+
+    def test_scan_data_extents_dense_file_uses_status_file(self):
+        # A fully written file with a status file may be on a filesystem without
+        # sparse files, so the status file decides
+        tempdir = tempfile.mkdtemp(prefix="test_system_scanner")
+        path = os.path.join(tempdir, "partial.mkv")
+        with open(path, 'wb') as f:
+            f.write(bytearray([0xff] * 24588))
+        with open(path + ".lftp-pget-status", "w") as f:
+            f.write("size=24588\n0.pos=3157\n0.limit=24588\n")
+        scanner = SystemScanner(tempdir)
+        scanner.set_use_data_extents(True)
+        self.assertEqual(3157, scanner.scan()[0].size)
+        os.remove(path + ".lftp-pget-status")
+        self.assertEqual(24588, scanner.scan()[0].size)
+        shutil.rmtree(tempdir)
@@ -0,0 +1,121 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from system import SystemWatcher, SystemWatcherError
+
+
+class TestSystemWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_system_watcher")
+
+        # a [dir]
+        #   aa [dir]
+        #     aaa [file]
+        # b [file]
+        os.mkdir(os.path.join(self.temp_dir, "a"))
+        os.mkdir(os.path.join(self.temp_dir, "a", "aa"))
+        self.__touch("a", "aa", "aaa")
+        self.__touch("b")
+
+        self.watcher = SystemWatcher(self.temp_dir)
+        try:
+            self.watcher.start()
+        except SystemWatcherError as e:
+            shutil.rmtree(self.temp_dir)
+            self.skipTest(str(e))
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.temp_dir)
+
+    def __touch(self, *args, size: int = 10):
+        with open(os.path.join(self.temp_dir, *args), "ab") as f:
+            f.write(bytearray([0xff] * size))
+
+    def test_no_changes(self):
+        self.assertEqual(set(), self.watcher.pop_changes())
+
+    def test_new_root_file(self):
+        self.__touch("c")
+        self.assertEqual({"c"}, self.watcher.pop_changes())
+        self.assertEqual(set(), self.watcher.pop_changes())
+
+    def test_modified_nested_file(self):
+        self.__touch("a", "aa", "aaa")
+        self.assertEqual({"a"}, self.watcher.pop_changes())
+
+    def test_deleted_file(self):
+        os.remove(os.path.join(self.temp_dir, "b"))
+        os.remove(os.path.join(self.temp_dir, "a", "aa", "aaa"))
+        self.assertEqual({"a", "b"}, self.watcher.pop_changes())
+
+    def test_watches_new_directories(self):
+        os.makedirs(os.path.join(self.temp_dir, "c", "ca"))
+        self.assertEqual({"c"}, self.watcher.pop_changes())
+        self.__touch("c", "ca", "caa")
+        self.assertEqual({"c"}, self.watcher.pop_changes())
+
+    def test_moved_directory(self):
+        os.rename(os.path.join(self.temp_dir, "a", "aa"), os.path.join(self.temp_dir, "d"))
+        self.assertEqual({"a", "d"}, self.watcher.pop_changes())
+        # Events in the moved directory are reported under its new name
+        self.__touch("d", "aaa")
+        self.assertEqual({"d"}, self.watcher.pop_changes())
+
+    def test_directory_moved_out_of_tree(self):
+        outside_dir = tempfile.mkdtemp(prefix="test_system_watcher")
+        try:
+            os.rename(os.path.join(self.temp_dir, "a"), os.path.join(outside_dir, "a"))
+            self.assertEqual({"a"}, self.watcher.pop_changes())
+            # Changes outside the watched tree are not reported
+            with open(os.path.join(outside_dir, "a", "aa", "aaa"), "ab") as f:
+                f.write(b"x")
+            self.assertEqual(set(), self.watcher.pop_changes())
+        finally:
+            shutil.rmtree(outside_dir)
+
+    def test_symlinked_directories(self):
+        outside_dir = tempfile.mkdtemp(prefix="test_system_watcher")
+        try:
+            os.mkdir(os.path.join(outside_dir, "ca"))
+            os.symlink(outside_dir, os.path.join(self.temp_dir, "c"))
+            self.watcher.close()
+            self.watcher.start()
+
+            # Changes below a symlinked directory are reported, as the scanner follows it
+            with open(os.path.join(outside_dir, "ca", "caa"), "wb") as f:
+                f.write(b"x")
+            self.assertEqual({"c"}, self.watcher.pop_changes())
+
+            # New symlinks are followed too, and changes are reported for every path
+            os.symlink(outside_dir, os.path.join(self.temp_dir, "d"))
+            self.assertEqual({"d"}, self.watcher.pop_changes())
+            with open(os.path.join(outside_dir, "ca", "caa"), "ab") as f:
+                f.write(b"x")
+            self.assertEqual({"c", "d"}, self.watcher.pop_changes())
+
+            # Removed symlinks are no longer watched
+            os.remove(os.path.join(self.temp_dir, "c"))
+            os.remove(os.path.join(self.temp_dir, "d"))
+            self.assertEqual({"c", "d"}, self.watcher.pop_changes())
+            with open(os.path.join(outside_dir, "ca", "caa"), "ab") as f:
+                f.write(b"x")
+            self.assertEqual(set(), self.watcher.pop_changes())
+        finally:
+            shutil.rmtree(outside_dir)
+
+    def test_symlink_loop(self):
+        os.symlink(os.path.join(self.temp_dir, "a"), os.path.join(self.temp_dir, "a", "aa", "loop"))
+        self.watcher.close()
+        self.watcher.start()
+        self.__touch("a", "aa", "aaa")
+        self.assertEqual({"a"}, self.watcher.pop_changes())
+
+    def test_pop_changes_fails_if_not_started(self):
+        self.watcher.close()
+        with self.assertRaises(SystemWatcherError):
+            self.watcher.pop_changes()
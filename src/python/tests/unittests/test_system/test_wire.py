@@ -0,0 +1,184 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+
+from system import SystemFile, WireEncoder, WireDecoder, WireError
+
+
+class TestWire(unittest.TestCase):
+    def setUp(self):
+        # a [dir]
+        #   aa [dir]
+        #     x [file]
+        #   ab [file]
+        #   ac [dir, empty]
+        # b [file]
+        self.a = SystemFile("a", 300, True)
+        aa = SystemFile("aa", 100, True)
+        aa.add_child(SystemFile("x", 100, False))
+        self.a.add_child(aa)
+        self.a.add_child(SystemFile("ab", 200, False))
+        self.a.add_child(SystemFile("ac", 0, True))
+        self.b = SystemFile("b", 2**40, False)
+
+    def test_round_trip(self):
+        for compress in (True, False):
+            data = WireEncoder(compress=compress).encode([self.a, self.b])
+            decoder = WireDecoder()
+            decoder.feed(data)
+            self.assertTrue(decoder.done)
+            self.assertEqual([self.a, self.b], decoder.files)
+
+    def test_empty(self):
+        decoder = WireDecoder()
+        decoder.feed(WireEncoder().encode([]))
+        self.assertTrue(decoder.done)
+        self.assertEqual([], decoder.files)
+
+    def test_unicode_names(self):
+        files = [SystemFile("üñíçødé", 1, False), SystemFile("bad\udcff", 2, False)]
+        decoder = WireDecoder()
+        decoder.feed(WireEncoder().encode(files))
+        self.assertEqual(files, decoder.files)
+
+    def test_incremental_decode(self):
+        for compress in (True, False):
+            data = WireEncoder(compress=compress).encode([self.a, self.b])
+            decoder = WireDecoder()
+            completed = []
+            for i in range(len(data)):
+                completed += decoder.feed(data[i:i+1])
+            self.assertTrue(decoder.done)
+            self.assertEqual([self.a, self.b], completed)
+
+    def test_roots_are_decodable_before_end(self):
+        encoder = WireEncoder()
+        decoder = WireDecoder()
+        self.assertEqual([], decoder.feed(encoder.header()))
+        self.assertEqual([self.a], decoder.feed(encoder.encode_file(self.a)))
+        self.assertFalse(decoder.done)
+        self.assertEqual([self.b], decoder.feed(encoder.encode_file(self.b)))
+        self.assertFalse(decoder.done)
+        self.assertEqual([], decoder.feed(encoder.end()))
+        self.assertTrue(decoder.done)
+
+    def test_skips_preamble_and_trailing_data(self):
+        data = b"Welcome to the server\n" + WireEncoder().encode([self.b]) + b"\nlogout\n"
+        decoder = WireDecoder()
+        decoder.feed(data)
+        self.assertTrue(decoder.done)
+        self.assertEqual([self.b], decoder.files)
+
+    def test_error_on_missing_header(self):
+        decoder = WireDecoder()
+        with self.assertRaises(WireError):
+            decoder.feed(b"x" * (128 * 1024))
+
+    def test_error_on_bad_version(self):
+        data = bytearray(WireEncoder(compress=False).encode([self.b]))
+        data[4] = 99
+        with self.assertRaises(WireError):
+            WireDecoder().feed(bytes(data))
+
+    def test_error_on_bad_compressed_data(self):
+        header = WireEncoder().header()
+        with self.assertRaises(WireError):
+            WireDecoder().feed(header + b"not zlib data")
+
+    def test_error_on_unknown_record(self):
+        header = WireEncoder(compress=False).header()
+        with self.assertRaises(WireError):
+            WireDecoder().feed(header + b"\x01\x00\x00\x00\x7f")
+
+    def test_error_on_wrong_root_count(self):
+        encoder = WireEncoder(compress=False)
+        data = encoder.header() + encoder.encode_file(self.b)
+        # End record claims 2 roots
+        data += b"\x05\x00\x00\x00\x02\x02\x00\x00\x00"
+        with self.assertRaises(WireError):
+            WireDecoder().feed(data)
+
+    def test_error_on_end_inside_tree(self):
+        encoder = WireEncoder(compress=False)
+        data = encoder.header() + encoder.encode_file(self.a)
+        # Drop the last record of a's tree (the empty "ac" dir) and end the stream
+        data = data[:-(5 + 13 + 2)]
+        data += b"\x05\x00\x00\x00\x02\x01\x00\x00\x00"
+        with self.assertRaises(WireError):
+            WireDecoder().feed(data)
+
+    def __delta_round_trip(self, old_files, new_files) -> list:
+        encoder = WireEncoder()
+        data = encoder.header() + encoder.generation(2, is_delta=True) + \
+            encoder.encode_delta(old_files, new_files) + encoder.end()
+        decoder = WireDecoder(base_files=old_files)
+        decoder.feed(data)
+        self.assertTrue(decoder.done)
+        self.assertTrue(decoder.is_delta)
+        self.assertEqual(2, decoder.generation)
+        return decoder.files
+
+    def test_generation(self):
+        encoder = WireEncoder()
+        data = encoder.header() + encoder.generation(1234) + encoder.encode_file(self.b) + encoder.end()
+        decoder = WireDecoder()
+        self.assertEqual([self.b], decoder.feed(data))
+        self.assertEqual(1234, decoder.generation)
+        self.assertFalse(decoder.is_delta)
+
+    def test_delta_no_change(self):
+        files = self.__delta_round_trip([self.a, self.b], [self.a, self.b])
+        self.assertEqual([self.a, self.b], files)
+        # Unchanged trees are shared with the base
+        self.assertIs(self.a, files[0])
+
+    def test_delta_changes(self):
+        # a [dir]
+        #   aa [dir]
+        #     x [file, resized]
+        #     y [file, added]
+        #   ab [removed]
+        #   ac [dir -> file]
+        # b [removed]
+        # c [dir, added]
+        #   ca [file]
+        a = SystemFile("a", 165, True)
+        aa = SystemFile("aa", 160, True)
+        aa.add_child(SystemFile("x", 150, False))
+        aa.add_child(SystemFile("y", 10, False))
+        a.add_child(aa)
+        a.add_child(SystemFile("ac", 5, False))
+        c = SystemFile("c", 1, True)
+        c.add_child(SystemFile("ca", 1, False))
+        files = self.__delta_round_trip([self.a, self.b], [a, c])
+        self.assertEqual([a, c], files)
+
+    def test_delta_without_base_fails(self):
+        encoder = WireEncoder()
+        data = encoder.header() + encoder.generation(2, is_delta=True) + \
+            encoder.encode_delta([self.a], [self.b]) + encoder.end()
+        with self.assertRaises(WireError):
+            WireDecoder().feed(data)
+
+    def test_delta_with_wrong_base_fails(self):
+        encoder = WireEncoder()
+        data = encoder.header() + encoder.generation(2, is_delta=True) + \
+            encoder.encode_delta([self.a, self.b], [self.a]) + encoder.end()
+        with self.assertRaises(WireError):
+            WireDecoder(base_files=[self.a]).feed(data)
+
+    def test_unused_data_holds_next_stream(self):
+        for compress in (True, False):
+            data = WireEncoder(compress=compress).encode([self.a]) + \
+                WireEncoder(compress=compress).encode([self.b])
+            # Feed byte by byte so that the end of the first stream is split up
+            decoder = WireDecoder()
+            for i in range(len(data)):
+                decoder.feed(data[i:i+1])
+            self.assertTrue(decoder.done)
+            self.assertEqual([self.a], decoder.files)
+            next_decoder = WireDecoder()
+            next_decoder.feed(decoder.unused_data)
+            self.assertTrue(next_decoder.done)
+            self.assertEqual([self.b], next_decoder.files)
+            self.assertEqual(b"", next_decoder.unused_data)
@@ -5,7 +5,7 @@ import json
 
 from .test_serialize import parse_stream
 from web.serialize import SerializeModel
-from model import ModelFile
+from model import ModelFile, ModelFilePatch
 
 
 class TestSerializeModel(unittest.TestCase):
@@ -32,6 +32,33 @@ class TestSerializeModel(unittest.TestCase):
         )
         self.assertEqual("model-removed", out["event"])
 
+    def test_event_ids(self):
+        serialize = SerializeModel()
+        out = parse_stream(serialize.model([]))
+        self.assertNotIn("id", out)
+        out = parse_stream(serialize.model([], 42))
+        self.assertEqual("42", out["id"])
+        out = parse_stream(
+            serialize.update_event(SerializeModel.UpdateEvent(
+                SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("a", False)
+            ), 43)
+        )
+        self.assertEqual("43", out["id"])
+        old_file = ModelFile("a", False)
+        new_file = ModelFile("a", False)
+        new_file.local_size = 100
+        out = parse_stream(
+            serialize.file_patches("a", ModelFilePatch.diff_files(old_file, new_file), 44)
+        )
+        self.assertEqual("44", out["id"])
+
+    def test_resumed(self):
+        serialize = SerializeModel()
+        out = parse_stream(serialize.resumed(42))
+        self.assertEqual("model-resumed", out["event"])
+        self.assertEqual("42", out["id"])
+        self.assertEqual({}, json.loads(out["data"]))
+
     def test_model_is_a_list(self):
         serialize = SerializeModel()
         files = []
@@ -95,6 +122,69 @@ class TestSerializeModel(unittest.TestCase):
         self.assertEqual(200, data["old_file"]["local_size"])
         self.assertEqual(None, data["new_file"])
 
+    def test_file_patches(self):
+        serialize = SerializeModel()
+        out = parse_stream(serialize.file_patches("a", [
+            ModelFilePatch(ModelFilePatch.Change.UPDATED, "a", fields={"local_size": 100}),
+            ModelFilePatch(ModelFilePatch.Change.REMOVED, "a/aa")
+        ], 42))
+        self.assertEqual("model-patched", out["event"])
+        self.assertEqual("42", out["id"])
+        self.assertEqual({
+            "name": "a",
+            "patches": [
+                {"change": "updated", "path": "a", "fields": {"local_size": 100}},
+                {"change": "removed", "path": "a/aa"}
+            ]
+        }, json.loads(out["data"]))
+
+    def test_file_patches_of_diff(self):
+        serialize = SerializeModel()
+        a1 = ModelFile("a", True)
+        aa1 = ModelFile("aa", False)
+        aa1.local_size = 100
+        a1.add_child(aa1)
+        ab1 = ModelFile("ab", False)
+        a1.add_child(ab1)
+        a1.freeze()
+        a2 = ModelFile("a", True)
+        aa2 = ModelFile("aa", False)
+        aa2.local_size = 200
+        aa2.transferred_size = 200
+        aa2.state = ModelFile.State.DOWNLOADING
+        a2.add_child(aa2)
+        ac2 = ModelFile("ac", False)
+        a2.add_child(ac2)
+        a2.freeze()
+
+        out = parse_stream(serialize.file_patches("a", ModelFilePatch.diff_files(a1, a2)))
+        self.assertEqual("model-patched", out["event"])
+        data = json.loads(out["data"])
+        self.assertEqual("a", data["name"])
+        patches = {p["path"]: p for p in data["patches"]}
+        self.assertEqual({"a/aa", "a/ab", "a/ac"}, set(patches.keys()))
+        # transferred size isn't sent
+        self.assertEqual({"change": "updated",
+                          "path": "a/aa",
+                          "fields": {"state": "downloading", "local_size": 200}}, patches["a/aa"])
+        self.assertEqual({"change": "removed", "path": "a/ab"}, patches["a/ab"])
+        self.assertEqual("added", patches["a/ac"]["change"])
+        self.assertEqual("ac", patches["a/ac"]["file"]["name"])
+        self.assertEqual("a/ac", patches["a/ac"]["file"]["full_path"])
+
+        # Nothing that's sent changed
+        a3 = ModelFile("a", True)
+        aa3 = ModelFile("aa", False)
+        aa3.local_size = 200
+        aa3.state = ModelFile.State.DOWNLOADING
+        a3.add_child(aa3)
+        ac3 = ModelFile("ac", False)
+        a3.add_child(ac3)
+        a3.freeze()
+        out = parse_stream(serialize.file_patches("a", ModelFilePatch.diff_files(a2, a3)))
+        data = json.loads(out["data"])
+        self.assertEqual([], data["patches"])
+
     def test_file_name(self):
         serialize = SerializeModel()
         files = [ModelFile("a", True), ModelFile("b", False)]
@@ -218,6 +308,24 @@ class TestSerializeModel(unittest.TestCase):
         self.assertEqual(False, data[0]["is_extractable"])
         self.assertEqual(True, data[1]["is_extractable"])
 
+    def test_file_counts(self):
+        serialize = SerializeModel()
+        a = ModelFile("a", True)
+        a.num_files = 3
+        a.num_remote_files = 2
+        a.num_downloaded_files = 1
+        b = ModelFile("b", False)
+        files = [a, b]
+        out = parse_stream(serialize.model(files))
+        data = json.loads(out["data"])
+        self.assertEqual(2, len(data))
+        self.assertEqual(3, data[0]["num_files"])
+        self.assertEqual(2, data[0]["num_remote_files"])
+        self.assertEqual(1, data[0]["num_downloaded_files"])
+        self.assertEqual(0, data[1]["num_files"])
+        self.assertEqual(0, data[1]["num_remote_files"])
+        self.assertEqual(0, data[1]["num_downloaded_files"])
+
     def test_children(self):
         serialize = SerializeModel()
         a = ModelFile("a", True)
@@ -75,3 +75,18 @@ class TestSerializeStatus(unittest.TestCase):
         out = parse_stream(serialize.status(status))
         data = json.loads(out["data"])
         self.assertEqual(str(time_float), data["controller"]["latest_remote_scan_time"])
+
+    def test_controller_status_scan_intervals(self):
+        serialize = SerializeStatus()
+        status = Status()
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertIsNone(data["controller"]["local_scan_interval_ms"])
+        self.assertIsNone(data["controller"]["remote_scan_interval_ms"])
+
+        status.controller.local_scan_interval_ms = 10000
+        status.controller.remote_scan_interval_ms = 60000
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertEqual(10000, data["controller"]["local_scan_interval_ms"])
+        self.assertEqual(60000, data["controller"]["remote_scan_interval_ms"])
@@ -1,65 +1,108 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from typing import Optional
+from typing import Optional, List
+
+import bottle
 
 from ..web_app import IStreamHandler
 from ..utils import StreamQueue
 from ..serialize import SerializeModel
-from model import IModelListener, ModelFile
+from model import IModelListener, ModelFile, ModelChange
 from common import overrides
 from controller import Controller
 
 
-class WebResponseModelListener(IModelListener, StreamQueue[SerializeModel.UpdateEvent]):
+class WebResponseModelListener(IModelListener, StreamQueue[ModelChange]):
     """
     Model listener used by streams to listen to model updates
     One listener should be created for each new request
+    The model's changes are queued rather than the file events, since they
+    already hold the changes by node of updated files
     """
     def __init__(self):
         super().__init__()
 
     @overrides(IModelListener)
     def file_added(self, file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.ADDED,
-                                            old_file=None,
-                                            new_file=file))
+        pass
 
     @overrides(IModelListener)
     def file_removed(self, file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.REMOVED,
-                                            old_file=file,
-                                            new_file=None))
+        pass
 
     @overrides(IModelListener)
     def file_updated(self, old_file: ModelFile, new_file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.UPDATED,
-                                            old_file=old_file,
-                                            new_file=new_file))
+        pass
+
+    @overrides(IModelListener)
+    def model_changed(self, change: ModelChange):
+        self.put(change)
 
 
 class ModelStreamHandler(IStreamHandler):
+    """
+    Streams the model, starting with the whole model and followed by its updates
+    A client that reconnects can pass the last model version it received in
+    the model_version query parameter. If the updates since are still kept,
+    the stream resumes from there instead of starting with the whole model.
+    """
+    QUERY_KEY_MODEL_VERSION = "model_version"
+
     def __init__(self, controller: Controller):
         self.controller = controller
         self.serialize = SerializeModel()
         self.model_listener = WebResponseModelListener()
-        self.initial_model_files = None
-        self.first_run = True
+        self.version = None  # model version of the last value
+        self.pending_values = []  # type: List[str]
 
     @overrides(IStreamHandler)
     def setup(self):
-        self.initial_model_files = self.controller.get_model_files_and_add_listener(self.model_listener)
+        last_version = ModelStreamHandler.__get_last_version()
+        changes = None
+        if last_version is not None:
+            changes = self.controller.get_model_changes_and_add_listener(self.model_listener, last_version)
+        if changes is not None:
+            self.version = last_version
+            self.pending_values.append(self.serialize.resumed(self.version))
+            for change in changes:
+                self.pending_values.append(self.__serialize_change(change))
+        else:
+            # Start with the whole model
+            self.version, model_files = \
+                self.controller.get_model_version_and_files_and_add_listener(self.model_listener)
+            self.pending_values.append(self.serialize.model(model_files, self.version))
 
     @overrides(IStreamHandler)
     def get_value(self) -> Optional[str]:
-        if self.first_run:
-            self.first_run = False
-            return self.serialize.model(self.initial_model_files)
+        if self.pending_values:
+            return self.pending_values.pop(0)
+        change = self.model_listener.get_next_event()
+        if change is not None:
+            return self.__serialize_change(change)
         else:
-            event = self.model_listener.get_next_event()
-            if event is not None:
-                return self.serialize.update_event(event)
-            else:
-                return None
+            return None
+
+    def __serialize_change(self, change: ModelChange) -> str:
+        self.version = change.version
+        if change.patches is not None:
+            # Only send what changed, updates are usually small
+            # changes to large trees
+            return self.serialize.file_patches(change.name, change.patches, self.version)
+        if change.old_file is None:
+            event = SerializeModel.UpdateEvent(SerializeModel.UpdateEvent.Change.ADDED, None, change.new_file)
+        else:
+            event = SerializeModel.UpdateEvent(SerializeModel.UpdateEvent.Change.REMOVED, change.old_file, None)
+        return self.serialize.update_event(event, self.version)
+
+    @staticmethod
+    def __get_last_version() -> Optional[int]:
+        value = bottle.request.query.get(ModelStreamHandler.QUERY_KEY_MODEL_VERSION)
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return None
 
     @overrides(IStreamHandler)
     def cleanup(self):
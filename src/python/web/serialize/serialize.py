@@ -1,6 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 from abc import ABC
+from typing import Optional
 
 
 class Serialize(ABC):
@@ -8,9 +9,11 @@ class Serialize(ABC):
     Base class for serialization
     """
     # noinspection PyMethodMayBeStatic
-    def _sse_pack(self, event: str, data: str) -> str:
+    def _sse_pack(self, event: str, data: str, event_id: Optional[str] = None) -> str:
         """Pack data in SSE format"""
         buffer = ""
+        if event_id is not None:
+            buffer += "id: %s\n" % event_id
         buffer += "event: %s\n" % event
         buffer += "data: %s\n" % data
         buffer += "\n"
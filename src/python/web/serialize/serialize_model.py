@@ -5,13 +5,15 @@ import json
 from typing import List, Optional
 
 from .serialize import Serialize
-from model import ModelFile
+from model import ModelFile, ModelFilePatch
 
 
 class SerializeModel(Serialize):
     """
     This class defines the serialization interface between the python backend
     and the EventSource client frontend for the model stream.
+    Events are given the model version they bring the client up to as their
+    id, so that a client can resume the stream from the last version it saw.
     """
 
     class UpdateEvent:
@@ -27,6 +29,7 @@ class SerializeModel(Serialize):
 
     # Event keys
     __EVENT_INIT = "model-init"
+    __EVENT_RESUMED = "model-resumed"
     __EVENT_UPDATE = {
         UpdateEvent.Change.ADDED: "model-added",
         UpdateEvent.Change.REMOVED: "model-removed",
@@ -34,6 +37,18 @@ class SerializeModel(Serialize):
     }
     __KEY_UPDATE_OLD_FILE = "old_file"
     __KEY_UPDATE_NEW_FILE = "new_file"
+    __EVENT_PATCH = "model-patched"
+    __KEY_PATCH_NAME = "name"
+    __KEY_PATCH_PATCHES = "patches"
+    __KEY_PATCH_CHANGE = "change"
+    __VALUES_PATCH_CHANGE = {
+        ModelFilePatch.Change.ADDED: "added",
+        ModelFilePatch.Change.REMOVED: "removed",
+        ModelFilePatch.Change.UPDATED: "updated"
+    }
+    __KEY_PATCH_PATH = "path"
+    __KEY_PATCH_FIELDS = "fields"
+    __KEY_PATCH_FILE = "file"
 
     # Model file keys
     __KEY_FILE_NAME = "name"
@@ -53,9 +68,25 @@ class SerializeModel(Serialize):
     __KEY_FILE_DOWNLOADING_SPEED = "downloading_speed"
     __KEY_FILE_ETA = "eta"
     __KEY_FILE_IS_EXTRACTABLE = "is_extractable"
+    __KEY_FILE_NUM_FILES = "num_files"
+    __KEY_FILE_NUM_REMOTE_FILES = "num_remote_files"
+    __KEY_FILE_NUM_DOWNLOADED_FILES = "num_downloaded_files"
     __KEY_FILE_FULL_PATH = "full_path"
     __KEY_FILE_CHILDREN = "children"
 
+    # Patch fields that are serialized, by ModelFile property name
+    __PATCH_FIELD_KEYS = {
+        "state": __KEY_FILE_STATE,
+        "remote_size": __KEY_FILE_REMOTE_SIZE,
+        "local_size": __KEY_FILE_LOCAL_SIZE,
+        "downloading_speed": __KEY_FILE_DOWNLOADING_SPEED,
+        "eta": __KEY_FILE_ETA,
+        "is_extractable": __KEY_FILE_IS_EXTRACTABLE,
+        "num_files": __KEY_FILE_NUM_FILES,
+        "num_remote_files": __KEY_FILE_NUM_REMOTE_FILES,
+        "num_downloaded_files": __KEY_FILE_NUM_DOWNLOADED_FILES
+    }
+
     @staticmethod
     def __model_file_to_json_dict(model_file: ModelFile) -> dict:
         json_dict = dict()
@@ -67,23 +98,44 @@ class SerializeModel(Serialize):
         json_dict[SerializeModel.__KEY_FILE_DOWNLOADING_SPEED] = model_file.downloading_speed
         json_dict[SerializeModel.__KEY_FILE_ETA] = model_file.eta
         json_dict[SerializeModel.__KEY_FILE_IS_EXTRACTABLE] = model_file.is_extractable
+        json_dict[SerializeModel.__KEY_FILE_NUM_FILES] = model_file.num_files
+        json_dict[SerializeModel.__KEY_FILE_NUM_REMOTE_FILES] = model_file.num_remote_files
+        json_dict[SerializeModel.__KEY_FILE_NUM_DOWNLOADED_FILES] = model_file.num_downloaded_files
         json_dict[SerializeModel.__KEY_FILE_FULL_PATH] = model_file.full_path
         json_dict[SerializeModel.__KEY_FILE_CHILDREN] = list()
-        for child in model_file.get_children():
+        for child in model_file.children:
             json_dict[SerializeModel.__KEY_FILE_CHILDREN].append(SerializeModel.__model_file_to_json_dict(child))
         return json_dict
 
-    def model(self, model_files: List[ModelFile]) -> str:
+    @staticmethod
+    def __event_id(version: Optional[int]) -> Optional[str]:
+        return str(version) if version is not None else None
+
+    def model(self, model_files: List[ModelFile], version: Optional[int] = None) -> str:
         """
         Serialize the model
+        :param model_files:
+        :param version: version of the model
         :return:
         """
         model_json_list = [SerializeModel.__model_file_to_json_dict(f) for f in model_files]
         model_json = json.dumps(model_json_list)
         return self._sse_pack(event=SerializeModel.__EVENT_INIT,
-                              data=model_json)
+                              data=model_json,
+                              event_id=SerializeModel.__event_id(version))
 
-    def update_event(self, event: UpdateEvent):
+    def resumed(self, version: int) -> str:
+        """
+        Serialize the notice that the stream resumes from the given version,
+        which the client already has, instead of starting with the model
+        :param version:
+        :return:
+        """
+        return self._sse_pack(event=SerializeModel.__EVENT_RESUMED,
+                              data=json.dumps({}),
+                              event_id=SerializeModel.__event_id(version))
+
+    def update_event(self, event: UpdateEvent, version: Optional[int] = None):
         model_file_json_dict = {
             SerializeModel.__KEY_UPDATE_OLD_FILE:
                 SerializeModel.__model_file_to_json_dict(event.old_file) if event.old_file else None,
@@ -92,4 +144,43 @@ class SerializeModel(Serialize):
         }
         model_file_json = json.dumps(model_file_json_dict)
         return self._sse_pack(event=SerializeModel.__EVENT_UPDATE[event.change],
-                              data=model_file_json)
+                              data=model_file_json,
+                              event_id=SerializeModel.__event_id(version))
+
+    def file_patches(self, name: str, patches: List[ModelFilePatch], version: Optional[int] = None) -> str:
+        """
+        Serialize the changes by node to the file of the given name
+        :param name:
+        :param patches:
+        :param version: version of the model after the changes
+        :return:
+        """
+        patches_json_list = []
+        for patch in patches:
+            patch_json_dict = {
+                SerializeModel.__KEY_PATCH_CHANGE: SerializeModel.__VALUES_PATCH_CHANGE[patch.change],
+                SerializeModel.__KEY_PATCH_PATH: patch.path
+            }
+            if patch.change == ModelFilePatch.Change.ADDED:
+                patch_json_dict[SerializeModel.__KEY_PATCH_FILE] = \
+                    SerializeModel.__model_file_to_json_dict(patch.file)
+            elif patch.change == ModelFilePatch.Change.UPDATED:
+                fields_json_dict = dict()
+                for field, value in patch.fields.items():
+                    if field not in SerializeModel.__PATCH_FIELD_KEYS:
+                        continue
+                    if field == "state":
+                        value = SerializeModel.__VALUES_FILE_STATE[value]
+                    fields_json_dict[SerializeModel.__PATCH_FIELD_KEYS[field]] = value
+                if not fields_json_dict:
+                    # None of the changes are sent to the frontend
+                    continue
+                patch_json_dict[SerializeModel.__KEY_PATCH_FIELDS] = fields_json_dict
+            patches_json_list.append(patch_json_dict)
+        patch_json = json.dumps({
+            SerializeModel.__KEY_PATCH_NAME: name,
+            SerializeModel.__KEY_PATCH_PATCHES: patches_json_list
+        })
+        return self._sse_pack(event=SerializeModel.__EVENT_PATCH,
+                              data=patch_json,
+                              event_id=SerializeModel.__event_id(version))
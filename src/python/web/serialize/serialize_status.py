@@ -23,6 +23,8 @@ class SerializeStatus(Serialize):
     __KEY_CONTROLLER = "controller"
     __KEY_CONTROLLER_LATEST_LOCAL_SCAN_TIME = "latest_local_scan_time"
     __KEY_CONTROLLER_LATEST_REMOTE_SCAN_TIME = "latest_remote_scan_time"
+    __KEY_CONTROLLER_LOCAL_SCAN_INTERVAL_MS = "local_scan_interval_ms"
+    __KEY_CONTROLLER_REMOTE_SCAN_INTERVAL_MS = "remote_scan_interval_ms"
 
     def status(self, status: Status) -> str:
         json_dict = dict()
@@ -40,6 +42,10 @@ class SerializeStatus(Serialize):
         json_dict[SerializeStatus.__KEY_CONTROLLER][SerializeStatus.__KEY_CONTROLLER_LATEST_REMOTE_SCAN_TIME] = \
             str(SerializeStatus.__datetime_to_time(status.controller.latest_remote_scan_time)) \
                 if status.controller.latest_remote_scan_time else None
+        json_dict[SerializeStatus.__KEY_CONTROLLER][SerializeStatus.__KEY_CONTROLLER_LOCAL_SCAN_INTERVAL_MS] = \
+            status.controller.local_scan_interval_ms
+        json_dict[SerializeStatus.__KEY_CONTROLLER][SerializeStatus.__KEY_CONTROLLER_REMOTE_SCAN_INTERVAL_MS] = \
+            status.controller.remote_scan_interval_ms
 
         status_json = json.dumps(json_dict)
         return self._sse_pack(event=SerializeStatus.__EVENT_STATUS, data=status_json)